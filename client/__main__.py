@@ -5,16 +5,19 @@ Run with ``python3 -m client <host name> <port number> <username> <message_type>
 
 import sys
 
-from logging_config import configure_logging
+from logging_config import add_log_file, configure_logging
 from .client import Client
 
 
 def main() -> None:
     """Run the client side of the program."""
-    configure_logging("client")
+    # The log file is only written when asked for, to keep startup quick
+    configure_logging("client", log_file=False)
 
     try:
         client = Client(sys.argv[1:])
+        if client.log_file:
+            add_log_file("client")
         client.run()
     except SystemExit:
         sys.exit(1)
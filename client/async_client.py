@@ -0,0 +1,402 @@
+"""An ``asyncio`` client, for sending requests on behalf of many users at once.
+
+Unlike ``Client``, which sends one request per process, an
+``AsyncMessagingClient`` keeps a few connections open and pipelines every
+request sent through it over them, so a single process can have thousands
+of requests in flight::
+
+    address = ServerAddress.from_str("localhost:12000")
+    async with AsyncMessagingClient(address) as client:
+        await client.send("Alice", "John", "Hello John!")
+        messages = await client.drain("John")
+
+Gateways holding the server's gateway key can read the mailboxes of
+thousands of users with a handful of requests, using ``read_many``.
+
+It is not imported by the ``client`` package, so the command line client
+does not pay for importing ``asyncio``.
+"""
+
+from collections import deque
+from types import TracebackType
+from typing import Any, Optional
+import asyncio
+import logging
+
+from src.packets.message_request import MessageRequest
+from src.packets.message_response import MessageResponse
+from src.packets.packet import Packet
+from src.packets.response_framing import split_responses
+from src.packets.result_response import ResultResponse
+from src.message_type import MessageType
+from src.request_option import RequestOption
+from src.result_code import ResultCode
+from src.server_address import ServerAddress
+
+
+logger = logging.getLogger(__name__)
+
+
+class RequestRejectedError(Exception):
+    """Raised when the server declines to carry out a request."""
+
+    def __init__(self, result_code: ResultCode):
+        """Create the error with the result the server responded with.
+
+        :param result_code: The result code describing why the request failed.
+        """
+        super().__init__(result_code.description)
+        self.result_code = result_code
+
+
+class PipelinedConnection:
+    """A connection carrying many requests at once.
+
+    The server answers the requests on a connection in the order they were
+    sent, so each response is matched to the oldest request still waiting.
+    Requests answered with several responses, such as bulk reads, wait for
+    them all. If the connection fails, every request waiting on it fails too.
+    """
+
+    RECEIVE_SIZE = 65536
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Start receiving responses on a newly opened connection.
+
+        :param reader: The stream the server's responses arrive on.
+        :param writer: The stream requests are sent on.
+        """
+        self.reader = reader
+        self.writer = writer
+        # The requests sent but not yet answered, oldest first, and the
+        # number of responses each is answered with
+        self.waiting: deque[tuple[asyncio.Future[bytes], int]] = deque()
+        # The responses received so far for the oldest request
+        self.responses: list[bytes] = []
+        self.buffer = bytearray()
+        self.closed = False
+        self.receiver = asyncio.ensure_future(self.receive())
+
+    async def request(self, packet: bytes, responses: int = 1) -> bytes:
+        """Send a request, and wait for the server's response.
+
+        :param packet: The encoded request.
+        :param responses: The number of message responses the request is
+            answered with, unless it is refused.
+        :return: The response, or every response one after another.
+        :raises ConnectionError: If the connection fails first.
+        """
+        if self.closed:
+            raise ConnectionResetError("Connection closed by server")
+
+        response: asyncio.Future[bytes] = asyncio.get_running_loop().create_future()
+        self.waiting.append((response, responses))
+        try:
+            self.writer.write(packet)
+            await self.writer.drain()
+        except OSError as error:
+            response.cancel()
+            self.fail(error)
+            raise
+        return await response
+
+    async def receive(self) -> None:
+        """Match each response that arrives to the request it answers."""
+        try:
+            while True:
+                data = await self.reader.read(PipelinedConnection.RECEIVE_SIZE)
+                if not data:
+                    raise ConnectionResetError("Connection closed by server")
+                self.buffer += data
+
+                for packet in split_responses(self.buffer):
+                    if not self.waiting:
+                        raise ValueError("Received a response to no request")
+                    response, responses = self.waiting[0]
+                    self.responses.append(packet)
+                    # A refusal is the only response to a request
+                    if (
+                        len(self.responses) < responses
+                        and Packet.peek_message_type(packet) == MessageType.RESPONSE
+                    ):
+                        continue
+
+                    self.waiting.popleft()
+                    data = b"".join(self.responses)
+                    self.responses.clear()
+                    # Requests which timed out are no longer waited for
+                    if not response.done():
+                        response.set_result(data)
+        except (OSError, ValueError) as error:
+            logger.error(error)
+            self.fail(error)
+
+    def fail(self, error: Exception) -> None:
+        """Close the connection, failing every request still waiting.
+
+        :param error: Why the connection failed.
+        """
+        self.closed = True
+        self.responses.clear()
+        while self.waiting:
+            response, _ = self.waiting.popleft()
+            if not response.done():
+                response.set_exception(ConnectionResetError(str(error)))
+        self.writer.close()
+
+    async def close(self) -> None:
+        """Close the connection, abandoning any requests still waiting."""
+        self.receiver.cancel()
+        self.fail(ConnectionAbortedError("Connection closed by client"))
+        # The server may already have gone
+        try:
+            await self.writer.wait_closed()
+        except OSError:
+            pass
+
+
+class AsyncMessagingClient:
+    """Sends requests to a server on behalf of any number of users.
+
+    Requests are spread over up to ``max_connections`` connections, each
+    opened the first time every open connection already has a request
+    waiting. At most ``max_in_flight`` requests are sent without having
+    been answered, and any more wait for one of those to be answered.
+
+    A request which is not answered within ``timeout`` seconds fails, but
+    the server may still carry it out. Reads remove the messages they are
+    answered with, so those of a read which timed out are lost.
+    """
+
+    def __init__(
+        self,
+        address: ServerAddress,
+        max_connections: int = 4,
+        max_in_flight: int = 4096,
+        timeout: float = 10.0,
+    ):
+        """Create a client for a server, without connecting to it yet.
+
+        :param address: The address of the server.
+        :param max_connections: The most connections to open to the server.
+        :param max_in_flight: The most requests awaiting responses at once.
+        :param timeout: The number of seconds to wait for each response.
+        """
+        self.address = address
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.connections: list[PipelinedConnection] = []
+        # Created by the event loop the client is first used in, as they
+        # belong to the loop running when they are created before Python 3.10
+        self.in_flight: Optional[asyncio.Semaphore] = None
+        self.connecting: Optional[asyncio.Lock] = None
+
+    async def __aenter__(self) -> "AsyncMessagingClient":
+        """Use the client as an asynchronous context manager.
+
+        :return: The client.
+        """
+        return self
+
+    async def __aexit__(
+        self,
+        exception_type: Optional[type[BaseException]],
+        exception: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Close every connection when leaving the context."""
+        await self.close()
+
+    async def send(  # noqa: PLR0913
+        self,
+        sender_name: str,
+        receiver_name: str,
+        message: str,
+        time_to_live: Optional[int] = None,
+        priority: int = 0,
+    ) -> None:
+        """Send a message, waiting until the server has stored it.
+
+        :param sender_name: The name of the user sending the message.
+        :param receiver_name: The name of the user to send the message to.
+        :param message: The message to send.
+        :param time_to_live: The number of seconds to keep the message for,
+            or ``None`` for the server's default.
+        :param priority: The message's lane in the receiver's mailbox, where
+            higher lanes are read first.
+        :raises RequestRejectedError: If the server did not store the message.
+        :raises OSError: If the server cannot be reached, or does not answer.
+        """
+        options: dict[RequestOption, Any] = {RequestOption.ACKNOWLEDGE: b""}
+        if time_to_live:
+            options[RequestOption.TIME_TO_LIVE] = time_to_live
+        if priority:
+            options[RequestOption.PRIORITY] = priority
+        response = await self.exchange(
+            MessageRequest(
+                MessageType.CREATE, sender_name, receiver_name, message, options
+            )
+        )
+
+        (result_code,) = ResultResponse.decode_packet(response)
+        if result_code != ResultCode.OK:
+            raise RequestRejectedError(result_code)
+
+    async def read(
+        self, user_name: str, priority: int = 0
+    ) -> tuple[list[tuple[str, str]], bool]:
+        """Read, and remove, the next page of messages in a user's mailbox.
+
+        :param user_name: The name of the user whose messages to read.
+        :param priority: How urgently the server should serve the read.
+        :return: The sender and text of each message, and whether the
+            mailbox has more messages.
+        :raises RequestRejectedError: If the server refused to read them.
+        :raises OSError: If the server cannot be reached, or does not answer.
+            The messages of a read which was not answered in time may
+            already have been removed.
+        """
+        options = {RequestOption.PRIORITY: priority} if priority else None
+        response = await self.exchange(
+            MessageRequest(MessageType.READ, user_name, "", "", options)
+        )
+        if Packet.peek_message_type(response) == MessageType.RESULT:
+            (result_code,) = ResultResponse.decode_packet(response)
+            raise RequestRejectedError(result_code)
+
+        return MessageResponse.decode_packet(response)
+
+    async def drain(self, user_name: str) -> list[tuple[str, str]]:
+        """Read, and remove, every message in a user's mailbox.
+
+        :param user_name: The name of the user whose messages to read.
+        :return: The sender and text of each message, highest lane first,
+            and oldest first within each lane.
+        :raises RequestRejectedError: If the server refused to read them.
+        :raises OSError: If the server cannot be reached, or does not answer.
+        """
+        messages = []
+        more_messages = True
+        while more_messages:
+            page, more_messages = await self.read(user_name)
+            messages.extend(page)
+        return messages
+
+    async def read_many(
+        self, gateway_name: str, user_names: list[str], gateway_key: bytes
+    ) -> dict[str, tuple[list[tuple[str, str]], bool]]:
+        """Read, and remove, the next page of messages in many users' mailboxes.
+
+        The names are sent in as few bulk read requests as will hold them,
+        each answered with a page for every user it names.
+
+        :param gateway_name: The name to send the requests as.
+        :param user_names: The names of the users whose messages to read.
+        :param gateway_key: The key the server allows bulk reads with.
+        :return: The sender and text of each message read for each user,
+            and whether their mailbox has more messages.
+        :raises ValueError: If a user name cannot be sent in a bulk read.
+        :raises RequestRejectedError: If the server refused to read them.
+        :raises OSError: If the server cannot be reached, or does not answer.
+        """
+        # Each mailbox is read once, however many times it is named
+        batches = MessageRequest.batch_names(list(dict.fromkeys(user_names)))
+        options = {RequestOption.GATEWAY_KEY: gateway_key}
+        responses = await asyncio.gather(
+            *(
+                self.exchange(
+                    MessageRequest(
+                        MessageType.BULK_READ, gateway_name, "", batch, options
+                    ),
+                    responses=batch.count(MessageRequest.NAME_SEPARATOR) + 1,
+                )
+                for batch in batches
+            )
+        )
+
+        pages = {}
+        for batch, response in zip(batches, responses):
+            if Packet.peek_message_type(response) == MessageType.RESULT:
+                (result_code,) = ResultResponse.decode_packet(response)
+                raise RequestRejectedError(result_code)
+            packets = split_responses(bytearray(response))
+            for user_name, packet in zip(
+                batch.split(MessageRequest.NAME_SEPARATOR), packets
+            ):
+                pages[user_name] = MessageResponse.decode_packet(packet)
+        return pages
+
+    async def exchange(self, request: MessageRequest, responses: int = 1) -> bytes:
+        """Send a request over one of the client's connections.
+
+        :param request: The request to send.
+        :param responses: The number of message responses the request is
+            answered with, unless it is refused.
+        :return: The server's response, or every response one after another.
+        :raises OSError: If the server cannot be reached, or does not answer.
+        """
+        packet = request.to_bytes()
+        if self.in_flight is None:
+            self.in_flight = asyncio.Semaphore(self.max_in_flight)
+        async with self.in_flight:
+            connection = await self.connection()
+            try:
+                return await asyncio.wait_for(
+                    connection.request(packet, responses), self.timeout
+                )
+            except asyncio.TimeoutError as error:
+                raise TimeoutError("No response from server") from error
+
+    async def connection(self) -> PipelinedConnection:
+        """Choose the connection with the fewest requests waiting on it.
+
+        A new connection is opened instead if every one has requests
+        waiting and there is room for another.
+
+        :return: An open connection.
+        :raises OSError: If a new connection could not be opened.
+        """
+        self.connections = [
+            connection for connection in self.connections if not connection.closed
+        ]
+        if self.connections:
+            least_busy = min(
+                self.connections, key=lambda connection: len(connection.waiting)
+            )
+            if not least_busy.waiting or len(self.connections) >= self.max_connections:
+                return least_busy
+
+        if self.connecting is None:
+            self.connecting = asyncio.Lock()
+        async with self.connecting:
+            if len(self.connections) < self.max_connections:
+                connection = await self.open_connection()
+                self.connections.append(connection)
+            return min(self.connections, key=lambda connection: len(connection.waiting))
+
+    async def open_connection(self) -> PipelinedConnection:
+        """Open a new connection to the server.
+
+        :return: The connection.
+        :raises OSError: If the connection could not be made.
+        """
+        if ServerAddress.is_unix(self.address.host_name):
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_unix_connection(self.address.unix_path), self.timeout
+            )
+        else:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(
+                    self.address.host_name, self.address.port_number
+                ),
+                self.timeout,
+            )
+        logger.info("Connected to %s", self.address)
+        return PipelinedConnection(reader, writer)
+
+    async def close(self) -> None:
+        """Close every connection, abandoning any requests still waiting."""
+        connections, self.connections = self.connections, []
+        for connection in connections:
+            await connection.close()
@@ -1,15 +1,22 @@
 """The client module contains the Client class."""
 
-from collections import OrderedDict
-from typing import Optional
+from collections import OrderedDict, deque
+from typing import Any, Callable, Iterator, Optional
+import contextlib
 import logging
+import os
 import socket
 
 from src.command_line_application import CommandLineApplication
-from src.packets.message_response import MessageResponse
+from src.option_parsers import non_negative_int, positive_int, switch
 from src.packets.message_request import MessageRequest
+from src.packets.result_response import ResultResponse
+from src.packets.packet import Packet
 from src.message_type import MessageType
 from src.port_number import PortNumber
+from src.request_option import RequestOption
+from src.result_code import ResultCode
+from src.server_address import ServerAddress
 
 
 logger = logging.getLogger(__name__)
@@ -31,8 +38,16 @@ class Client(CommandLineApplication):
                 host_name=self.parse_hostname,
                 port_number=PortNumber,
                 user_name=self.parse_username,
-                message_type=MessageType.from_str,
-            )
+                message_type=self.parse_message_type,
+            ),
+            OrderedDict(
+                time_to_live=(positive_int, None),
+                window=(positive_int, None),
+                retries=(non_negative_int, 0),
+                priority=(non_negative_int, 0),
+                attach=(str, None),
+                log_file=(switch, False),
+            ),
         )
 
         # pylint thinks that self.parse_arguments is only capable
@@ -50,22 +65,46 @@ class Client(CommandLineApplication):
             self.host_name,
             self.port_number,
             self.user_name,
-            self.message_type.name.lower(),
+            "session" if self.message_type is None else self.message_type.name.lower(),
         )
 
+        self.address = ServerAddress(
+            (
+                self.host_name
+                if ServerAddress.is_unix(self.host_name)
+                else ServerAddress.resolve(self.host_name)
+            ),
+            self.port_number,
+        )
         self.receiver_name = ""
         self.message = ""
+        self.time_to_live = self.option_values["time_to_live"]
+        self.window = self.option_values["window"]
+        self.retries = self.option_values["retries"]
+        # Sent as a single byte
+        self.priority = min(self.option_values["priority"], 255)
+        self.attachment_path = self.option_values["attach"]
+        self.log_file = self.option_values["log_file"]
 
     @staticmethod
     def parse_hostname(host_name: str) -> str:
         """Parse the host name, ensuring it is valid.
 
+        Host names of the form ``unix:/path`` refer to a Unix domain socket,
+        which is not resolved.
+
         :param host_name: String representing the host name.
         :return: String of the host name.
         :raises ValueError: If the host name is invalid.
         """
+        if ServerAddress.is_unix(host_name):
+            if not ServerAddress(host_name, 0).unix_path:
+                raise ValueError("Unix socket address must include a path")
+            return host_name
+
         try:
-            socket.getaddrinfo(host_name, 1024)
+            # Cached, so connecting to the host does not look it up again
+            ServerAddress.resolve(host_name)
         except socket.gaierror as error:
             logger.error(error)
             raise ValueError(
@@ -75,6 +114,18 @@ class Client(CommandLineApplication):
 
         return host_name
 
+    @staticmethod
+    def parse_message_type(string: str) -> Optional[MessageType]:
+        """Parse the type of request to send, or ``session`` to send many.
+
+        :param string: String representing the message type.
+        :return: The message type, or ``None`` to start a session.
+        :raises ValueError: If the message type is invalid.
+        """
+        if string.lower() == "session":
+            return None
+        return MessageType.from_str(string)
+
     @staticmethod
     def parse_username(user_name: str) -> str:
         """Parse the username, ensuring it is valid.
@@ -93,49 +144,259 @@ class Client(CommandLineApplication):
 
         return user_name
 
-    def send_message_request(self, request: MessageRequest) -> Optional[bytes]:
-        """Send a message request record to the server.
+    @contextlib.contextmanager
+    def reporting_connection_errors(self) -> Iterator[None]:
+        """Explain to the user why the server could not be reached.
 
-        :param request: The message request to be sent.
-        :return: The server's response if applicable, otherwise ``None``.
+        :return: A context manager which reports connection failures.
+        :raises SystemExit: If the connection fails or times out.
         """
-        packet = request.to_bytes()
-        response = None
         try:
-            with socket.socket() as connection_socket:
-                connection_socket.settimeout(1)
-                connection_socket.connect((self.host_name, self.port_number))
-                connection_socket.send(packet)
-                if self.message_type == MessageType.READ:
-                    response = connection_socket.recv(4096)
+            yield
 
         except ConnectionRefusedError as error:
             logger.error(error)
             print("Connection refused, likely due to invalid port number")
             raise SystemExit from error
+        except ConnectionError as error:
+            logger.error(error)
+            print("Connection closed by the server")
+            raise SystemExit from error
+        except FileNotFoundError as error:
+            logger.error(error)
+            print(f"No server is listening on {self.address.unix_path}")
+            raise SystemExit from error
         except socket.timeout as error:
             logger.error(error)
             print("Connection timed out, likely due to invalid host name")
             raise SystemExit from error
 
+    @contextlib.contextmanager
+    def connect(self) -> Iterator[socket.socket]:
+        """Connect to the server, explaining to the user if it cannot be reached.
+
+        :return: A context manager giving the connected socket.
+        :raises SystemExit: If the connection fails or times out.
+        """
+        with self.reporting_connection_errors():
+            with self.address.connect(timeout=1) as connection_socket:
+                yield connection_socket
+
+    def send_message_request(self, request: MessageRequest) -> Optional[bytes]:
+        """Send a message request record to the server.
+
+        Requests which fail or go unanswered are sent again, up to
+        ``retries`` times. Create requests carrying an idempotency key
+        keep it when retried, so the server stores the message only once.
+
+        :param request: The message request to be sent.
+        :return: The server's response if applicable, otherwise ``None``.
+        """
+        # Create requests are only answered if acknowledged or rejected
+        wait_for_response = (
+            request.message_type != MessageType.CREATE
+            or RequestOption.ACKNOWLEDGE in request.options
+        )
+        retried = key_replaced = False
+        attempt = 0
+        with self.reporting_connection_errors():
+            while True:
+                try:
+                    response = self.exchange(
+                        request.to_bytes(),
+                        wait_for_response,
+                        request.options.get(RequestOption.ATTACHMENT),
+                    )
+                except (ConnectionError, socket.timeout) as error:
+                    if attempt == self.retries:
+                        raise
+                    attempt += 1
+                    retried = True
+                    logger.warning("Request failed, retrying: %s", error)
+                    print(
+                        f"No response from server, retrying ({attempt}/{self.retries})"
+                    )
+                    continue
+
+                if (
+                    response
+                    and Packet.peek_message_type(response) == MessageType.RESULT
+                    and ResultResponse.decode_packet(response)
+                    == (ResultCode.DUPLICATE,)
+                ):
+                    if retried:
+                        # One of the earlier attempts was stored
+                        response = ResultResponse(ResultCode.OK).to_bytes()
+                    elif not key_replaced:
+                        # A new key was mistaken for a repeat, so choose another
+                        request.options[RequestOption.IDEMPOTENCY_KEY] = os.urandom(16)
+                        key_replaced = True
+                        continue
+                break
+
         logger.info(
-            "%s record sent as %s", self.message_type.name.lower(), self.user_name
+            "%s record sent as %s", request.message_type.name.lower(), self.user_name
         )
-        print(f"{self.message_type.name.lower()} record sent as {self.user_name}")
+        print(f"{request.message_type.name.lower()} record sent as {self.user_name}")
 
         return response
 
+    def exchange(
+        self,
+        packet: bytes,
+        wait_for_response: bool,
+        attachment_size: Optional[int] = None,
+    ) -> Optional[bytes]:
+        """Send a single packet to the server on a new connection.
+
+        :param packet: The packet to send.
+        :param wait_for_response: Whether the server always responds, rather
+            than only to refuse a create request.
+        :param attachment_size: The length of the attachment to send in
+            chunks after the packet, if it has one.
+        :return: The server's response, or ``None`` if it accepted a create
+            request without responding.
+        :raises OSError: If the connection fails or times out.
+        """
+        with self.address.connect(timeout=1) as connection_socket:
+            connection_socket.sendall(packet)
+            if attachment_size is not None:
+                self.send_attachment(connection_socket, attachment_size)
+            if not wait_for_response:
+                # The server only answers a create request to refuse it, and
+                # closes the connection once it has served the request
+                connection_socket.shutdown(socket.SHUT_WR)
+                return connection_socket.recv(65536) or None
+
+            response = connection_socket.recv(65536)
+            if not response:
+                raise ConnectionResetError("Connection closed by server")
+            if Packet.peek_message_type(response) != MessageType.RESPONSE:
+                return response
+
+            # Messages, and any attachments, may arrive over several reads
+            # pylint: disable-next=import-outside-toplevel
+            from src.packets.message_response import MessageResponse
+
+            buffer = bytearray(response)
+            length = MessageResponse.frame_length(buffer)
+            while length is None or len(buffer) < length:
+                data = connection_socket.recv(65536)
+                if not data:
+                    raise ConnectionResetError("Connection closed by server")
+                buffer += data
+                length = MessageResponse.frame_length(buffer)
+            return bytes(buffer)
+
+    def send_attachment(self, connection_socket: socket.socket, size: int) -> None:
+        """Send the attachment file in chunks, without reading it all into memory.
+
+        :param connection_socket: The socket connected to the server.
+        :param size: The length of the attachment, as given in its request.
+        :raises OSError: If the file cannot be read, or has changed length.
+        """
+        assert self.attachment_path is not None
+        with open(self.attachment_path, "rb") as attachment_file:
+            remaining = size
+            while remaining:
+                data = attachment_file.read(
+                    min(remaining, MessageRequest.MAX_CHUNK_SIZE)
+                )
+                if not data:
+                    raise OSError(f"{self.attachment_path} changed while being sent")
+                connection_socket.sendall(
+                    MessageRequest.encode_chunk(self.user_name, data)
+                )
+                remaining -= len(data)
+
+    def read_windowed(self) -> None:
+        """Read every message in the mailbox, acknowledging each page once printed.
+
+        Up to ``window`` pages are requested at a time, and another is
+        requested as each one arrives, acknowledging the messages received
+        so far. Messages are only removed from the mailbox once acknowledged,
+        so any lost on the way are sent again by the next read.
+        """
+        # Response decoders are imported when first needed, to keep startup
+        # quick for the many requests which never receive messages
+        # pylint: disable=import-outside-toplevel
+        from src.packets.message_response import MessageResponse
+        from src.packets.response_framing import split_responses
+
+        def request_pages(pages: int, acknowledged: int) -> None:
+            options = {RequestOption.WINDOW: pages}
+            if acknowledged:
+                options[RequestOption.ACKNOWLEDGE_SEQUENCE] = acknowledged
+            if self.priority:
+                options[RequestOption.PRIORITY] = self.priority
+            request = MessageRequest(MessageType.READ, self.user_name, "", "", options)
+            connection_socket.sendall(request.to_bytes())
+            # Every request is answered with at least one page
+            outstanding.append(max(pages, 1))
+
+        # The most pages still to come in response to each request sent
+        outstanding: deque[int] = deque()
+        buffer = bytearray()
+        received = acknowledged = delivered = 0
+        with self.connect() as connection_socket:
+            # The window is sent as a single byte
+            request_pages(min(self.window, 255), 0)
+            while outstanding:
+                data = connection_socket.recv(65536)
+                if not data:
+                    raise ConnectionResetError("Connection closed by server")
+                buffer += data
+
+                for packet in split_responses(buffer):
+                    if Packet.peek_message_type(packet) == MessageType.RESULT:
+                        self.read_result_response(packet)
+                        outstanding.popleft()
+                        continue
+
+                    messages, more_messages = MessageResponse.decode_packet(packet)
+                    attachments = MessageResponse.decode_attachments(packet)
+                    for index, (sender, message) in enumerate(messages):
+                        logger.info('Received %s\'s message "%s"', sender, message)
+                        print(f"Message from {sender}:\n{message}\n")
+                        if index in attachments:
+                            size = len(attachments[index])
+                            print(f"With a {size} byte attachment\n")
+                    if messages:
+                        delivered += len(messages)
+                        received = MessageResponse.decode_sequence(packet) or received
+
+                    outstanding[0] -= 1
+                    if not more_messages or outstanding[0] == 0:
+                        outstanding.popleft()
+                    if more_messages:
+                        request_pages(1, received)
+                        acknowledged = received
+
+                if not outstanding and acknowledged != received:
+                    request_pages(0, received)
+                    acknowledged = received
+
+        logger.info("%s message(s) read and acknowledged", delivered)
+        if delivered == 0:
+            print("No messages available")
+
     @staticmethod
     def read_message_response(packet: bytes) -> None:
         """Read a message response from the server.
 
         :param packet: The message response from the server.
         """
+        # pylint: disable-next=import-outside-toplevel
+        from src.packets.message_response import MessageResponse
+
         messages, more_messages = MessageResponse.decode_packet(packet)
+        attachments = MessageResponse.decode_attachments(packet)
 
-        for sender, message in messages:
+        for index, (sender, message) in enumerate(messages):
             logger.info('Received %s\'s message "%s"', sender, message)
             print(f"Message from {sender}:\n{message}\n")
+            if index in attachments:
+                print(f"With a {len(attachments[index])} byte attachment\n")
 
         if len(messages) == 0:
             logger.info("Response contained no messages")
@@ -144,18 +405,175 @@ class Client(CommandLineApplication):
             logger.info("Server has more messages available for this user")
             print("More messages available, please send another request")
 
+    def search(
+        self,
+        request: MessageRequest,
+        send_request: Optional[Callable[[MessageRequest], Optional[bytes]]] = None,
+    ) -> None:
+        """Print every message in the mailbox containing the words searched for.
+
+        Matches are sent a page at a time, and each page after the first is
+        asked for by the sequence number of the last match received. The
+        messages found are left in the mailbox.
+
+        :param request: The search request for the first page of matches.
+        :param send_request: Sends a request and returns the response,
+            ``send_message_request`` by default.
+        """
+        # pylint: disable-next=import-outside-toplevel
+        from src.packets.message_response import MessageResponse
+
+        found = 0
+        while True:
+            response = (send_request or self.send_message_request)(request)
+            if not response:
+                return
+            if Packet.peek_message_type(response) == MessageType.RESULT:
+                self.read_result_response(response)
+                return
+
+            messages, more_messages = MessageResponse.decode_packet(response)
+            for sender, message in messages:
+                logger.info('Found %s\'s message "%s"', sender, message)
+                print(f"Message from {sender}:\n{message}\n")
+            found += len(messages)
+            if not more_messages:
+                break
+            request.options[RequestOption.SEARCH_AFTER] = (
+                MessageResponse.decode_sequence(response)
+            )
+
+        logger.info("%s message(s) found", found)
+        if found == 0:
+            print("No messages found")
+
+    @staticmethod
+    def read_status_response(packet: bytes) -> None:
+        """Report how many messages are waiting, without reading them.
+
+        :param packet: The status response from the server.
+        """
+        # pylint: disable-next=import-outside-toplevel
+        from src.packets.status_response import StatusResponse
+
+        message_count, byte_count, oldest_age = StatusResponse.decode_packet(packet)
+        logger.info(
+            "%s message(s) waiting, %s bytes, oldest %.1f seconds old",
+            message_count,
+            byte_count,
+            oldest_age,
+        )
+        if message_count == 0:
+            print("No messages available")
+        else:
+            print(
+                f"{message_count} message(s) waiting ({byte_count} bytes),"
+                f" the oldest sent {oldest_age:.0f} seconds ago"
+            )
+
+    @staticmethod
+    def read_result_response(packet: bytes) -> None:
+        """Report the result of a request that the server declined to process.
+
+        :param packet: The result response from the server.
+        """
+        (result_code,) = ResultResponse.decode_packet(packet)
+        logger.warning("Request rejected by server: %s", result_code.name)
+        print(result_code.description)
+
+    def request_options(self) -> Optional[dict[RequestOption, Any]]:
+        """Gather the options to send with the request.
+
+        :return: A dictionary mapping each option to its value, or ``None``
+            if the attachment to send cannot be read.
+        """
+        options: dict[RequestOption, Any] = {}
+        if self.message_type == MessageType.CREATE and self.attachment_path:
+            try:
+                options[RequestOption.ATTACHMENT] = os.path.getsize(
+                    self.attachment_path
+                )
+            except OSError as error:
+                logger.error(error)
+                print(f"Unable to read {self.attachment_path}")
+                return None
+            # Attachments take a while to send, so say when they are stored
+            options[RequestOption.ACKNOWLEDGE] = b""
+        if self.message_type == MessageType.CREATE and self.time_to_live:
+            options[RequestOption.TIME_TO_LIVE] = self.time_to_live
+        if self.message_type == MessageType.CREATE and self.retries:
+            # Retried messages are only stored once if they share a key
+            options[RequestOption.IDEMPOTENCY_KEY] = os.urandom(16)
+            options[RequestOption.ACKNOWLEDGE] = b""
+        if self.priority:
+            options[RequestOption.PRIORITY] = self.priority
+        return options
+
     def run(self) -> None:
         """Ask the user to input message and send request to server."""
+        if self.message_type is None:
+            # pylint: disable-next=import-outside-toplevel
+            from .session import Session
+
+            Session(self).run()
+            return
+
         if self.message_type == MessageType.CREATE:
             self.receiver_name = input("Enter the name of the receiver: ")
             self.message = input("Enter the message to be sent: ")
             logger.info(
                 'User specified message to %s: "%s"', self.receiver_name, self.message
             )
+        elif self.message_type == MessageType.SEARCH:
+            self.message = input("Enter the words to search for: ")
+            logger.info('User searching for "%s"', self.message)
+            if not self.message:
+                print("Nothing to search for")
+                return
+
+        options = self.request_options()
+        if options is None:
+            return
+
+        if self.message_type == MessageType.READ and self.window:
+            self.read_windowed()
+            return
 
         request = MessageRequest(
-            self.message_type, self.user_name, self.receiver_name, self.message
+            self.message_type,
+            self.user_name,
+            self.receiver_name,
+            self.message,
+            options,
         )
+        if self.message_type == MessageType.SEARCH:
+            self.search(request)
+            return
+
         response = self.send_message_request(request)
-        if self.message_type == MessageType.READ and response:
+        if response:
+            self.read_response(response)
+
+    def read_response(self, response: bytes) -> None:
+        """Show the user the server's response to their request.
+
+        :param response: The response packet.
+        """
+        if Packet.peek_message_type(response) == MessageType.RESULT:
+            (result_code,) = ResultResponse.decode_packet(response)
+            if result_code != ResultCode.OK:
+                self.read_result_response(response)
+            elif self.message_type == MessageType.PING:
+                logger.info("Server is up")
+                print("Server is up")
+            elif self.message_type == MessageType.CREATE:
+                # Acknowledged, as asked for when retrying or attaching a file
+                logger.info("Message sent to %s", self.receiver_name)
+                print(f"Message sent to {self.receiver_name}")
+            else:
+                logger.info(result_code.description)
+                print(result_code.description)
+        elif self.message_type in (MessageType.READ, MessageType.PEEK):
             self.read_message_response(response)
+        elif self.message_type == MessageType.STATUS:
+            self.read_status_response(response)
@@ -0,0 +1,351 @@
+"""Home to the ``Session`` class."""
+
+from typing import Any, Callable, Optional
+import logging
+import os
+import socket
+
+from src.packets.message_request import MessageRequest
+from src.packets.message_response import MessageResponse
+from src.packets.packet import Packet
+from src.packets.response_framing import split_responses
+from src.packets.result_response import ResultResponse
+from src.message_type import MessageType
+from src.request_option import RequestOption
+from src.result_code import ResultCode
+from .client import Client
+
+
+logger = logging.getLogger(__name__)
+
+
+class Session:
+    """Runs commands typed by the user, sending every request over one connection.
+
+    Each request is answered before the next is sent. If the server closes
+    the connection between requests, for being idle or because it only
+    serves one request per connection, the session connects again and
+    resends the request. Servers found closing the connection after every
+    response are given a new connection for each request from then on.
+    Messages carry an idempotency key, so one resent after being stored
+    is only stored once. Servers which predate request options close the
+    connection instead of answering a message sent with them, so from then
+    on messages are sent to them without options, and without waiting for
+    an answer. A command which fails is reported, and the session goes on.
+    """
+
+    # How many connections must be closed after a single response before
+    # the server is taken to close every connection after responding
+    SINGLE_REQUEST_CONNECTIONS = 2
+
+    HELP = (
+        "Commands:\n"
+        "  send <receiver> <message>  Send a message\n"
+        "  read                       Read the next page of messages\n"
+        "  drain                      Read every message in the mailbox\n"
+        "  peek                       Show the next page, leaving it in the mailbox\n"
+        "  status                     Count the messages waiting\n"
+        "  search <words>             Find the messages containing some words\n"
+        "  ping                       Check that the server is up\n"
+        "  help                       Show this help\n"
+        "  quit                       End the session"
+    )
+
+    def __init__(self, client: Client):
+        """Create a session for a client's user and server.
+
+        :param client: The client whose user and server the session is for.
+        """
+        self.client = client
+        self.connection: Optional[socket.socket] = None
+        self.buffer = bytearray()
+        # Requests answered on the current connection
+        self.connection_requests = 0
+        # Connections the server closed after answering a single request
+        self.single_request_connections = 0
+        # Whether the server closes the connection after every response
+        self.reconnect_each_request = False
+        # Whether the server predates request options
+        self.plain_creates = False
+        # Whether the last request had to be sent more than once
+        self.resent = False
+        self.requests = 0
+        self.connections = 0
+
+    def run(self) -> None:
+        """Run commands until the user quits or input ends."""
+        print(f"Session started as {self.client.user_name}, type help for commands")
+        try:
+            with self.client.reporting_connection_errors():
+                while True:
+                    try:
+                        line = input("> ").strip()
+                    except EOFError:
+                        break
+                    if line in ("quit", "exit"):
+                        break
+                    if not line:
+                        continue
+                    try:
+                        self.run_command(line)
+                    except (ConnectionError, socket.timeout) as error:
+                        self.disconnect()
+                        logger.error(error)
+                        print(f"Command failed: {error}")
+        finally:
+            self.disconnect()
+            logger.info(
+                "Session sent %s request(s) over %s connection(s)",
+                self.requests,
+                self.connections,
+            )
+
+    def run_command(self, line: str) -> None:
+        """Run a single command typed by the user.
+
+        :param line: The command and its arguments.
+        :raises OSError: If the server cannot be reached.
+        """
+        command, _, arguments = line.partition(" ")
+        command = command.lower()
+        arguments = arguments.strip()
+        if command == "send":
+            receiver_name, _, message = arguments.partition(" ")
+            if receiver_name and message:
+                self.send(receiver_name, message)
+            else:
+                print("Usage: send <receiver> <message>")
+        elif command == "read":
+            self.read()
+        elif command == "drain":
+            while self.read():
+                pass
+        elif command == "peek":
+            self.show(self.request(MessageType.PEEK), self.client.read_message_response)
+        elif command == "status":
+            self.show(
+                self.request(MessageType.STATUS), self.client.read_status_response
+            )
+        elif command == "search":
+            self.search(arguments)
+        elif command == "ping":
+            self.report_result(self.request(MessageType.PING), "Server is up")
+        elif command == "help":
+            print(self.HELP)
+        else:
+            print(f"Unknown command {command}, type help for commands")
+
+    def show(self, response: bytes, read_response: Callable[[bytes], object]) -> None:
+        """Print a response, or the reason the server gave for not answering.
+
+        :param response: The server's response.
+        :param read_response: What prints the response if it is not a result.
+        """
+        if Packet.peek_message_type(response) == MessageType.RESULT:
+            self.client.read_result_response(response)
+        else:
+            read_response(response)
+
+    def search(self, words: str) -> None:
+        """Print the messages in the mailbox containing every one of some words.
+
+        :param words: The words to look for.
+        :raises OSError: If the server cannot be reached.
+        """
+        if not words:
+            print("Usage: search <words>")
+            return
+        self.client.search(
+            MessageRequest(MessageType.SEARCH, self.client.user_name, "", words),
+            self.exchange,
+        )
+
+    def send(self, receiver_name: str, message: str) -> None:
+        """Send a message, waiting for the server to confirm it was stored.
+
+        :param receiver_name: The name of the user to send the message to.
+        :param message: The message to send.
+        :raises OSError: If the server cannot be reached.
+        """
+        if self.plain_creates:
+            self.send_plain(receiver_name, message)
+            return
+
+        options: dict[RequestOption, Any] = {
+            RequestOption.ACKNOWLEDGE: b"",
+            RequestOption.IDEMPOTENCY_KEY: os.urandom(16),
+        }
+        if self.client.time_to_live:
+            options[RequestOption.TIME_TO_LIVE] = self.client.time_to_live
+        try:
+            response = self.request(MessageType.CREATE, receiver_name, message, options)
+        except ConnectionError:
+            # Even a new connection was closed without an answer
+            logger.info("Server does not accept request options")
+            self.plain_creates = True
+            self.send_plain(receiver_name, message)
+            return
+
+        duplicate = ResultResponse.decode_packet(response) == (ResultCode.DUPLICATE,)
+        if duplicate and not self.resent:
+            # A new key was mistaken for a repeat, so choose another
+            options[RequestOption.IDEMPOTENCY_KEY] = os.urandom(16)
+            response = self.request(MessageType.CREATE, receiver_name, message, options)
+        self.report_result(response, f"Message sent to {receiver_name}")
+
+    def send_plain(self, receiver_name: str, message: str) -> None:
+        """Send a message without options, to a server which predates them.
+
+        Such servers only answer a message to refuse it, and close the
+        connection once they have read it, so it is sent on its own one.
+
+        :param receiver_name: The name of the user to send the message to.
+        :param message: The message to send.
+        :raises OSError: If the server cannot be reached.
+        """
+        self.disconnect()
+        packet = MessageRequest(
+            MessageType.CREATE, self.client.user_name, receiver_name, message
+        ).to_bytes()
+        response = self.client.exchange(packet, wait_for_response=False)
+        self.requests += 1
+        self.connections += 1
+        if response is None:
+            logger.info("Message sent to %s", receiver_name)
+            print(f"Message sent to {receiver_name}")
+        else:
+            self.client.read_result_response(response)
+
+    def read(self) -> bool:
+        """Read and print the next page of messages in the mailbox.
+
+        :return: ``True`` if the server has more messages waiting.
+        :raises OSError: If the server cannot be reached.
+        """
+        response = self.request(MessageType.READ)
+        if Packet.peek_message_type(response) == MessageType.RESULT:
+            self.client.read_result_response(response)
+            return False
+
+        messages, more_messages = MessageResponse.decode_packet(response)
+        for sender, message in messages:
+            logger.info('Received %s\'s message "%s"', sender, message)
+            print(f"Message from {sender}:\n{message}\n")
+        if not messages:
+            print("No messages available")
+        return more_messages
+
+    def report_result(self, response: bytes, success: str) -> None:
+        """Tell the user whether the server carried out a request.
+
+        :param response: The server's result response.
+        :param success: What to tell the user if it succeeded.
+        """
+        (result_code,) = ResultResponse.decode_packet(response)
+        # A resent message reported as a duplicate was stored the first time
+        if result_code == ResultCode.OK or (
+            self.resent and result_code == ResultCode.DUPLICATE
+        ):
+            logger.info(success)
+            print(success)
+        else:
+            self.client.read_result_response(response)
+
+    def request(
+        self,
+        message_type: MessageType,
+        receiver_name: str = "",
+        message: str = "",
+        options: Optional[dict[RequestOption, Any]] = None,
+    ) -> bytes:
+        """Send a request as the session's user, and wait for the response.
+
+        :param message_type: The type of request to send.
+        :param receiver_name: The name of the user to send a message to.
+        :param message: The message to send.
+        :param options: Options to attach to the request.
+        :return: The server's response.
+        :raises OSError: If the server cannot be reached.
+        """
+        if self.client.priority:
+            options = {**(options or {}), RequestOption.PRIORITY: self.client.priority}
+        return self.exchange(
+            MessageRequest(
+                message_type, self.client.user_name, receiver_name, message, options
+            )
+        )
+
+    def exchange(self, request: MessageRequest) -> bytes:
+        """Send a request over the session's connection, and wait for the response.
+
+        A request which finds that the server has closed the connection is
+        sent again on a new one.
+
+        :param request: The request to send.
+        :return: The server's response.
+        :raises OSError: If the server cannot be reached.
+        """
+        packet = request.to_bytes()
+        self.resent = False
+        while True:
+            reused = self.connection is not None
+            connection = self.connect()
+            try:
+                connection.sendall(packet)
+                response = self.receive(connection)
+            except ConnectionError:
+                self.disconnect()
+                if not reused:
+                    raise
+                if self.connection_requests == 1:
+                    self.single_request_connections += 1
+                # Once could be an idle connection timing out, but not twice
+                if self.single_request_connections == self.SINGLE_REQUEST_CONNECTIONS:
+                    logger.info("Server closes connections after each response")
+                    self.reconnect_each_request = True
+                logger.info("Connection closed by server, reconnecting")
+                self.resent = True
+                continue
+
+            self.requests += 1
+            self.connection_requests += 1
+            if self.reconnect_each_request:
+                self.disconnect()
+            return response
+
+    def connect(self) -> socket.socket:
+        """Get the session's connection, opening one if needed.
+
+        :return: The connected socket.
+        :raises OSError: If the server cannot be reached.
+        """
+        if self.connection is None:
+            self.connection = self.client.address.connect(timeout=5)
+            self.connection_requests = 0
+            self.connections += 1
+        return self.connection
+
+    def disconnect(self) -> None:
+        """Close the session's connection, if open."""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+            self.buffer.clear()
+
+    def receive(self, connection: socket.socket) -> bytes:
+        """Wait for the server's response to the last request.
+
+        :param connection: The connection the request was sent on.
+        :return: The response.
+        :raises OSError: If the connection fails or times out.
+        """
+        while True:
+            responses = split_responses(self.buffer)
+            if responses:
+                # Each request is answered by exactly one packet
+                return responses[0]
+
+            data = connection.recv(65536)
+            if not data:
+                raise ConnectionResetError("Connection closed by server")
+            self.buffer += data
@@ -0,0 +1,120 @@
+"""Measures how long the client takes to start up, send a request and exit.
+
+Scripts which send messages in a loop start a new client for every
+message, so the client's startup time bounds how quickly they can go.
+
+Run with ``python3 -m client.startup_benchmark [--runs <runs>]``.
+"""
+
+from collections import OrderedDict
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from src.command_line_application import CommandLineApplication
+from src.option_parsers import positive_int
+from src.packets.result_response import ResultResponse
+from src.port_number import PortNumber
+from src.result_code import ResultCode
+
+
+class StartupBenchmark(CommandLineApplication):
+    """Times ``python3 -m client`` pinging a stand-in server.
+
+    The stand-in server answers every request at once, so the time taken
+    is spent starting the interpreter and the client. Starting a bare
+    interpreter is timed too, to show how much of that is the client's.
+    """
+
+    def __init__(self, arguments: list[str]):
+        """Initialise the benchmark.
+
+        :param arguments: The program arguments from the command line.
+        """
+        super().__init__(OrderedDict(), OrderedDict(runs=(positive_int, 20)))
+        self.parse_arguments(arguments)
+        self.runs = self.option_values["runs"]
+
+    def run(self) -> None:
+        """Time the client and a bare interpreter, and report the results."""
+        with self.stand_in_server() as welcoming_socket:
+            port_number = welcoming_socket.getsockname()[1]
+            client_times = self.time_command(
+                ["-m", "client", "localhost", str(port_number), "benchmark", "ping"]
+            )
+        interpreter_times = self.time_command(["-c", "pass"])
+
+        client_median = statistics.median(client_times)
+        print(
+            f"Client: median {client_median * 1000:.1f}ms,"
+            f" fastest {min(client_times) * 1000:.1f}ms over {self.runs} run(s)"
+        )
+        interpreter_median = statistics.median(interpreter_times)
+        print(f"Interpreter alone: median {interpreter_median * 1000:.1f}ms")
+        print(
+            "Client's own share:"
+            f" {(client_median - interpreter_median) * 1000:.1f}ms of the median"
+        )
+
+    def time_command(self, arguments: list[str]) -> list[float]:
+        """Run the interpreter repeatedly, timing each run.
+
+        :param arguments: The arguments to pass to the interpreter.
+        :return: The number of seconds each run took.
+        :raises SystemExit: If a run does not succeed.
+        """
+        # The client is run from the repository, as by its users
+        directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        times = []
+        for _ in range(self.runs):
+            started = time.perf_counter()
+            completed = subprocess.run(
+                [sys.executable, *arguments],
+                cwd=directory,
+                capture_output=True,
+                check=False,
+            )
+            times.append(time.perf_counter() - started)
+            if completed.returncode:
+                print(completed.stdout.decode() + completed.stderr.decode())
+                raise SystemExit(1)
+
+        return times
+
+    @staticmethod
+    def stand_in_server() -> socket.socket:
+        """Listen for clients, answering every request with success.
+
+        :return: The listening socket, which stops the server once closed.
+        """
+        while True:
+            port_number = random.randint(PortNumber.MINIMUM, PortNumber.MAXIMUM)
+            try:
+                welcoming_socket = socket.create_server(("localhost", port_number))
+                break
+            except OSError:
+                continue
+
+        response = ResultResponse(ResultCode.OK).to_bytes()
+
+        def serve() -> None:
+            while True:
+                try:
+                    connection_socket, _ = welcoming_socket.accept()
+                except OSError:
+                    return
+                with connection_socket:
+                    connection_socket.recv(4096)
+                    connection_socket.sendall(response)
+
+        threading.Thread(target=serve, daemon=True).start()
+        return welcoming_socket
+
+
+if __name__ == "__main__":
+    StartupBenchmark(sys.argv[1:]).run()
@@ -4,7 +4,6 @@ Applies formatting and specifies output locations
 for all module loggers.
 """
 
-from datetime import datetime
 import logging
 import sys
 import os
@@ -29,20 +28,17 @@ class PathnameFormatter(logging.Formatter):
         return super().format(record)
 
 
-def configure_logging(package_name: str) -> None:
-    """Configure logging for the project."""
-    file_formatter = PathnameFormatter(
-        "%(asctime)s - %(levelname)-8s - %(pathname)-35s - %(message)s"
-    )
-    file_formatter.datefmt = "%d-%m-%y - %H:%M:%S.%s"
+def configure_logging(package_name: str, log_file: bool = True) -> None:
+    """Configure logging for the project.
 
-    file_name = datetime.now().strftime("%d-%m-%y %H:%M:%S")
-
-    os.makedirs(os.path.dirname(f"logs/{package_name}/"), exist_ok=True)
-    file_handler = logging.FileHandler(f"logs/{package_name}/{file_name}.log")
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(file_formatter)
+    Warnings and errors are always written to stderr. Everything else is
+    only recorded once a log file is added, so programs which do not keep
+    a log file skip formatting their informational messages.
 
+    :param package_name: The name of the package being run, which names
+        the directory its log files are written to.
+    :param log_file: Whether to add a log file straight away.
+    """
     console_formatter = PathnameFormatter(
         "%(levelname)-8s - %(pathname)-35s - %(message)s"
     )
@@ -56,7 +52,32 @@ def configure_logging(package_name: str) -> None:
     stderr_handler.setLevel(logging.WARNING)
     stderr_handler.setFormatter(console_formatter)
 
-    logging.basicConfig(
-        level=logging.DEBUG,
-        handlers=[file_handler, stderr_handler],
+    logging.basicConfig(level=logging.WARNING, handlers=[stderr_handler])
+    if log_file:
+        add_log_file(package_name)
+
+
+def add_log_file(package_name: str) -> None:
+    """Record every message logged in a new timestamped log file.
+
+    :param package_name: The name of the package being run, which names
+        the directory the log file is written to.
+    """
+    # Only imported by programs which keep a log file
+    from datetime import datetime  # pylint: disable=import-outside-toplevel
+
+    file_formatter = PathnameFormatter(
+        "%(asctime)s - %(levelname)-8s - %(pathname)-35s - %(message)s"
     )
+    file_formatter.datefmt = "%d-%m-%y - %H:%M:%S.%s"
+
+    file_name = datetime.now().strftime("%d-%m-%y %H:%M:%S")
+
+    os.makedirs(os.path.dirname(f"logs/{package_name}/"), exist_ok=True)
+    file_handler = logging.FileHandler(f"logs/{package_name}/{file_name}.log")
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(file_formatter)
+
+    root_logger = logging.getLogger()
+    root_logger.addHandler(file_handler)
+    root_logger.setLevel(logging.DEBUG)
@@ -0,0 +1,11 @@
+"""The edge proxy.
+
+The proxy package is directly executable using::
+
+    python3 -m proxy <port_number> <upstream_address> <upstream_port>
+
+"""
+
+from .proxy import Proxy
+
+__all__ = ["Proxy"]
@@ -0,0 +1,32 @@
+"""Edge proxy program.
+
+Run with ``python3 -m proxy <port number> <upstream address> <upstream port>``
+"""
+
+import logging
+import sys
+
+from logging_config import configure_logging
+from .proxy import Proxy
+
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    """Boot up the proxy, ready to pass client requests upstream."""
+    configure_logging("proxy")
+
+    try:
+        proxy = Proxy(sys.argv[1:])
+        proxy.run()
+    except SystemExit:
+        sys.exit(1)
+    except KeyboardInterrupt:
+        logger.info("Proxy shut down due to keyboard interrupt")
+        print("\nProxy shut down")
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Home to the ``Proxy`` class."""
+
+from collections import OrderedDict
+from typing import Optional, Union
+import contextlib
+import logging
+import time
+import zlib
+
+from src.command_line_application import CommandLineApplication
+from src.option_parsers import (
+    non_negative_float,
+    non_negative_int,
+    positive_int,
+    switch,
+)
+from src.packets.message_request import MessageRequest
+from src.packets.packet import Packet
+from src.packets.result_response import ResultResponse
+from src.message_type import MessageType
+from src.port_number import PortNumber
+from src.request_option import RequestOption
+from src.result_code import ResultCode
+from src.server_address import ServerAddress
+from server.admission import AdmissionController
+from server.cluster import ClusterNode, PeerLink
+from server.connection import Connection, ConnectionPhase, PendingResponse
+from server.event_loop import EventLoop
+from server import Server
+
+
+logger = logging.getLogger(__name__)
+
+
+class Proxy(CommandLineApplication):
+    """An edge proxy which passes many clients' requests to one server.
+
+    Clients connect to the proxy exactly as they would to the server. Their
+    requests are pipelined onto a few persistent upstream connections, and
+    every request forwarded in the same round of the event loop is sent
+    upstream together, so a flood of short lived clients costs the server
+    a handful of connections. Requests for the same mailbox always share
+    an upstream connection, so they are served in the order they arrived.
+    Each request is marked with the number of the client which sent it,
+    so the server keeps a separate read cursor for every client.
+
+    The proxy can be run with
+    ``python3 -m proxy <port number> <upstream address>``.
+    """
+
+    # Seconds between each report of the proxy's statistics
+    HOUSEKEEPING_INTERVAL = 1.0
+
+    def __init__(self, arguments: list[str]):
+        """Initialise the proxy with its port number and upstream server.
+
+        :param arguments: The program arguments from the command line.
+        """
+        super().__init__(
+            OrderedDict(port_number=PortNumber, upstream=ServerAddress.from_str),
+            OrderedDict(
+                tcp=(switch, True),
+                unix_socket=(str, None),
+                listen_backlog=(positive_int, 128),
+                max_connections=(non_negative_int, 0),
+                upstream_connections=(positive_int, 4),
+                header_timeout=(non_negative_float, 10.0),
+                body_timeout=(non_negative_float, 5.0),
+                write_timeout=(non_negative_float, 5.0),
+                stats_interval=(non_negative_float, 60.0),
+            ),
+        )
+
+        # pylint thinks that self.parse_arguments is only
+        # capable of returning an empty list
+        # pylint: disable=unbalanced-tuple-unpacking
+        self.port_number, self.upstream = self.parse_arguments(arguments)
+
+        self.hostname = "localhost"
+        self.listen_tcp = self.option_values["tcp"]
+        self.unix_socket_path = self.option_values["unix_socket"]
+        if not self.listen_tcp and not self.unix_socket_path:
+            logger.error("Proxy has no sockets to listen on")
+            print(self.usage_prompt)
+            print("A Unix socket path is required when TCP is turned off")
+            raise SystemExit
+        self.listen_backlog = self.option_values["listen_backlog"]
+        self.upstream_connections = self.option_values["upstream_connections"]
+        self.timeouts = {
+            ConnectionPhase.READ_HEADER: self.option_values["header_timeout"],
+            ConnectionPhase.READ_BODY: self.option_values["body_timeout"],
+            ConnectionPhase.WRITE: self.option_values["write_timeout"],
+        }
+        # Rate limits are left to the server, which sees every request
+        self.admission = AdmissionController(
+            max_connections=self.option_values["max_connections"]
+        )
+        self.stats_interval = self.option_values["stats_interval"]
+        self.next_stats_report = time.monotonic() + self.stats_interval
+
+        self.event_loop: Optional[EventLoop] = None
+        self.links: list[PeerLink] = []
+        self.forwarded_requests = 0
+
+    def run(self) -> None:
+        """Initiate the welcoming sockets and start the event loop.
+
+        :raise SystemExit: If the socket fails to connect
+        """
+        addresses = []
+        if self.listen_tcp:
+            addresses.append(ServerAddress(self.hostname, self.port_number))
+        if self.unix_socket_path:
+            addresses.append(
+                ServerAddress(ServerAddress.UNIX_PREFIX + self.unix_socket_path, 0)
+            )
+
+        with contextlib.ExitStack() as stack:
+            try:
+                welcoming_sockets = Server.bind_welcoming_sockets(
+                    stack, addresses, self.listen_backlog
+                )
+            except OSError as error:
+                logger.error(error)
+                print("Error binding socket on provided port")
+                raise SystemExit from error
+
+            event_loop = EventLoop(
+                welcoming_sockets,
+                self.handle_request,
+                self.admission,
+                self.timeouts,
+                self.run_housekeeping,
+                Proxy.HOUSEKEEPING_INTERVAL,
+            )
+            stack.callback(event_loop.close)
+            self.attach(event_loop)
+            stack.callback(self.close)
+            logger.info("Forwarding requests to %s", self.upstream)
+            event_loop.run()
+
+    def attach(self, event_loop: EventLoop) -> None:
+        """Use an event loop to run the upstream connections.
+
+        :param event_loop: The proxy's event loop.
+        """
+        self.event_loop = event_loop
+        self.links = [
+            PeerLink(
+                ClusterNode(f"upstream-{index}", self.upstream), event_loop, batch=True
+            )
+            for index in range(self.upstream_connections)
+        ]
+
+    def handle_request(
+        self, packet: bytes, connection: Optional[Connection] = None
+    ) -> Union[bytes, PendingResponse, None]:
+        """Pass a client's request on to the server.
+
+        Requests are checked before being forwarded, as the server does not
+        answer invalid requests, which would leave the upstream connection
+        unable to tell which response belongs to which request.
+
+        :param packet: The message request packet received from a client.
+        :param connection: The connection the request arrived on.
+        :return: The server's response, once it arrives.
+        """
+        # Attachments are refused below, so their chunks are thrown away
+        with contextlib.suppress(ValueError):
+            if Packet.peek_message_type(packet) == MessageType.CHUNK:
+                return None
+
+        result_code = self.admission.admit_request(packet)
+        if result_code is not None:
+            return ResultResponse(result_code).to_bytes()
+
+        try:
+            message_type, sender_name, receiver_name, _ = MessageRequest.decode_packet(
+                packet
+            )
+            options = MessageRequest.decode_options(packet)
+        except ValueError as error:
+            logger.error(error)
+            print("Message request discarded")
+            return None
+        if message_type in (MessageType.RESPONSE, MessageType.RESULT):
+            return None
+        if RequestOption.ATTACHMENT in options or message_type == MessageType.BULK_READ:
+            # Chunks are not answered, and bulk reads are answered with a
+            # response per user, so neither can be pipelined with the rest
+            return ResultResponse(ResultCode.UNAVAILABLE).to_bytes()
+
+        # Mailboxes are read by the user who owns them
+        mailbox_name = (
+            receiver_name if message_type == MessageType.CREATE else sender_name
+        )
+        link = self.links[zlib.crc32(mailbox_name.encode()) % len(self.links)]
+
+        self.forwarded_requests += 1
+        client_number = 0 if connection is None else connection.number
+        # Every request must be answered to keep the pipeline in step
+        forwarded_packet = MessageRequest.add_options(
+            packet,
+            {
+                RequestOption.FORWARDED: client_number.to_bytes(8, "big"),
+                RequestOption.ACKNOWLEDGE: b"",
+            },
+        )
+        return link.forward(
+            forwarded_packet,
+            # A ping is answered with the same result as an acknowledgement
+            acknowledge=(
+                RequestOption.ACKNOWLEDGE in options or message_type == MessageType.PING
+            ),
+            max_pages=max(options.get(RequestOption.WINDOW, 1), 1),
+        )
+
+    def run_housekeeping(self) -> None:
+        """Periodically report the proxy's statistics."""
+        now = time.monotonic()
+        if self.stats_interval and now >= self.next_stats_report:
+            logger.info("Proxy statistics: %s", self.stats)
+            self.next_stats_report = now + self.stats_interval
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Get the proxy's statistics.
+
+        :return: A dictionary mapping each statistic's name to its value.
+        """
+        clients = 0 if self.event_loop is None else len(self.event_loop.connections)
+        return {
+            "clients": clients,
+            "forwarded_requests": self.forwarded_requests,
+            "upstream_batches": sum(link.batches_sent for link in self.links),
+            "upstream_connections": sum(link.socket is not None for link in self.links),
+        }
+
+    def close(self) -> None:
+        """Close every upstream connection."""
+        for link in self.links:
+            link.close()
@@ -0,0 +1,11 @@
+"""The capture replay tool.
+
+The replay package is directly executable using::
+
+    python3 -m replay <capture_file> <server_address>
+
+"""
+
+from .replay import Replay
+
+__all__ = ["Replay"]
@@ -0,0 +1,32 @@
+"""Capture replay program.
+
+Run with ``python3 -m replay <capture file> <server address>``
+"""
+
+import logging
+import sys
+
+from logging_config import configure_logging
+from .replay import Replay
+
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    """Replay a capture against a server, and report how it kept up."""
+    configure_logging("replay")
+
+    try:
+        replay = Replay(sys.argv[1:])
+        replay.run()
+    except SystemExit:
+        sys.exit(1)
+    except KeyboardInterrupt:
+        logger.info("Replay stopped due to keyboard interrupt")
+        print("\nReplay stopped")
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""Home to the ``Replay`` class."""
+
+from collections import OrderedDict
+import logging
+import socket
+import time
+
+from src.command_line_application import CommandLineApplication
+from src.option_parsers import non_negative_float
+from src.packets.message_request import MessageRequest
+from src.packets.message_response import MessageResponse
+from src.packets.packet import Packet
+from src.packets.response_framing import split_responses
+from src.message_type import MessageType
+from src.request_option import RequestOption
+from src.server_address import ServerAddress
+from server.capture import CapturedRequest, read_capture
+
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Find the value a fraction of the way through some sorted values.
+
+    :param values: The values, sorted from smallest to largest.
+    :param fraction: How far through the values to look, from zero to one.
+    :return: The value found, or zero if there are no values.
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Replay(CommandLineApplication):
+    """Drives a server with the requests recorded in a capture file.
+
+    Requests are sent over a single connection at the pace they were
+    captured, sped up by ``--speed``, or as fast as the server answers
+    them with a speed of zero. Each is sent once the previous request has
+    been answered, so a server which falls behind delays the rest of the
+    replay, and how late each request was sent is reported alongside the
+    time taken to answer it.
+
+    The replay can be run with
+    ``python3 -m replay <capture file> <server address>``.
+    """
+
+    def __init__(self, arguments: list[str]):
+        """Initialise the replay with its capture file and server.
+
+        :param arguments: The program arguments from the command line.
+        """
+        super().__init__(
+            OrderedDict(capture_file=str, server=ServerAddress.from_str),
+            OrderedDict(speed=(non_negative_float, 1.0)),
+        )
+
+        # pylint thinks that self.parse_arguments is only
+        # capable of returning an empty list
+        # pylint: disable=unbalanced-tuple-unpacking
+        self.capture_path, self.server = self.parse_arguments(arguments)
+        self.speed = self.option_values["speed"]
+
+        self.skipped_requests = 0
+        # Seconds taken to answer each replayed request
+        self.latencies: list[float] = []
+        # Seconds the server spent serving each request when captured
+        self.service_times: list[float] = []
+        # Seconds each request was sent after it was due
+        self.lags: list[float] = []
+
+    def run(self) -> None:
+        """Replay the capture, then report how the server kept up.
+
+        :raise SystemExit: If the capture cannot be read or the server
+            cannot be reached.
+        """
+        try:
+            requests = list(read_capture(self.capture_path))
+        except (OSError, ValueError) as error:
+            logger.error(error)
+            print("Error reading capture file")
+            raise SystemExit from error
+
+        logger.info("Replaying %s request(s) to %s", len(requests), self.server)
+        try:
+            with self.server.connect(timeout=5) as connection_socket:
+                self.replay(connection_socket, requests)
+        except OSError as error:
+            logger.error(error)
+            print("Connection to server failed")
+            raise SystemExit from error
+
+        logger.info("Replay statistics: %s", self.stats)
+        print(self.report())
+
+    def replay(
+        self, connection_socket: socket.socket, requests: list[CapturedRequest]
+    ) -> None:
+        """Send each captured request to the server, and await its response.
+
+        Every request asks for an acknowledgement, so each one is answered
+        and the time it took can be measured.
+
+        :param connection_socket: A connection to the server.
+        :param requests: The captured requests, in the order they arrived.
+        :raises OSError: If the connection fails or times out.
+        """
+        buffer = bytearray()
+        started = time.monotonic()
+        for request in requests:
+            try:
+                message_type, _, _, message = MessageRequest.decode_packet(
+                    request.packet
+                )
+                options = MessageRequest.decode_options(request.packet)
+                # A bulk read is answered with a response for each user
+                responses = 1
+                if message_type == MessageType.BULK_READ:
+                    responses = len(MessageRequest.split_names(message))
+            except ValueError as error:
+                # The server did not answer it, so neither would it now
+                logger.warning("Skipping captured request: %s", error)
+                self.skipped_requests += 1
+                continue
+            if message_type == MessageType.CHUNK or RequestOption.ATTACHMENT in options:
+                # Chunks are never answered, so uploads cannot be timed
+                self.skipped_requests += 1
+                continue
+
+            if self.speed:
+                due = started + request.offset / self.speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self.lags.append(max(0.0, -delay))
+
+            packet = MessageRequest.add_options(
+                request.packet, {RequestOption.ACKNOWLEDGE: b""}
+            )
+            sent = time.monotonic()
+            connection_socket.sendall(packet)
+            max_pages = 1
+            if message_type == MessageType.READ:
+                max_pages = max(options.get(RequestOption.WINDOW, 1), 1)
+            self.await_response(connection_socket, buffer, max_pages, responses)
+            self.latencies.append(time.monotonic() - sent)
+            self.service_times.append(request.service_time)
+
+    @staticmethod
+    def await_response(
+        connection_socket: socket.socket,
+        buffer: bytearray,
+        max_pages: int,
+        responses: int = 1,
+    ) -> None:
+        """Receive the whole of the server's response to a request.
+
+        :param connection_socket: The connection the request was sent on.
+        :param buffer: Bytes already received but not yet used.
+        :param max_pages: The most pages of messages the response may span.
+        :param responses: The number of message responses expected, such as
+            one per user of a bulk read, each of up to ``max_pages`` pages.
+        :raises OSError: If the connection fails or times out.
+        """
+        pages = 0
+        while True:
+            for packet in split_responses(buffer):
+                pages += 1
+                if Packet.peek_message_type(packet) != MessageType.RESPONSE:
+                    return
+                _, more_messages = MessageResponse.decode_header(packet)
+                if not more_messages or pages >= max_pages:
+                    responses -= 1
+                    pages = 0
+                    if not responses:
+                        return
+
+            data = connection_socket.recv(65536)
+            if not data:
+                raise ConnectionResetError("Connection closed by server")
+            buffer += data
+
+    @property
+    def stats(self) -> dict[str, float]:
+        """Summarise the replay's timings, in seconds.
+
+        A request's divergence is how much longer it took to answer than
+        the server spent serving it when captured, which includes the
+        time spent travelling to and from the server.
+
+        :return: A dictionary mapping each statistic's name to its value.
+        """
+        latencies = sorted(self.latencies)
+        divergences = sorted(
+            latency - service_time
+            for latency, service_time in zip(self.latencies, self.service_times)
+        )
+        lags = sorted(self.lags)
+        return {
+            "replayed_requests": len(latencies),
+            "skipped_requests": self.skipped_requests,
+            "latency_p50": percentile(latencies, 0.5),
+            "latency_p99": percentile(latencies, 0.99),
+            "latency_max": percentile(latencies, 1.0),
+            "divergence_p50": percentile(divergences, 0.5),
+            "divergence_p99": percentile(divergences, 0.99),
+            "divergence_max": percentile(divergences, 1.0),
+            "lag_p50": percentile(lags, 0.5),
+            "lag_p99": percentile(lags, 0.99),
+            "lag_max": percentile(lags, 1.0),
+        }
+
+    def report(self) -> str:
+        """Describe the replay's timings for the user.
+
+        :return: A summary of how quickly the server answered.
+        """
+        stats = self.stats
+        lines = [
+            f"Replayed {stats['replayed_requests']} request(s),"
+            f" skipped {stats['skipped_requests']}"
+        ]
+        for name in ("latency", "divergence", "lag"):
+            lines.append(
+                f"{name.capitalize():<10}"
+                + "".join(
+                    f" {statistic} {stats[f'{name}_{statistic}'] * 1000:.3f}ms"
+                    for statistic in ("p50", "p99", "max")
+                )
+            )
+        return "\n".join(lines)
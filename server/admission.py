@@ -0,0 +1,229 @@
+"""Home to the ``AdmissionController`` class.
+
+Admission control decides whether the server should spend any effort on
+a connection or request, shedding load as cheaply as possible when a
+client exceeds its rate limit or the server is at capacity.
+"""
+
+from typing import Callable, NamedTuple, Optional
+import logging
+import threading
+import time
+
+from src.message_type import MessageType
+from src.packets.message_request import MessageRequest
+from src.result_code import ResultCode
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """A token bucket rate limiter.
+
+    Tokens are added to the bucket at a constant rate up to a maximum
+    burst size, and each admitted request consumes one token.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        """Create a full token bucket.
+
+        :param rate: The number of tokens added to the bucket per second.
+        :param burst: The maximum number of tokens the bucket can hold.
+        :param now: The current time, in seconds.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        """Add the tokens accumulated since the bucket was last updated.
+
+        :param now: The current time, in seconds.
+        """
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def try_consume(self, now: float) -> bool:
+        """Take a token from the bucket if one is available.
+
+        :param now: The current time, in seconds.
+        :return: ``True`` if a token was taken, otherwise ``False``.
+        """
+        self.refill(now)
+        if self.tokens < 1:
+            return False
+
+        self.tokens -= 1
+        return True
+
+    def is_full(self, now: float) -> bool:
+        """Check whether the bucket has refilled completely.
+
+        A full bucket behaves exactly like a new one, so it can be discarded.
+
+        :param now: The current time, in seconds.
+        :return: ``True`` if the bucket is full, otherwise ``False``.
+        """
+        self.refill(now)
+        return self.tokens >= self.burst
+
+
+class RateLimit(NamedTuple):
+    """A request rate, and how many requests may be sent at once above it."""
+
+    # Requests per second, or zero for no limit
+    rate: float = 0.0
+    burst: float = 1.0
+
+
+class AdmissionController:
+    """Decides which connections and requests the server will accept.
+
+    Requests are limited by a token bucket per sender and per receiver,
+    and the number of concurrently open connections is capped. A limit of
+    zero disables the corresponding check. Every check is safe to make
+    from several threads at once.
+    """
+
+    MAX_TRACKED_BUCKETS = 65536
+
+    def __init__(
+        self,
+        max_connections: int = 0,
+        sender_limit: RateLimit = RateLimit(),
+        receiver_limit: RateLimit = RateLimit(),
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Initialise the admission controller.
+
+        :param max_connections: The maximum number of open connections.
+        :param sender_limit: The requests allowed from each sender.
+        :param receiver_limit: The messages allowed to each receiver.
+        :param clock: A function returning the current time in seconds.
+        """
+        self.max_connections = max_connections
+        self.sender_limit = RateLimit(sender_limit.rate, max(1.0, sender_limit.burst))
+        self.receiver_limit = RateLimit(
+            receiver_limit.rate, max(1.0, receiver_limit.burst)
+        )
+        self.clock = clock
+
+        self.open_connections = 0
+        self.sender_buckets: dict[bytes, TokenBucket] = {}
+        self.receiver_buckets: dict[bytes, TokenBucket] = {}
+
+        self.rejected_connections = 0
+        self.rejected_requests = 0
+        # Only held for a few arithmetic operations, so never contended for long
+        self.lock = threading.Lock()
+
+    def admit_connection(self) -> bool:
+        """Reserve a slot for a newly accepted connection.
+
+        Every admitted connection must later be released with
+        ``release_connection``.
+
+        :return: ``True`` if the connection may be served, otherwise ``False``.
+        """
+        with self.lock:
+            if self.max_connections and self.open_connections >= self.max_connections:
+                self.rejected_connections += 1
+                logger.warning(
+                    "Rejecting connection, %s connections already open",
+                    self.open_connections,
+                )
+                return False
+
+            self.open_connections += 1
+            return True
+
+    def release_connection(self) -> None:
+        """Release the slot held by a connection that has been closed."""
+        with self.lock:
+            self.open_connections -= 1
+
+    def admit_request(self, packet: bytes) -> Optional[ResultCode]:
+        """Decide whether a request should be processed.
+
+        Only the fixed size header and raw user names are inspected,
+        so rejecting a request costs far less than decoding it.
+
+        :param packet: The raw message request packet.
+        :return: ``None`` if the request is admitted,
+            otherwise the reason it was rejected.
+        """
+        if not self.sender_limit.rate and not self.receiver_limit.rate:
+            return None
+
+        try:
+            message_type, user_name, receiver_name = MessageRequest.peek_names(packet)
+        except ValueError:
+            # Malformed requests are left for the decoder to report
+            return None
+
+        now = self.clock()
+        if self.sender_limit.rate and not self._consume(
+            self.sender_buckets, user_name, self.sender_limit, now
+        ):
+            self.rejected_requests += 1
+            logger.warning("Rate limiting requests from %s", user_name)
+            return ResultCode.RATE_LIMITED
+
+        if (
+            self.receiver_limit.rate
+            and message_type == MessageType.CREATE.value
+            and not self._consume(
+                self.receiver_buckets, receiver_name, self.receiver_limit, now
+            )
+        ):
+            self.rejected_requests += 1
+            logger.warning("Rate limiting messages to %s", receiver_name)
+            return ResultCode.RATE_LIMITED
+
+        return None
+
+    def _consume(
+        self,
+        buckets: dict[bytes, TokenBucket],
+        key: bytes,
+        limit: RateLimit,
+        now: float,
+    ) -> bool:
+        """Take a token from the bucket belonging to ``key``.
+
+        :param buckets: The buckets to take the token from.
+        :param key: The raw user name owning the bucket.
+        :param limit: The refill rate and capacity for newly created buckets.
+        :param now: The current time, in seconds.
+        :return: ``True`` if a token was taken, otherwise ``False``.
+        """
+        with self.lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                if len(buckets) >= self.MAX_TRACKED_BUCKETS:
+                    self._prune(buckets, now)
+                bucket = buckets[key] = TokenBucket(limit.rate, limit.burst, now)
+
+            return bucket.try_consume(now)
+
+    def _prune(self, buckets: dict[bytes, TokenBucket], now: float) -> None:
+        """Discard buckets that no longer hold any state worth keeping.
+
+        Full buckets are discarded first. If that is not enough,
+        the longest tracked buckets are discarded too.
+
+        :param buckets: The buckets to prune.
+        :param now: The current time, in seconds.
+        """
+        for key in [key for key, bucket in buckets.items() if bucket.is_full(now)]:
+            del buckets[key]
+
+        if len(buckets) >= self.MAX_TRACKED_BUCKETS:
+            excess = len(buckets) - self.MAX_TRACKED_BUCKETS // 2
+            for key in list(buckets)[:excess]:
+                del buckets[key]
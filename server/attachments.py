@@ -0,0 +1,310 @@
+"""Spooling large attachments to disk as their chunks arrive.
+
+An attachment is never held in memory whole. Each chunk is written to a
+spool file as soon as it arrives, and readers are sent attachments
+straight from their files, so the server's memory use does not grow with
+the size of the attachments passing through it.
+"""
+
+from typing import Any, BinaryIO, Callable, Optional
+import contextlib
+import logging
+import os
+import tempfile
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class FileSpan:
+    """Part of an open file, waiting to be sent on a connection.
+
+    The span owns the file, and closes it once sent or abandoned.
+    """
+
+    __slots__ = ("file", "offset", "size")
+
+    def __init__(self, file: BinaryIO, offset: int, size: int):
+        """Wrap an open file.
+
+        :param file: The file to send from, opened for reading in binary mode.
+        :param offset: The position of the first byte to send.
+        :param size: The number of bytes to send.
+        """
+        self.file = file
+        self.offset = offset
+        self.size = size
+
+    def close(self) -> None:
+        """Close the file, whether or not it has all been sent."""
+        self.file.close()
+
+
+class Upload:
+    """An attachment part way through arriving, and the message it belongs to.
+
+    An upload with no spool file path is being discarded, as the message it
+    belongs to was refused or its file could not be written, and its chunks
+    are only counted off as they arrive.
+    """
+
+    __slots__ = (
+        "sender_name",
+        "receiver_name",
+        "message",
+        "options",
+        "size",
+        "received",
+        "file",
+        "path",
+    )
+
+    def __init__(  # noqa: PLR0913
+        self,
+        sender_name: str,
+        receiver_name: str,
+        message: bytes,
+        options: dict[Any, Any],
+        size: int,
+        file: Optional[BinaryIO] = None,
+        path: Optional[str] = None,
+    ):
+        """Start receiving an attachment.
+
+        :param sender_name: The name of the user sending the attachment.
+        :param receiver_name: The name of the user who will receive it.
+        :param message: The message the attachment belongs to.
+        :param options: The options attached to the message's request.
+        :param size: The length of the attachment.
+        :param file: The spool file to write the attachment to, or ``None``
+            to discard it.
+        :param path: The path of the spool file, until the finished
+            attachment is handed to the spool.
+        """
+        self.sender_name = sender_name
+        self.receiver_name = receiver_name
+        self.message = message
+        self.options = options
+        self.size = size
+        self.received = 0
+        self.file = file
+        self.path = path
+
+    @property
+    def complete(self) -> bool:
+        """Whether every byte of the attachment has arrived.
+
+        :return: ``True`` once the upload has received ``size`` bytes.
+        """
+        return self.received >= self.size
+
+    def write(self, data: bytes) -> None:
+        """Write the next chunk of the attachment to the spool file.
+
+        The spool file is closed once the last chunk has been written.
+
+        :param data: The bytes carried by the chunk.
+        :raises ValueError: If the chunk runs past the end of the attachment.
+        :raises OSError: If the spool file cannot be written to.
+        """
+        if self.received + len(data) > self.size:
+            raise ValueError("Received chunk running past the end of the attachment")
+
+        self.received += len(data)
+        if self.file is None:
+            return
+        self.file.write(data)
+        if self.complete:
+            self.file.close()
+            self.file = None
+
+    def abort(self) -> None:
+        """Abandon the attachment, removing its spool file.
+
+        Any chunks still to arrive are discarded. Does nothing once the
+        attachment has been handed to the spool.
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.path is not None:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.path)
+            self.path = None
+
+
+class Attachment:
+    """An attachment held in a spool file, belonging to a stored message."""
+
+    __slots__ = ("path", "size")
+
+    def __init__(self, path: str, size: int):
+        """Describe a spooled attachment.
+
+        :param path: The path of the spool file.
+        :param size: The length of the attachment.
+        """
+        self.path = path
+        self.size = size
+
+    def open(self) -> FileSpan:
+        """Open the attachment to be sent.
+
+        The open file can still be sent once the attachment is discarded.
+
+        :return: A span covering the whole attachment.
+        :raises OSError: If the spool file cannot be opened.
+        """
+        # pylint: disable-next=consider-using-with
+        return FileSpan(open(self.path, "rb"), 0, self.size)
+
+
+class AttachmentSpool:
+    """The attachments of every stored message, by mailbox and sequence number.
+
+    Attachments are discarded when their message is delivered, or found to
+    have gone by a ``sweep``, such as after expiring or being acknowledged.
+    """
+
+    def __init__(self, directory: str, max_size: int = 0):
+        """Create an empty spool.
+
+        :param directory: The directory to write spool files to, created
+            when the first attachment arrives.
+        :param max_size: The largest attachment accepted, or zero for no limit.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.attachments: dict[tuple[str, int], Attachment] = {}
+        # Worker threads upload and deliver attachments at the same time
+        self.lock = threading.Lock()
+
+        self.uploaded = 0
+        self.uploaded_bytes = 0
+        self.discarded = 0
+
+    def accepts(self, size: int) -> bool:
+        """Check whether an attachment is small enough to accept.
+
+        :param size: The length of the attachment.
+        :return: ``True`` if the attachment may be uploaded.
+        """
+        return not self.max_size or size <= self.max_size
+
+    def start(  # noqa: PLR0913
+        self,
+        sender_name: str,
+        receiver_name: str,
+        message: bytes,
+        options: dict[Any, Any],
+        size: int,
+    ) -> Upload:
+        """Start receiving an attachment into a new spool file.
+
+        :param sender_name: The name of the user sending the attachment.
+        :param receiver_name: The name of the user who will receive it.
+        :param message: The message the attachment belongs to.
+        :param options: The options attached to the message's request.
+        :param size: The length of the attachment.
+        :return: The upload, to write the attachment's chunks to.
+        :raises OSError: If the spool file cannot be created.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        descriptor, path = tempfile.mkstemp(suffix=".attachment", dir=self.directory)
+        return Upload(
+            sender_name,
+            receiver_name,
+            message,
+            options,
+            size,
+            os.fdopen(descriptor, "wb"),
+            path,
+        )
+
+    def register(self, receiver_name: str, sequence: int, upload: Upload) -> None:
+        """Take ownership of a finished upload, once its message is stored.
+
+        :param receiver_name: The name of the user who will receive it.
+        :param sequence: The sequence number of the message it belongs to.
+        :param upload: The finished upload.
+        """
+        assert upload.complete and upload.path is not None
+        with self.lock:
+            self.attachments[receiver_name, sequence] = Attachment(
+                upload.path, upload.size
+            )
+            self.uploaded += 1
+            self.uploaded_bytes += upload.size
+        upload.path = None
+
+    def find(self, receiver_name: str, sequence: int) -> Optional[Attachment]:
+        """Look up the attachment belonging to a message.
+
+        :param receiver_name: The name of the user whose mailbox holds the message.
+        :param sequence: The sequence number of the message.
+        :return: The attachment, or ``None`` if the message has none.
+        """
+        if not self.attachments:
+            return None
+        with self.lock:
+            return self.attachments.get((receiver_name, sequence))
+
+    def discard(self, receiver_name: str, sequence: int) -> None:
+        """Remove the attachment belonging to a message, if it has one.
+
+        :param receiver_name: The name of the user whose mailbox held the message.
+        :param sequence: The sequence number of the message.
+        """
+        if not self.attachments:
+            return
+        with self.lock:
+            attachment = self.attachments.pop((receiver_name, sequence), None)
+        if attachment is not None:
+            self.remove_file(attachment)
+
+    def sweep(self, holds: Callable[[str, int], bool]) -> int:
+        """Remove the attachments of every message which has gone.
+
+        :param holds: Called with a mailbox name and sequence number, and
+            returns whether the message is still waiting to be delivered.
+        :return: The number of attachments removed.
+        """
+        with self.lock:
+            keys = list(self.attachments)
+        gone = [key for key in keys if not holds(*key)]
+        for receiver_name, sequence in gone:
+            self.discard(receiver_name, sequence)
+        return len(gone)
+
+    def remove_file(self, attachment: Attachment) -> None:
+        """Delete an attachment's spool file.
+
+        :param attachment: The attachment to delete.
+        """
+        self.discarded += 1
+        try:
+            os.remove(attachment.path)
+        except OSError as error:
+            logger.error("Unable to remove attachment %s: %s", attachment.path, error)
+
+    def close(self) -> None:
+        """Delete every spool file, as the messages they belong to are lost."""
+        with self.lock:
+            attachments = list(self.attachments.values())
+            self.attachments.clear()
+        for attachment in attachments:
+            self.remove_file(attachment)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Get the attachments passed through the spool.
+
+        :return: A dictionary mapping each statistic's name to its value.
+        """
+        return {
+            "attachments": len(self.attachments),
+            "uploaded": self.uploaded,
+            "uploaded_bytes": self.uploaded_bytes,
+            "discarded": self.discarded,
+        }
@@ -0,0 +1,157 @@
+"""Moving every message in a store to or from a file in bulk.
+
+A dump file starts with a magic number, followed by chunks of messages.
+Each chunk holds up to ``CHUNK_MESSAGES`` messages for one mailbox, and
+begins with a header giving the length of the mailbox owner's name, the
+number of messages and the number of bytes they take up. Each message is
+encoded as it would be spilled to disk: its expiry time, storage time,
+sequence number and priority, followed by a ``Message`` record. A mailbox
+with many messages spans several chunks, so only one chunk is held in
+memory at once.
+"""
+
+from typing import NamedTuple, Union
+import os
+import struct
+import time
+
+from .mailbox_store import MailboxStore
+from .stored_message import StoredMessage
+from .striped_store import StripedMailboxStore
+
+
+# Identifies dump files, and the version of their layout
+DUMP_MAGIC = b"MSGDUMP2"
+# Owner name length, message count and record length of a chunk
+CHUNK_HEADER = struct.Struct("!HII")
+# The most messages held in a single chunk
+CHUNK_MESSAGES = 1024
+# The number of bytes after which a chunk is written, however few messages
+CHUNK_BYTES = 1 << 20
+
+
+class TransferStats(NamedTuple):
+    """How much was moved by an export or import, and how quickly."""
+
+    messages: int
+    # Messages which were read but not stored, having expired or not fit
+    skipped: int
+    byte_count: int
+    seconds: float
+
+    def describe(self) -> str:
+        """Summarise the transfer and its throughput.
+
+        :return: A description of the transfer.
+        """
+        seconds = max(self.seconds, 1e-9)
+        return (
+            f"{self.messages} message(s), {self.byte_count} bytes"
+            f" in {self.seconds:.2f} seconds"
+            f" ({self.messages / seconds:.0f} messages/s,"
+            f" {self.byte_count / seconds / 1e6:.1f} MB/s)"
+        )
+
+
+def export_store(
+    store: Union[MailboxStore, StripedMailboxStore], path: str
+) -> TransferStats:
+    """Write every deliverable message in a store to a dump file.
+
+    The file is written alongside its final path, and moved into place
+    once complete, so a failed export never leaves a partial dump behind.
+
+    :param store: The store to export.
+    :param path: The path of the dump file.
+    :return: The number of messages and bytes written, and the time taken.
+    :raises OSError: If the file cannot be written.
+    """
+    started = time.monotonic()
+    messages = byte_count = 0
+    partial_path = path + ".partial"
+    with open(partial_path, "wb") as dump_file:
+        dump_file.write(DUMP_MAGIC)
+        byte_count += len(DUMP_MAGIC)
+
+        chunk_owner = ""
+        chunk: list[bytes] = []
+        chunk_bytes = 0
+
+        def write_chunk() -> None:
+            nonlocal byte_count
+            owner = chunk_owner.encode()
+            dump_file.write(CHUNK_HEADER.pack(len(owner), len(chunk), chunk_bytes))
+            dump_file.write(owner)
+            dump_file.writelines(chunk)
+            byte_count += CHUNK_HEADER.size + len(owner) + chunk_bytes
+
+        for receiver_name, stored_message in store.snapshot():
+            if chunk and (
+                receiver_name != chunk_owner
+                or len(chunk) == CHUNK_MESSAGES
+                or chunk_bytes >= CHUNK_BYTES
+            ):
+                write_chunk()
+                chunk = []
+                chunk_bytes = 0
+
+            chunk_owner = receiver_name
+            record = stored_message.to_bytes()
+            chunk.append(record)
+            chunk_bytes += len(record)
+            messages += 1
+
+        if chunk:
+            write_chunk()
+
+    os.replace(partial_path, path)
+    return TransferStats(messages, 0, byte_count, time.monotonic() - started)
+
+
+def import_store(
+    store: Union[MailboxStore, StripedMailboxStore], path: str
+) -> TransferStats:
+    """Add every message in a dump file to a store.
+
+    Each chunk is read and stored as one batch. Messages keep their expiry
+    and storage times, but are numbered afresh by the store.
+
+    :param store: The store to add the messages to.
+    :param path: The path of the dump file.
+    :return: The number of messages stored and skipped, the number of
+        bytes read, and the time taken.
+    :raises ValueError: If the file is not a dump file, or is truncated.
+    :raises OSError: If the file cannot be read.
+    """
+    started = time.monotonic()
+    messages = skipped = 0
+    with open(path, "rb") as dump_file:
+        if dump_file.read(len(DUMP_MAGIC)) != DUMP_MAGIC:
+            raise ValueError(f"{path} is not a dump file")
+
+        while True:
+            header = dump_file.read(CHUNK_HEADER.size)
+            if not header:
+                break
+            if len(header) < CHUNK_HEADER.size:
+                raise ValueError("Dump file ends part way through a chunk")
+
+            owner_length, count, chunk_bytes = CHUNK_HEADER.unpack(header)
+            owner = dump_file.read(owner_length)
+            buffer = dump_file.read(chunk_bytes)
+            if len(owner) < owner_length or len(buffer) < chunk_bytes:
+                raise ValueError("Dump file ends part way through a chunk")
+
+            chunk = []
+            offset = 0
+            for _ in range(count):
+                stored_message, offset = StoredMessage.unpack_from(buffer, offset)
+                chunk.append(stored_message)
+
+            stored = store.add_many(owner.decode(), chunk)
+            messages += stored
+            skipped += count - stored
+
+        byte_count = dump_file.tell()
+
+    return TransferStats(messages, skipped, byte_count, time.monotonic() - started)
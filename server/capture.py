@@ -0,0 +1,133 @@
+"""Recording the requests a server receives, so they can be replayed later.
+
+A capture file starts with a header holding the time the capture began,
+followed by a record for every request. Each record holds when the
+request arrived, relative to the start of the capture, how long the
+server took to serve it, and the request packet as received, except
+that gateway keys are blanked.
+"""
+
+from typing import Iterator, NamedTuple
+import struct
+import threading
+import time
+
+from src.packets.message_request import MessageRequest
+from src.packets.packet import Packet
+from src.message_type import MessageType
+from src.request_option import RequestOption
+
+
+# Identifies capture files, and the version of their layout
+CAPTURE_MAGIC = b"MSGCAP01"
+# The magic bytes and the wall clock time the capture began
+FILE_HEADER = struct.Struct("!8sd")
+# Seconds since the capture began, seconds spent serving, and packet length
+RECORD_HEADER = struct.Struct("!dfI")
+
+
+class CapturedRequest(NamedTuple):
+    """A request read back from a capture file."""
+
+    # Seconds after the start of the capture that the request arrived
+    offset: float
+    # Seconds the server spent serving the request
+    service_time: float
+    packet: bytes
+
+
+class CaptureWriter:
+    """Appends every request a server receives to a capture file.
+
+    Records are buffered, and may be written by several worker threads.
+    """
+
+    def __init__(self, path: str):
+        """Create the capture file, overwriting any existing file.
+
+        :param path: The path of the capture file.
+        :raises OSError: If the file cannot be created.
+        """
+        self.path = path
+        self.file = open(path, "wb")  # pylint: disable=consider-using-with
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.file.write(FILE_HEADER.pack(CAPTURE_MAGIC, time.time()))
+        self.records = 0
+
+    def record(self, packet: bytes, arrived: float, service_time: float) -> None:
+        """Write a request to the capture file.
+
+        :param packet: The request packet, as received.
+        :param arrived: The ``time.monotonic`` time the request arrived.
+        :param service_time: The number of seconds spent serving the request.
+        """
+        packet = redact_packet(packet)
+        header = RECORD_HEADER.pack(arrived - self.started, service_time, len(packet))
+        with self.lock:
+            self.file.write(header + packet)
+            self.records += 1
+
+    def close(self) -> None:
+        """Write any buffered records and close the capture file."""
+        with self.lock:
+            self.file.close()
+
+
+def redact_packet(packet: bytes) -> bytes:
+    """Blank the gateway key of a bulk read, so it is never written to disk.
+
+    The key is overwritten with zeros, so the request keeps its length,
+    but a replayed bulk read is refused.
+
+    :param packet: The request packet, as received.
+    :return: The request packet, without any gateway key.
+    """
+    try:
+        if Packet.peek_message_type(packet) != MessageType.BULK_READ:
+            return packet
+        stripped = MessageRequest.without_options(packet)
+    except ValueError:
+        # Too short to hold any options
+        return packet
+
+    try:
+        options = MessageRequest.decode_options(packet)
+    except ValueError:
+        # Malformed options may still hold the key, so none are kept
+        return stripped
+
+    gateway_key = options.get(RequestOption.GATEWAY_KEY)
+    if gateway_key is None:
+        return packet
+    options[RequestOption.GATEWAY_KEY] = bytes(len(gateway_key))
+    return MessageRequest.add_options(stripped, options)
+
+
+def read_capture(path: str) -> Iterator[CapturedRequest]:
+    """Read back the requests recorded in a capture file.
+
+    :param path: The path of the capture file.
+    :return: An iterator of the requests, in the order they arrived.
+    :raises ValueError: If the file is not a capture file, or is truncated.
+    :raises OSError: If the file cannot be read.
+    """
+    with open(path, "rb") as capture_file:
+        header = capture_file.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size or (
+            FILE_HEADER.unpack(header)[0] != CAPTURE_MAGIC
+        ):
+            raise ValueError(f"{path} is not a capture file")
+
+        while True:
+            record_header = capture_file.read(RECORD_HEADER.size)
+            if not record_header:
+                return
+            if len(record_header) < RECORD_HEADER.size:
+                raise ValueError("Capture file ends part way through a record")
+
+            offset, service_time, length = RECORD_HEADER.unpack(record_header)
+            packet = capture_file.read(length)
+            if len(packet) < length:
+                raise ValueError("Capture file ends part way through a record")
+            yield CapturedRequest(offset, service_time, packet)
@@ -0,0 +1,493 @@
+"""Sharding mailboxes across the nodes of a cluster.
+
+Each node owns the mailboxes whose receiver names hash onto its arcs of
+a consistent hash ring. Any node accepts any request, and forwards those
+for mailboxes it does not own to their owner over a persistent connection.
+"""
+
+from collections import deque
+from typing import Any, NamedTuple, Optional
+import errno
+import logging
+import os
+import selectors
+import socket
+import time
+
+from src.message_type import MessageType
+from src.packets.message_request import MessageRequest
+from src.packets.message_response import MessageResponse
+from src.packets.packet import Packet
+from src.packets.response_framing import split_responses
+from src.packets.result_response import ResultResponse
+from src.port_number import PortNumber
+from src.request_option import RequestOption
+from src.result_code import ResultCode
+from src.server_address import ServerAddress
+from .connection import PendingResponse
+from .event_loop import EventLoop
+from .hash_ring import HashRing
+
+
+logger = logging.getLogger(__name__)
+
+# The response to a request which asked to be acknowledged
+ACKNOWLEDGEMENT = ResultResponse(ResultCode.OK).to_bytes()
+
+# Sent on an idle link, so the node does not close it
+HEARTBEAT = MessageRequest(MessageType.PING, "", "", "").to_bytes()
+
+# Requests for the mailbox of the user sending them, rather than of the receiver
+READER_REQUESTS = frozenset(
+    message_type.value
+    for message_type in (
+        MessageType.READ,
+        MessageType.STATUS,
+        MessageType.SEARCH,
+        MessageType.PEEK,
+    )
+)
+
+
+class ClusterNode(NamedTuple):
+    """A server which owns part of the cluster's mailboxes."""
+
+    name: str
+    address: ServerAddress
+
+
+def load_cluster_config(path: str) -> list[ClusterNode]:
+    """Read the members of a cluster from a configuration file.
+
+    Each line names a node followed by its address, either a host name
+    and port number, or a ``unix:`` socket path. Blank lines and anything
+    after a ``#`` are ignored. For example::
+
+        alpha localhost 12000
+        beta  localhost 12001
+        gamma unix:/tmp/gamma.sock
+
+    Every node of a cluster must be given the same file.
+
+    :param path: The path of the configuration file.
+    :return: The nodes of the cluster, in the order they are listed.
+    :raises OSError: If the file cannot be read.
+    :raises ValueError: If the file is malformed.
+    """
+    nodes: list[ClusterNode] = []
+    with open(path, encoding="utf-8") as config_file:
+        for line_number, line in enumerate(config_file, start=1):
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+
+            name, *address = fields
+            if len(address) == 1 and ServerAddress.is_unix(address[0]):
+                (host_name,) = address
+                port_number = 0
+            else:
+                try:
+                    host_name, port = address
+                except ValueError:
+                    raise ValueError(
+                        f"{path}:{line_number}: expected a node name and address"
+                    ) from None
+                try:
+                    port_number = PortNumber(port)
+                except (TypeError, ValueError) as error:
+                    raise ValueError(f"{path}:{line_number}: {error}") from error
+
+            if any(node.name == name for node in nodes):
+                raise ValueError(f"{path}:{line_number}: node {name} listed twice")
+            nodes.append(ClusterNode(name, ServerAddress(host_name, port_number)))
+
+    if not nodes:
+        raise ValueError(f"{path} does not list any nodes")
+
+    return nodes
+
+
+class PeerLink:
+    """A persistent connection for forwarding requests to another node.
+
+    Requests are pipelined, and the peer answers them in order, so each
+    response resolves the oldest request still awaiting one. A windowed
+    read may be answered with several pages, which are collected until
+    the last one arrives. The link is opened when first used, and reopened
+    after it fails. The node closes it if it stays idle for too long, so
+    heartbeats are sent while there is nothing else to send.
+    """
+
+    RECEIVE_SIZE = 65536
+
+    def __init__(self, node: ClusterNode, event_loop: EventLoop, batch: bool = False):
+        """Create a link to a node, without connecting to it yet.
+
+        :param node: The node to forward requests to.
+        :param event_loop: The event loop which watches the link's socket.
+        :param batch: Whether to hold requests until the socket is next
+            writable, so that every request forwarded in the same round of
+            the event loop is sent in a single system call.
+        """
+        self.node = node
+        self.event_loop = event_loop
+        self.batch = batch
+        self.batches_sent = 0
+        self.socket: Optional[socket.socket] = None
+        self.connected = False
+        self.inbound = bytearray()
+        self.outbound = bytearray()
+        # Each request awaiting a response, whether its sender wants an ack,
+        # and the most pages it may be answered with
+        self.waiting: deque[tuple[PendingResponse, bool, int]] = deque()
+        # The pages received so far for the oldest request
+        self.pages: list[bytes] = []
+        # When a request was last sent
+        self.last_sent = time.monotonic()
+
+    def forward(
+        self, packet: bytes, acknowledge: bool, max_pages: int = 1
+    ) -> PendingResponse:
+        """Send a request to the node.
+
+        :param packet: The request, which must ask for an acknowledgement
+            so that every request gets a response.
+        :param acknowledge: Whether the original sender asked for one too.
+        :param max_pages: The most pages of messages the request may be
+            answered with.
+        :return: The node's response, once it arrives.
+        """
+        response = PendingResponse()
+        self.waiting.append((response, acknowledge, max_pages))
+        self.outbound += packet
+        self.last_sent = time.monotonic()
+
+        try:
+            if self.socket is None:
+                self.open()
+            elif self.connected and not self.batch:
+                self.flush()
+        except OSError as error:
+            self.fail(error)
+            return response
+
+        self.update_interest()
+        return response
+
+    def heartbeat(self, idle_time: float) -> None:
+        """Ping the node if the link is open but has not been used lately.
+
+        :param idle_time: The number of seconds the link may go unused.
+        """
+        if self.socket is not None and time.monotonic() - self.last_sent >= idle_time:
+            self.forward(HEARTBEAT, acknowledge=False)
+
+    def open(self) -> None:
+        """Start connecting to the node, without waiting for it to answer.
+
+        :raises OSError: If the connection cannot be started.
+        """
+        address = self.node.address
+        self.socket = address.create_socket()
+        self.socket.setblocking(False)
+        error = self.socket.connect_ex(address.socket_address)
+        if error not in (0, errno.EINPROGRESS, errno.EAGAIN):
+            raise OSError(error, os.strerror(error))
+
+        self.connected = error == 0
+        logger.info("Connecting to cluster node %s at %s", self.node.name, address)
+
+    def on_event(self, events: int) -> None:
+        """Make progress once the link's socket is ready.
+
+        :param events: The selector events which are ready.
+        """
+        assert self.socket is not None
+        try:
+            if events & selectors.EVENT_WRITE:
+                if not self.connected:
+                    error = self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if error:
+                        raise OSError(error, os.strerror(error))
+                    self.connected = True
+                self.flush()
+
+            if events & selectors.EVENT_READ:
+                self.receive()
+        except OSError as error:
+            self.fail(error)
+            return
+
+        self.update_interest()
+
+    def flush(self) -> None:
+        """Send as much of the queued requests as the socket will accept.
+
+        :raises OSError: If the connection has failed.
+        """
+        assert self.socket is not None
+        try:
+            sent = self.socket.send(self.outbound)
+        except BlockingIOError:
+            return
+        del self.outbound[:sent]
+        self.batches_sent += 1
+
+    def receive(self) -> None:
+        """Read responses from the node and pass them on.
+
+        :raises OSError: If the connection has failed or been closed.
+        """
+        assert self.socket is not None
+        peer_closed = False
+        while True:
+            try:
+                data = self.socket.recv(PeerLink.RECEIVE_SIZE)
+            except BlockingIOError:
+                break
+            if not data:
+                peer_closed = True
+                break
+
+            self.inbound += data
+            if len(data) < PeerLink.RECEIVE_SIZE:
+                break
+
+        try:
+            responses = split_responses(self.inbound)
+        except ValueError as error:
+            raise ConnectionError(
+                f"Invalid response from cluster node: {error}"
+            ) from error
+
+        for packet in responses:
+            self.pass_on(packet)
+
+        if peer_closed:
+            raise ConnectionResetError("Connection closed by cluster node")
+
+    def pass_on(self, packet: bytes) -> None:
+        """Resolve the oldest waiting request with a response from the node.
+
+        :param packet: A single response packet.
+        :raises ConnectionError: If no request is waiting for a response.
+        """
+        if not self.waiting:
+            raise ConnectionError("Unexpected response from cluster node")
+
+        response, acknowledge, max_pages = self.waiting[0]
+        answer = packet
+        if Packet.peek_message_type(packet) == MessageType.RESPONSE:
+            self.pages.append(packet)
+            _, more_messages = MessageResponse.decode_header(packet)
+            if more_messages and len(self.pages) < max_pages:
+                return
+            answer = b"".join(self.pages)
+            self.pages.clear()
+
+        self.waiting.popleft()
+        if not acknowledge and answer == ACKNOWLEDGEMENT:
+            # The sender only expects a response if it was rejected
+            response.resolve(None)
+        else:
+            response.resolve(answer)
+
+    def update_interest(self) -> None:
+        """Choose which socket events to wait for."""
+        if self.socket is None:
+            return
+
+        events = selectors.EVENT_READ
+        if self.outbound or not self.connected:
+            events |= selectors.EVENT_WRITE
+        self.event_loop.watch(self.socket, events, self.on_event)
+
+    def fail(self, error: OSError) -> None:
+        """Close a failed link, telling senders their requests were not served.
+
+        :param error: The reason the link failed.
+        """
+        if self.waiting:
+            logger.error(
+                "Lost connection to cluster node %s: %s", self.node.name, error
+            )
+        else:
+            logger.info(
+                "Closed connection to cluster node %s: %s", self.node.name, error
+            )
+
+        self.close()
+        unavailable = ResultResponse(ResultCode.UNAVAILABLE).to_bytes()
+        while self.waiting:
+            response, _, _ = self.waiting.popleft()
+            response.resolve(unavailable)
+
+    def close(self) -> None:
+        """Close the link's socket, discarding anything not yet sent or received."""
+        if self.socket is not None:
+            self.event_loop.unwatch(self.socket)
+            self.socket.close()
+            self.socket = None
+        self.connected = False
+        self.inbound.clear()
+        self.outbound.clear()
+        self.pages.clear()
+
+
+class Cluster:
+    """The view one node has of the cluster it belongs to."""
+
+    def __init__(self, nodes: list[ClusterNode], local_name: str):
+        """Join a cluster as one of its nodes.
+
+        :param nodes: Every node in the cluster, including this one.
+        :param local_name: The name of this node.
+        :raises ValueError: If this node is not a member of the cluster.
+        """
+        self.nodes = {node.name: node for node in nodes}
+        if local_name not in self.nodes:
+            raise ValueError(f"Node {local_name} is not listed in the cluster")
+
+        self.local_name = local_name
+        self.peer_hosts = Cluster.resolve_hosts(nodes)
+        self.unix_peers = any(
+            ServerAddress.is_unix(node.address.host_name) for node in nodes
+        )
+        self.ring = HashRing(list(self.nodes))
+        self.links: dict[str, PeerLink] = {}
+        self.event_loop: Optional[EventLoop] = None
+        self.forwarded_requests = 0
+
+    @staticmethod
+    def resolve_hosts(nodes: list[ClusterNode]) -> set[str]:
+        """Look up the IPv4 addresses of the nodes reached over TCP.
+
+        :param nodes: Every node in the cluster.
+        :return: The addresses which could be resolved.
+        """
+        hosts = set()
+        for node in nodes:
+            if ServerAddress.is_unix(node.address.host_name):
+                continue
+            try:
+                hosts.add(ServerAddress.resolve(node.address.host_name))
+            except socket.gaierror as error:
+                logger.warning("Cannot resolve cluster node %s: %s", node.name, error)
+        return hosts
+
+    def is_peer(self, client_address: Any) -> bool:
+        """Check whether a connection could have come from another node.
+
+        Clients on a Unix socket share the host, so are trusted only if
+        the cluster's nodes talk over Unix sockets.
+
+        :param client_address: The address the connection was accepted from.
+        :return: ``True`` if the address belongs to a node of the cluster.
+        """
+        if isinstance(client_address, tuple):
+            return client_address[0] in self.peer_hosts
+        return self.unix_peers
+
+    def attach(self, event_loop: EventLoop) -> None:
+        """Use an event loop to run the connections to other nodes.
+
+        :param event_loop: The server's event loop.
+        """
+        self.event_loop = event_loop
+
+    def owner(self, mailbox_name: bytes) -> str:
+        """Find the node which holds a mailbox.
+
+        :param mailbox_name: The name of the mailbox's owner.
+        :return: The name of the node holding the mailbox.
+        """
+        return self.ring.owner(mailbox_name)
+
+    def request_owner(
+        self, message_type: int, user_name: bytes, receiver_name: bytes
+    ) -> str:
+        """Find the node which holds the mailbox a request is for.
+
+        Mailboxes are sharded by the name of the user who reads them.
+
+        :param message_type: The raw type of the request.
+        :param user_name: The name of the user who sent the request.
+        :param receiver_name: The name of the user the request is sent to.
+        :return: The name of the node holding the mailbox.
+        """
+        if message_type in READER_REQUESTS:
+            return self.owner(user_name)
+        return self.owner(receiver_name)
+
+    def admits_locally(self, packet: bytes) -> bool:
+        """Check whether this node, rather than another, admits a request.
+
+        Requests are only counted against the rate limits of the node which
+        holds their mailbox, so those forwarded on are not counted twice.
+        Only the header and raw user names are inspected, as for admission.
+
+        :param packet: The raw message request packet.
+        :return: ``False`` if the request will be forwarded to another node.
+        """
+        try:
+            message_type, user_name, receiver_name = MessageRequest.peek_names(packet)
+        except ValueError:
+            return True
+        # Bulk reads are answered by whichever node they arrive at
+        if message_type == MessageType.BULK_READ.value:
+            return True
+        node_name = self.request_owner(message_type, user_name, receiver_name)
+        return node_name == self.local_name
+
+    def forward(
+        self,
+        node_name: str,
+        packet: bytes,
+        options: dict[RequestOption, Any],
+        client_number: int = 0,
+    ) -> PendingResponse:
+        """Pass a request on to the node which holds its mailbox.
+
+        The requests of every client are sent on the same connection, so
+        each is marked with the number of the client which sent it, to
+        keep the readers behind one connection apart.
+
+        :param node_name: The name of the node to forward the request to.
+        :param packet: The request received from a client.
+        :param options: The options attached to the request.
+        :param client_number: The number of the connection the request
+            arrived on, unique to this node.
+        :return: The node's response, once it arrives.
+        """
+        assert self.event_loop is not None
+        link = self.links.get(node_name)
+        if link is None:
+            link = PeerLink(self.nodes[node_name], self.event_loop)
+            self.links[node_name] = link
+
+        self.forwarded_requests += 1
+        forwarded_packet = MessageRequest.add_options(
+            packet,
+            {
+                RequestOption.FORWARDED: client_number.to_bytes(8, "big"),
+                RequestOption.ACKNOWLEDGE: b"",
+            },
+        )
+        return link.forward(
+            forwarded_packet,
+            acknowledge=RequestOption.ACKNOWLEDGE in options,
+            max_pages=max(options.get(RequestOption.WINDOW, 1), 1),
+        )
+
+    def heartbeat(self, idle_time: float) -> None:
+        """Ping every node whose link has not been used lately.
+
+        :param idle_time: The number of seconds a link may go unused.
+        """
+        for link in self.links.values():
+            link.heartbeat(idle_time)
+
+    def close(self) -> None:
+        """Close the connections to every other node."""
+        for link in self.links.values():
+            link.close()
@@ -0,0 +1,418 @@
+"""Home to the ``Connection`` class."""
+
+from collections import OrderedDict, deque
+from enum import Enum
+from typing import Any, Callable, Optional, Sequence, Union
+import itertools
+import logging
+import os
+import socket
+
+from src.packets.message_request import MessageRequest
+from src.request_option import RequestOption
+from .attachments import FileSpan, Upload
+from .stored_message import StoredMessage
+
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPhase(Enum):
+    """The stages a connection moves through while serving a request.
+
+    Each phase has its own deadline, after which the connection is closed.
+    """
+
+    READ_HEADER = 1
+    READ_BODY = 2
+    WRITE = 3
+
+
+class StreamedResponse:
+    """A response sent partly from files, such as one carrying attachments.
+
+    The files are sent straight from disk, without being read into memory.
+    A response may also have work to do once the client has been sent all
+    of it, such as removing the messages it delivered.
+    """
+
+    __slots__ = ("parts", "on_sent")
+
+    def __init__(
+        self,
+        parts: Sequence[Union[bytes, FileSpan, Callable[[], None]]],
+        on_sent: Optional[Callable[[], None]] = None,
+    ):
+        """Gather the parts of a response, in the order they are sent.
+
+        :param parts: The bytes and open file spans making up the response,
+            and work to do once every part before it has been sent.
+        :param on_sent: Called once the whole response has been sent, but
+            never if the connection closes first.
+        """
+        self.parts = parts
+        self.on_sent = on_sent
+
+    def close(self) -> None:
+        """Close the response's files, if it will never be sent."""
+        for part in self.parts:
+            if isinstance(part, FileSpan):
+                part.close()
+
+
+class PendingResponse:
+    """A response which is not yet known, such as one awaited from another node.
+
+    Responses are sent in the order their requests arrived, so a pending
+    response holds back every response queued after it until resolved.
+    """
+
+    __slots__ = ("data", "done", "on_done")
+
+    def __init__(self) -> None:
+        """Create an unresolved response."""
+        self.data: Union[bytes, StreamedResponse, None] = None
+        self.done = False
+        self.on_done: Optional[Callable[[], None]] = None
+
+    def resolve(self, data: Union[bytes, StreamedResponse, None]) -> None:
+        """Supply the response, and notify whoever is waiting for it.
+
+        :param data: The response to send, or ``None`` if there is nothing to send.
+        """
+        self.data = data
+        self.done = True
+        if self.on_done is not None:
+            self.on_done()
+
+
+class ReadCursor:
+    """How far a windowed reader has been sent through each lane of its mailbox.
+
+    Higher priority lanes are delivered first, so messages are not always
+    sent in the order they were numbered. The cursor keeps the number
+    of the last message sent from each lane, and a copy of those numbers
+    for every page not yet acknowledged, so acknowledging a page removes
+    exactly the messages sent up to the end of it.
+    """
+
+    __slots__ = ("sent", "pages")
+
+    def __init__(self) -> None:
+        """Create a cursor for a reader which has not been sent anything."""
+        # The sequence number of the last message sent from each lane
+        self.sent: dict[int, int] = {}
+        # The sequence number of each page's last message, and ``sent``
+        # as it was once the page was sent, oldest page first
+        self.pages: deque[tuple[int, dict[int, int]]] = deque()
+
+    def page_sent(self, stored_messages: list[StoredMessage]) -> None:
+        """Move past the messages of a page once it has been sent.
+
+        :param stored_messages: The messages in the page, in the order sent.
+        """
+        for stored_message in stored_messages:
+            self.sent[stored_message.priority] = stored_message.sequence
+        if stored_messages:
+            self.pages.append((stored_messages[-1].sequence, dict(self.sent)))
+
+    def acknowledge(self, sequence: int) -> Optional[dict[int, int]]:
+        """Find how far through each lane a reader had been sent a page.
+
+        :param sequence: The sequence number of the page's last message.
+        :return: The sequence number of the last message sent from each
+            lane once the page had been sent, or ``None`` if no such page
+            is waiting to be acknowledged.
+        """
+        while self.pages:
+            last_sequence, sent = self.pages.popleft()
+            if last_sequence == sequence:
+                return sent
+        return None
+
+
+class Connection:
+    """The state of a single client connection in the event loop.
+
+    Requests are read into a buffer until a complete packet has arrived,
+    and responses are queued until the socket is ready to send them,
+    so a slow client never blocks the server.
+    """
+
+    RECEIVE_SIZE = 65536
+
+    # Stop receiving once this many bytes are waiting to be served, leaving
+    # the rest in the socket, so a client uploading quickly is held back
+    MAX_RECEIVE_BUFFER = 16 * RECEIVE_SIZE
+
+    # The most queued chunks sent in a single system call
+    MAX_SEND_CHUNKS = 64
+
+    # The most clients behind another node whose read cursors are kept
+    MAX_FORWARDED_CLIENTS = 4096
+
+    # Numbers each connection, so clients can be told apart once forwarded
+    numbers = itertools.count(1)
+
+    def __init__(self, connection_socket: socket.socket, client_address: Any):
+        """Wrap a newly accepted, non-blocking connection socket.
+
+        :param connection_socket: The socket connected to the client.
+        :param client_address: The address of the client.
+        """
+        self.socket = connection_socket
+        self.client_address = client_address
+        self.number = next(Connection.numbers)
+        self.inbound = bytearray()
+        # Bytes and files to send, and what to do once each response is sent
+        self.outbound: deque[Union[memoryview, FileSpan, Callable[[], None]]] = deque()
+        # Bytes held in memory waiting to be sent, leaving out files
+        self.outbound_size = 0
+        self.outbound_files = 0
+        # Responses waiting on a pending response before them
+        self.waiting: deque[PendingResponse] = deque()
+
+        self.phase = ConnectionPhase.READ_HEADER
+        # Incremented on every deadline change, so stale timers can be ignored
+        self.deadline_generation = 0
+        self.peer_closed = False
+        self.closed = False
+        # Connections from other cluster nodes, where every request is answered
+        # so that the node can match up the responses
+        self.persistent = False
+        # How far each windowed reader has been sent, by mailbox name
+        self.read_cursors: dict[str, ReadCursor] = {}
+        # The read cursors of each client whose requests another node
+        # forwards on this connection, least recently used first
+        self.forwarded_cursors: OrderedDict[bytes, dict[str, ReadCursor]] = (
+            OrderedDict()
+        )
+        # The last message in each lane of the pages queued for plain
+        # readers but not yet sent, by mailbox name and lane priority
+        self.unsent_reads: dict[str, dict[int, int]] = {}
+        # The attachment whose chunks are arriving, if any
+        self.upload: Optional[Upload] = None
+        # The options of the request being served, if they were already
+        # decoded to rank it, so they are not decoded again
+        self.request_options: Optional[dict[RequestOption, Any]] = None
+
+    def fileno(self) -> int:
+        """Get the file descriptor of the connection socket.
+
+        :return: The file descriptor.
+        """
+        return self.socket.fileno()
+
+    def receive(self) -> bool:
+        """Read all available bytes from the socket into the inbound buffer.
+
+        :return: ``True`` if the client is still sending,
+            or ``False`` if it has closed its side of the connection.
+        :raises OSError: If the connection has failed.
+        """
+        while len(self.inbound) < Connection.MAX_RECEIVE_BUFFER:
+            try:
+                data = self.socket.recv(Connection.RECEIVE_SIZE)
+            except BlockingIOError:
+                return True
+
+            if not data:
+                self.peer_closed = True
+                return False
+
+            self.inbound += data
+            if len(data) < Connection.RECEIVE_SIZE:
+                return True
+
+        return True
+
+    def client_cursors(self, client: bytes) -> dict[str, ReadCursor]:
+        """Find the read cursors of a client whose requests another node forwards.
+
+        Only the cursors of the clients which read most recently are kept,
+        and any other client starts again from its oldest unacknowledged
+        message, as it would after reconnecting.
+
+        :param client: The number the forwarding node gave the client.
+        :return: How far each of the client's readers has been sent
+            through their mailbox, by mailbox name.
+        """
+        cursors = self.forwarded_cursors.pop(client, None)
+        if cursors is None:
+            cursors = {}
+            if len(self.forwarded_cursors) >= Connection.MAX_FORWARDED_CLIENTS:
+                self.forwarded_cursors.popitem(last=False)
+        self.forwarded_cursors[client] = cursors
+        return cursors
+
+    def next_request(self) -> Optional[bytes]:
+        """Take the next complete request out of the inbound buffer.
+
+        :return: The request packet, or ``None`` if it has not fully arrived.
+        :raises ValueError: If the buffer does not start with a request.
+        """
+        length = MessageRequest.frame_length(self.inbound)
+        if length is None or len(self.inbound) < length:
+            return None
+
+        request = bytes(self.inbound[:length])
+        del self.inbound[:length]
+        return request
+
+    def queue(self, data: Union[bytes, StreamedResponse]) -> None:
+        """Queue data to be sent to the client.
+
+        :param data: The bytes to send, or a response sent partly from files.
+        """
+        if self.waiting:
+            response = PendingResponse()
+            response.resolve(data)
+            self.waiting.append(response)
+        else:
+            self.append_output(data)
+
+    def append_output(self, data: Union[bytes, StreamedResponse, None]) -> None:
+        """Add data to the end of the outbound queue.
+
+        :param data: The bytes to send, or a response sent partly from files.
+        """
+        if isinstance(data, StreamedResponse):
+            for part in data.parts:
+                if isinstance(part, FileSpan):
+                    self.outbound.append(part)
+                    self.outbound_files += 1
+                elif callable(part):
+                    self.outbound.append(part)
+                else:
+                    self.append_output(part)
+            if data.on_sent is not None:
+                self.outbound.append(data.on_sent)
+        elif data:
+            self.outbound.append(memoryview(data))
+            self.outbound_size += len(data)
+
+    def defer(self, response: PendingResponse) -> None:
+        """Reserve a place in the queue for a response which is not yet known.
+
+        :param response: The response to send once it has been resolved.
+        """
+        self.waiting.append(response)
+
+    def release(self) -> None:
+        """Queue every resolved response which is no longer held back."""
+        while self.waiting and self.waiting[0].done:
+            self.append_output(self.waiting.popleft().data)
+
+    @property
+    def has_output(self) -> bool:
+        """Whether any response has yet to be sent.
+
+        :return: ``True`` if a response is queued or pending.
+        """
+        return bool(self.outbound or self.waiting)
+
+    def flush(self) -> bool:
+        """Send as much queued data as the socket will accept.
+
+        Files are sent by ``sendfile``, straight from disk to the socket.
+
+        :return: ``True`` if all queued data has been sent.
+        :raises OSError: If the connection has failed.
+        """
+        while self.outbound:
+            head = self.outbound[0]
+            if isinstance(head, FileSpan):
+                if not self.send_file(head):
+                    return False
+                self.outbound.popleft()
+                head.close()
+                self.outbound_files -= 1
+                continue
+            if not isinstance(head, memoryview):
+                # Everything queued before it has been sent
+                self.outbound.popleft()
+                head()
+                continue
+
+            chunks: list[memoryview] = []
+            for chunk in itertools.islice(self.outbound, Connection.MAX_SEND_CHUNKS):
+                if not isinstance(chunk, memoryview):
+                    break
+                chunks.append(chunk)
+            try:
+                sent = self.socket.sendmsg(chunks)
+            except BlockingIOError:
+                return False
+
+            self.outbound_size -= sent
+            while sent:
+                chunk = self.outbound[0]
+                assert isinstance(chunk, memoryview)
+                if sent < len(chunk):
+                    self.outbound[0] = chunk[sent:]
+                    return False
+                sent -= len(chunk)
+                self.outbound.popleft()
+
+        return True
+
+    def send_file(self, span: FileSpan) -> bool:
+        """Send as much of a file as the socket will accept.
+
+        :param span: The part of the file still to send.
+        :return: ``True`` if the whole span has been sent.
+        :raises OSError: If the connection has failed, or the file is
+            shorter than expected.
+        """
+        while span.size:
+            try:
+                if self.socket.gettimeout() == 0:
+                    sent = os.sendfile(
+                        self.socket.fileno(), span.file.fileno(), span.offset, span.size
+                    )
+                else:
+                    # Waits for the socket to be ready, up to its timeout
+                    sent = self.socket.sendfile(span.file, span.offset, span.size)
+            except BlockingIOError:
+                return False
+
+            if not sent:
+                raise OSError("Attachment ended before it was all sent")
+            span.offset += sent
+            span.size -= sent
+
+        return True
+
+    def current_phase(self) -> ConnectionPhase:
+        """Work out which phase the connection is in from its buffers.
+
+        :return: The connection's current phase.
+        """
+        if self.outbound or self.waiting:
+            return ConnectionPhase.WRITE
+        if len(self.inbound) >= MessageRequest.header_size():
+            return ConnectionPhase.READ_BODY
+        return ConnectionPhase.READ_HEADER
+
+    def close(self) -> None:
+        """Close the connection socket."""
+        if self.closed:
+            return
+
+        self.closed = True
+        try:
+            self.socket.close()
+        except OSError as error:
+            logger.info(
+                "Error closing connection to %s: %s", self.client_address, error
+            )
+
+        for chunk in self.outbound:
+            if isinstance(chunk, FileSpan):
+                chunk.close()
+        for response in self.waiting:
+            if isinstance(response.data, StreamedResponse):
+                response.data.close()
+        if self.upload is not None:
+            self.upload.abort()
+            self.upload = None
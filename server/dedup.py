@@ -0,0 +1,202 @@
+"""Detecting repeated requests by the idempotency keys their senders attach.
+
+A client which does not hear back from the server cannot tell whether its
+request was served, so it sends the request again with the same key. The
+server remembers every key seen within a sliding window, and serves each
+key at most once.
+"""
+
+from collections import deque
+from typing import Callable
+import hashlib
+import math
+import threading
+import time
+
+
+class BloomFilter:
+    """A compact set which may mistake new keys for members, but never misses one.
+
+    Each key sets a handful of bits chosen by hashing it, and is taken to
+    be a member if all of its bits are set. The filter is sized so that
+    a new key is mistaken for a member at most ``error_rate`` of the time
+    while it holds no more than ``capacity`` keys. The size is rounded up
+    to a power of two, so positions wrap around it with a mask.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        """Create an empty Bloom filter.
+
+        :param capacity: The number of keys the filter is sized for.
+        :param error_rate: The chance of mistaking a new key for a member
+            once the filter is full.
+        """
+        bits_per_key = -math.log(error_rate) / math.log(2) ** 2
+        self.size = 1 << max(3, (math.ceil(capacity * bits_per_key) - 1).bit_length())
+        self.mask = self.size - 1
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: bytes) -> list[int]:
+        """Find the bits a key sets, combining two hashes of the key.
+
+        :param key: The key to hash.
+        :return: The positions of the key's bits.
+        """
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "big")
+        # An odd step is coprime with the power of two size, so it never
+        # revisits a position before every hash is used
+        step = int.from_bytes(digest[8:], "big") | 1
+        return [
+            position & self.mask
+            for position in range(first, first + step * self.hash_count, step)
+        ]
+
+    def add(self, key: bytes) -> None:
+        """Add a key to the filter.
+
+        :param key: The key to add.
+        """
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: bytes) -> bool:
+        """Check whether a key may have been added to the filter.
+
+        :param key: The key to look for.
+        :return: ``False`` if the key was certainly never added,
+            otherwise ``True``.
+        """
+        for position in self._positions(key):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class DedupIndex:
+    """Remembers the idempotency keys seen within a sliding window of time.
+
+    Keys are added to the newest of two Bloom filters, which is rotated
+    out once it has covered a whole window or is full, so each key is
+    remembered for between one and two windows in a fixed amount of
+    memory. The most recent keys are also kept in an exact set, so that
+    prompt retries, the most common kind, are recognised with certainty.
+
+    A key found only in a Bloom filter is a probable duplicate, which a
+    new key is mistaken for at most ``error_rate`` of the time.
+
+    The index may be shared by several threads. Repeats of a request must
+    be kept from being checked at the same time by the caller.
+    """
+
+    # The chance of a new key being mistaken for a probable duplicate
+    ERROR_RATE = 1e-6
+
+    def __init__(
+        self,
+        window: float,
+        capacity: int,
+        exact_keys: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Create an empty index.
+
+        :param window: The least number of seconds a key is remembered for.
+        :param capacity: The number of keys expected within a window.
+        :param exact_keys: The number of most recent keys kept exactly.
+        :param clock: A function returning the current time in seconds.
+        """
+        self.window = window
+        self.capacity = capacity
+        self.clock = clock
+
+        self.filters = deque(
+            [
+                BloomFilter(capacity, DedupIndex.ERROR_RATE),
+                BloomFilter(capacity, DedupIndex.ERROR_RATE),
+            ]
+        )
+        self.rotated_at = clock()
+
+        self.exact_keys: set[bytes] = set()
+        self.exact_order: deque[bytes] = deque()
+        self.exact_limit = exact_keys
+
+        self.duplicates = 0
+        self.probable_duplicates = 0
+        self.lock = threading.Lock()
+
+    def is_duplicate(self, key: bytes) -> bool:
+        """Check whether a key is certainly one seen recently.
+
+        :param key: The idempotency key, scoped to its sender.
+        :return: ``True`` if the key is in the exact set, otherwise ``False``.
+        """
+        with self.lock:
+            if key in self.exact_keys:
+                self.duplicates += 1
+                return True
+            return False
+
+    def is_probable_duplicate(self, key: bytes) -> bool:
+        """Check whether a key may have been seen within the window.
+
+        :param key: The idempotency key, scoped to its sender.
+        :return: ``True`` if the key is in either Bloom filter, otherwise ``False``.
+        """
+        with self.lock:
+            self._rotate()
+            if any(key in bloom_filter for bloom_filter in self.filters):
+                self.probable_duplicates += 1
+                return True
+            return False
+
+    def add(self, key: bytes) -> None:
+        """Remember a key, once the request carrying it has been served.
+
+        :param key: The idempotency key, scoped to its sender.
+        """
+        with self.lock:
+            self._rotate()
+            newest = self.filters[-1]
+            if newest.count >= self.capacity:
+                self._start_filter()
+                newest = self.filters[-1]
+            newest.add(key)
+
+            if self.exact_limit and key not in self.exact_keys:
+                self.exact_keys.add(key)
+                self.exact_order.append(key)
+                if len(self.exact_order) > self.exact_limit:
+                    self.exact_keys.discard(self.exact_order.popleft())
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Get the index's statistics.
+
+        :return: A dictionary mapping each statistic's name to its value.
+        """
+        return {
+            "keys": sum(bloom_filter.count for bloom_filter in self.filters),
+            "exact_keys": len(self.exact_keys),
+            "duplicates": self.duplicates,
+            "probable_duplicates": self.probable_duplicates,
+        }
+
+    def _rotate(self) -> None:
+        """Start a new filter once the newest has covered a whole window."""
+        elapsed = self.clock() - self.rotated_at
+        if elapsed >= self.window:
+            self._start_filter()
+        if elapsed >= 2 * self.window:
+            # Nothing was added for a whole window, so forget everything
+            self._start_filter()
+
+    def _start_filter(self) -> None:
+        """Replace the oldest filter with an empty one."""
+        self.filters.popleft()
+        self.filters.append(BloomFilter(self.capacity, DedupIndex.ERROR_RATE))
+        self.rotated_at = self.clock()
@@ -0,0 +1,466 @@
+"""Home to the ``EventLoop`` class."""
+
+from typing import Any, Callable, Optional, Union
+import heapq
+import itertools
+import selectors
+import logging
+import socket
+import time
+
+from src.packets.message_request import MessageRequest
+from src.packets.result_response import ResultResponse
+from src.request_option import RequestOption
+from src.result_code import ResultCode
+from .admission import AdmissionController
+from .connection import (
+    Connection,
+    ConnectionPhase,
+    PendingResponse,
+    StreamedResponse,
+)
+from .timer_wheel import TimerWheel
+
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoop:
+    """A single threaded, non-blocking event loop serving many connections.
+
+    Every connection has a deadline for the phase it is in: receiving a
+    request header, receiving the rest of the request, or sending the
+    response. Deadlines are kept in a timer wheel, so any number of idle
+    or slow connections are reaped together without blocking anyone else.
+
+    The requests received in each round are served by priority, so an
+    urgent request is not left waiting behind a bulk load arriving on
+    another connection.
+    """
+
+    # The resolution of connection deadlines, in seconds
+    DEADLINE_TICK = 0.1
+
+    # Stop reading from a client with this many bytes of unsent responses
+    MAX_PENDING_OUTPUT = 1 << 20
+
+    # Stop reading from a client with this many responses still pending
+    MAX_PENDING_RESPONSES = 1024
+
+    # Stop reading from a client with this many attachments' files still open
+    MAX_PENDING_FILES = 1024
+
+    def __init__(  # noqa: PLR0913
+        self,
+        welcoming_sockets: list[socket.socket],
+        handle_request: Callable[
+            [bytes, Connection],
+            Union[bytes, PendingResponse, StreamedResponse, None],
+        ],
+        admission: AdmissionController,
+        timeouts: dict[ConnectionPhase, float],
+        housekeeping: Callable[[], None],
+        housekeeping_interval: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Initialise the event loop.
+
+        :param welcoming_sockets: The listening sockets to accept connections on.
+        :param handle_request: Called with each request packet and the
+            connection it arrived on, returning the response to send, if any.
+        :param admission: Decides which connections are accepted.
+        :param timeouts: The number of seconds a connection may spend in
+            each phase, where zero means forever.
+        :param housekeeping: Called periodically to perform background work.
+        :param housekeeping_interval: The number of seconds between
+            calls to ``housekeeping``.
+        :param clock: A function returning the current time in seconds.
+        """
+        self.handle_request = handle_request
+        self.admission = admission
+        self.timeouts = timeouts
+        self.housekeeping = housekeeping
+        self.housekeeping_interval = housekeeping_interval
+        self.clock = clock
+
+        self.selector = selectors.DefaultSelector()
+        for welcoming_socket in welcoming_sockets:
+            welcoming_socket.setblocking(False)
+            self.selector.register(welcoming_socket, selectors.EVENT_READ)
+
+        self.connections: set[Connection] = set()
+        self.deadlines: TimerWheel[tuple[Connection, int]] = TimerWheel(
+            clock(), tick=EventLoop.DEADLINE_TICK
+        )
+        self.next_housekeeping = clock() + housekeeping_interval
+        self.timed_out_connections = 0
+
+    def close(self) -> None:
+        """Close every open connection and the selector."""
+        for connection in list(self.connections):
+            self.close_connection(connection)
+        self.selector.close()
+
+    def run(self) -> None:
+        """Serve connections forever."""
+        while True:
+            self.run_once()
+
+    def run_once(self) -> None:
+        """Wait for and process a single round of socket events."""
+        now = self.clock()
+        timeout = max(0.0, self.next_housekeeping - now)
+        if self.connections:
+            timeout = min(timeout, EventLoop.DEADLINE_TICK)
+
+        readable = []
+        for key, events in self.selector.select(timeout):
+            if key.data is None:
+                self.accept_connections(key.fileobj)  # type: ignore[arg-type]
+                continue
+
+            if not isinstance(key.data, Connection):
+                key.data(events)
+                continue
+
+            connection: Connection = key.data
+            if events & selectors.EVENT_WRITE and not connection.closed:
+                self.on_writable(connection)
+            if events & selectors.EVENT_READ:
+                readable.append(connection)
+
+        # Read from every client before serving any, so requests can be ranked
+        self.on_readable(
+            [connection for connection in readable if not connection.closed]
+        )
+
+        now = self.clock()
+        self.reap_expired_connections(now)
+        if now >= self.next_housekeeping:
+            self.housekeeping()
+            self.next_housekeeping = now + self.housekeeping_interval
+
+    def watch(
+        self, file_object: Any, events: int, handler: Callable[[int], None]
+    ) -> None:
+        """Call a handler whenever a socket the server opened becomes ready.
+
+        :param file_object: The socket to watch.
+        :param events: The selector events to wait for.
+        :param handler: Called with the events which are ready.
+        """
+        try:
+            key = self.selector.get_key(file_object)
+        except KeyError:
+            self.selector.register(file_object, events, handler)
+            return
+
+        if key.events != events or key.data is not handler:
+            self.selector.modify(file_object, events, handler)
+
+    def unwatch(self, file_object: Any) -> None:
+        """Stop watching a socket.
+
+        :param file_object: The socket to stop watching.
+        """
+        try:
+            self.selector.unregister(file_object)
+        except (KeyError, ValueError):
+            pass
+
+    def accept_connections(self, welcoming_socket: socket.socket) -> None:
+        """Accept every connection waiting on a welcoming socket.
+
+        :param welcoming_socket: The welcoming socket which is ready.
+        """
+        while True:
+            try:
+                connection_socket, client_address = welcoming_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as error:
+                # Such as running out of file descriptors, try again later
+                logger.error("Unable to accept connection: %s", error)
+                return
+
+            connection_socket.setblocking(False)
+            if not self.admission.admit_connection():
+                self.reject_connection(connection_socket)
+                continue
+
+            logger.info("New client connection from %s", client_address)
+            print("New client connection from", client_address)
+
+            connection = Connection(connection_socket, client_address)
+            self.connections.add(connection)
+            self.selector.register(connection.socket, selectors.EVENT_READ, connection)
+            self.set_deadline(connection, ConnectionPhase.READ_HEADER)
+
+    @staticmethod
+    def reject_connection(connection_socket: socket.socket) -> None:
+        """Tell a client the server is too busy, and close its connection.
+
+        :param connection_socket: The socket connected to the client.
+        """
+        with connection_socket:
+            try:
+                connection_socket.send(ResultResponse(ResultCode.OVERLOADED).to_bytes())
+            except OSError as error:
+                logger.info("Unable to send rejection: %s", error)
+
+    def on_readable(self, connections: list[Connection]) -> None:
+        """Receive data from clients and serve every complete request.
+
+        :param connections: The connections which are ready to read.
+        """
+        receiving = []
+        for connection in connections:
+            try:
+                connection.receive()
+            except OSError as error:
+                logger.info(
+                    "Connection to %s failed: %s", connection.client_address, error
+                )
+                self.close_connection(connection)
+                continue
+            receiving.append(connection)
+
+        served = self.serve_requests(receiving)
+
+        for connection in receiving:
+            if connection.closed:
+                continue
+
+            connection.release()
+            if connection.outbound and not self.flush(connection):
+                continue
+
+            if connection.peer_closed and not connection.has_output:
+                self.close_connection(connection)
+                continue
+
+            self.update_interest(connection)
+            self.update_deadline(connection, restart=connection in served)
+
+    def serve_requests(self, connections: list[Connection]) -> set[Connection]:
+        """Serve every complete request received, the most urgent first.
+
+        Each connection's requests are served in the order they arrived,
+        as their responses must be sent in that order. Across connections,
+        the request with the highest ``PRIORITY`` option is served first,
+        and requests of equal priority take turns.
+
+        :param connections: The connections which have received data.
+        :return: The connections which had at least one request served.
+        """
+        # The next request of each connection and its options, if they
+        # could be read, ranked by priority then arrival
+        ranked: list[
+            tuple[int, int, Connection, bytes, Optional[dict[RequestOption, Any]]]
+        ] = []
+        arrivals = itertools.count()
+
+        def rank_next_request(connection: Connection) -> None:
+            request = self.next_request(connection)
+            if request is not None:
+                options = MessageRequest.peek_options(request)
+                priority: int = (options or {}).get(RequestOption.PRIORITY, 0)
+                heapq.heappush(
+                    ranked, (-priority, next(arrivals), connection, request, options)
+                )
+
+        for connection in connections:
+            rank_next_request(connection)
+
+        served = set()
+        while ranked:
+            _, _, connection, request, options = heapq.heappop(ranked)
+            connection.request_options = options
+            try:
+                response = self.handle_request(request, connection)
+            finally:
+                connection.request_options = None
+            served.add(connection)
+            if isinstance(response, PendingResponse):
+                self.defer(connection, response)
+            elif response:
+                connection.queue(response)
+            rank_next_request(connection)
+
+        return served
+
+    @staticmethod
+    def next_request(connection: Connection) -> Optional[bytes]:
+        """Take a connection's next complete request out of its buffer.
+
+        :param connection: The connection to take the request from.
+        :return: The request packet, or ``None`` if it has not fully arrived
+            or the stream could not be framed.
+        """
+        try:
+            return connection.next_request()
+        except ValueError as error:
+            # Without a valid header, the rest of the stream cannot be framed
+            logger.error(error)
+            print("Message request discarded")
+            connection.inbound.clear()
+            connection.peer_closed = True
+            return None
+
+    def on_writable(self, connection: Connection) -> None:
+        """Continue sending queued responses to a client.
+
+        :param connection: The connection which is ready to write.
+        """
+        if not self.flush(connection):
+            return
+
+        if connection.peer_closed and not connection.has_output:
+            self.close_connection(connection)
+            return
+
+        self.update_interest(connection)
+        self.update_deadline(connection)
+
+    def defer(self, connection: Connection, response: PendingResponse) -> None:
+        """Hold a connection's place in line for a response that is not yet known.
+
+        :param connection: The connection the response will be sent on.
+        :param response: The pending response.
+        """
+        connection.defer(response)
+        if not response.done:
+            response.on_done = lambda: self.on_response_ready(connection)
+
+    def on_response_ready(self, connection: Connection) -> None:
+        """Send a response which has just been resolved.
+
+        :param connection: The connection awaiting the response.
+        """
+        if connection.closed:
+            return
+
+        connection.release()
+        if connection.outbound and not self.flush(connection):
+            return
+
+        if connection.peer_closed and not connection.has_output:
+            self.close_connection(connection)
+            return
+
+        self.update_interest(connection)
+        self.update_deadline(connection, restart=True)
+
+    def flush(self, connection: Connection) -> bool:
+        """Send queued data, closing the connection if it has failed.
+
+        :param connection: The connection to flush.
+        :return: ``False`` if the connection was closed, otherwise ``True``.
+        """
+        try:
+            connection.flush()
+        except OSError as error:
+            logger.info("Connection to %s failed: %s", connection.client_address, error)
+            self.close_connection(connection)
+            return False
+
+        return True
+
+    def update_interest(self, connection: Connection) -> None:
+        """Choose which socket events to wait for on a connection.
+
+        Reading stops while a client has too many unsent responses,
+        so a client which never reads cannot exhaust the server's memory.
+
+        :param connection: The connection to update.
+        """
+        events = 0
+        if (
+            not connection.peer_closed
+            and connection.outbound_size < EventLoop.MAX_PENDING_OUTPUT
+            and len(connection.waiting) < EventLoop.MAX_PENDING_RESPONSES
+            and connection.outbound_files < EventLoop.MAX_PENDING_FILES
+        ):
+            events |= selectors.EVENT_READ
+        if connection.outbound:
+            events |= selectors.EVENT_WRITE
+
+        if not events:
+            # Nothing to do until a pending response is resolved
+            self.unwatch(connection.socket)
+            return
+
+        try:
+            key = self.selector.get_key(connection.socket)
+        except KeyError:
+            self.selector.register(connection.socket, events, connection)
+            return
+
+        if key.events != events:
+            self.selector.modify(connection.socket, events, connection)
+
+    def update_deadline(self, connection: Connection, restart: bool = False) -> None:
+        """Start a new deadline if the connection has changed phase.
+
+        :param connection: The connection to update.
+        :param restart: Whether to restart the deadline even if the phase
+            has not changed, because the client has made progress.
+        """
+        phase = connection.current_phase()
+        if restart or phase != connection.phase:
+            self.set_deadline(connection, phase)
+
+    def set_deadline(self, connection: Connection, phase: ConnectionPhase) -> None:
+        """Enter a new phase, with a deadline for leaving it.
+
+        :param connection: The connection changing phase.
+        :param phase: The phase being entered.
+        """
+        connection.phase = phase
+        connection.deadline_generation += 1
+
+        timeout = self.timeouts.get(phase, 0.0)
+        if timeout:
+            self.deadlines.schedule(
+                self.clock() + timeout, (connection, connection.deadline_generation)
+            )
+
+    def reap_expired_connections(self, now: float) -> None:
+        """Close every connection that has stayed in one phase for too long.
+
+        :param now: The current time, in seconds.
+        """
+        for connection, generation in self.deadlines.advance(now):
+            if connection.closed or generation != connection.deadline_generation:
+                continue
+
+            self.timed_out_connections += 1
+            if (
+                connection.phase == ConnectionPhase.READ_HEADER
+                and not connection.inbound
+            ):
+                logger.info("Closing idle connection to %s", connection.client_address)
+            else:
+                logger.error(
+                    "Connection to %s timed out in %s phase",
+                    connection.client_address,
+                    connection.phase.name,
+                )
+                print("Timed out while waiting for message request")
+            self.close_connection(connection)
+
+    def close_connection(self, connection: Connection) -> None:
+        """Close a connection and stop tracking it.
+
+        :param connection: The connection to close.
+        """
+        if connection.closed:
+            return
+
+        try:
+            self.selector.unregister(connection.socket)
+        except (KeyError, ValueError):
+            pass
+        connection.close()
+        self.connections.discard(connection)
+        self.admission.release_connection()
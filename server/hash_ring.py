@@ -0,0 +1,56 @@
+"""Home to the ``HashRing`` class."""
+
+import bisect
+import hashlib
+
+
+class HashRing:
+    """A consistent hash ring assigning keys to nodes.
+
+    Each node is placed on the ring at many points, and a key belongs to
+    the node at the first point clockwise from the key's hash. Adding or
+    removing a node only moves the keys on the arcs next to its points,
+    and the many points per node spread keys evenly between the nodes.
+
+    Hashes are computed with BLAKE2, so every process agrees on the
+    owner of each key regardless of ``PYTHONHASHSEED``.
+    """
+
+    def __init__(self, node_names: list[str], points_per_node: int = 64):
+        """Build a ring of the given nodes.
+
+        :param node_names: The names of the nodes on the ring.
+        :param points_per_node: The number of points each node is placed at.
+        :raises ValueError: If there are no nodes, or a node is listed twice.
+        """
+        if not node_names:
+            raise ValueError("A hash ring must have at least one node")
+        if len(set(node_names)) != len(node_names):
+            raise ValueError("Hash ring nodes must have unique names")
+
+        self.node_names = list(node_names)
+        points = sorted(
+            (self.hash(f"{node_name}#{index}".encode()), node_name)
+            for node_name in node_names
+            for index in range(points_per_node)
+        )
+        self.hashes = [point_hash for point_hash, _ in points]
+        self.owners = [node_name for _, node_name in points]
+
+    @staticmethod
+    def hash(key: bytes) -> int:
+        """Find the position of a key on the ring.
+
+        :param key: The key to hash.
+        :return: A 64 bit hash of the key.
+        """
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big")
+
+    def owner(self, key: bytes) -> str:
+        """Find the node which a key belongs to.
+
+        :param key: The key to look up, such as a receiver's name.
+        :return: The name of the node owning the key.
+        """
+        index = bisect.bisect(self.hashes, self.hash(key))
+        return self.owners[index % len(self.owners)]
@@ -0,0 +1,1241 @@
+"""Home to the ``MailboxStore`` class.
+
+The mailbox store holds every undelivered message, keeping an exact
+account of the bytes held so that per-mailbox and global quotas can
+be enforced.
+"""
+
+from collections import OrderedDict
+from enum import Enum
+from typing import (
+    BinaryIO,
+    Callable,
+    ContextManager,
+    Iterable,
+    Iterator,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Protocol,
+    Union,
+)
+import bisect
+import contextlib
+import hashlib
+import heapq
+import itertools
+import logging
+import threading
+import time
+import os
+
+from src.result_code import ResultCode
+from .message_arena import OBJECT_LAYOUT_OVERHEAD, MessageArena, MessageColumns
+from .search_index import SearchIndex, words_in
+from .stored_message import StoredMessage
+from .timer_wheel import TimerWheel
+from .user_directory import UserDirectory
+
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaPolicy(Enum):
+    """What the store does when a quota would be exceeded."""
+
+    REJECT = 1
+    EVICT = 2
+    SPILL = 3
+
+    @staticmethod
+    def from_str(string: str) -> "QuotaPolicy":
+        """Convert a string to a quota policy.
+
+        :param string: The string to convert.
+        :return: The quota policy.
+        """
+        try:
+            return QuotaPolicy[string.upper()]
+        except KeyError as error:
+            raise ValueError(
+                f'Invalid quota policy: {string}, must be "reject", "evict" or "spill"'
+            ) from error
+
+
+class QuotaExceededError(Exception):
+    """Raised when a message cannot be stored without exceeding a quota."""
+
+    def __init__(self, result_code: ResultCode):
+        """Create the error with the result to report to the client.
+
+        :param result_code: The result code describing which quota was hit.
+        """
+        super().__init__(result_code.description)
+        self.result_code = result_code
+
+
+class MemoryUsage:
+    """The number of bytes held in memory by one or more stores.
+
+    Stores sharing a memory limit share one ``MemoryUsage``, which may be
+    updated by several threads at once.
+    """
+
+    def __init__(self) -> None:
+        """Start with nothing held in memory."""
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def add(self, size: int) -> None:
+        """Account for bytes taken into or released from memory.
+
+        :param size: The number of bytes taken, or negative if released.
+        """
+        with self.lock:
+            self.bytes += size
+
+
+class MailboxStatus(NamedTuple):
+    """A summary of the messages waiting in a mailbox."""
+
+    message_count: int
+    byte_count: int
+    # The number of seconds the oldest message has been waiting for
+    oldest_age: float
+
+
+class StoreObserver(Protocol):
+    """Something to be told about every change to the messages in a store.
+
+    Expiries are not reported, as every copy of a store expires its
+    messages independently.
+    """
+
+    def message_added(self, receiver_name: str, stored_message: StoredMessage) -> None:
+        """Observe a message once it has been added to a mailbox.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param stored_message: The message which was added.
+        """
+
+    def messages_removed(
+        self, receiver_name: str, last_sequence: int, priority: int
+    ) -> None:
+        """Observe the oldest messages of a mailbox's lane once they are removed.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param last_sequence: The sequence number of the last message
+            removed, every message before which in the lane is gone too.
+        :param priority: The priority of the lane they were removed from.
+        """
+
+
+class Mailbox:
+    """The messages waiting to be read by a single user.
+
+    Messages are held in a lane for each priority they were sent with,
+    and are delivered from the highest priority lane first, oldest first
+    within each lane. Most mailboxes only ever have the one lane.
+
+    Messages are held in memory, apart from those which have been
+    spilled to disk, which are always older than those in memory. The
+    oldest message in memory of each lane is always deliverable, so the
+    age of the mailbox can be found without looking through it.
+    """
+
+    __slots__ = (
+        "arena",
+        "users",
+        "lanes",
+        "total_bytes",
+        "expired_count",
+        "spill_path",
+        "spilled_count",
+        "spilled_bytes",
+        "spilled_stored_at",
+    )
+
+    def __init__(self, arena: MessageArena, users: UserDirectory) -> None:
+        """Create an empty mailbox.
+
+        :param arena: The arena holding the bodies of the mailbox's messages.
+        :param users: The directory numbering the senders of its messages.
+        """
+        self.arena = arena
+        self.users = users
+        # Highest priority first, only holding lanes with messages in memory
+        self.lanes: list[MessageColumns] = []
+        self.total_bytes = 0
+        self.expired_count = 0
+        self.spill_path: Optional[str] = None
+        self.spilled_count = 0
+        self.spilled_bytes = 0
+        # When the oldest message spilled to disk was stored
+        self.spilled_stored_at = 0.0
+
+    def __len__(self) -> int:
+        """Get the number of deliverable messages, including spilled ones.
+
+        :return: The number of messages.
+        """
+        in_memory = sum(len(lane) for lane in self.lanes)
+        return in_memory - self.expired_count + self.spilled_count
+
+    def lane(self, priority: int) -> MessageColumns:
+        """Get the lane holding messages of a priority, adding it if needed.
+
+        :param priority: The priority of the lane's messages.
+        :return: The lane.
+        """
+        index = 0
+        for index, lane in enumerate(self.lanes):
+            if lane.priority == priority:
+                return lane
+            if lane.priority < priority:
+                break
+        else:
+            index = len(self.lanes)
+
+        lane = MessageColumns(self.arena, self.users, priority)
+        self.lanes.insert(index, lane)
+        return lane
+
+    def find(self, sequence: int) -> Optional[tuple[MessageColumns, int]]:
+        """Find a message in memory by its sequence number.
+
+        :param sequence: The sequence number of the message.
+        :return: The lane holding the message and its position in the lane,
+            or ``None`` if it is not in memory.
+        """
+        for lane in self.lanes:
+            index = lane.find(sequence)
+            if index is not None:
+                return lane, index
+        return None
+
+    def after(self, sequence: int) -> Iterator[tuple[MessageColumns, int]]:
+        """Visit the messages in memory numbered after a sequence number, in order.
+
+        :param sequence: The sequence number to look after.
+        :return: An iterator of the lane holding each message and its
+            position in the lane, oldest first across every lane.
+        """
+        if len(self.lanes) == 1:
+            lane = self.lanes[0]
+            return ((lane, index) for index in range(lane.after(sequence), len(lane)))
+
+        merged = heapq.merge(
+            *(_numbered_positions(lane, lane.after(sequence)) for lane in self.lanes)
+        )
+        return ((lane, index) for _, index, lane in merged)
+
+    def discard_empty_lanes(self) -> None:
+        """Stop holding lanes which no longer have any messages in memory."""
+        if not all(self.lanes):
+            self.lanes = [lane for lane in self.lanes if lane]
+
+
+def _numbered_positions(
+    lane: MessageColumns, start: int
+) -> Iterator[tuple[int, int, MessageColumns]]:
+    """Visit the messages of a lane from a position onwards.
+
+    :param lane: The lane to visit.
+    :param start: The position of the first message to visit.
+    :return: An iterator of the sequence number and position of each
+        message, and the lane, so lanes can be merged by sequence number.
+    """
+    for index in range(start, len(lane)):
+        yield lane.sequence(index), index, lane
+
+
+class MailboxStore:
+    """Holds the mailbox of every user, enforcing quotas on their size.
+
+    All sizes are measured as the number of bytes the messages take up
+    when encoded as ``Message`` packets. A limit of zero means unlimited.
+    """
+
+    # The number of bytes read from a spill file at a time when streaming it
+    SPILL_READ_SIZE = 65536
+
+    def __init__(  # noqa: PLR0913
+        self,
+        mailbox_message_limit: int = 0,
+        mailbox_byte_limit: int = 0,
+        memory_limit: int = 0,
+        policy: QuotaPolicy = QuotaPolicy.REJECT,
+        spill_directory: str = "spill",
+        default_time_to_live: float = 0.0,
+        clock: Callable[[], float] = time.time,
+        search_memory_limit: Optional[int] = None,
+    ):
+        """Initialise an empty mailbox store.
+
+        :param mailbox_message_limit: The maximum number of messages per mailbox.
+        :param mailbox_byte_limit: The maximum number of bytes per mailbox.
+        :param memory_limit: The maximum number of bytes held in memory
+            across all mailboxes.
+        :param policy: What to do when a limit is reached.
+        :param spill_directory: Where to write mailboxes spilled to disk.
+        :param default_time_to_live: The number of seconds messages are kept
+            for when their sender does not specify, or zero to keep them forever.
+        :param clock: A function returning the current time in seconds.
+        :param search_memory_limit: The most bytes the search index may use,
+            zero for no limit, or ``None`` to search without an index.
+        """
+        self.mailbox_message_limit = mailbox_message_limit
+        self.mailbox_byte_limit = mailbox_byte_limit
+        self.memory_limit = memory_limit
+        self.policy = policy
+        self.spill_directory = spill_directory
+        self.default_time_to_live = default_time_to_live
+        self.clock = clock
+
+        # The receiver and sequence number of each message due to expire
+        self.expiry_wheel: TimerWheel[tuple[str, int]] = TimerWheel(clock())
+        self.observer: Optional[StoreObserver] = None
+        self.search_index = (
+            None if search_memory_limit is None else SearchIndex(search_memory_limit)
+        )
+
+        # Ordered from least to most recently used
+        self.mailboxes: OrderedDict[str, Mailbox] = OrderedDict()
+        self.arena = MessageArena(self._arena_fragmented_changed)
+        self.users = UserDirectory()
+        self.next_sequence = 1
+
+        # The bytes held by this store, and by every store sharing its limit
+        self._memory_bytes = 0
+        self.memory = MemoryUsage()
+        self.message_count = 0
+        self.spilled_bytes = 0
+        self.rejected_messages = 0
+        self.evicted_messages = 0
+        self.expired_messages = 0
+
+    @property
+    def memory_bytes(self) -> int:
+        """Get the number of bytes this store holds in memory.
+
+        :return: The number of bytes held in memory.
+        """
+        return self._memory_bytes
+
+    @memory_bytes.setter
+    def memory_bytes(self, value: int) -> None:
+        """Set the number of bytes this store holds in memory.
+
+        :param value: The number of bytes held in memory.
+        """
+        self.memory.add(value - self._memory_bytes)
+        self._memory_bytes = value
+
+    def _arena_fragmented_changed(self, change: int) -> None:
+        """Count the space left in full arena blocks towards the memory limit.
+
+        :param change: The number of bytes the space grew by, or negative
+            if it shrank.
+        """
+        self.memory.add(change)
+
+    def locked(self, receiver_name: str) -> ContextManager[None]:
+        """Group several operations on a mailbox, so no other thread sees them apart.
+
+        The store is only ever used by one thread, so nothing is locked.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :return: A context manager which does nothing.
+        """
+        return contextlib.nullcontext()
+
+    def add(  # noqa: PLR0913
+        self,
+        receiver_name: str,
+        sender_name: str,
+        message: bytes,
+        time_to_live: Optional[float] = None,
+        expires_at: Optional[float] = None,
+        sequence: Optional[int] = None,
+        stored_at: Optional[float] = None,
+        priority: int = 0,
+    ) -> int:
+        """Store a message in the receiver's mailbox.
+
+        :param receiver_name: The name of the user who will receive the message.
+        :param sender_name: The name of the user who sent the message.
+        :param message: The message body.
+        :param time_to_live: The number of seconds to keep the message for,
+            zero to keep it forever, or ``None`` to use the default.
+        :param expires_at: The time at which the message expires, or zero
+            if it never expires, used instead of ``time_to_live`` if given.
+        :param sequence: The message's sequence number, or ``None`` to number
+            it after every message already stored.
+        :param stored_at: The time at which the message was first stored,
+            or ``None`` if it is being stored now.
+        :param priority: How urgently the message is to be delivered, with
+            higher priorities delivered first.
+        :return: The message's sequence number.
+        :raises QuotaExceededError: If the message cannot be stored.
+        """
+        now = self.clock()
+        if expires_at is None:
+            if time_to_live is None:
+                time_to_live = self.default_time_to_live
+            expires_at = now + time_to_live if time_to_live > 0 else 0.0
+        if sequence is None:
+            sequence = self.next_sequence
+        if stored_at is None:
+            stored_at = now
+
+        stored_message = StoredMessage(
+            sender_name,
+            message,
+            expires_at,
+            sequence,
+            stored_at,
+            self.users.encode(sender_name),
+            priority,
+        )
+        mailbox = self.mailboxes.get(receiver_name)
+        if mailbox is None:
+            mailbox = self.mailboxes[receiver_name] = Mailbox(self.arena, self.users)
+        self.mailboxes.move_to_end(receiver_name)
+
+        try:
+            self._store(receiver_name, mailbox, stored_message)
+        except QuotaExceededError:
+            self._discard_if_empty(receiver_name, mailbox)
+            raise
+        return sequence
+
+    def add_many(
+        self, receiver_name: str, stored_messages: Iterable[StoredMessage]
+    ) -> int:
+        """Store a batch of messages in the receiver's mailbox, in order.
+
+        Each message keeps its expiry and storage times, but is given a new
+        sequence number. Messages which have already expired are dropped,
+        and those which do not fit are rejected without stopping the rest.
+
+        :param receiver_name: The name of the user who will receive the messages.
+        :param stored_messages: The messages to store, oldest first.
+        :return: The number of messages stored.
+        """
+        mailbox = self.mailboxes.get(receiver_name)
+        if mailbox is None:
+            mailbox = self.mailboxes[receiver_name] = Mailbox(self.arena, self.users)
+        self.mailboxes.move_to_end(receiver_name)
+
+        now = self.clock()
+        stored = 0
+        for stored_message in stored_messages:
+            if stored_message.has_expired(now):
+                continue
+            stored_message.sequence = self.next_sequence
+            with contextlib.suppress(QuotaExceededError):
+                self._store(receiver_name, mailbox, stored_message)
+                stored += 1
+
+        self._discard_if_empty(receiver_name, mailbox)
+        return stored
+
+    def peek(
+        self,
+        receiver_name: str,
+        count: int,
+        after_sequence: Union[int, Mapping[int, int]] = 0,
+    ) -> list[StoredMessage]:
+        """Get the next messages to deliver from a mailbox without removing them.
+
+        Messages are taken from the highest priority lane first, oldest
+        first within each lane. Any messages spilled to disk are loaded
+        back into memory first, and expired messages are never returned.
+
+        :param receiver_name: The name of the user whose mailbox to look in.
+        :param count: The maximum number of messages to return.
+        :param after_sequence: Skip messages numbered up to and including
+            this, or up to the number given for their lane's priority.
+        :return: Up to ``count`` messages, in the order they are delivered.
+        """
+        mailbox = self.mailboxes.get(receiver_name)
+        if mailbox is None:
+            return []
+
+        self.mailboxes.move_to_end(receiver_name)
+        if mailbox.spill_path is not None:
+            self._reload(receiver_name, mailbox)
+            self._make_room_in_memory(receiver_name, 0, include_receiver=False)
+
+        # Messages can expire between ticks of the expiry wheel
+        now = self.clock()
+        messages: list[StoredMessage] = []
+        expired = []
+        for lane in mailbox.lanes:
+            skipped = _lane_sequence(after_sequence, lane.priority)
+            for index in range(lane.after(skipped), len(lane)):
+                if len(messages) == count:
+                    break
+                if not lane.is_held(index):
+                    continue
+                if lane.has_expired(index, now):
+                    expired.append(lane.sequence(index))
+                else:
+                    messages.append(lane[index])
+
+        self._expire_all(receiver_name, mailbox, expired)
+        return messages
+
+    def drain(
+        self, receiver_name: str, count: int, priority: Optional[int] = None
+    ) -> None:
+        """Remove the first messages from a mailbox once they have been delivered.
+
+        :param receiver_name: The name of the user whose mailbox to drain.
+        :param count: The number of messages to remove, which must not be
+            more than were returned by ``peek``.
+        :param priority: The priority of the only lane to remove messages
+            from, or ``None`` to remove them in the order they are delivered.
+        """
+        mailbox = self.mailboxes.get(receiver_name)
+        if mailbox is None:
+            return
+
+        for lane in list(mailbox.lanes):
+            if priority is not None and lane.priority != priority:
+                continue
+            removed = 0
+            last_sequence = 0
+            while removed < count and lane:
+                last_sequence = lane.sequence(0)
+                if self._pop_oldest(receiver_name, mailbox, lane):
+                    removed += 1
+            count -= removed
+            if removed and self.observer is not None:
+                self.observer.messages_removed(
+                    receiver_name, last_sequence, lane.priority
+                )
+
+        self._pop_expired(mailbox)
+        self._discard_if_empty(receiver_name, mailbox)
+
+    def acknowledge(
+        self, receiver_name: str, sequence: Union[int, Mapping[int, int]]
+    ) -> int:
+        """Remove the messages a reader has confirmed it received.
+
+        :param receiver_name: The name of the user whose mailbox to drain.
+        :param sequence: The sequence number of the last message received,
+            or of the last received from each lane, by priority.
+        :return: The number of messages removed.
+        """
+        mailbox = self.mailboxes.get(receiver_name)
+        if mailbox is None:
+            return 0
+
+        if mailbox.spill_path is not None:
+            self._reload(receiver_name, mailbox)
+
+        counts = [
+            (
+                lane.priority,
+                sum(
+                    lane.is_held(index)
+                    for index in range(
+                        lane.after(_lane_sequence(sequence, lane.priority))
+                    )
+                ),
+            )
+            for lane in mailbox.lanes
+        ]
+        for priority, count in counts:
+            if count:
+                self.drain(receiver_name, count, priority)
+        return sum(count for _, count in counts)
+
+    def search(
+        self,
+        receiver_name: str,
+        words: set[str],
+        count: int,
+        after_sequence: int = 0,
+    ) -> list[StoredMessage]:
+        """Find the oldest messages in a mailbox containing every one of some words.
+
+        Mailboxes covered by the search index only visit the messages which
+        match, and any others are read through from the front.
+
+        :param receiver_name: The name of the user whose mailbox to look in.
+        :param words: The words to look for, in lower case.
+        :param count: The maximum number of messages to return.
+        :param after_sequence: Skip messages numbered up to and including this.
+        :return: Up to ``count`` of the oldest matching messages in the mailbox,
+            whatever their priority.
+        """
+        mailbox = self.mailboxes.get(receiver_name)
+        if mailbox is None:
+            return []
+
+        self.mailboxes.move_to_end(receiver_name)
+        if mailbox.spill_path is not None:
+            self._reload(receiver_name, mailbox)
+            self._make_room_in_memory(receiver_name, 0, include_receiver=False)
+
+        positions: Iterable[Optional[tuple[MessageColumns, int]]]
+        if self.search_index is not None and self.search_index.covers(receiver_name):
+            sequences = self.search_index.search(receiver_name, words)
+            first = bisect.bisect_right(sequences, after_sequence)
+            positions = (mailbox.find(sequence) for sequence in sequences[first:])
+        else:
+            positions = mailbox.after(after_sequence)
+
+        now = self.clock()
+        messages: list[StoredMessage] = []
+        expired = []
+        for position in positions:
+            if len(messages) == count:
+                break
+            if position is None:
+                continue
+            lane, index = position
+            if not lane.is_held(index):
+                continue
+            if lane.has_expired(index, now):
+                expired.append(lane.sequence(index))
+                continue
+            stored_message = lane[index]
+            if words <= words_in(stored_message.message):
+                messages.append(stored_message)
+
+        self._expire_all(receiver_name, mailbox, expired)
+        return messages
+
+    def search_candidates(
+        self, receiver_name: str, after_sequence: int = 0, limit: Optional[int] = None
+    ) -> Optional[tuple[list[int], list[bytearray], Optional[int]]]:
+        """Get the messages a search of a mailbox would have to read through.
+
+        Searches of mailboxes covered by the search index only visit the
+        messages which match, so they have no candidates to read through.
+
+        :param receiver_name: The name of the user whose mailbox to look in.
+        :param after_sequence: Skip messages numbered up to and including this.
+        :param limit: The most messages to read from each lane, or ``None``
+            to read them all.
+        :return: The sequence numbers and bodies of the mailbox's messages,
+            oldest first, and the sequence number to carry on reading
+            after, or ``None`` once every message has been read. ``None``
+            is returned instead if the search index covers the mailbox.
+        """
+        if self.search_index is not None and self.search_index.covers(receiver_name):
+            return None
+
+        mailbox = self.mailboxes.get(receiver_name)
+        if mailbox is None:
+            return [], [], None
+
+        self.mailboxes.move_to_end(receiver_name)
+        if mailbox.spill_path is not None:
+            self._reload(receiver_name, mailbox)
+            self._make_room_in_memory(receiver_name, 0, include_receiver=False)
+
+        now = self.clock()
+        lanes = []
+        # Every lane has been read up to here, if any was left part read
+        read_until: Optional[int] = None
+        for lane in mailbox.lanes:
+            start = lane.after(after_sequence)
+            lanes.append(lane.bodies(start, now, limit))
+            if limit is not None and len(lane) - start > limit:
+                last_read = lane.sequence(start + limit - 1)
+                read_until = (
+                    last_read if read_until is None else min(last_read, read_until)
+                )
+        if len(lanes) == 1:
+            return (*lanes[0], read_until)
+
+        # Sequence numbers are unique, so the pairs are ordered by them alone
+        messages = list(
+            itertools.takewhile(
+                lambda message: read_until is None or message[0] <= read_until,
+                heapq.merge(*(zip(*lane) for lane in lanes)),
+            )
+        )
+        return (
+            [sequence for sequence, _ in messages],
+            [body for _, body in messages],
+            read_until,
+        )
+
+    def find_messages(
+        self, receiver_name: str, sequences: Iterable[int]
+    ) -> list[StoredMessage]:
+        """Look up messages in a mailbox by their sequence numbers.
+
+        :param receiver_name: The name of the user whose mailbox to look in.
+        :param sequences: The sequence numbers of the messages.
+        :return: The messages which are still in the mailbox, in the order
+            asked for.
+        """
+        mailbox = self.mailboxes.get(receiver_name)
+        if mailbox is None:
+            return []
+
+        if mailbox.spill_path is not None:
+            self._reload(receiver_name, mailbox)
+            self._make_room_in_memory(receiver_name, 0, include_receiver=False)
+
+        now = self.clock()
+        messages = []
+        for sequence in sequences:
+            position = mailbox.find(sequence)
+            if position is None:
+                continue
+            lane, index = position
+            if lane.is_held(index) and not lane.has_expired(index, now):
+                messages.append(lane[index])
+        return messages
+
+    def holds(self, receiver_name: str, sequence: int) -> bool:
+        """Check whether a message is still waiting in a mailbox.
+
+        Spilled mailboxes are not loaded back to check, so any message
+        which may have been spilled is taken to still be waiting.
+
+        :param receiver_name: The name of the user whose mailbox to look in.
+        :param sequence: The sequence number of the message.
+        :return: ``False`` if the message has been delivered or removed.
+        """
+        mailbox = self.mailboxes.get(receiver_name)
+        if mailbox is None:
+            return False
+        if mailbox.spill_path is not None:
+            return True
+
+        position = mailbox.find(sequence)
+        if position is None:
+            return False
+        lane, index = position
+        return lane.is_held(index)
+
+    def snapshot(self) -> Iterator[tuple[str, StoredMessage]]:
+        """Visit every deliverable message, without loading spilled mailboxes.
+
+        :return: An iterator of each message and the name of its receiver,
+            with each lane's messages visited oldest first.
+        """
+        for receiver_name, mailbox in list(self.mailboxes.items()):
+            # The store may change whenever the caller pauses between mailboxes
+            if self.mailboxes.get(receiver_name) is not mailbox:
+                continue
+            held_messages = [
+                lane[index]
+                for lane in mailbox.lanes
+                for index in range(len(lane))
+                if lane.is_held(index)
+            ]
+            if mailbox.spill_path is not None:
+                with open(mailbox.spill_path, "rb") as spill_file:
+                    # Anything spilled later is already among the held messages
+                    length = os.fstat(spill_file.fileno()).st_size
+                    for stored_message in self._stream_spill_file(spill_file, length):
+                        yield receiver_name, stored_message
+            for stored_message in held_messages:
+                yield receiver_name, stored_message
+
+    def clear(self) -> None:
+        """Remove every message, including those spilled to disk."""
+        for mailbox in self.mailboxes.values():
+            if mailbox.spill_path is not None:
+                os.remove(mailbox.spill_path)
+
+        self.mailboxes.clear()
+        self.memory.add(-self.arena.fragmented_bytes)
+        self.arena = MessageArena(self._arena_fragmented_changed)
+        self.users = UserDirectory()
+        if self.search_index is not None:
+            self.search_index.clear()
+        self.memory_bytes = 0
+        self.message_count = 0
+        self.spilled_bytes = 0
+
+    def expire(self) -> int:
+        """Remove every message whose time to live has passed.
+
+        Only the messages due to expire are visited, never whole mailboxes.
+
+        :return: The number of messages which expired.
+        """
+        expired_before = self.expired_messages
+        for receiver_name, sequence in self.expiry_wheel.advance(self.clock()):
+            # Messages which have since left the store are no longer found
+            mailbox = self.mailboxes.get(receiver_name)
+            if mailbox is not None:
+                self._expire_all(receiver_name, mailbox, [sequence])
+
+        return self.expired_messages - expired_before
+
+    def mailbox_size(self, receiver_name: str) -> int:
+        """Get the number of messages waiting in a mailbox.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :return: The number of messages in the mailbox.
+        """
+        mailbox = self.mailboxes.get(receiver_name)
+        return 0 if mailbox is None else len(mailbox)
+
+    def mailbox_status(self, receiver_name: str) -> MailboxStatus:
+        """Summarise a mailbox from its running totals, without visiting its messages.
+
+        Messages spilled to disk are counted until the mailbox is next
+        loaded, even if they expire in the meantime.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :return: The number of messages in the mailbox, the bytes they take
+            up, and how long the oldest has been waiting.
+        """
+        mailbox = self.mailboxes.get(receiver_name)
+        if mailbox is None or len(mailbox) == 0:
+            return MailboxStatus(0, 0, 0.0)
+
+        if mailbox.spilled_count:
+            oldest_stored_at = mailbox.spilled_stored_at
+        else:
+            oldest_stored_at = min(lane.stored_at(0) for lane in mailbox.lanes)
+        return MailboxStatus(
+            len(mailbox),
+            mailbox.total_bytes,
+            max(0.0, self.clock() - oldest_stored_at),
+        )
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Get the store's memory and quota statistics.
+
+        :return: A dictionary mapping each statistic's name to its value.
+        """
+        stats = {
+            "mailboxes": len(self.mailboxes),
+            "messages": self.message_count,
+            "memory_bytes": self.memory_bytes,
+            "spilled_bytes": self.spilled_bytes,
+            "rejected_messages": self.rejected_messages,
+            "evicted_messages": self.evicted_messages,
+            "expired_messages": self.expired_messages,
+            "pending_expiries": len(self.expiry_wheel),
+            "users": len(self.users),
+            "arena_bytes": self.arena.block_bytes,
+            "fragmented_arena_bytes": self.arena.fragmented_bytes,
+            "reclaimed_arenas": self.arena.reclaimed_blocks,
+            "layout_saved_bytes": self.layout_saved_bytes,
+        }
+        if self.search_index is not None:
+            for name, value in self.search_index.stats.items():
+                stats[f"search_{name}"] = value
+        return stats
+
+    @property
+    def layout_saved_bytes(self) -> int:
+        """Estimate the memory saved by holding messages in columns and arenas.
+
+        This compares the columns, and the space in the arenas not taken up
+        by bodies, with the objects each message would otherwise be held as.
+
+        :return: The estimated number of bytes saved.
+        """
+        in_memory = self.message_count - sum(
+            mailbox.spilled_count for mailbox in self.mailboxes.values()
+        )
+        saved_per_message = OBJECT_LAYOUT_OVERHEAD - MessageColumns.BYTES_PER_MESSAGE
+        return in_memory * saved_per_message - self.arena.unused_bytes
+
+    def _store(
+        self, receiver_name: str, mailbox: Mailbox, stored_message: StoredMessage
+    ) -> None:
+        """Append a message to a mailbox, making room for it first.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param mailbox: The mailbox to append the message to.
+        :param stored_message: The message to append.
+        :raises QuotaExceededError: If the message cannot be stored.
+        """
+        try:
+            self._make_room_in_mailbox(receiver_name, mailbox, stored_message.size)
+            self._make_room_in_memory(receiver_name, stored_message.size)
+        except QuotaExceededError:
+            self.rejected_messages += 1
+            raise
+
+        self.next_sequence = max(self.next_sequence, stored_message.sequence + 1)
+        mailbox.lane(stored_message.priority).append(stored_message)
+        mailbox.total_bytes += stored_message.size
+        self.memory_bytes += stored_message.size
+        self.message_count += 1
+        if stored_message.expires_at:
+            self.expiry_wheel.schedule(
+                stored_message.expires_at, (receiver_name, stored_message.sequence)
+            )
+        if self.search_index is not None:
+            self.search_index.add(
+                receiver_name, stored_message.sequence, stored_message.message
+            )
+        if self.observer is not None:
+            self.observer.message_added(receiver_name, stored_message)
+
+    def _make_room_in_mailbox(
+        self, receiver_name: str, mailbox: Mailbox, size: int
+    ) -> None:
+        """Ensure a mailbox has room for a new message.
+
+        Spilling does not free up room in a mailbox, so the spill policy
+        rejects messages to a full mailbox.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param mailbox: The mailbox to make room in.
+        :param size: The size of the new message, in bytes.
+        :raises QuotaExceededError: If the mailbox is full.
+        """
+
+        def is_full() -> bool:
+            return bool(
+                self.mailbox_message_limit
+                and len(mailbox) + 1 > self.mailbox_message_limit
+                or self.mailbox_byte_limit
+                and mailbox.total_bytes + size > self.mailbox_byte_limit
+            )
+
+        if not is_full():
+            return
+
+        if self.policy != QuotaPolicy.EVICT or size > self.mailbox_byte_limit > 0:
+            logger.warning("Mailbox of %s is full", receiver_name)
+            raise QuotaExceededError(ResultCode.MAILBOX_FULL)
+
+        if mailbox.spill_path is not None:
+            self._reload(receiver_name, mailbox)
+
+        self._evict(receiver_name, mailbox, is_full)
+
+    def _make_room_in_memory(
+        self, receiver_name: str, size: int, include_receiver: bool = True
+    ) -> None:
+        """Ensure there is room in memory for a new message.
+
+        The least recently used mailboxes are spilled or evicted first.
+        The receiver's mailbox is never discarded, and is only spilled
+        or evicted as a last resort.
+
+        :param receiver_name: The name of the user receiving the message.
+        :param size: The size of the new message, in bytes.
+        :param include_receiver: Whether the receiver's own messages may
+            be spilled or evicted to make room.
+        :raises QuotaExceededError: If there is not enough memory available.
+        """
+        if not self.memory_limit or self.memory.bytes + size <= self.memory_limit:
+            return
+
+        if self.policy == QuotaPolicy.REJECT or size > self.memory_limit:
+            logger.warning("Mailbox store memory limit reached")
+            raise QuotaExceededError(ResultCode.STORE_FULL)
+
+        emptied_mailboxes = []
+        for name, mailbox in self.mailboxes.items():
+            if self.memory.bytes + size <= self.memory_limit:
+                break
+            if name == receiver_name:
+                continue
+
+            self._free_memory(name, mailbox, size)
+            if len(mailbox) == 0:
+                emptied_mailboxes.append(name)
+
+        for name in emptied_mailboxes:
+            del self.mailboxes[name]
+            if self.search_index is not None:
+                self.search_index.forget_mailbox(name)
+
+        if include_receiver and self.memory.bytes + size > self.memory_limit:
+            self._free_memory(receiver_name, self.mailboxes[receiver_name], size)
+
+        if include_receiver and self.memory.bytes + size > self.memory_limit:
+            # Only reachable when the rest is held by stores sharing the limit
+            logger.warning("Mailbox store memory limit reached")
+            raise QuotaExceededError(ResultCode.STORE_FULL)
+
+    def _free_memory(self, receiver_name: str, mailbox: Mailbox, size: int) -> None:
+        """Spill or evict a mailbox's messages according to the quota policy.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param mailbox: The mailbox to free memory from.
+        :param size: The size of the new message that needs room, in bytes.
+        """
+        if self.policy == QuotaPolicy.SPILL:
+            self._spill(receiver_name, mailbox)
+            return
+
+        self._evict(
+            receiver_name,
+            mailbox,
+            lambda: self.memory.bytes + size > self.memory_limit,
+        )
+
+    def _evict(
+        self, receiver_name: str, mailbox: Mailbox, is_over: Callable[[], bool]
+    ) -> None:
+        """Evict the oldest messages of the lowest priority lanes first.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param mailbox: The mailbox to evict messages from.
+        :param is_over: Whether a limit is still exceeded.
+        """
+        while mailbox.lanes and is_over():
+            lane = mailbox.lanes[-1]
+            evicted = 0
+            last_sequence = 0
+            while lane and is_over():
+                last_sequence = lane.sequence(0)
+                if self._pop_oldest(receiver_name, mailbox, lane):
+                    evicted += 1
+            self.evicted_messages += evicted
+            if evicted and self.observer is not None:
+                self.observer.messages_removed(
+                    receiver_name, last_sequence, lane.priority
+                )
+        self._pop_expired(mailbox)
+
+    def _pop_oldest(
+        self, receiver_name: str, mailbox: Mailbox, lane: MessageColumns
+    ) -> bool:
+        """Remove the oldest in memory message from a lane of a mailbox.
+
+        A lane left empty is no longer held by the mailbox.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param mailbox: The mailbox to remove the message from.
+        :param lane: The lane to remove the message from.
+        :return: ``True`` if a deliverable message was removed,
+            or ``False`` if it had already expired.
+        """
+        held = lane.is_held(0)
+        size = lane.size(0) if held else 0
+        sequence = lane.sequence(0)
+        lane.popleft()
+        if not lane:
+            mailbox.lanes.remove(lane)
+        if not held:
+            # Expired messages have already been accounted for
+            mailbox.expired_count -= 1
+            return False
+
+        mailbox.total_bytes -= size
+        self.memory_bytes -= size
+        self.message_count -= 1
+        if self.search_index is not None:
+            self.search_index.remove(receiver_name, sequence)
+        return True
+
+    def _pop_expired(self, mailbox: Mailbox) -> None:
+        """Remove the expired messages from the front of each lane of a mailbox.
+
+        :param mailbox: The mailbox to remove the messages from.
+        """
+        for lane in mailbox.lanes:
+            while lane and not lane.is_held(0):
+                lane.popleft()
+                mailbox.expired_count -= 1
+        mailbox.discard_empty_lanes()
+
+    def _expire_all(
+        self, receiver_name: str, mailbox: Mailbox, sequences: list[int]
+    ) -> None:
+        """Remove some expired messages from their mailbox.
+
+        Each message is released immediately, but is only taken out of the
+        mailbox once every message in front of it has gone.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param mailbox: The mailbox holding the messages.
+        :param sequences: The sequence numbers of the messages which have
+            expired, ignoring any no longer held in memory.
+        """
+        for sequence in sequences:
+            position = mailbox.find(sequence)
+            if position is None or not position[0].is_held(position[1]):
+                continue
+
+            lane, index = position
+            size = lane.size(index)
+            lane.release(index)
+            mailbox.expired_count += 1
+            mailbox.total_bytes -= size
+            self.memory_bytes -= size
+            self.message_count -= 1
+            self.expired_messages += 1
+            if self.search_index is not None:
+                self.search_index.remove(receiver_name, sequence)
+
+        self._pop_expired(mailbox)
+        self._discard_if_empty(receiver_name, mailbox)
+
+    def _discard_if_empty(self, receiver_name: str, mailbox: Mailbox) -> None:
+        """Forget about a mailbox if it holds no messages.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param mailbox: The mailbox to check.
+        """
+        if len(mailbox) == 0:
+            self.mailboxes.pop(receiver_name, None)
+            if self.search_index is not None:
+                self.search_index.forget_mailbox(receiver_name)
+
+    def _spill(self, receiver_name: str, mailbox: Mailbox) -> None:
+        """Move a mailbox's in memory messages to disk.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param mailbox: The mailbox to spill.
+        """
+        if not mailbox.lanes:
+            return
+
+        # A file left by an earlier run is overwritten, not added to
+        mode = "ab"
+        if mailbox.spill_path is None:
+            digest = hashlib.sha256(receiver_name.encode()).hexdigest()
+            mailbox.spill_path = os.path.join(self.spill_directory, f"{digest}.mailbox")
+            mode = "wb"
+
+        held_messages = [
+            lane[index]
+            for lane in mailbox.lanes
+            for index in range(len(lane))
+            if lane.is_held(index)
+        ]
+        os.makedirs(self.spill_directory, exist_ok=True)
+        with open(mailbox.spill_path, mode) as spill_file:
+            spill_file.write(
+                b"".join(stored_message.to_bytes() for stored_message in held_messages)
+            )
+
+        spilled_bytes = sum(stored_message.size for stored_message in held_messages)
+        if held_messages and not mailbox.spilled_count:
+            mailbox.spilled_stored_at = min(
+                stored_message.stored_at for stored_message in held_messages
+            )
+        mailbox.spilled_count += len(held_messages)
+        mailbox.spilled_bytes += spilled_bytes
+        self.memory_bytes -= spilled_bytes
+        self.spilled_bytes += spilled_bytes
+
+        # Pending expiries are no longer found, and are scheduled again on reload
+        for lane in mailbox.lanes:
+            lane.clear()
+        mailbox.lanes = []
+        mailbox.expired_count = 0
+        logger.info("Spilled %s bytes to %s", spilled_bytes, mailbox.spill_path)
+
+    def _reload(self, receiver_name: str, mailbox: Mailbox) -> None:
+        """Load a spilled mailbox's messages back into memory.
+
+        Messages which expired while on disk are dropped.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param mailbox: The spilled mailbox to load.
+        """
+        assert mailbox.spill_path is not None
+        spilled_messages = self._read_spill_file(mailbox.spill_path)
+        os.remove(mailbox.spill_path)
+
+        now = self.clock()
+        reloaded: dict[int, list[StoredMessage]] = {}
+        for stored_message in spilled_messages:
+            if stored_message.has_expired(now):
+                mailbox.spilled_bytes -= stored_message.size
+                mailbox.total_bytes -= stored_message.size
+                self.spilled_bytes -= stored_message.size
+                self.message_count -= 1
+                self.expired_messages += 1
+                if self.search_index is not None:
+                    self.search_index.remove(receiver_name, stored_message.sequence)
+                continue
+
+            reloaded.setdefault(stored_message.priority, []).append(stored_message)
+            if stored_message.expires_at:
+                self.expiry_wheel.schedule(
+                    stored_message.expires_at, (receiver_name, stored_message.sequence)
+                )
+
+        for priority, stored_messages in reloaded.items():
+            mailbox.lane(priority).prepend(stored_messages)
+        self.memory_bytes += mailbox.spilled_bytes
+        self.spilled_bytes -= mailbox.spilled_bytes
+        logger.info(
+            "Reloaded %s bytes from %s", mailbox.spilled_bytes, mailbox.spill_path
+        )
+
+        mailbox.spill_path = None
+        mailbox.spilled_count = 0
+        mailbox.spilled_bytes = 0
+
+    @staticmethod
+    def _stream_spill_file(
+        spill_file: BinaryIO, length: int
+    ) -> Iterator[StoredMessage]:
+        """Read the messages written to a spill file, a chunk at a time.
+
+        :param spill_file: The spill file, open at its start.
+        :param length: The number of bytes of the file to read.
+        :return: An iterator of the spilled messages, oldest first.
+        :raises ValueError: If the file ends part way through a message.
+        """
+        buffer = bytearray()
+        while length:
+            data = spill_file.read(min(length, MailboxStore.SPILL_READ_SIZE))
+            if not data:
+                break
+            length -= len(data)
+            buffer += data
+
+            offset = 0
+            while offset < len(buffer):
+                try:
+                    stored_message, end = StoredMessage.unpack_from(buffer, offset)
+                except ValueError:
+                    # The rest of the message is in the next chunk
+                    break
+                offset = end
+                yield stored_message
+            del buffer[:offset]
+
+        if buffer or length:
+            raise ValueError("Spill file ends part way through a stored message")
+
+    @staticmethod
+    def _read_spill_file(path: str) -> list[StoredMessage]:
+        """Read the messages written to a spill file.
+
+        :param path: The path of the spill file.
+        :return: The spilled messages, oldest first.
+        """
+        with open(path, "rb") as spill_file:
+            buffer = spill_file.read()
+
+        stored_messages = []
+        offset = 0
+        while offset < len(buffer):
+            stored_message, offset = StoredMessage.unpack_from(buffer, offset)
+            stored_messages.append(stored_message)
+
+        return stored_messages
+
+
+def _lane_sequence(sequence: Union[int, Mapping[int, int]], priority: int) -> int:
+    """Find the sequence number which applies to a lane.
+
+    :param sequence: A sequence number for every lane, or one for each
+        lane by priority.
+    :param priority: The priority of the lane.
+    :return: The lane's sequence number, zero if none is given for it.
+    """
+    if isinstance(sequence, int):
+        return sequence
+    return sequence.get(priority, 0)
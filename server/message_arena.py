@@ -0,0 +1,462 @@
+"""Compact storage for the messages waiting in a store's mailboxes.
+
+Holding every message as its own Python objects costs a few hundred bytes
+of headers and pointers per message, before its body is counted. Instead,
+message bodies are appended to large shared byte arrays, and each mailbox
+records its messages in columns of machine sized numbers: the sender's
+number in the store's ``UserDirectory``, where the body is, and when it
+expires. A message only becomes a ``StoredMessage`` object while it is
+being read.
+"""
+
+from array import array
+from itertools import compress
+from typing import Any, Callable, Iterable, Iterator, Optional
+import bisect
+import sys
+
+from src.packets.message import Message
+from .stored_message import StoredMessage
+from .user_directory import UserDirectory
+
+
+class MessageArena:
+    """Holds the bodies of every message in a store.
+
+    Bodies are appended to the current block until it is full, when a new
+    block is started. Each block counts the bytes of the bodies still held
+    in it, and is freed once they have all gone. Until then, the space left
+    in a full block by bodies which have gone is still taken up, and is
+    reported as it grows and shrinks so that it can be counted against a
+    memory limit. The current block is left out, as it is reused from the
+    start once empty, and is never larger than ``BLOCK_SIZE``.
+    """
+
+    # The size of each block of message bodies
+    BLOCK_SIZE = 1 << 20
+
+    def __init__(self, fragmented_changed: Optional[Callable[[int], None]] = None):
+        """Create an empty arena.
+
+        :param fragmented_changed: A function told the number of bytes the
+            space left in full blocks grows by, negative if it shrinks.
+        """
+        self.blocks: list[Optional[bytearray]] = []
+        # The bytes of the bodies still held in each block
+        self.live_bytes: list[int] = []
+        self.free_blocks: list[int] = []
+        self.current_block = self._new_block()
+        self.body_bytes = 0
+        self.block_bytes = 0
+        self.fragmented_bytes = 0
+        self.reclaimed_blocks = 0
+        self.fragmented_changed = fragmented_changed
+
+    def _new_block(self) -> int:
+        """Start a new block, reusing the number of a freed one if possible.
+
+        :return: The number of the new block.
+        """
+        if self.free_blocks:
+            number = self.free_blocks.pop()
+            self.blocks[number] = bytearray()
+            return number
+
+        self.blocks.append(bytearray())
+        self.live_bytes.append(0)
+        return len(self.blocks) - 1
+
+    def store_body(self, body: bytes) -> int:
+        """Copy a message body into the arena.
+
+        :param body: The message body.
+        :return: The location of the body, which ``body`` reads it back from.
+        """
+        block = self.blocks[self.current_block]
+        assert block is not None
+        if block and len(block) + len(body) > MessageArena.BLOCK_SIZE:
+            full_block = self.current_block
+            self.current_block = self._new_block()
+            self._count_fragmented(len(block) - self.live_bytes[full_block])
+            block = self.blocks[self.current_block]
+            assert block is not None
+
+        offset = len(block)
+        block += body
+        self.live_bytes[self.current_block] += len(body)
+        self.body_bytes += len(body)
+        self.block_bytes += len(body)
+        return self.current_block << 32 | offset
+
+    def body(self, location: int, length: int) -> bytes:
+        """Read a message body back out of the arena.
+
+        :param location: The location returned by ``store_body``.
+        :param length: The length of the body.
+        :return: A copy of the body.
+        """
+        if not length:
+            return b""
+        block = self.blocks[location >> 32]
+        assert block is not None
+        offset = location & 0xFFFFFFFF
+        return bytes(block[offset : offset + length])
+
+    def bodies(
+        self, locations: Iterable[int], lengths: Iterable[int]
+    ) -> list[bytearray]:
+        """Read many message bodies back out of the arena at once.
+
+        :param locations: The locations returned by ``store_body``.
+        :param lengths: The length of each body.
+        :return: A copy of each body.
+        """
+        blocks = self.blocks
+        return [
+            blocks[location >> 32][offset : offset + length]  # type: ignore[index]
+            for location, length in zip(locations, lengths)
+            for offset in (location & 0xFFFFFFFF,)
+        ]
+
+    def free_body(self, location: int, length: int) -> None:
+        """Stop holding a message body, freeing its block once it is empty.
+
+        :param location: The location returned by ``store_body``.
+        :param length: The length of the body.
+        """
+        number = location >> 32
+        self.live_bytes[number] -= length
+        self.body_bytes -= length
+        if not length:
+            return
+        if number != self.current_block:
+            self._count_fragmented(length)
+        if self.live_bytes[number]:
+            return
+
+        block = self.blocks[number]
+        assert block is not None
+        self.block_bytes -= len(block)
+        if number == self.current_block:
+            # Keep filling the current block from the start
+            self.blocks[number] = bytearray()
+        else:
+            self._count_fragmented(-len(block))
+            self.blocks[number] = None
+            self.free_blocks.append(number)
+            self.reclaimed_blocks += 1
+
+    def _count_fragmented(self, change: int) -> None:
+        """Account for space in full blocks being left or given back.
+
+        :param change: The number of bytes left, or negative if given back.
+        """
+        self.fragmented_bytes += change
+        if change and self.fragmented_changed is not None:
+            self.fragmented_changed(change)
+
+    @property
+    def unused_bytes(self) -> int:
+        """Get the number of bytes in blocks not taken up by bodies.
+
+        :return: The size of every block, less the bodies still held in them.
+        """
+        return self.block_bytes - self.body_bytes
+
+
+class MessageColumns:
+    """The messages in one lane of a mailbox, oldest first, as columns of numbers.
+
+    Messages are removed from the front by moving past them, and the space
+    they took up in each column is given back once it is a large enough
+    share of the column.
+    """
+
+    __slots__ = (
+        "arena",
+        "users",
+        "senders",
+        "locations",
+        "lengths",
+        "expiry_times",
+        "storage_times",
+        "sequences",
+        "held",
+        "head",
+        "priority",
+    )
+
+    # Bytes taken up in the columns by each message
+    BYTES_PER_MESSAGE = 4 + 8 + 4 + 8 + 8 + 8 + 1
+    # The fewest removed messages worth giving back the space of
+    COMPACT_THRESHOLD = 1024
+
+    def __init__(
+        self, arena: MessageArena, users: UserDirectory, priority: int = 0
+    ) -> None:
+        """Create an empty set of columns.
+
+        :param arena: The arena holding the message bodies.
+        :param users: The directory numbering the messages' senders.
+        :param priority: The priority every message in the columns was sent with.
+        """
+        self.arena = arena
+        self.users = users
+        self.senders = array("I")
+        self.locations = array("Q")
+        self.lengths = array("I")
+        self.expiry_times = array("d")
+        self.storage_times = array("d")
+        self.sequences = array("Q")
+        self.held = bytearray()
+        # The position of the oldest message still in the columns
+        self.head = 0
+        self.priority = priority
+
+    def __len__(self) -> int:
+        """Get the number of messages, including those no longer held.
+
+        :return: The number of messages.
+        """
+        return len(self.sequences) - self.head
+
+    def __getitem__(self, index: int) -> StoredMessage:
+        """Read a message out of the columns.
+
+        :param index: The position of the message, counting from the oldest.
+        :return: The message, whose body is empty if it is no longer held.
+        """
+        position = self.head + index
+        sender = self.senders[position]
+        stored_message = StoredMessage(
+            self.users.names[sender],
+            self.arena.body(self.locations[position], self.lengths[position])
+            if self.held[position]
+            else b"",
+            self.expiry_times[position],
+            self.sequences[position],
+            self.storage_times[position],
+            self.users.encoded_names[sender],
+            self.priority,
+        )
+        stored_message.held = bool(self.held[position])
+        return stored_message
+
+    def __iter__(self) -> Iterator[StoredMessage]:
+        """Read every message out of the columns, oldest first.
+
+        :return: An iterator of the messages.
+        """
+        return (self[index] for index in range(len(self)))
+
+    def append(self, stored_message: StoredMessage) -> None:
+        """Add a message after every other.
+
+        :param stored_message: The message to add.
+        """
+        self.senders.append(self.users.add(stored_message.sender_name))
+        self.locations.append(self.arena.store_body(stored_message.message))
+        self.lengths.append(len(stored_message.message))
+        self.expiry_times.append(stored_message.expires_at)
+        self.storage_times.append(stored_message.stored_at)
+        self.sequences.append(stored_message.sequence)
+        self.held.append(1)
+
+    def prepend(self, stored_messages: list[StoredMessage]) -> None:
+        """Add some messages in front of every other.
+
+        The messages take the place of removed messages not yet given back,
+        so only the columns, and never the bodies, of the messages already
+        here are moved, and only if there is not enough room.
+
+        :param stored_messages: The messages to add, oldest first.
+        """
+        added = MessageColumns(self.arena, self.users, self.priority)
+        for stored_message in stored_messages:
+            added.append(stored_message)
+
+        start = max(0, self.head - len(stored_messages))
+        for column, added_column in zip(self._columns(), added._columns()):
+            column[start : self.head] = added_column
+        self.held[start : self.head] = added.held
+        self.head = start
+
+        for index, stored_message in enumerate(stored_messages):
+            if not stored_message.held:
+                self.release(index)
+
+    def bodies(
+        self, index: int, now: float, count: Optional[int] = None
+    ) -> tuple[list[int], list[bytearray]]:
+        """Read the bodies of the deliverable messages from a position on.
+
+        Much quicker than reading each message in turn, as the columns are
+        read straight through.
+
+        :param index: The position of the first message, counting from the oldest.
+        :param now: The current time, in seconds.
+        :param count: The number of positions to read, or ``None`` to read
+            to the newest message.
+        :return: The sequence number and body of each message which is
+            held and has not expired, oldest first.
+        """
+        start = self.head + index
+        stop = None if count is None else start + count
+        deliverable = [
+            held and not 0 < expires_at <= now
+            for held, expires_at in zip(
+                self.held[start:stop], self.expiry_times[start:stop]
+            )
+        ]
+        sequences = list(compress(self.sequences[start:stop], deliverable))
+        return sequences, self.arena.bodies(
+            compress(self.locations[start:stop], deliverable),
+            compress(self.lengths[start:stop], deliverable),
+        )
+
+    def is_held(self, index: int) -> bool:
+        """Check whether a message is still deliverable.
+
+        :param index: The position of the message, counting from the oldest.
+        :return: ``True`` if the message is held, otherwise ``False``.
+        """
+        return bool(self.held[self.head + index])
+
+    def sequence(self, index: int) -> int:
+        """Get a message's sequence number.
+
+        :param index: The position of the message, counting from the oldest.
+        :return: The sequence number.
+        """
+        return self.sequences[self.head + index]
+
+    def stored_at(self, index: int) -> float:
+        """Get the time a message was first stored.
+
+        :param index: The position of the message, counting from the oldest.
+        :return: The time, in seconds.
+        """
+        return self.storage_times[self.head + index]
+
+    def has_expired(self, index: int, now: float) -> bool:
+        """Check whether a message's time to live has passed.
+
+        :param index: The position of the message, counting from the oldest.
+        :param now: The current time, in seconds.
+        :return: ``True`` if the message has expired, otherwise ``False``.
+        """
+        return 0 < self.expiry_times[self.head + index] <= now
+
+    def size(self, index: int) -> int:
+        """Get the number of bytes a held message is accounted as.
+
+        :param index: The position of the message, counting from the oldest.
+        :return: The size of the message encoded as a ``Message`` packet.
+        """
+        position = self.head + index
+        return (
+            Message.header_size()
+            + len(self.users.encoded_names[self.senders[position]])
+            + self.lengths[position]
+        )
+
+    def find(self, sequence: int) -> Optional[int]:
+        """Find a message by its sequence number.
+
+        :param sequence: The sequence number of the message.
+        :return: The position of the message, or ``None`` if it is not here.
+        """
+        index = self.after(sequence - 1)
+        if index < len(self) and self.sequence(index) == sequence:
+            return index
+        return None
+
+    def after(self, sequence: int) -> int:
+        """Find the first message numbered after a sequence number.
+
+        Messages are numbered in the order they are stored, so the columns
+        are always sorted by sequence number.
+
+        :param sequence: The sequence number to look after.
+        :return: The position of the first later message, or the number of
+            messages if there is none.
+        """
+        return bisect.bisect_right(self.sequences, sequence, self.head) - self.head
+
+    def release(self, index: int) -> None:
+        """Stop holding a message, freeing its body and forgetting its sender.
+
+        :param index: The position of the message, counting from the oldest.
+        """
+        position = self.head + index
+        if self.held[position]:
+            self.held[position] = 0
+            self._free(index)
+
+    def _free(self, index: int) -> None:
+        """Give a message's body back to the arena, and forget its sender.
+
+        :param index: The position of the message, counting from the oldest.
+        """
+        position = self.head + index
+        self.arena.free_body(self.locations[position], self.lengths[position])
+        self.users.remove(self.senders[position])
+
+    def popleft(self) -> None:
+        """Remove the oldest message, releasing it first if still held."""
+        self.release(0)
+        self.head += 1
+        if self.head >= MessageColumns.COMPACT_THRESHOLD and self.head * 2 >= len(
+            self.sequences
+        ):
+            for column in self._columns():
+                del column[: self.head]
+            del self.held[: self.head]
+            self.head = 0
+
+    def clear(self) -> None:
+        """Remove every message, releasing those still held."""
+        for index in range(len(self)):
+            self.release(index)
+        for column in self._columns():
+            del column[:]
+        self.held.clear()
+        self.head = 0
+
+    def _columns(self) -> tuple["array[Any]", ...]:
+        """Get every column of numbers, in the same order for all columns.
+
+        :return: The columns.
+        """
+        return (
+            self.senders,
+            self.locations,
+            self.lengths,
+            self.expiry_times,
+            self.storage_times,
+            self.sequences,
+        )
+
+
+def _object_layout_overhead() -> int:
+    """Estimate the bytes each message would cost held as Python objects.
+
+    This counts a ``StoredMessage``, its body, sender name, times, sequence
+    number and size, and its place in a ``deque``, apart from the bytes of
+    the body and name themselves.
+
+    :return: The number of bytes.
+    """
+    stored_message = StoredMessage("", b"", 1.5, 1 << 40, 1.5)
+    return (
+        sys.getsizeof(stored_message)
+        + sys.getsizeof(stored_message.message)
+        + sys.getsizeof(stored_message.sender_name)
+        + sys.getsizeof(stored_message.expires_at) * 2
+        + sys.getsizeof(stored_message.sequence) * 2
+        + 8
+    )
+
+
+# Bytes saved by each message held in columns instead of as objects
+OBJECT_LAYOUT_OVERHEAD = _object_layout_overhead()
@@ -0,0 +1,296 @@
+"""Caching the first page of each mailbox, for reads which leave it in place.
+
+A peek is answered with the same page of messages each time until the
+mailbox changes, so the encoded page is kept and sent again. Messages
+stored or delivered by the server update the cached page in place, and
+any other change, such as a message expiring or being evicted, is noticed
+from the mailbox's size and the page encoded afresh.
+"""
+
+from collections import OrderedDict
+from typing import Callable, Optional
+import bisect
+import threading
+import time
+
+from src.packets.message_response import MessageResponse
+from .stored_message import StoredMessage
+
+
+class CachedPage:
+    """The first messages of a mailbox, in the order they are delivered.
+
+    The page holds one message more than a response can, if the mailbox
+    has that many, so the response can say whether there are more to come.
+    """
+
+    __slots__ = ("mailbox_size", "entries", "expires_at", "record", "size")
+
+    def __init__(self, mailbox_size: int, stored_messages: list[StoredMessage]):
+        """Cache the first messages of a mailbox.
+
+        :param mailbox_size: The number of messages in the mailbox.
+        :param stored_messages: The first messages of the mailbox, in the
+            order they are delivered.
+        """
+        self.mailbox_size = mailbox_size
+        # Ordered by priority, highest first, then by sequence number, as
+        # messages are delivered
+        self.entries: list[tuple[int, int, float, bytes]] = [
+            (
+                -stored_message.priority,
+                stored_message.sequence,
+                stored_message.expires_at,
+                stored_message.encode(),
+            )
+            for stored_message in stored_messages
+        ]
+        self.expires_at = 0.0
+        self.record: Optional[bytes] = None
+        self.size = 0
+        self.changed()
+
+    @property
+    def is_complete(self) -> bool:
+        """Whether the page holds every message it should.
+
+        :return: ``True`` if the page holds a full response's worth of
+            messages, or every message in the mailbox.
+        """
+        return len(self.entries) >= min(
+            self.mailbox_size, MessageResponse.MAX_MESSAGE_LENGTH + 1
+        )
+
+    def add(self, stored_message: StoredMessage) -> None:
+        """Add a message which has just been stored in the mailbox.
+
+        :param stored_message: The message stored.
+        """
+        entry = (
+            -stored_message.priority,
+            stored_message.sequence,
+            stored_message.expires_at,
+            stored_message.encode(),
+        )
+        position = bisect.bisect(self.entries, entry)
+        # A message after the end of a full page may belong after others
+        # not in the page either
+        if position < len(self.entries) or len(self.entries) == self.mailbox_size:
+            self.entries.insert(position, entry)
+            del self.entries[MessageResponse.MAX_MESSAGE_LENGTH + 1 :]
+        self.mailbox_size += 1
+        self.changed()
+
+    def remove(self, is_removed: Callable[[int, int], bool], count: int) -> None:
+        """Remove messages which have left the mailbox.
+
+        :param is_removed: Called with the priority and sequence number of
+            each message in the page, and returns whether it was removed.
+        :param count: The number of messages removed from the mailbox,
+            including any not in the page.
+        """
+        self.entries = [
+            entry for entry in self.entries if not is_removed(-entry[0], entry[1])
+        ]
+        self.mailbox_size -= count
+        self.changed()
+
+    def changed(self) -> None:
+        """Forget the encoded page, and total up the page's size and expiry."""
+        self.record = None
+        self.size = sum(len(entry[3]) for entry in self.entries)
+        self.expires_at = min(
+            (entry[2] for entry in self.entries if entry[2]), default=0.0
+        )
+
+    def encode(self) -> bytes:
+        """Encode the page as a message response, unless already encoded.
+
+        :return: The message response.
+        """
+        if self.record is None:
+            self.record = MessageResponse.from_encoded(
+                [entry[3] for entry in self.entries]
+            ).to_bytes()
+        return self.record
+
+
+class PeekCache:
+    """The encoded first page of the most recently peeked at mailboxes.
+
+    Once the pages take up more than the cache's memory limit, those of the
+    mailboxes peeked at least recently are dropped.
+    """
+
+    def __init__(self, max_bytes: int, clock: Callable[[], float] = time.time):
+        """Create an empty cache.
+
+        :param max_bytes: The most bytes of messages held by the cache.
+        :param clock: A function returning the current time in seconds,
+            the same as the store's.
+        """
+        self.max_bytes = max_bytes
+        self.clock = clock
+        # Least recently used first
+        self.pages: OrderedDict[str, CachedPage] = OrderedDict()
+        self.bytes = 0
+        # Worker threads peek at different mailboxes at the same time
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.updates = 0
+        self.evictions = 0
+
+    def __contains__(self, receiver_name: object) -> bool:
+        """Check whether a mailbox's page is cached.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :return: ``True`` if the mailbox's page is cached.
+        """
+        return receiver_name in self.pages
+
+    def get(self, receiver_name: str, mailbox_size: int) -> Optional[bytes]:
+        """Get the encoded first page of a mailbox, if it is cached.
+
+        Pages which have fallen out of step with their mailbox, or hold
+        a message which has expired, are dropped.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param mailbox_size: The number of messages in the mailbox.
+        :return: The message response, or ``None`` if it is not cached.
+        """
+        with self.lock:
+            page = self.pages.get(receiver_name)
+            if page is not None and (
+                page.mailbox_size != mailbox_size
+                or (page.expires_at and page.expires_at <= self.clock())
+            ):
+                self._drop(receiver_name)
+                page = None
+            if page is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.pages.move_to_end(receiver_name)
+            self.bytes -= len(page.record or b"")
+            record = page.encode()
+            self.bytes += len(record)
+            self._evict()
+            return record
+
+    def put(
+        self,
+        receiver_name: str,
+        mailbox_size: int,
+        stored_messages: list[StoredMessage],
+    ) -> bytes:
+        """Cache the first page of a mailbox.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param mailbox_size: The number of messages in the mailbox.
+        :param stored_messages: The first messages of the mailbox, in the
+            order they are delivered, up to one more than fit in a response.
+        :return: The message response.
+        """
+        page = CachedPage(mailbox_size, stored_messages)
+        record = page.encode()
+        with self.lock:
+            self._drop(receiver_name)
+            self.pages[receiver_name] = page
+            self.bytes += page.size + len(record)
+            self._evict()
+        return record
+
+    def messages_added(
+        self,
+        receiver_name: str,
+        stored_messages: list[StoredMessage],
+        mailbox_size: int,
+    ) -> None:
+        """Add messages just stored to a mailbox's page, if it is cached.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param stored_messages: The messages stored.
+        :param mailbox_size: The number of messages in the mailbox once
+            they were stored.
+        """
+        with self.lock:
+            page = self.pages.get(receiver_name)
+            if page is None:
+                return
+            if page.mailbox_size + len(stored_messages) != mailbox_size:
+                # Changed some other way, such as by evicting a message
+                self._drop(receiver_name)
+                return
+
+            self.bytes -= page.size + len(page.record or b"")
+            for stored_message in stored_messages:
+                page.add(stored_message)
+            self.bytes += page.size
+            self.updates += 1
+            self._evict()
+
+    def messages_removed(
+        self,
+        receiver_name: str,
+        is_removed: Callable[[int, int], bool],
+        count: int,
+        mailbox_size: int,
+    ) -> None:
+        """Remove messages just delivered from a mailbox's page, if it is cached.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param is_removed: Called with the priority and sequence number of
+            each message in the page, and returns whether it was removed.
+        :param count: The number of messages removed from the mailbox.
+        :param mailbox_size: The number of messages in the mailbox once
+            they were removed.
+        """
+        with self.lock:
+            page = self.pages.get(receiver_name)
+            if page is None:
+                return
+            if page.mailbox_size - count != mailbox_size:
+                self._drop(receiver_name)
+                return
+
+            self.bytes -= page.size + len(page.record or b"")
+            page.remove(is_removed, count)
+            self.bytes += page.size
+            self.updates += 1
+            if not page.is_complete:
+                # The page cannot be refilled without the mailbox
+                self._drop(receiver_name)
+
+    def _drop(self, receiver_name: str) -> None:
+        """Remove a mailbox's page from the cache, if there.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        """
+        page = self.pages.pop(receiver_name, None)
+        if page is not None:
+            self.bytes -= page.size + len(page.record or b"")
+
+    def _evict(self) -> None:
+        """Drop the least recently used pages until within the memory limit."""
+        while self.bytes > self.max_bytes and self.pages:
+            receiver_name = next(iter(self.pages))
+            self._drop(receiver_name)
+            self.evictions += 1
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Get the cache's statistics.
+
+        :return: A dictionary mapping each statistic's name to its value.
+        """
+        return {
+            "pages": len(self.pages),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "updates": self.updates,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,214 @@
+"""Running CPU heavy jobs in other processes, so serving is never held up.
+
+Each job's payload is copied into a block of shared memory, which the
+worker process attaches to by name, so a large payload is never pickled
+and sent down a pipe. Only the job's function, the block's name, any small
+arguments and the job's result pass between the processes. The block is
+freed by the server once the job has finished.
+"""
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+from typing import Any, Callable, Optional, Sequence, Union
+import logging
+import selectors
+import socket
+import threading
+
+from .event_loop import EventLoop
+
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessPool:
+    """Runs jobs on a fixed number of worker processes.
+
+    When attached to an event loop, jobs report back on the event loop's
+    thread, woken by a byte written to a socket it watches, so their
+    results can be used without any locking.
+    """
+
+    def __init__(self, processes: int):
+        """Create a pool, whose workers are started as jobs arrive.
+
+        :param processes: The number of worker processes.
+        """
+        # Workers are started afresh, rather than forked, so they inherit
+        # none of the server's sockets or threads
+        self.executor = ProcessPoolExecutor(processes, mp_context=get_context("spawn"))
+        self.event_loop: Optional[EventLoop] = None
+        self.wakeup_sockets: Optional[tuple[socket.socket, socket.socket]] = None
+        # Jobs which have finished, and the callbacks waiting for them
+        self.finished: deque[Callable[[], None]] = deque()
+        self.lock = threading.Lock()
+
+        self.jobs = 0
+        self.payload_bytes = 0
+        self.failed_jobs = 0
+
+    def attach(self, event_loop: EventLoop) -> None:
+        """Report finished jobs on an event loop's thread.
+
+        :param event_loop: The server's event loop.
+        """
+        self.event_loop = event_loop
+        self.wakeup_sockets = socket.socketpair()
+        for wakeup_socket in self.wakeup_sockets:
+            wakeup_socket.setblocking(False)
+        event_loop.watch(self.wakeup_sockets[0], selectors.EVENT_READ, self.on_wakeup)
+
+    def submit(
+        self,
+        function: Callable[..., Any],
+        payload: Sequence[Union[bytes, bytearray]],
+        *arguments: Any,
+    ) -> "Future[Any]":
+        """Run a function on a payload in one of the worker processes.
+
+        :param function: A module level function, called with a view of
+            the payload followed by ``arguments``.
+        :param payload: The parts of the bytes to pass through shared
+            memory, each copied straight into place.
+        :param arguments: Small values to pass to the function as they are.
+        :return: The function's result, once the job has finished.
+        """
+        size = sum(map(len, payload))
+        block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        offset = 0
+        for part in payload:
+            block.buf[offset : offset + len(part)] = part
+            offset += len(part)
+        try:
+            future = self.executor.submit(
+                run_job, function, block.name, size, arguments
+            )
+        except BaseException:
+            release_block(block)
+            raise
+
+        future.add_done_callback(lambda done: self.job_done(done, block))
+        self.jobs += 1
+        self.payload_bytes += size
+        return future
+
+    def job_done(
+        self, future: "Future[Any]", block: shared_memory.SharedMemory
+    ) -> None:
+        """Free a job's payload once it has finished, noting whether it failed.
+
+        :param future: The finished job.
+        :param block: The shared memory block holding the job's payload.
+        """
+        release_block(block)
+        if future.cancelled() or future.exception() is not None:
+            with self.lock:
+                self.failed_jobs += 1
+
+    def when_done(self, future: "Future[Any]", callback: Callable[[], None]) -> None:
+        """Call a function on the event loop's thread once a job has finished.
+
+        :param future: The job to wait for.
+        :param callback: Called with no arguments once the job has finished.
+        """
+        future.add_done_callback(lambda _: self.finish(callback))
+
+    def finish(self, callback: Callable[[], None]) -> None:
+        """Hand a callback to the event loop, waking it up.
+
+        Called on whichever thread a job finished on, or on the event
+        loop's own thread to carry on with some work on its next pass.
+
+        :param callback: The callback to run on the event loop's thread.
+        """
+        wakeup_sockets = self.wakeup_sockets
+        if wakeup_sockets is None:
+            # The pool has been closed, so there is no one left to tell
+            return
+
+        with self.lock:
+            self.finished.append(callback)
+        try:
+            wakeup_sockets[1].send(b"\0")
+        except OSError:
+            # Already woken, or shutting down
+            pass
+
+    def on_wakeup(self, events: int) -> None:
+        """Run the callbacks of every job which has finished.
+
+        Callbacks handed over while these run are left for the next pass,
+        so the event loop can serve connections in between.
+
+        :param events: The selector events which are ready.
+        """
+        assert self.wakeup_sockets is not None
+        try:
+            while self.wakeup_sockets[0].recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        with self.lock:
+            callbacks = len(self.finished)
+        for _ in range(callbacks):
+            with self.lock:
+                callback = self.finished.popleft()
+            callback()
+
+    def close(self) -> None:
+        """Stop the worker processes, abandoning any jobs not yet started."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.wakeup_sockets is not None:
+            if self.event_loop is not None:
+                self.event_loop.unwatch(self.wakeup_sockets[0])
+            for wakeup_socket in self.wakeup_sockets:
+                wakeup_socket.close()
+            self.wakeup_sockets = None
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Get the work done by the pool.
+
+        :return: A dictionary mapping each statistic's name to its value.
+        """
+        return {
+            "jobs": self.jobs,
+            "payload_bytes": self.payload_bytes,
+            "failed_jobs": self.failed_jobs,
+        }
+
+
+def run_job(
+    function: Callable[..., Any], name: str, size: int, arguments: tuple[Any, ...]
+) -> Any:
+    """Run a job in a worker process, reading its payload from shared memory.
+
+    :param function: The function to run.
+    :param name: The name of the shared memory block holding the payload.
+    :param size: The length of the payload.
+    :param arguments: The rest of the function's arguments.
+    :return: The function's result.
+    """
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        payload = block.buf[:size]
+        try:
+            return function(payload, *arguments)
+        finally:
+            payload.release()
+    finally:
+        block.close()
+
+
+def release_block(block: shared_memory.SharedMemory) -> None:
+    """Free a job's shared memory block.
+
+    :param block: The block to free.
+    """
+    block.close()
+    try:
+        block.unlink()
+    except FileNotFoundError:
+        pass
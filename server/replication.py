@@ -0,0 +1,663 @@
+"""Asynchronous primary/follower replication of the mailbox store.
+
+The primary numbers every change made to its store, and streams the
+changes to each of its followers in order. Changes are appended to each
+follower's buffer as they happen, and written whenever the follower's
+socket is ready, so changes made in quick succession are batched into a
+single write, and the primary never waits for a follower.
+
+A follower which connects for the first time, or has fallen too far
+behind, is sent a snapshot of the whole store. Otherwise it carries on
+from the recent changes the primary keeps in its backlog.
+"""
+
+from collections import deque
+from enum import Enum
+from typing import Callable, Iterator, Optional
+import errno
+import logging
+import os
+import selectors
+import socket
+import struct
+import time
+
+from src.packets.packet import Packet
+from src.server_address import ServerAddress
+from .event_loop import EventLoop
+from .mailbox_store import MailboxStore, QuotaExceededError
+from .stored_message import StoredMessage
+
+
+logger = logging.getLogger(__name__)
+
+
+class RecordKind(Enum):
+    """The kinds of record in a replication stream."""
+
+    CREATE = 1
+    DRAIN = 2
+    SNAPSHOT_START = 3
+    SNAPSHOT_END = 4
+    HEARTBEAT = 5
+
+
+# The kind, sequence number and payload length of a record
+RECORD_HEADER = struct.Struct("!BQI")
+NAME_LENGTH = struct.Struct("!H")
+# The sequence number of the last message drained, and the priority of its lane
+DRAIN_THROUGH = struct.Struct("!QB")
+HEARTBEAT_TIME = struct.Struct("!d")
+
+# Sent by a follower as it connects: the stream it was following,
+# and the sequence number of the first record it has not applied
+HANDSHAKE = struct.Struct("!H16sQ")
+
+# Sent by a follower to report the last sequence number it has applied
+ACKNOWLEDGEMENT = struct.Struct("!Q")
+
+RECEIVE_SIZE = 65536
+
+# A snapshot is encoded as the follower takes it, this many bytes at a time
+SNAPSHOT_CHUNK_SIZE = 1 << 20
+
+
+def encode_record(kind: RecordKind, sequence: int, payload: bytes = b"") -> bytes:
+    """Encode a record of a replication stream.
+
+    :param kind: The kind of record.
+    :param sequence: The sequence number of the record.
+    :param payload: The contents of the record.
+    :return: The encoded record.
+    """
+    return RECORD_HEADER.pack(kind.value, sequence, len(payload)) + payload
+
+
+def encode_name(name: str) -> bytes:
+    """Encode a length prefixed user name.
+
+    :param name: The user name.
+    :return: The encoded name.
+    """
+    encoded_name = name.encode()
+    return NAME_LENGTH.pack(len(encoded_name)) + encoded_name
+
+
+def decode_name(payload: bytes, offset: int = 0) -> tuple[str, int]:
+    """Decode a length prefixed user name.
+
+    :param payload: A buffer holding the encoded name.
+    :param offset: The index at which the encoded name starts.
+    :return: The user name, and the index immediately after it.
+    """
+    (length,) = NAME_LENGTH.unpack_from(payload, offset)
+    start = offset + NAME_LENGTH.size
+    return bytes(payload[start : start + length]).decode(), start + length
+
+
+def split_records(buffer: bytearray) -> list[tuple[RecordKind, int, bytes]]:
+    """Remove every complete record from the start of a buffer.
+
+    :param buffer: The bytes received so far, which is modified in place.
+    :return: The kind, sequence number and payload of each record.
+    :raises ValueError: If a record is not of a known kind.
+    """
+    records = []
+    offset = 0
+    while len(buffer) >= offset + RECORD_HEADER.size:
+        kind, sequence, length = RECORD_HEADER.unpack_from(buffer, offset)
+        start = offset + RECORD_HEADER.size
+        if len(buffer) < start + length:
+            break
+
+        records.append(
+            (RecordKind(kind), sequence, bytes(buffer[start : start + length]))
+        )
+        offset = start + length
+
+    del buffer[:offset]
+    return records
+
+
+class FollowerStream:
+    """The primary's connection to one of its followers."""
+
+    def __init__(self, connection_socket: socket.socket, address: object):
+        """Wrap a newly accepted, non-blocking follower connection.
+
+        :param connection_socket: The socket connected to the follower.
+        :param address: The address of the follower.
+        """
+        self.socket = connection_socket
+        self.address = address
+        self.inbound = bytearray()
+        self.outbound = bytearray()
+        # Nothing is streamed to a follower until it has said where to start
+        self.streaming = False
+        self.acknowledged_sequence = 0
+        # The rest of the snapshot being sent, the sequence number it was
+        # taken at, and the changes made since, held back until it is sent
+        self.snapshot: Optional[Iterator[tuple[str, StoredMessage]]] = None
+        self.snapshot_sequence = 0
+        self.held_back = bytearray()
+
+
+class ReplicationPrimary:
+    """Streams every change to the mailbox store to the connected followers."""
+
+    # Followers this far behind are disconnected, and catch up from a snapshot
+    MAX_FOLLOWER_OUTPUT = 64 << 20
+
+    def __init__(
+        self,
+        store: MailboxStore,
+        backlog_limit: int,
+        clock: Callable[[], float] = time.time,
+    ):
+        """Start recording the changes made to a store.
+
+        :param store: The store to replicate.
+        :param backlog_limit: The number of bytes of recent changes to keep
+            for followers which reconnect.
+        :param clock: A function returning the current time in seconds.
+        """
+        self.store = store
+        store.observer = self
+        self.backlog_limit = backlog_limit
+        self.clock = clock
+
+        # Identifies this run of the primary, as sequence numbers restart with it
+        self.replication_id = os.urandom(16)
+        self.sequence = 0
+        self.backlog: deque[tuple[int, bytes]] = deque()
+        self.backlog_bytes = 0
+        self.followers: set[FollowerStream] = set()
+        self.event_loop: Optional[EventLoop] = None
+
+    def attach(self, event_loop: EventLoop, welcoming_socket: socket.socket) -> None:
+        """Start accepting followers.
+
+        :param event_loop: The server's event loop.
+        :param welcoming_socket: The listening socket followers connect to.
+        """
+        self.event_loop = event_loop
+        welcoming_socket.setblocking(False)
+        event_loop.watch(
+            welcoming_socket,
+            selectors.EVENT_READ,
+            lambda _: self.accept_followers(welcoming_socket),
+        )
+
+    def message_added(self, receiver_name: str, stored_message: StoredMessage) -> None:
+        """Replicate a message being added to a mailbox.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param stored_message: The message which was added.
+        """
+        self.append(
+            RecordKind.CREATE, encode_name(receiver_name) + stored_message.to_bytes()
+        )
+
+    def messages_removed(
+        self, receiver_name: str, last_sequence: int, priority: int
+    ) -> None:
+        """Replicate messages being removed from the front of a mailbox's lane.
+
+        The follower removes the same messages by their sequence numbers,
+        so its copy of the mailbox cannot drift from the primary's.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param last_sequence: The sequence number of the last message removed.
+        :param priority: The priority of the lane they were removed from.
+        """
+        self.append(
+            RecordKind.DRAIN,
+            encode_name(receiver_name) + DRAIN_THROUGH.pack(last_sequence, priority),
+        )
+
+    def append(self, kind: RecordKind, payload: bytes) -> None:
+        """Add a change to the stream, and queue it for every follower.
+
+        :param kind: The kind of change.
+        :param payload: The details of the change.
+        """
+        self.sequence += 1
+        record = encode_record(kind, self.sequence, payload)
+
+        self.backlog.append((self.sequence, record))
+        self.backlog_bytes += len(record)
+        while self.backlog_bytes > self.backlog_limit:
+            _, old_record = self.backlog.popleft()
+            self.backlog_bytes -= len(old_record)
+
+        self.broadcast(record)
+
+    def heartbeat(self) -> None:
+        """Tell every follower the latest sequence number and the time.
+
+        Followers use heartbeats to measure how far behind they are.
+        """
+        self.broadcast(
+            encode_record(
+                RecordKind.HEARTBEAT, self.sequence, HEARTBEAT_TIME.pack(self.clock())
+            )
+        )
+
+    def broadcast(self, record: bytes) -> None:
+        """Queue a record for every follower which is streaming.
+
+        :param record: The encoded record.
+        """
+        for follower in list(self.followers):
+            if not follower.streaming:
+                continue
+            queued = len(follower.outbound) + len(follower.held_back)
+            if queued > ReplicationPrimary.MAX_FOLLOWER_OUTPUT:
+                self.drop(follower, "fell too far behind")
+                continue
+
+            if follower.snapshot is not None:
+                follower.held_back += record
+            else:
+                follower.outbound += record
+                self.update_interest(follower)
+
+    def accept_followers(self, welcoming_socket: socket.socket) -> None:
+        """Accept every follower waiting to connect.
+
+        :param welcoming_socket: The listening socket followers connect to.
+        """
+        assert self.event_loop is not None
+        while True:
+            try:
+                connection_socket, address = welcoming_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as error:
+                logger.error("Unable to accept follower: %s", error)
+                return
+
+            connection_socket.setblocking(False)
+            follower = FollowerStream(connection_socket, address)
+            self.followers.add(follower)
+            self.update_interest(follower)
+            logger.info("Follower connected from %s", address)
+
+    def on_follower_event(self, follower: FollowerStream, events: int) -> None:
+        """Make progress once a follower's socket is ready.
+
+        :param follower: The follower whose socket is ready.
+        :param events: The selector events which are ready.
+        """
+        try:
+            if events & selectors.EVENT_WRITE:
+                sent = follower.socket.send(follower.outbound)
+                del follower.outbound[:sent]
+                if follower.snapshot is not None:
+                    self.continue_snapshot(follower)
+
+            if events & selectors.EVENT_READ:
+                self.receive(follower)
+        except BlockingIOError:
+            pass
+        except (OSError, ValueError) as error:
+            self.drop(follower, str(error))
+            return
+
+        self.update_interest(follower)
+
+    def receive(self, follower: FollowerStream) -> None:
+        """Read a follower's handshake and acknowledgements.
+
+        :param follower: The follower to read from.
+        :raises OSError: If the connection has failed or been closed.
+        :raises ValueError: If the follower sent an invalid handshake.
+        """
+        data = follower.socket.recv(RECEIVE_SIZE)
+        if not data:
+            raise ConnectionResetError("Connection closed by follower")
+        follower.inbound += data
+
+        if not follower.streaming:
+            if len(follower.inbound) < HANDSHAKE.size:
+                return
+            magic_number, replication_id, next_sequence = HANDSHAKE.unpack_from(
+                follower.inbound
+            )
+            if magic_number != Packet.MAGIC_NUMBER:
+                raise ValueError("Invalid replication handshake")
+            del follower.inbound[: HANDSHAKE.size]
+            self.start_stream(follower, replication_id, next_sequence)
+
+        count = len(follower.inbound) // ACKNOWLEDGEMENT.size
+        if count:
+            (follower.acknowledged_sequence,) = ACKNOWLEDGEMENT.unpack_from(
+                follower.inbound, (count - 1) * ACKNOWLEDGEMENT.size
+            )
+            del follower.inbound[: count * ACKNOWLEDGEMENT.size]
+
+    def start_stream(
+        self, follower: FollowerStream, replication_id: bytes, next_sequence: int
+    ) -> None:
+        """Bring a follower up to date, then stream it every new change.
+
+        :param follower: The follower which has just connected.
+        :param replication_id: The stream the follower was following.
+        :param next_sequence: The first record the follower has not applied.
+        """
+        follower.streaming = True
+        can_resume = replication_id == self.replication_id and (
+            next_sequence == self.sequence + 1
+            or bool(self.backlog)
+            and self.backlog[0][0] <= next_sequence <= self.sequence
+        )
+
+        if can_resume:
+            logger.info("Follower %s resuming from %s", follower.address, next_sequence)
+            follower.acknowledged_sequence = next_sequence - 1
+            follower.outbound += b"".join(
+                record for sequence, record in self.backlog if sequence >= next_sequence
+            )
+            return
+
+        logger.info(
+            "Sending snapshot at %s to follower %s", self.sequence, follower.address
+        )
+        follower.acknowledged_sequence = 0
+        follower.outbound += encode_record(
+            RecordKind.SNAPSHOT_START, self.sequence, self.replication_id
+        )
+        follower.snapshot = self.store.snapshot()
+        follower.snapshot_sequence = self.sequence
+        self.continue_snapshot(follower)
+
+    def continue_snapshot(self, follower: FollowerStream) -> None:
+        """Encode more of a follower's snapshot, once it has taken the last part.
+
+        The store may change between parts. Those changes are sent once the
+        snapshot ends, and the follower skips any it already holds.
+
+        :param follower: The follower being sent a snapshot.
+        """
+        assert follower.snapshot is not None
+        while len(follower.outbound) < SNAPSHOT_CHUNK_SIZE:
+            entry = next(follower.snapshot, None)
+            if entry is None:
+                follower.outbound += encode_record(
+                    RecordKind.SNAPSHOT_END, follower.snapshot_sequence
+                )
+                follower.outbound += follower.held_back
+                follower.held_back.clear()
+                follower.snapshot = None
+                return
+
+            receiver_name, stored_message = entry
+            follower.outbound += encode_record(
+                RecordKind.CREATE,
+                follower.snapshot_sequence,
+                encode_name(receiver_name) + stored_message.to_bytes(),
+            )
+
+    def update_interest(self, follower: FollowerStream) -> None:
+        """Choose which socket events to wait for on a follower's connection.
+
+        :param follower: The follower to update.
+        """
+        assert self.event_loop is not None
+        events = selectors.EVENT_READ
+        if follower.outbound:
+            events |= selectors.EVENT_WRITE
+        self.event_loop.watch(
+            follower.socket,
+            events,
+            lambda ready: self.on_follower_event(follower, ready),
+        )
+
+    def drop(self, follower: FollowerStream, reason: str) -> None:
+        """Disconnect a follower.
+
+        :param follower: The follower to disconnect.
+        :param reason: Why the follower is being disconnected.
+        """
+        logger.warning("Disconnecting follower %s: %s", follower.address, reason)
+        if self.event_loop is not None:
+            self.event_loop.unwatch(follower.socket)
+        follower.socket.close()
+        self.followers.discard(follower)
+
+    def close(self) -> None:
+        """Disconnect every follower."""
+        for follower in list(self.followers):
+            self.drop(follower, "primary shutting down")
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Get the state of replication to the followers.
+
+        :return: A dictionary mapping each statistic's name to its value.
+        """
+        return {
+            "followers": len(self.followers),
+            "sequence": self.sequence,
+            "backlog_bytes": self.backlog_bytes,
+            "max_follower_lag": max(
+                (
+                    self.sequence - follower.acknowledged_sequence
+                    for follower in self.followers
+                    if follower.streaming
+                ),
+                default=0,
+            ),
+        }
+
+
+class ReplicationFollower:
+    """Keeps a copy of a primary's mailbox store up to date."""
+
+    def __init__(
+        self,
+        store: MailboxStore,
+        primary_address: ServerAddress,
+        clock: Callable[[], float] = time.time,
+    ):
+        """Prepare to follow a primary, without connecting to it yet.
+
+        :param store: The store to apply the primary's changes to.
+        :param primary_address: The address of the primary's replication socket.
+        :param clock: A function returning the current time in seconds.
+        """
+        self.store = store
+        self.primary_address = primary_address
+        self.clock = clock
+
+        self.replication_id = bytes(16)
+        self.snapshot_id = bytes(16)
+        self.applied_sequence = 0
+        self.primary_sequence = 0
+        self.lag_seconds = 0.0
+        self.in_snapshot = False
+
+        self.socket: Optional[socket.socket] = None
+        self.connected = False
+        self.inbound = bytearray()
+        self.outbound = bytearray()
+        self.event_loop: Optional[EventLoop] = None
+
+    def attach(self, event_loop: EventLoop) -> None:
+        """Connect to the primary using the server's event loop.
+
+        :param event_loop: The server's event loop.
+        """
+        self.event_loop = event_loop
+        self.connect()
+
+    def connect(self) -> None:
+        """Start connecting to the primary, if not already connected."""
+        if self.socket is not None or self.event_loop is None:
+            return
+
+        self.socket = self.primary_address.create_socket()
+        self.socket.setblocking(False)
+        error = self.socket.connect_ex(self.primary_address.socket_address)
+        if error not in (0, errno.EINPROGRESS, errno.EAGAIN):
+            self.disconnect(OSError(error, os.strerror(error)))
+            return
+
+        self.connected = error == 0
+        self.in_snapshot = False
+        self.outbound += HANDSHAKE.pack(
+            Packet.MAGIC_NUMBER, self.replication_id, self.applied_sequence + 1
+        )
+        self.update_interest()
+        logger.info("Connecting to primary at %s", self.primary_address)
+
+    def on_event(self, events: int) -> None:
+        """Make progress once the connection to the primary is ready.
+
+        :param events: The selector events which are ready.
+        """
+        assert self.socket is not None
+        try:
+            if events & selectors.EVENT_WRITE:
+                if not self.connected:
+                    error = self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if error:
+                        raise OSError(error, os.strerror(error))
+                    self.connected = True
+                sent = self.socket.send(self.outbound)
+                del self.outbound[:sent]
+
+            if events & selectors.EVENT_READ:
+                self.receive()
+        except BlockingIOError:
+            pass
+        except (OSError, ValueError) as error:
+            self.disconnect(error)
+            return
+
+        self.update_interest()
+
+    def receive(self) -> None:
+        """Apply the records sent by the primary, and acknowledge them.
+
+        :raises OSError: If the connection has failed or been closed.
+        :raises ValueError: If the primary sent an invalid record.
+        """
+        assert self.socket is not None
+        data = self.socket.recv(RECEIVE_SIZE)
+        if not data:
+            raise ConnectionResetError("Connection closed by primary")
+        self.inbound += data
+
+        applied_before = self.applied_sequence
+        for kind, sequence, payload in split_records(self.inbound):
+            self.apply(kind, sequence, payload)
+
+        if self.applied_sequence != applied_before:
+            self.outbound += ACKNOWLEDGEMENT.pack(self.applied_sequence)
+
+    def apply(self, kind: RecordKind, sequence: int, payload: bytes) -> None:
+        """Apply a single record from the primary.
+
+        :param kind: The kind of record.
+        :param sequence: The sequence number of the record.
+        :param payload: The contents of the record.
+        """
+        self.primary_sequence = max(self.primary_sequence, sequence)
+
+        if kind == RecordKind.SNAPSHOT_START:
+            logger.info("Loading snapshot at %s from primary", sequence)
+            self.store.clear()
+            # Until the snapshot is complete, reconnecting needs a new snapshot
+            self.replication_id = bytes(16)
+            self.applied_sequence = 0
+            self.snapshot_id = payload
+            self.primary_sequence = sequence
+            self.in_snapshot = True
+        elif kind == RecordKind.SNAPSHOT_END:
+            self.in_snapshot = False
+            self.replication_id = self.snapshot_id
+            self.applied_sequence = sequence
+        elif kind == RecordKind.HEARTBEAT:
+            (sent_at,) = HEARTBEAT_TIME.unpack(payload)
+            self.lag_seconds = max(0.0, self.clock() - sent_at)
+        elif not self.in_snapshot and sequence <= self.applied_sequence:
+            # Already applied before reconnecting
+            return
+        elif kind == RecordKind.CREATE:
+            self.apply_create(payload)
+        elif kind == RecordKind.DRAIN:
+            receiver_name, offset = decode_name(payload)
+            last_sequence, priority = DRAIN_THROUGH.unpack_from(payload, offset)
+            self.store.acknowledge(receiver_name, {priority: last_sequence})
+
+        if not self.in_snapshot and kind in (RecordKind.CREATE, RecordKind.DRAIN):
+            self.applied_sequence = sequence
+
+    def apply_create(self, payload: bytes) -> None:
+        """Add a message sent by the primary to its mailbox.
+
+        Changes made while a snapshot was being sent may already be in it,
+        so a message the store already holds is not added again.
+
+        :param payload: The name of the receiver, followed by the message.
+        """
+        receiver_name, offset = decode_name(payload)
+        stored_message, _ = StoredMessage.unpack_from(payload, offset)
+        if self.store.holds(receiver_name, stored_message.sequence):
+            return
+
+        try:
+            self.store.add(
+                receiver_name,
+                stored_message.sender_name,
+                stored_message.message,
+                expires_at=stored_message.expires_at,
+                sequence=stored_message.sequence,
+                stored_at=stored_message.stored_at,
+                priority=stored_message.priority,
+            )
+        except QuotaExceededError as error:
+            logger.error("Unable to replicate message to %s: %s", receiver_name, error)
+
+    def update_interest(self) -> None:
+        """Choose which socket events to wait for."""
+        assert self.event_loop is not None and self.socket is not None
+        events = selectors.EVENT_READ
+        if self.outbound or not self.connected:
+            events |= selectors.EVENT_WRITE
+        self.event_loop.watch(self.socket, events, self.on_event)
+
+    def disconnect(self, error: Exception) -> None:
+        """Close a failed connection to the primary, to be retried later.
+
+        :param error: The reason the connection failed.
+        """
+        logger.error(
+            "Lost connection to primary at %s: %s", self.primary_address, error
+        )
+        self.close()
+
+    def close(self) -> None:
+        """Close the connection to the primary."""
+        if self.socket is not None:
+            if self.event_loop is not None:
+                self.event_loop.unwatch(self.socket)
+            self.socket.close()
+            self.socket = None
+        self.connected = False
+        self.inbound.clear()
+        self.outbound.clear()
+
+    @property
+    def stats(self) -> dict[str, float]:
+        """Get how far behind the primary this follower is.
+
+        :return: A dictionary mapping each statistic's name to its value.
+        """
+        return {
+            "connected": self.connected,
+            "applied_sequence": self.applied_sequence,
+            "lag_records": self.primary_sequence - self.applied_sequence,
+            "lag_seconds": self.lag_seconds,
+        }
@@ -0,0 +1,226 @@
+"""Finding the pending messages which contain some words.
+
+Each mailbox has an inverted index, mapping every word found in its
+messages to the sequence numbers of the messages containing it. The
+index is kept up to date as messages arrive and leave, so a search only
+looks at the messages it returns.
+"""
+
+from array import array
+from typing import Iterable, Sequence, Union
+import re
+import struct
+
+
+# Words are runs of letters, digits and underscores, compared ignoring case
+WORD_PATTERN = re.compile(r"\w+")
+# The number of messages packed by ``pack_messages``
+PACKED_COUNT = struct.Struct("!Q")
+
+
+def words_in(text: bytes) -> set[str]:
+    """Find the distinct words in a message.
+
+    :param text: The message body, or a search query.
+    :return: Every word found, in lower case.
+    """
+    return set(WORD_PATTERN.findall(text.decode(errors="replace").lower()))
+
+
+def pack_messages(messages: Sequence[Union[bytes, bytearray]]) -> bytes:
+    """Pack message bodies into one buffer, to be searched by ``find_packed``.
+
+    :param messages: The message bodies.
+    :return: The packed messages.
+    """
+    return b"".join(packed_parts(messages))
+
+
+def packed_parts(
+    messages: Sequence[Union[bytes, bytearray]],
+) -> list[Union[bytes, bytearray]]:
+    """Get the parts of the buffer ``pack_messages`` would pack, unjoined.
+
+    The buffer holds the number of messages, then the length of each one
+    as an array of native integers, then the messages themselves, so it
+    is built without visiting each message in Python.
+
+    :param messages: The message bodies.
+    :return: The parts, in order.
+    """
+    lengths = array("I", map(len, messages))
+    return [PACKED_COUNT.pack(len(messages)) + lengths.tobytes(), *messages]
+
+
+def find_packed(packed: memoryview, words: set[str], count: int) -> list[int]:
+    """Find the packed messages which contain every one of some words.
+
+    Reading through a mailbox which is not indexed takes a long time, so
+    this is run in another process on a copy of the messages.
+
+    :param packed: Messages packed by ``pack_messages`` on the same machine.
+    :param words: The words to look for, in lower case.
+    :param count: The maximum number of matches to find.
+    :return: The positions of up to ``count`` matching messages, in the
+        order they were packed.
+    """
+    (message_count,) = PACKED_COUNT.unpack_from(packed)
+    lengths = array("I")
+    offset = PACKED_COUNT.size + message_count * lengths.itemsize
+    lengths.frombytes(packed[PACKED_COUNT.size : offset])
+
+    matches: list[int] = []
+    for position, length in enumerate(lengths):
+        if words <= words_in(bytes(packed[offset : offset + length])):
+            matches.append(position)
+            if len(matches) == count:
+                break
+        offset += length
+    return matches
+
+
+class SearchIndex:
+    """Maps the words in each mailbox's messages to the messages containing them.
+
+    Memory is accounted by estimating the cost of each word and of each
+    posting, the record that a message contains a word. Once the limit
+    is reached, new messages are left out of the index, and the mailboxes
+    they belong to are searched by reading every message until emptied.
+    """
+
+    # Estimated bytes used by a word's entry, on top of the word itself
+    WORD_OVERHEAD = 200
+    # Estimated bytes used by each posting, counting the copy kept for removal
+    POSTING_SIZE = 80
+
+    def __init__(self, memory_limit: int = 0):
+        """Create an empty index.
+
+        :param memory_limit: The most bytes the index may use, or zero for
+            no limit.
+        """
+        self.memory_limit = memory_limit
+        self.memory_bytes = 0
+        self.word_count = 0
+        self.postings = 0
+
+        # The sequence numbers of each mailbox's messages, by the words they contain
+        self.mailboxes: dict[str, dict[str, set[int]]] = {}
+        # The words in each indexed message, so they can be removed
+        self.message_words: dict[tuple[str, int], tuple[str, ...]] = {}
+        # Mailboxes holding messages which were not indexed
+        self.incomplete: set[str] = set()
+        self.skipped_messages = 0
+
+    def add(self, receiver_name: str, sequence: int, message: bytes) -> None:
+        """Index a message which has just been stored.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param sequence: The message's sequence number.
+        :param message: The message body.
+        """
+        if receiver_name in self.incomplete:
+            # Searches read the whole mailbox, so there is no use indexing it
+            self.skipped_messages += 1
+            return
+
+        words = tuple(words_in(message))
+        index = self.mailboxes.setdefault(receiver_name, {})
+        cost = len(words) * SearchIndex.POSTING_SIZE + sum(
+            len(word) + SearchIndex.WORD_OVERHEAD for word in words if word not in index
+        )
+        if self.memory_limit and self.memory_bytes + cost > self.memory_limit:
+            self.skipped_messages += 1
+            self.incomplete.add(receiver_name)
+            if not index:
+                del self.mailboxes[receiver_name]
+            return
+
+        for word in words:
+            sequences = index.get(word)
+            if sequences is None:
+                sequences = index[word] = set()
+                self.word_count += 1
+            sequences.add(sequence)
+        self.message_words[receiver_name, sequence] = words
+        self.memory_bytes += cost
+        self.postings += len(words)
+
+    def remove(self, receiver_name: str, sequence: int) -> None:
+        """Forget a message which has left its mailbox.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param sequence: The message's sequence number.
+        """
+        words = self.message_words.pop((receiver_name, sequence), None)
+        if words is None:
+            return
+
+        index = self.mailboxes[receiver_name]
+        for word in words:
+            sequences = index[word]
+            sequences.discard(sequence)
+            if not sequences:
+                del index[word]
+                self.word_count -= 1
+                self.memory_bytes -= len(word) + SearchIndex.WORD_OVERHEAD
+        if not index:
+            del self.mailboxes[receiver_name]
+        self.memory_bytes -= len(words) * SearchIndex.POSTING_SIZE
+        self.postings -= len(words)
+
+    def forget_mailbox(self, receiver_name: str) -> None:
+        """Forget a mailbox which has been emptied, so it can be indexed again.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        """
+        self.incomplete.discard(receiver_name)
+
+    def covers(self, receiver_name: str) -> bool:
+        """Check whether every message in a mailbox has been indexed.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :return: ``True`` if the index can be searched instead of the mailbox.
+        """
+        return receiver_name not in self.incomplete
+
+    def search(self, receiver_name: str, words: Iterable[str]) -> list[int]:
+        """Find the messages in a mailbox which contain every one of some words.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :param words: The words to look for, in lower case.
+        :return: The sequence numbers of the matching messages, oldest first.
+        """
+        index = self.mailboxes.get(receiver_name, {})
+        postings = sorted((index.get(word, set()) for word in words), key=len)
+        if not postings:
+            return []
+
+        # Start from the rarest word, so as few sequence numbers as possible are kept
+        matches = set(postings[0])
+        for sequences in postings[1:]:
+            matches &= sequences
+        return sorted(matches)
+
+    def clear(self) -> None:
+        """Forget every message."""
+        self.mailboxes.clear()
+        self.message_words.clear()
+        self.incomplete.clear()
+        self.memory_bytes = 0
+        self.word_count = 0
+        self.postings = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Get the index's memory statistics.
+
+        :return: A dictionary mapping each statistic's name to its value.
+        """
+        return {
+            "indexed_messages": len(self.message_words),
+            "words": self.word_count,
+            "postings": self.postings,
+            "memory_bytes": self.memory_bytes,
+            "skipped_messages": self.skipped_messages,
+        }
@@ -1,14 +1,56 @@
 """Home to the ``Server`` class."""
 
 from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Optional, Union
+import contextlib
+import functools
+import hmac
 import logging
 import socket
+import stat
+import time
+import os
 
 from src.command_line_application import CommandLineApplication
+from src.option_parsers import (
+    non_negative_float,
+    non_negative_int,
+    positive_int,
+    switch,
+)
 from src.packets.message_response import MessageResponse
 from src.packets.message_request import MessageRequest
+from src.packets.packet import Packet
+from src.packets.result_response import ResultResponse
+from src.packets.status_response import StatusResponse
 from src.message_type import MessageType
 from src.port_number import PortNumber
+from src.request_option import RequestOption
+from src.result_code import ResultCode
+from src.server_address import ServerAddress
+from .admission import AdmissionController, RateLimit
+from .attachments import AttachmentSpool, FileSpan, Upload
+from .bulk import export_store, import_store
+from .capture import CaptureWriter
+from .cluster import Cluster, load_cluster_config
+from .connection import (
+    Connection,
+    ConnectionPhase,
+    PendingResponse,
+    ReadCursor,
+    StreamedResponse,
+)
+from .dedup import DedupIndex
+from .event_loop import EventLoop
+from .mailbox_store import MailboxStore, QuotaExceededError, QuotaPolicy
+from .peek_cache import PeekCache
+from .process_pool import ProcessPool
+from .replication import ReplicationFollower, ReplicationPrimary
+from .search_index import find_packed, packed_parts, words_in
+from .stored_message import StoredMessage
+from .striped_store import StripedMailboxStore
+from .worker_pool import Engine, WorkerPool
 
 logger = logging.getLogger(__name__)
 
@@ -19,12 +61,66 @@ class Server(CommandLineApplication):
     The server can be run with ``python3 -m server <port number>``.
     """
 
-    def __init__(self, arguments: list[str]):
+    # Seconds between each round of expiring messages
+    HOUSEKEEPING_INTERVAL = 1.0
+
+    # Searches reading through at least this many messages are run in the
+    # process pool, if there is one
+    OFFLOAD_MIN_MESSAGES = 1024
+    # The most messages read from each lane of a mailbox for each job of
+    # a search run in the process pool, so the event loop is only ever
+    # held up copying part of a large mailbox
+    OFFLOAD_SLICE_MESSAGES = 8192
+
+    def __init__(self, arguments: list[str]):  # noqa: PLR0915
         """Initialise the server with a specified port number.
 
         :param arguments: The program arguments from the command line.
         """
-        super().__init__(OrderedDict(port_number=PortNumber))
+        super().__init__(
+            OrderedDict(port_number=PortNumber),
+            OrderedDict(
+                tcp=(switch, True),
+                unix_socket=(str, None),
+                listen_backlog=(positive_int, 128),
+                max_connections=(non_negative_int, 0),
+                sender_rate=(non_negative_float, 0.0),
+                sender_burst=(positive_int, 10),
+                receiver_rate=(non_negative_float, 0.0),
+                receiver_burst=(positive_int, 10),
+                mailbox_message_limit=(non_negative_int, 0),
+                mailbox_byte_limit=(non_negative_int, 0),
+                memory_limit=(non_negative_int, 0),
+                quota_policy=(QuotaPolicy.from_str, QuotaPolicy.REJECT),
+                spill_directory=(str, "spill"),
+                default_ttl=(non_negative_float, 0.0),
+                stats_interval=(non_negative_float, 60.0),
+                header_timeout=(non_negative_float, 10.0),
+                body_timeout=(non_negative_float, 5.0),
+                write_timeout=(non_negative_float, 5.0),
+                cluster_config=(str, None),
+                node_name=(str, None),
+                replication_port=(PortNumber, None),
+                replication_backlog=(positive_int, 1 << 20),
+                primary=(ServerAddress.from_str, None),
+                dedup_window=(non_negative_float, 0.0),
+                dedup_capacity=(positive_int, 1_000_000),
+                dedup_exact_keys=(non_negative_int, 65536),
+                engine=(Engine.from_str, Engine.EVENTS),
+                threads=(positive_int, 8),
+                lock_stripes=(positive_int, 64),
+                search_index=(switch, False),
+                search_memory_limit=(non_negative_int, 64 << 20),
+                processes=(non_negative_int, 0),
+                peek_cache_limit=(non_negative_int, 16 << 20),
+                gateway_key_file=(str, None),
+                attachment_directory=(str, "attachments"),
+                attachment_limit=(non_negative_int, 1 << 30),
+                capture_file=(str, None),
+                import_file=(str, None),
+                export_file=(str, None),
+            ),
+        )
 
         # pylint thinks that self.parse_arguments is only
         # capable of returning an empty list
@@ -32,65 +128,1321 @@ class Server(CommandLineApplication):
         (self.port_number,) = self.parse_arguments(arguments)
 
         self.hostname = "localhost"
-        self.messages: dict[str, list[tuple[str, bytes]]] = {}
+        self.listen_tcp = self.option_values["tcp"]
+        self.unix_socket_path = self.option_values["unix_socket"]
+        if not self.listen_tcp and not self.unix_socket_path:
+            logger.error("Server has no sockets to listen on")
+            print(self.usage_prompt)
+            print("A Unix socket path is required when TCP is turned off")
+            raise SystemExit
+        self.listen_backlog = self.option_values["listen_backlog"]
+        self.engine = self.option_values["engine"]
+        self.threads = self.option_values["threads"]
+        # Worker threads share the store, so it is split into locked stripes
+        store_class: Callable[..., Union[MailboxStore, StripedMailboxStore]] = (
+            MailboxStore
+        )
+        if self.engine == Engine.THREADS:
+            store_class = functools.partial(
+                StripedMailboxStore, self.option_values["lock_stripes"]
+            )
+        self.store = store_class(
+            mailbox_message_limit=self.option_values["mailbox_message_limit"],
+            mailbox_byte_limit=self.option_values["mailbox_byte_limit"],
+            memory_limit=self.option_values["memory_limit"],
+            policy=self.option_values["quota_policy"],
+            spill_directory=self.option_values["spill_directory"],
+            default_time_to_live=self.option_values["default_ttl"],
+            search_memory_limit=(
+                self.option_values["search_memory_limit"]
+                if self.option_values["search_index"]
+                else None
+            ),
+        )
+        self.stats_interval = self.option_values["stats_interval"]
+        self.next_stats_report = time.monotonic() + self.stats_interval
+        self.timeouts = {
+            ConnectionPhase.READ_HEADER: self.option_values["header_timeout"],
+            ConnectionPhase.READ_BODY: self.option_values["body_timeout"],
+            ConnectionPhase.WRITE: self.option_values["write_timeout"],
+        }
+        self.admission = AdmissionController(
+            max_connections=self.option_values["max_connections"],
+            sender_limit=RateLimit(
+                self.option_values["sender_rate"], self.option_values["sender_burst"]
+            ),
+            receiver_limit=RateLimit(
+                self.option_values["receiver_rate"],
+                self.option_values["receiver_burst"],
+            ),
+        )
+        self.cluster = self.join_cluster(
+            self.option_values["cluster_config"], self.option_values["node_name"]
+        )
+
+        self.gateway_key = self.load_gateway_key(self.option_values["gateway_key_file"])
+
+        self.replication_port = self.option_values["replication_port"]
+        primary_address = self.option_values["primary"]
+        if self.replication_port is not None and primary_address is not None:
+            logger.error("Server cannot be both a primary and a follower")
+            print(self.usage_prompt)
+            print("A follower cannot accept followers of its own")
+            raise SystemExit
+
+        # Both run their connections on the event loop
+        if self.engine == Engine.THREADS and (
+            self.cluster is not None
+            or self.replication_port is not None
+            or primary_address is not None
+        ):
+            logger.error("Clusters and replication need the events engine")
+            print(self.usage_prompt)
+            print("Clusters and replication are only supported by the events engine")
+            raise SystemExit
+
+        self.primary: Optional[ReplicationPrimary] = None
+        if self.replication_port is not None:
+            assert isinstance(self.store, MailboxStore)
+            self.primary = ReplicationPrimary(
+                self.store, self.option_values["replication_backlog"]
+            )
+
+        self.follower: Optional[ReplicationFollower] = None
+        if primary_address is not None:
+            assert isinstance(self.store, MailboxStore)
+            self.follower = ReplicationFollower(self.store, primary_address)
+
+        self.capture_path = self.option_values["capture_file"]
+        self.import_path = self.option_values["import_file"]
+        self.export_path = self.option_values["export_file"]
+        self.capture: Optional[CaptureWriter] = None
+        self.processes = self.option_values["processes"]
+        self.process_pool: Optional[ProcessPool] = None
+        self.attachments = AttachmentSpool(
+            self.option_values["attachment_directory"],
+            self.option_values["attachment_limit"],
+        )
+
+        self.peek_cache: Optional[PeekCache] = None
+        # A follower's mailboxes change under it, by replication, so each
+        # peek reads the mailbox afresh
+        if self.option_values["peek_cache_limit"] and self.follower is None:
+            self.peek_cache = PeekCache(self.option_values["peek_cache_limit"])
+
+        self.dedup: Optional[DedupIndex] = None
+        if self.option_values["dedup_window"]:
+            self.dedup = DedupIndex(
+                self.option_values["dedup_window"],
+                self.option_values["dedup_capacity"],
+                self.option_values["dedup_exact_keys"],
+            )
+
+    def join_cluster(
+        self, config_path: Optional[str], node_name: Optional[str]
+    ) -> Optional[Cluster]:
+        """Load the cluster this server is a node of, if any.
+
+        :param config_path: The path of the cluster configuration file.
+        :param node_name: The name of this server in the configuration.
+        :return: The cluster, or ``None`` if the server runs on its own.
+        :raises SystemExit: If the cluster cannot be loaded.
+        """
+        if config_path is None:
+            return None
+
+        try:
+            if node_name is None:
+                raise ValueError("A node name is required to join a cluster")
+            return Cluster(load_cluster_config(config_path), node_name)
+        except (OSError, ValueError) as error:
+            logger.error(error)
+            print(self.usage_prompt)
+            print(error)
+            raise SystemExit from error
+
+    def load_gateway_key(self, key_path: Optional[str]) -> Optional[bytes]:
+        """Load the key gateways must present to read many mailboxes at once.
+
+        :param key_path: The path of the file holding the key.
+        :return: The key, or ``None`` if bulk reads are not allowed.
+        :raises SystemExit: If the key cannot be loaded.
+        """
+        if key_path is None:
+            return None
+
+        try:
+            with open(key_path, "rb") as key_file:
+                gateway_key = key_file.read().strip()
+            if not gateway_key:
+                raise ValueError(f"The gateway key file {key_path} is empty")
+            return gateway_key
+        except (OSError, ValueError) as error:
+            logger.error(error)
+            print(self.usage_prompt)
+            print(error)
+            raise SystemExit from error
 
     def run(self) -> None:
-        """Initiate the welcoming socket and start main event loop.
+        """Initiate the welcoming sockets and start main event loop.
 
         :raise SystemExit: If the socket fails to connect
         """
+        with contextlib.ExitStack() as stack:
+            # Attachments are only held while the server runs
+            stack.callback(self.attachments.close)
+            try:
+                welcoming_sockets = self.open_welcoming_sockets(stack)
+                if self.replication_port is not None:
+                    replication_socket = stack.enter_context(socket.socket())
+                    replication_socket.bind((self.hostname, self.replication_port))
+                    replication_socket.listen(self.listen_backlog)
+                    logger.info("Accepting followers on port %s", self.replication_port)
+            except OSError as error:
+                logger.error(error)
+                print("Error binding socket on provided port")
+                raise SystemExit from error
+
+            if self.import_path is not None:
+                self.import_messages(self.import_path)
+            if self.export_path is not None:
+                # Callbacks run in reverse, so this runs once serving has stopped
+                stack.callback(self.export_messages, self.export_path)
+
+            if self.capture_path is not None:
+                try:
+                    self.capture = CaptureWriter(self.capture_path)
+                except OSError as error:
+                    logger.error(error)
+                    print("Error creating capture file")
+                    raise SystemExit from error
+                stack.callback(self.capture.close)
+                logger.info("Capturing requests to %s", self.capture_path)
+
+            if self.processes:
+                self.process_pool = ProcessPool(self.processes)
+                stack.callback(self.process_pool.close)
+
+            if self.engine == Engine.THREADS:
+                pool = WorkerPool(
+                    welcoming_sockets,
+                    self.handle_request,
+                    self.admission,
+                    self.timeouts,
+                    self.run_housekeeping,
+                    Server.HOUSEKEEPING_INTERVAL,
+                    self.threads,
+                )
+                stack.callback(pool.close)
+                pool.run()
+                return
+
+            event_loop = EventLoop(
+                welcoming_sockets,
+                self.handle_request,
+                self.admission,
+                self.timeouts,
+                self.run_housekeeping,
+                Server.HOUSEKEEPING_INTERVAL,
+            )
+            stack.callback(event_loop.close)
+            if self.process_pool is not None:
+                self.process_pool.attach(event_loop)
+            if self.cluster is not None:
+                self.cluster.attach(event_loop)
+                stack.callback(self.cluster.close)
+            if self.primary is not None:
+                self.primary.attach(event_loop, replication_socket)
+                stack.callback(self.primary.close)
+            if self.follower is not None:
+                self.follower.attach(event_loop)
+                stack.callback(self.follower.close)
+            event_loop.run()
+
+    def import_messages(self, path: str) -> None:
+        """Load the messages in a dump file into the store.
+
+        :param path: The path of the dump file.
+        :raise SystemExit: If the dump file cannot be read.
+        """
+        try:
+            transfer = import_store(self.store, path)
+        except (OSError, ValueError) as error:
+            logger.error(error)
+            print("Error importing messages")
+            raise SystemExit from error
+
+        logger.info("Imported %s from %s", transfer.describe(), path)
+        print(f"Imported {transfer.describe()}")
+        if transfer.skipped:
+            logger.warning("%s imported message(s) skipped", transfer.skipped)
+
+    def export_messages(self, path: str) -> None:
+        """Write every message in the store to a dump file.
+
+        :param path: The path of the dump file.
+        """
         try:
-            # Create a TCP/IP socket
-            with socket.socket() as welcoming_socket:
-                welcoming_socket.bind((self.hostname, self.port_number))
-                # A maximum, of five unprocessed connections are allowed
-                welcoming_socket.listen(5)
-                logger.info(
-                    "Server started on %s port %s", self.hostname, self.port_number
+            transfer = export_store(self.store, path)
+        except OSError as error:
+            logger.error(error)
+            print("Error exporting messages")
+            return
+
+        logger.info("Exported %s to %s", transfer.describe(), path)
+        print(f"Exported {transfer.describe()}")
+
+    def open_welcoming_sockets(
+        self, stack: contextlib.ExitStack
+    ) -> list[socket.socket]:
+        """Bind a welcoming socket to each address the server listens on.
+
+        :param stack: The exit stack that will close the sockets.
+        :return: The listening welcoming sockets.
+        :raise OSError: If a socket cannot be bound.
+        """
+        addresses = []
+        if self.listen_tcp:
+            addresses.append(ServerAddress(self.hostname, self.port_number))
+        if self.unix_socket_path:
+            addresses.append(
+                ServerAddress(ServerAddress.UNIX_PREFIX + self.unix_socket_path, 0)
+            )
+        return self.bind_welcoming_sockets(stack, addresses, self.listen_backlog)
+
+    @staticmethod
+    def bind_welcoming_sockets(
+        stack: contextlib.ExitStack,
+        addresses: list[ServerAddress],
+        listen_backlog: int,
+    ) -> list[socket.socket]:
+        """Bind a listening welcoming socket to each of the given addresses.
+
+        :param stack: The exit stack that will close the sockets.
+        :param addresses: The addresses to listen on.
+        :param listen_backlog: The most connections waiting to be accepted.
+        :return: The listening welcoming sockets.
+        :raise OSError: If a socket cannot be bound.
+        """
+        welcoming_sockets = []
+        for address in addresses:
+            welcoming_socket = stack.enter_context(address.create_socket())
+            if address.family == socket.AF_UNIX:
+                Server.remove_stale_unix_socket(address.unix_path)
+                welcoming_socket.bind(address.socket_address)
+                stack.callback(os.remove, address.unix_path)
+            else:
+                welcoming_socket.bind(address.socket_address)
+
+            welcoming_socket.listen(listen_backlog)
+            welcoming_socket.setblocking(False)
+            welcoming_sockets.append(welcoming_socket)
+
+            logger.info("Server started on %s", address)
+            print(f"starting up on {address}")
+
+        return welcoming_sockets
+
+    @staticmethod
+    def remove_stale_unix_socket(path: str) -> None:
+        """Remove a Unix socket file left behind by a previous server.
+
+        :param path: The path of the socket file.
+        """
+        try:
+            if stat.S_ISSOCK(os.stat(path).st_mode):
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def run_housekeeping(self) -> None:
+        """Expire old messages and periodically report the store's statistics."""
+        expired = self.store.expire()
+        if expired:
+            logger.info("%s message(s) expired", expired)
+        # Such as those of messages which expired or were acknowledged
+        removed = self.attachments.sweep(self.store.holds)
+        if removed:
+            logger.info("%s attachment(s) removed", removed)
+
+        if self.primary is not None:
+            self.primary.heartbeat()
+        header_timeout = self.timeouts[ConnectionPhase.READ_HEADER]
+        if self.cluster is not None and header_timeout:
+            # Before the other nodes close the links for being idle
+            self.cluster.heartbeat(header_timeout / 2)
+        if self.follower is not None:
+            self.follower.connect()
+
+        now = time.monotonic()
+        if self.stats_interval and now >= self.next_stats_report:
+            logger.info("Mailbox store statistics: %s", self.store.stats)
+            if self.primary is not None:
+                logger.info("Replication statistics: %s", self.primary.stats)
+            if self.follower is not None:
+                logger.info("Replication statistics: %s", self.follower.stats)
+            if self.dedup is not None:
+                logger.info("Duplicate detection statistics: %s", self.dedup.stats)
+            if self.process_pool is not None:
+                logger.info("Process pool statistics: %s", self.process_pool.stats)
+            logger.info("Attachment spool statistics: %s", self.attachments.stats)
+            if self.peek_cache is not None:
+                logger.info("Peek cache statistics: %s", self.peek_cache.stats)
+            self.next_stats_report = now + self.stats_interval
+
+    def handle_request(
+        self, packet: bytes, connection: Optional[Connection] = None
+    ) -> Union[bytes, PendingResponse, StreamedResponse, None]:
+        """Serve a single message request, capturing it if asked to.
+
+        Requests forwarded to another node are captured as soon as they
+        are sent on, so their service time leaves out the other node's.
+
+        :param packet: The message request packet received from a client.
+        :param connection: The connection the request arrived on.
+        :return: The response to send to the client, if any.
+        """
+        if self.capture is None:
+            return self.serve_request(packet, connection)
+
+        arrived = time.monotonic()
+        response = self.serve_request(packet, connection)
+        self.capture.record(packet, arrived, time.monotonic() - arrived)
+        return response
+
+    def serve_request(  # noqa: PLR0911
+        self, packet: bytes, connection: Optional[Connection] = None
+    ) -> Union[bytes, PendingResponse, StreamedResponse, None]:
+        """Serve a single message request.
+
+        :param packet: The message request packet received from a client.
+        :param connection: The connection the request arrived on.
+        :return: The response to send to the client, if any.
+        """
+        try:
+            peeked_type: Optional[MessageType] = Packet.peek_message_type(packet)
+        except ValueError:
+            peeked_type = None
+
+        # Health checks are answered before anything else is looked at
+        if peeked_type == MessageType.PING:
+            return ResultResponse(ResultCode.OK).to_bytes()
+
+        # Chunks are admitted with the attachment they belong to
+        if peeked_type == MessageType.CHUNK:
+            return self.serve_chunk_request(packet, connection)
+
+        # Shed load before spending any time decoding the request, leaving
+        # requests for another node's mailboxes to be admitted there
+        if self.cluster is None or self.cluster.admits_locally(packet):
+            result_code = self.admission.admit_request(packet)
+            if result_code is not None:
+                return ResultResponse(result_code).to_bytes()
+
+        try:
+            request_fields = MessageRequest.decode_packet(packet)
+            if connection is not None and connection.request_options is not None:
+                options = connection.request_options
+            else:
+                options = MessageRequest.decode_options(packet)
+        except ValueError as error:
+            logger.error(error)
+            print("Message request discarded")
+            if connection is not None and connection.persistent:
+                return ResultResponse(ResultCode.INVALID).to_bytes()
+            return None
+
+        response = self.dispatch_request(request_fields, options, packet, connection)
+        if (
+            response is None
+            and connection is not None
+            and self.is_forwarded(options, connection)
+        ):
+            # The node which forwarded the request matches each response to
+            # the oldest request it is waiting on, so every one is answered
+            return ResultResponse(ResultCode.INVALID).to_bytes()
+        return response
+
+    def is_forwarded(
+        self, options: dict[RequestOption, Any], connection: Connection
+    ) -> bool:
+        """Check whether a request was forwarded by another node of the cluster.
+
+        The option is only trusted from the cluster's own nodes, so that no
+        client can skip routing by claiming its requests were forwarded.
+
+        :param options: The options attached to the request.
+        :param connection: The connection the request arrived on.
+        :return: ``True`` if the request should be served as forwarded.
+        """
+        return (
+            RequestOption.FORWARDED in options
+            and self.cluster is not None
+            and self.cluster.is_peer(connection.client_address)
+        )
+
+    def dispatch_request(  # noqa: PLR0911, PLR0912
+        self,
+        request_fields: tuple[MessageType, str, str, bytes],
+        options: dict[RequestOption, Any],
+        packet: bytes,
+        connection: Optional[Connection],
+    ) -> Union[bytes, PendingResponse, StreamedResponse, None]:
+        """Serve a decoded message request, or forward it to the node it is for.
+
+        :param request_fields: The type of the request, the names of its
+            sender and receiver, and its message.
+        :param options: The options attached to the request.
+        :param packet: The message request packet received from a client.
+        :param connection: The connection the request arrived on.
+        :return: The response to send to the client, if any.
+        """
+        message_type, sender_name, receiver_name, message = request_fields
+        if message_type == MessageType.CREATE and RequestOption.ATTACHMENT in options:
+            return self.start_upload(
+                sender_name, receiver_name, message, options, connection
+            )
+
+        if message_type == MessageType.BULK_READ:
+            return self.serve_bulk_read_request(
+                sender_name,
+                message,
+                options,
+                None if connection is None else connection.unsent_reads,
+            )
+
+        read_cursors = {} if connection is None else connection.read_cursors
+        if connection is not None and self.is_forwarded(options, connection):
+            connection.persistent = True
+            read_cursors = connection.client_cursors(options[RequestOption.FORWARDED])
+        elif self.cluster is not None:
+            node_name = self.cluster.request_owner(
+                message_type.value, sender_name.encode(), receiver_name.encode()
+            )
+            if node_name != self.cluster.local_name:
+                logger.info("Forwarding request from %s to %s", sender_name, node_name)
+                return self.cluster.forward(
+                    node_name,
+                    packet,
+                    options,
+                    0 if connection is None else connection.number,
+                )
+
+        if message_type == MessageType.READ:
+            # Only the primary removes delivered messages, and followers copy it
+            if RequestOption.WINDOW in options:
+                return self.process_windowed_read_request(
+                    sender_name,
+                    options[RequestOption.WINDOW],
+                    options.get(RequestOption.ACKNOWLEDGE_SEQUENCE),
+                    read_cursors,
+                )
+            return self.process_read_request(
+                sender_name,
+                drain=self.follower is None,
+                unsent_reads=None if connection is None else connection.unsent_reads,
+            )
+
+        if message_type == MessageType.STATUS:
+            return self.process_status_request(sender_name)
+
+        if message_type == MessageType.PEEK:
+            return self.process_peek_request(sender_name)
+
+        if message_type == MessageType.SEARCH:
+            return self.process_search_request(
+                sender_name, message, options.get(RequestOption.SEARCH_AFTER, 0)
+            )
+
+        if message_type == MessageType.CREATE:
+            if self.follower is not None:
+                return ResultResponse(ResultCode.READ_ONLY).to_bytes()
+
+            # Repeats of a message are sent to the same mailbox, so holding its
+            # lock keeps them from being checked for at the same time
+            with self.store.locked(receiver_name):
+                return self.serve_create_request(
+                    sender_name, receiver_name, message, options
+                )
+
+        return None
+
+    def start_upload(  # noqa: PLR0913
+        self,
+        sender_name: str,
+        receiver_name: str,
+        message: bytes,
+        options: dict[RequestOption, Any],
+        connection: Optional[Connection],
+    ) -> Optional[bytes]:
+        """Start receiving the attachment of a `create` request.
+
+        The attachment's chunks follow the request on its connection, and
+        the request is answered once the last of them has arrived. Chunks
+        of an attachment which is refused are read and thrown away.
+
+        :param sender_name: The name of the user who sent the `create` request.
+        :param receiver_name: The name of the user who will receive the message.
+        :param message: The message the attachment belongs to.
+        :param options: The options attached to the request.
+        :param connection: The connection the attachment will arrive on.
+        :return: The response to send to the client, if any.
+        """
+        size = options[RequestOption.ATTACHMENT]
+        if connection is None:
+            return ResultResponse(ResultCode.UNAVAILABLE).to_bytes()
+        if connection.upload is not None:
+            logger.error(
+                "Attachment from %s ended early", connection.upload.sender_name
+            )
+            connection.upload.abort()
+            connection.upload = None
+
+        result_code = None
+        if self.follower is not None:
+            result_code = ResultCode.READ_ONLY
+        elif not self.attachments.accepts(size):
+            result_code = ResultCode.TOO_LARGE
+        elif (
+            self.cluster is not None
+            and self.cluster.owner(receiver_name.encode()) != self.cluster.local_name
+        ):
+            # Attachments are stored where they arrive, so are never forwarded
+            result_code = ResultCode.UNAVAILABLE
+        else:
+            try:
+                upload = self.attachments.start(
+                    sender_name, receiver_name, message, options, size
                 )
-                print(f"starting up on {self.hostname} port {self.port_number}")
+            except OSError as error:
+                logger.error("Unable to spool attachment: %s", error)
+                result_code = ResultCode.STORE_FULL
 
-                while True:
-                    self.run_server(welcoming_socket)
+        if result_code is not None:
+            logger.error("Attachment from %s refused", sender_name)
+            print("Message discarded:", result_code.description)
+            upload = Upload(sender_name, receiver_name, message, options, size)
+            connection.upload = None if upload.complete else upload
+            return ResultResponse(result_code).to_bytes()
 
+        logger.info("Receiving %s byte attachment from %s", size, sender_name)
+        connection.upload = upload
+        if upload.complete:
+            return self.finish_upload(connection)
+        return None
+
+    def serve_chunk_request(
+        self, packet: bytes, connection: Optional[Connection]
+    ) -> Optional[bytes]:
+        """Write a chunk of an attachment to its spool file.
+
+        :param packet: The chunk request packet received from a client.
+        :param connection: The connection the chunk arrived on.
+        :return: The response to the attachment's `create` request, once
+            its last chunk has arrived or it could not be stored.
+        """
+        try:
+            _, sender_name, _, data = MessageRequest.decode_packet(packet)
+        except ValueError as error:
+            logger.error(error)
+            print("Message request discarded")
+            return None
+
+        upload = None if connection is None else connection.upload
+        if upload is None or sender_name != upload.sender_name:
+            logger.error("Received chunk from %s without an attachment", sender_name)
+            print("Message request discarded")
+            return None
+        assert connection is not None
+
+        # Chunks are admitted like any other request, until the attachment
+        # is refused and the rest of its chunks are thrown away
+        result_code = None
+        if upload.file is not None:
+            result_code = self.admission.admit_request(packet)
+            if result_code is not None:
+                logger.error("Attachment from %s refused", sender_name)
+                upload.abort()
+
+        try:
+            upload.write(data)
+        except ValueError as error:
+            logger.error(error)
+            print("Message request discarded")
+            upload.abort()
+            connection.upload = None
+            return None
         except OSError as error:
+            # The rest of the attachment is still read, so it can be thrown away
+            logger.error("Unable to spool attachment: %s", error)
+            upload.abort()
+            result_code = ResultCode.STORE_FULL
+
+        if result_code is not None:
+            if upload.complete:
+                connection.upload = None
+            return ResultResponse(result_code).to_bytes()
+        if upload.complete:
+            return self.finish_upload(connection)
+        return None
+
+    def finish_upload(self, connection: Connection) -> Optional[bytes]:
+        """Store the message an attachment belongs to, once it has all arrived.
+
+        :param connection: The connection the attachment arrived on.
+        :return: The response to the attachment's `create` request, if any.
+        """
+        upload = connection.upload
+        assert upload is not None
+        connection.upload = None
+        if upload.path is None:
+            # Refused or failed, and already answered
+            return None
+
+        try:
+            with self.store.locked(upload.receiver_name):
+                return self.serve_create_request(
+                    upload.sender_name,
+                    upload.receiver_name,
+                    upload.message,
+                    upload.options,
+                    upload,
+                )
+        finally:
+            # Unless the spool has taken the attachment
+            upload.abort()
+
+    def serve_create_request(  # noqa: PLR0913
+        self,
+        sender_name: str,
+        receiver_name: str,
+        message: bytes,
+        options: dict[RequestOption, Any],
+        upload: Optional[Upload] = None,
+    ) -> Optional[bytes]:
+        """Store a message unless it repeats one already stored.
+
+        :param sender_name: The name of the user who sent the `create` request.
+        :param receiver_name: The name of the user who will receive the message.
+        :param message: The message to be sent.
+        :param options: The options attached to the request.
+        :param upload: The message's attachment, once it has all arrived.
+        :return: The response to send to the client, if any.
+        """
+        idempotency_key = options.get(RequestOption.IDEMPOTENCY_KEY)
+        if idempotency_key is not None and self.dedup is not None:
+            # Keys are chosen by each sender, so only unique to that sender
+            idempotency_key = sender_name.encode() + b"\0" + idempotency_key
+            if self.dedup.is_duplicate(idempotency_key):
+                logger.info("Ignoring repeated message from %s", sender_name)
+                if RequestOption.ACKNOWLEDGE in options:
+                    return ResultResponse(ResultCode.OK).to_bytes()
+                return None
+            if self.dedup.is_probable_duplicate(idempotency_key):
+                logger.warning("Ignoring probable repeat from %s", sender_name)
+                return ResultResponse(ResultCode.DUPLICATE).to_bytes()
+
+        try:
+            self.process_create_request(
+                sender_name,
+                receiver_name,
+                message,
+                options.get(RequestOption.TIME_TO_LIVE),
+                options.get(RequestOption.PRIORITY, 0),
+                upload,
+            )
+        except QuotaExceededError as error:
             logger.error(error)
-            print("Error binding socket on provided port")
-            raise SystemExit from error
+            print("Message discarded:", error)
+            return ResultResponse(error.result_code).to_bytes()
+
+        if idempotency_key is not None and self.dedup is not None:
+            self.dedup.add(idempotency_key)
+        if RequestOption.ACKNOWLEDGE in options:
+            return ResultResponse(ResultCode.OK).to_bytes()
+
+        return None
 
     def process_read_request(
-        self, connection_socket: socket.socket, sender_name: str
-    ) -> None:
+        self,
+        sender_name: str,
+        drain: bool = True,
+        unsent_reads: Optional[dict[str, dict[int, int]]] = None,
+    ) -> Union[bytes, StreamedResponse]:
         """Respond to read requests.
 
         :param sender_name: The name of the user who sent the read request.
-        :param connection_socket: The connection socket to send the response on.
-        :return: The response to the read request.
+        :param drain: Whether to remove the delivered messages from the mailbox.
+        :param unsent_reads: How far the connection's pages not yet sent
+            have read through each mailbox, if it has any.
+        :return: The response to the read request, followed by the
+            attachments of the messages delivered, if they have any.
+        """
+        num_messages, record = self.deliver_page(sender_name, drain, unsent_reads)
+        logger.info("%s message(s) delivered to %s", num_messages, sender_name)
+        print(f"{num_messages} message(s) delivered to {sender_name}")
+
+        return record
+
+    def deliver_page(
+        self,
+        sender_name: str,
+        drain: bool,
+        unsent_reads: Optional[dict[str, dict[int, int]]] = None,
+    ) -> tuple[int, Union[bytes, StreamedResponse]]:
+        """Encode the next page of a mailbox, to remove the messages in it once sent.
+
+        The messages stay in the mailbox until the page has been sent, so a
+        reader which disconnects first is sent them again by its next read.
+
+        :param sender_name: The name of the user whose mailbox to read.
+        :param drain: Whether to remove the delivered messages from the mailbox.
+        :param unsent_reads: The sequence number of the last message in each
+            lane of the pages queued on the connection but not yet sent, by
+            mailbox name, so a page is never followed by the same messages.
+        :return: The number of messages in the page, and the page followed
+            by the attachments of its messages, if they have any.
         """
-        response = MessageResponse(self.messages.get(sender_name, []))
+        queued = {} if unsent_reads is None else unsent_reads.get(sender_name, {})
+        with self.store.locked(sender_name):
+            stored_messages = self.store.peek(
+                sender_name, MessageResponse.MAX_MESSAGE_LENGTH + 1, queued
+            )
+        delivered = stored_messages[: MessageResponse.MAX_MESSAGE_LENGTH]
+        attachments = self.open_attachments(sender_name, delivered)
+        response = MessageResponse.from_encoded(
+            [stored_message.encode() for stored_message in stored_messages],
+            attachment_sizes=[(index, span.size) for index, span in attachments],
+        )
         record = response.to_bytes()
-        connection_socket.send(record)
-        del self.messages.get(sender_name, [])[: response.num_messages]
+        if not drain:
+            return response.num_messages, self.attach_files(record, attachments)
+
+        last_sent = dict(queued)
+        for stored_message in delivered:
+            last_sent[stored_message.priority] = stored_message.sequence
+        if unsent_reads is not None and delivered:
+            unsent_reads[sender_name] = last_sent
+
+        def remove_sent() -> None:
+            self.remove_delivered(sender_name, last_sent)
+            for stored_message in delivered:
+                self.attachments.discard(sender_name, stored_message.sequence)
+            if unsent_reads is not None and unsent_reads.get(sender_name) is last_sent:
+                del unsent_reads[sender_name]
+
+        return response.num_messages, StreamedResponse(
+            [record] + [span for _, span in attachments], on_sent=remove_sent
+        )
+
+    def remove_delivered(
+        self, sender_name: str, last_sent: Union[int, dict[int, int]]
+    ) -> int:
+        """Remove the messages a reader has been sent, or has acknowledged.
+
+        :param sender_name: The name of the user whose mailbox to drain.
+        :param last_sent: The sequence number of the last message sent from
+            each lane of the mailbox, by priority, or of the last message to
+            remove from every lane.
+        :return: The number of messages removed.
+        """
+        with self.store.locked(sender_name):
+            removed = self.store.acknowledge(sender_name, last_sent)
+            if self.peek_cache is not None:
+                self.peek_cache.messages_removed(
+                    sender_name,
+                    lambda priority, sequence: sequence
+                    <= (
+                        last_sent
+                        if isinstance(last_sent, int)
+                        else last_sent.get(priority, 0)
+                    ),
+                    removed,
+                    self.store.mailbox_size(sender_name),
+                )
+        return removed
+
+    def serve_bulk_read_request(
+        self,
+        gateway_name: str,
+        message: bytes,
+        options: dict[RequestOption, Any],
+        unsent_reads: Optional[dict[str, dict[int, int]]] = None,
+    ) -> Union[bytes, StreamedResponse, None]:
+        """Check that a bulk read is allowed, before serving it.
+
+        :param gateway_name: The name the gateway sent the request as.
+        :param message: The names of the users whose mailboxes to read.
+        :param options: The options attached to the request.
+        :param unsent_reads: How far the connection's pages not yet sent
+            reach into each mailbox.
+        :return: The response to send to the gateway, if any.
+        """
+        gateway_key = options.get(RequestOption.GATEWAY_KEY)
+        if (
+            self.gateway_key is None
+            or gateway_key is None
+            or not hmac.compare_digest(gateway_key, self.gateway_key)
+        ):
+            logger.warning(
+                "Refused bulk read from %s without a valid key", gateway_name
+            )
+            return ResultResponse(ResultCode.FORBIDDEN).to_bytes()
+
+        try:
+            user_names = MessageRequest.split_names(message)
+        except ValueError as error:
+            logger.error(error)
+            print("Message request discarded")
+            return None
+
+        # The responses of every user are sent together, so are never forwarded
+        if self.cluster is not None and any(
+            self.cluster.owner(user_name.encode()) != self.cluster.local_name
+            for user_name in user_names
+        ):
+            return ResultResponse(ResultCode.UNAVAILABLE).to_bytes()
+
+        return self.process_bulk_read_request(gateway_name, user_names, unsent_reads)
+
+    def process_bulk_read_request(
+        self,
+        gateway_name: str,
+        user_names: list[str],
+        unsent_reads: Optional[dict[str, dict[int, int]]] = None,
+    ) -> StreamedResponse:
+        """Respond to bulk read requests, reading many users' mailboxes at once.
+
+        Each user is sent the page a read request of their own would be,
+        one after another in the order they were listed. Each page is
+        queued as it is encoded, and its messages are removed as soon as
+        it has been sent, rather than once every page has.
+
+        :param gateway_name: The name the gateway sent the request as.
+        :param user_names: The names of the users whose mailboxes to read.
+        :param unsent_reads: How far the connection's pages not yet sent
+            reach into each mailbox.
+        :return: A message response for each user, each followed by the
+            attachments of the messages it holds.
+        """
+        parts: list[Union[bytes, FileSpan, Callable[[], None]]] = []
+        delivered = 0
+        for user_name in user_names:
+            # Only the primary removes delivered messages, and followers copy it
+            num_messages, record = self.deliver_page(
+                user_name, self.follower is None, unsent_reads
+            )
+            delivered += num_messages
+            if isinstance(record, StreamedResponse):
+                parts.extend(record.parts)
+                if record.on_sent is not None:
+                    parts.append(record.on_sent)
+            else:
+                parts.append(record)
         logger.info(
-            "%s message(s) delivered to %s",
-            response.num_messages,
+            "%s message(s) delivered to %s user(s) for %s",
+            delivered,
+            len(user_names),
+            gateway_name,
+        )
+        return StreamedResponse(parts)
+
+    def process_peek_request(self, sender_name: str) -> bytes:
+        """Respond to peek requests, leaving the messages sent in the mailbox.
+
+        The encoded page is cached, so peeking again at a mailbox which
+        has not changed sends it again as it is.
+
+        :param sender_name: The name of the user who sent the peek request.
+        :return: The first page of messages in the mailbox.
+        """
+        with self.store.locked(sender_name):
+            if self.peek_cache is not None:
+                record = self.peek_cache.get(
+                    sender_name, self.store.mailbox_size(sender_name)
+                )
+                if record is not None:
+                    logger.info("Cached page sent to %s", sender_name)
+                    return record
+
+            stored_messages = self.store.peek(
+                sender_name, MessageResponse.MAX_MESSAGE_LENGTH + 1
+            )
+            logger.info(
+                "%s message(s) shown to %s",
+                min(len(stored_messages), MessageResponse.MAX_MESSAGE_LENGTH),
+                sender_name,
+            )
+            if self.peek_cache is not None:
+                return self.peek_cache.put(
+                    sender_name, self.store.mailbox_size(sender_name), stored_messages
+                )
+            return MessageResponse.from_encoded(
+                [stored_message.encode() for stored_message in stored_messages]
+            ).to_bytes()
+
+    def open_attachments(
+        self, receiver_name: str, stored_messages: list[StoredMessage]
+    ) -> list[tuple[int, FileSpan]]:
+        """Open the attachments of a page of messages, to be sent after it.
+
+        :param receiver_name: The name of the user whose mailbox holds the messages.
+        :param stored_messages: The messages in the page, in the order sent.
+        :return: The position in the page of each message with an attachment,
+            and its attachment opened to be sent, in order.
+        """
+        attachments = []
+        for index, stored_message in enumerate(stored_messages):
+            attachment = self.attachments.find(receiver_name, stored_message.sequence)
+            if attachment is None:
+                continue
+            try:
+                attachments.append((index, attachment.open()))
+            except OSError as error:
+                logger.error("Unable to open attachment %s: %s", attachment.path, error)
+        return attachments
+
+    @staticmethod
+    def attach_files(
+        record: bytes, attachments: list[tuple[int, FileSpan]]
+    ) -> Union[bytes, StreamedResponse]:
+        """Follow a response with the attachments of the messages it holds.
+
+        :param record: The encoded response.
+        :param attachments: The attachments opened to be sent, in order.
+        :return: The response as it is, if there are no attachments.
+        """
+        if not attachments:
+            return record
+        return StreamedResponse([record] + [span for _, span in attachments])
+
+    def process_status_request(self, sender_name: str) -> bytes:
+        """Respond to status requests, without delivering any messages.
+
+        :param sender_name: The name of the user who sent the status request.
+        :return: The response to the status request.
+        """
+        message_count, byte_count, oldest_age = self.store.mailbox_status(sender_name)
+        logger.info("%s message(s) waiting for %s", message_count, sender_name)
+        return StatusResponse(message_count, byte_count, oldest_age).to_bytes()
+
+    def process_search_request(
+        self, sender_name: str, query: bytes, after_sequence: int
+    ) -> Union[bytes, PendingResponse]:
+        """Respond to search requests, without delivering the messages found.
+
+        The response's sequence number is that of the last match it holds,
+        so the client can ask for the next page of matches by sending it
+        back as the request's ``SEARCH_AFTER`` option. Searches which have
+        to read through a large mailbox are run in the process pool.
+
+        :param sender_name: The name of the user who sent the search request.
+        :param query: The words every matching message must contain.
+        :param after_sequence: Skip matches numbered up to and including this.
+        :return: A page of the oldest matching messages.
+        """
+        words = words_in(query)
+        if (
+            words
+            and self.process_pool is not None
+            and self.store.mailbox_size(sender_name) >= Server.OFFLOAD_MIN_MESSAGES
+        ):
+            with self.store.locked(sender_name):
+                candidates = self.store.search_candidates(
+                    sender_name, after_sequence, Server.OFFLOAD_SLICE_MESSAGES
+                )
+            if candidates is not None:
+                return self.offload_search(
+                    sender_name, words, after_sequence, candidates
+                )
+
+        return self.search_mailbox(sender_name, words, after_sequence)
+
+    def search_mailbox(
+        self, sender_name: str, words: set[str], after_sequence: int
+    ) -> bytes:
+        """Search through a mailbox's messages on this thread.
+
+        :param sender_name: The name of the user who sent the search request.
+        :param words: The words every matching message must contain.
+        :param after_sequence: Skip matches numbered up to and including this.
+        :return: A page of the oldest matching messages.
+        """
+        # The messages are encoded before another thread can take them
+        with self.store.locked(sender_name):
+            stored_messages = []
+            if words:
+                stored_messages = self.store.search(
+                    sender_name,
+                    words,
+                    MessageResponse.MAX_MESSAGE_LENGTH + 1,
+                    after_sequence,
+                )
+            return self.encode_search_page(sender_name, stored_messages, after_sequence)
+
+    def offload_search(
+        self,
+        sender_name: str,
+        words: set[str],
+        after_sequence: int,
+        candidates: tuple[list[int], list[bytearray], Optional[int]],
+    ) -> Union[bytes, PendingResponse]:
+        """Search through a mailbox's messages in the process pool.
+
+        The messages are copied out of the store a slice at a time, each
+        searched by a job of its own, so the store can carry on changing
+        while they are searched. On the event loop, each slice after the
+        first is copied on a later pass, so other connections are served
+        in between. Matches which have left the mailbox by the time the
+        search finishes are left out of the page.
+
+        :param sender_name: The name of the user who sent the search request.
+        :param words: The words every matching message must contain.
+        :param after_sequence: Skip matches numbered up to and including this.
+        :param candidates: The first slice of messages to search, as given
+            by ``search_candidates``.
+        :return: A page of the oldest matching messages, which is pending
+            until the search finishes if served by the event loop.
+        """
+        process_pool = self.process_pool
+        assert process_pool is not None
+        # One more match than fits in a page tells whether there are more
+        count = MessageResponse.MAX_MESSAGE_LENGTH + 1
+        # Each slice's job, and the sequence numbers of the messages it searches
+        jobs: list[tuple[Future[Any], list[int]]] = []
+
+        def search_slice(
+            candidates: tuple[list[int], list[bytearray], Optional[int]],
+        ) -> Optional[int]:
+            sequences, bodies, read_until = candidates
+            future = process_pool.submit(
+                find_packed, packed_parts(bodies), words, count
+            )
+            jobs.append((future, sequences))
+            return read_until
+
+        def next_candidates(
+            read_until: int,
+        ) -> Optional[tuple[list[int], list[bytearray], Optional[int]]]:
+            with self.store.locked(sender_name):
+                return self.store.search_candidates(
+                    sender_name, read_until, Server.OFFLOAD_SLICE_MESSAGES
+                )
+
+        def finish_search() -> bytes:
+            try:
+                matches = [
+                    sequences[position]
+                    for future, sequences in jobs
+                    for position in future.result()
+                ][:count]
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                # Such as a worker process dying, so search here instead
+                logger.error("Search in process pool failed: %s", error)
+                return self.search_mailbox(sender_name, words, after_sequence)
+
+            with self.store.locked(sender_name):
+                stored_messages = self.store.find_messages(sender_name, matches)
+                return self.encode_search_page(
+                    sender_name,
+                    stored_messages,
+                    after_sequence,
+                    more_messages=len(matches) == count,
+                )
+
+        read_until = search_slice(candidates)
+        if process_pool.event_loop is None:
+            # Worker threads wait for the search, leaving the others to serve
+            while read_until is not None:
+                candidates_left = next_candidates(read_until)
+                if candidates_left is None:
+                    # The search index has caught up with the mailbox
+                    return self.search_mailbox(sender_name, words, after_sequence)
+                read_until = search_slice(candidates_left)
+            return finish_search()
+
+        response = PendingResponse()
+
+        def wait_for_jobs(index: int) -> None:
+            if index == len(jobs):
+                response.resolve(finish_search())
+            else:
+                process_pool.when_done(jobs[index][0], lambda: wait_for_jobs(index + 1))
+
+        def carry_on(read_until: Optional[int]) -> None:
+            if read_until is None:
+                wait_for_jobs(0)
+            else:
+                process_pool.finish(lambda: read_slice(read_until))
+
+        def read_slice(read_until: int) -> None:
+            candidates_left = next_candidates(read_until)
+            if candidates_left is None:
+                response.resolve(
+                    self.search_mailbox(sender_name, words, after_sequence)
+                )
+            else:
+                carry_on(search_slice(candidates_left))
+
+        carry_on(read_until)
+        return response
+
+    @staticmethod
+    def encode_search_page(
+        sender_name: str,
+        stored_messages: list[StoredMessage],
+        after_sequence: int,
+        more_messages: Optional[bool] = None,
+    ) -> bytes:
+        """Encode the matches found by a search as a page of messages.
+
+        :param sender_name: The name of the user who sent the search request.
+        :param stored_messages: The matching messages, one more than fit in
+            a page if there are more to come.
+        :param after_sequence: The sequence number the search started after.
+        :param more_messages: Whether more matches were found than fit in
+            a page, or ``None`` to tell from ``stored_messages``.
+        :return: The message response.
+        """
+        page_messages = stored_messages[: MessageResponse.MAX_MESSAGE_LENGTH]
+        response = MessageResponse.from_encoded(
+            [stored_message.encode() for stored_message in stored_messages],
+            last_sequence=(
+                page_messages[-1].sequence if page_messages else after_sequence
+            ),
+        )
+        if more_messages is not None:
+            response.more_messages = more_messages
+        logger.info("%s message(s) found for %s", response.num_messages, sender_name)
+        return response.to_bytes()
+
+    def process_windowed_read_request(
+        self,
+        sender_name: str,
+        window: int,
+        acknowledged: Optional[int],
+        read_cursors: dict[str, ReadCursor],
+    ) -> Union[bytes, StreamedResponse]:
+        """Respond to read requests which acknowledge the messages they receive.
+
+        Messages stay in the mailbox until acknowledged, so a reader which
+        disconnects part way through is sent them again next time. Several
+        pages may be sent without waiting for the first to be acknowledged.
+        A page is acknowledged by the sequence number of its last message.
+        Pages acknowledged on the connection they were sent on remove
+        exactly the messages sent in them. Otherwise, such as once a
+        reader has reconnected, every message numbered up to the
+        acknowledged one is removed, whichever lane it is in.
+
+        :param sender_name: The name of the user who sent the read request.
+        :param window: The number of pages of messages to send.
+        :param acknowledged: The sequence number of the last message the
+            reader has safely received, or ``None`` when starting to read.
+        :param read_cursors: How far each of the connection's readers has
+            been sent through their mailbox.
+        :return: The response to the read request, of up to ``window``
+            pages, or a single empty page if there was nothing to send, each
+            followed by its attachments.
+        """
+        with self.store.locked(sender_name):
+            cursor = read_cursors.get(sender_name)
+            acknowledged_lanes = (
+                None
+                if acknowledged is None or cursor is None
+                else cursor.acknowledge(acknowledged)
+            )
+            if cursor is None or acknowledged_lanes is None:
+                # Start again from the oldest unacknowledged message
+                cursor = read_cursors[sender_name] = ReadCursor()
+            if acknowledged is not None and self.follower is None:
+                removed = self.remove_delivered(
+                    sender_name,
+                    acknowledged if acknowledged_lanes is None else acknowledged_lanes,
+                )
+                logger.info("%s acknowledged %s message(s)", sender_name, removed)
+
+            page_size = MessageResponse.MAX_MESSAGE_LENGTH
+            stored_messages = []
+            if window:
+                stored_messages = self.store.peek(
+                    sender_name, window * page_size + 1, after_sequence=cursor.sent
+                )
+
+            pages = []
+            # The pages, each followed by its attachments
+            parts: list[Union[bytes, FileSpan]] = []
+            delivered = 0
+            last_sequence = acknowledged or 0
+            for page_number in range(max(window, 1)):
+                # One message beyond the page tells whether there are more to come
+                page_messages = stored_messages[
+                    page_number * page_size : (page_number + 1) * page_size + 1
+                ]
+                cursor.page_sent(page_messages[:page_size])
+                if page_messages:
+                    last_sequence = page_messages[:page_size][-1].sequence
+                attachments = self.open_attachments(
+                    sender_name, page_messages[:page_size]
+                )
+                response = MessageResponse.from_encoded(
+                    [stored_message.encode() for stored_message in page_messages],
+                    last_sequence=last_sequence,
+                    attachment_sizes=[
+                        (index, span.size) for index, span in attachments
+                    ],
+                )
+                pages.append(response.to_bytes())
+                parts.append(pages[-1])
+                parts.extend(span for _, span in attachments)
+                delivered += response.num_messages
+                if not response.more_messages:
+                    break
+
+        logger.info(
+            "%s message(s) delivered to %s in %s page(s)",
+            delivered,
             sender_name,
+            len(pages),
         )
-        print(f"{response.num_messages} message(s) delivered to {sender_name}")
+        print(f"{delivered} message(s) delivered to {sender_name}")
+
+        if len(parts) > len(pages):
+            return StreamedResponse(parts)
+        return b"".join(pages)
 
-    def process_create_request(
-        self, sender_name: str, receiver_name: str, message: bytes
+    def process_create_request(  # noqa: PLR0913
+        self,
+        sender_name: str,
+        receiver_name: str,
+        message: bytes,
+        time_to_live: Optional[float] = None,
+        priority: int = 0,
+        upload: Optional[Upload] = None,
     ) -> None:
         """Process `create` requests.
 
         :param sender_name: The name of the user who sent the `create` request.
         :param receiver_name: The name of the user who will receive the message.
         :param message: The message to be sent.
+        :param time_to_live: The number of seconds to keep the message for,
+            or ``None`` to use the server's default.
+        :param priority: How urgently the message is to be delivered.
+        :param upload: The message's attachment, once it has all arrived.
+        :raises QuotaExceededError: If there is no room to store the message.
         """
-        if receiver_name not in self.messages:
-            self.messages[receiver_name] = []
-
-        self.messages[receiver_name].append((sender_name, message))
+        # A cached page is updated before another thread can peek at it
+        with self.store.locked(receiver_name):
+            sequence = self.store.add(
+                receiver_name, sender_name, message, time_to_live, priority=priority
+            )
+            if self.peek_cache is not None and receiver_name in self.peek_cache:
+                self.peek_cache.messages_added(
+                    receiver_name,
+                    self.store.find_messages(receiver_name, [sequence]),
+                    self.store.mailbox_size(receiver_name),
+                )
+        if upload is not None:
+            self.attachments.register(receiver_name, sequence, upload)
         logger.info(
             'Storing %s\'s message to %s: "%s"',
             sender_name,
@@ -101,33 +1453,4 @@ class Server(CommandLineApplication):
             f"{sender_name} sends the message "
             f'"{message.decode()}" to {receiver_name}'
         )
-
-    def run_server(self, welcoming_socket: socket.socket) -> None:
-        """Run the server side of the program.
-
-        :param welcoming_socket: The welcoming socket to accept connections on
-        """
-        connection_socket, client_address = welcoming_socket.accept()
-        connection_socket.settimeout(1)
-
-        logger.info("New client connection from %s", client_address)
-        print("New client connection from", client_address)
-
-        try:
-            with connection_socket:
-                record = connection_socket.recv(4096)
-                request_fields = MessageRequest.decode_packet(record)
-                message_type, sender_name, receiver_name, message = request_fields
-
-                if message_type == MessageType.READ:
-                    self.process_read_request(connection_socket, sender_name)
-
-                elif message_type == MessageType.CREATE:
-                    self.process_create_request(sender_name, receiver_name, message)
-
-        except socket.timeout as error:
-            logger.error(error)
-            print("Timed out while waiting for message request")
-        except ValueError as error:
-            logger.error(error)
-            print("Message request discarded")
+        logger.debug("Mailbox store usage: %s", self.store.stats)
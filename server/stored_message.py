@@ -0,0 +1,122 @@
+"""Home to the ``StoredMessage`` class."""
+
+from typing import Optional
+import struct
+
+from src.packets.message import Message
+
+
+class StoredMessage:
+    """A message waiting in a mailbox to be read.
+
+    Mailboxes hold their messages in columns, and only read them out as
+    ``StoredMessage`` objects when they are needed. A message is ``held``
+    while it is deliverable. Messages which expire while in the middle of
+    a mailbox stop being held, and are left in place until they reach the
+    front of the mailbox.
+
+    Every message is numbered when it is stored, with numbers increasing
+    across the whole store, so readers can acknowledge the messages they
+    have received by the number of the last one. Messages sent with a
+    higher priority are delivered before any of lower priority.
+    """
+
+    __slots__ = (
+        "sender_name",
+        "encoded_sender_name",
+        "message",
+        "size",
+        "expires_at",
+        "stored_at",
+        "sequence",
+        "priority",
+        "held",
+    )
+
+    # The expiry time, storage time, sequence number and priority of a
+    # message, preceding its ``Message`` packet on disk
+    SPILL_HEADER = struct.Struct("!ddQB")
+
+    def __init__(  # noqa: PLR0913
+        self,
+        sender_name: str,
+        message: bytes,
+        expires_at: float = 0.0,
+        sequence: int = 0,
+        stored_at: float = 0.0,
+        encoded_sender_name: Optional[bytes] = None,
+        priority: int = 0,
+    ):
+        """Create a stored message.
+
+        :param sender_name: The name of the user who sent the message.
+        :param message: The message body.
+        :param expires_at: The time at which the message expires,
+            or zero if it never expires.
+        :param sequence: The message's sequence number.
+        :param stored_at: The time at which the message was first stored.
+        :param encoded_sender_name: The sender's name already encoded, or
+            ``None`` to encode it.
+        :param priority: How urgently the message is to be delivered.
+        """
+        self.sender_name = sender_name
+        self.encoded_sender_name = (
+            sender_name.encode() if encoded_sender_name is None else encoded_sender_name
+        )
+        self.message = message
+        self.size = Message.header_size() + len(self.encoded_sender_name) + len(message)
+        self.expires_at = expires_at
+        self.stored_at = stored_at
+        self.sequence = sequence
+        self.priority = priority
+        self.held = True
+
+    def has_expired(self, now: float) -> bool:
+        """Check whether the message's time to live has passed.
+
+        :param now: The current time, in seconds.
+        :return: ``True`` if the message has expired, otherwise ``False``.
+        """
+        return 0 < self.expires_at <= now
+
+    def encode(self) -> bytes:
+        """Encode the message as it is sent to its receiver.
+
+        :return: The message encoded as a ``Message`` packet.
+        """
+        return Message.pack(self.encoded_sender_name, self.message)
+
+    def to_bytes(self) -> bytes:
+        """Encode the message for spilling to disk.
+
+        :return: The encoded message.
+        """
+        return (
+            self.SPILL_HEADER.pack(
+                self.expires_at, self.stored_at, self.sequence, self.priority
+            )
+            + self.encode()
+        )
+
+    @classmethod
+    def unpack_from(cls, buffer: bytes, offset: int = 0) -> tuple["StoredMessage", int]:
+        """Decode a message encoded by ``to_bytes`` found within a buffer.
+
+        :param buffer: A buffer containing one or more encoded messages.
+        :param offset: The index at which the encoded message starts.
+        :return: The message, and the index immediately after it.
+        :raises ValueError: If the buffer ends part way through the message.
+        """
+        if len(buffer) < offset + cls.SPILL_HEADER.size:
+            raise ValueError("Buffer ends part way through a stored message")
+
+        expires_at, stored_at, sequence, priority = cls.SPILL_HEADER.unpack_from(
+            buffer, offset
+        )
+        sender_name, message, offset = Message.unpack_from(
+            buffer, offset + cls.SPILL_HEADER.size
+        )
+        stored_message = cls(
+            sender_name, message, expires_at, sequence, stored_at, priority=priority
+        )
+        return stored_message, offset
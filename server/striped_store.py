@@ -0,0 +1,373 @@
+"""Home to the ``StripedMailboxStore`` class.
+
+A mailbox store shared by many worker threads is split into stripes,
+each an ordinary ``MailboxStore`` guarded by its own lock. Every mailbox
+lives in the stripe chosen by a hash of its owner's name, so requests
+for different mailboxes rarely wait for each other, and the store scales
+with the number of threads on builds of Python without a global lock.
+"""
+
+from typing import (
+    Callable,
+    ContextManager,
+    Iterable,
+    Iterator,
+    Mapping,
+    Optional,
+    Union,
+)
+import contextlib
+import math
+import threading
+import time
+
+from .mailbox_store import (
+    MailboxStatus,
+    MailboxStore,
+    MemoryUsage,
+    QuotaExceededError,
+    QuotaPolicy,
+)
+from .stored_message import StoredMessage
+
+
+class StripedMailboxStore:
+    """A thread safe mailbox store, locked one stripe at a time.
+
+    Offers the same operations as ``MailboxStore``. Each operation locks
+    only the stripe holding the mailbox it touches, and operations which
+    must happen together are grouped with ``locked``.
+
+    Per-mailbox limits apply exactly, and the memory limit is shared by
+    every stripe, but room is made by spilling or evicting the least
+    recently used mailboxes from within the same stripe. Stripes check the
+    shared total without waiting for each other, so it may be overrun by
+    up to one message per stripe.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        stripes: int,
+        mailbox_message_limit: int = 0,
+        mailbox_byte_limit: int = 0,
+        memory_limit: int = 0,
+        policy: QuotaPolicy = QuotaPolicy.REJECT,
+        spill_directory: str = "spill",
+        default_time_to_live: float = 0.0,
+        clock: Callable[[], float] = time.time,
+        search_memory_limit: Optional[int] = None,
+    ):
+        """Initialise an empty store.
+
+        :param stripes: The number of independently locked stripes.
+        :param mailbox_message_limit: The maximum number of messages per mailbox.
+        :param mailbox_byte_limit: The maximum number of bytes per mailbox.
+        :param memory_limit: The maximum number of bytes held in memory
+            across all mailboxes.
+        :param policy: What to do when a limit is reached.
+        :param spill_directory: Where to write mailboxes spilled to disk.
+        :param default_time_to_live: The number of seconds messages are kept
+            for when their sender does not specify, or zero to keep them forever.
+        :param clock: A function returning the current time in seconds.
+        :param search_memory_limit: The most bytes the search index may use,
+            zero for no limit, or ``None`` to search without an index.
+        """
+        if search_memory_limit is not None:
+            search_memory_limit = math.ceil(search_memory_limit / stripes)
+        self.stripes = [
+            MailboxStore(
+                mailbox_message_limit=mailbox_message_limit,
+                mailbox_byte_limit=mailbox_byte_limit,
+                memory_limit=memory_limit,
+                policy=policy,
+                spill_directory=spill_directory,
+                default_time_to_live=default_time_to_live,
+                clock=clock,
+                search_memory_limit=search_memory_limit,
+            )
+            for _ in range(stripes)
+        ]
+        self.memory = MemoryUsage()
+        for stripe in self.stripes:
+            stripe.memory = self.memory
+        # Reentrant, so operations grouped by ``locked`` can take the lock again
+        self.locks = [threading.RLock() for _ in range(stripes)]
+        # Each stripe numbers its messages from its own residue class,
+        # so sequence numbers are unique without a shared counter
+        self.next_sequences = list(range(1, stripes + 1))
+
+    def _stripe_index(self, receiver_name: str) -> int:
+        """Find the stripe holding a mailbox.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :return: The index of the stripe.
+        """
+        return hash(receiver_name) % len(self.stripes)
+
+    def locked(self, receiver_name: str) -> ContextManager[bool]:
+        """Hold the lock on a mailbox's stripe across several operations.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :return: A context manager holding the lock.
+        """
+        return self.locks[self._stripe_index(receiver_name)]
+
+    def add(  # noqa: PLR0913
+        self,
+        receiver_name: str,
+        sender_name: str,
+        message: bytes,
+        time_to_live: Optional[float] = None,
+        expires_at: Optional[float] = None,
+        priority: int = 0,
+    ) -> int:
+        """Store a message in the receiver's mailbox.
+
+        :param receiver_name: The name of the user who will receive the message.
+        :param sender_name: The name of the user who sent the message.
+        :param message: The message body.
+        :param time_to_live: The number of seconds to keep the message for,
+            zero to keep it forever, or ``None`` to use the default.
+        :param expires_at: The time at which the message expires, or zero
+            if it never expires, used instead of ``time_to_live`` if given.
+        :param priority: How urgently the message is to be delivered, with
+            higher priorities delivered first.
+        :return: The message's sequence number.
+        :raises QuotaExceededError: If the message cannot be stored.
+        """
+        index = self._stripe_index(receiver_name)
+        with self.locks[index]:
+            sequence = self.next_sequences[index]
+            self.stripes[index].add(
+                receiver_name,
+                sender_name,
+                message,
+                time_to_live,
+                expires_at,
+                sequence=sequence,
+                priority=priority,
+            )
+            self.next_sequences[index] = sequence + len(self.stripes)
+        return sequence
+
+    def add_many(
+        self, receiver_name: str, stored_messages: Iterable[StoredMessage]
+    ) -> int:
+        """Store a batch of messages in the receiver's mailbox, in order.
+
+        The stripe is locked once for the whole batch.
+
+        :param receiver_name: The name of the user who will receive the messages.
+        :param stored_messages: The messages to store, oldest first.
+        :return: The number of messages stored.
+        """
+        index = self._stripe_index(receiver_name)
+        stripe = self.stripes[index]
+        stored = 0
+        with self.locks[index]:
+            now = stripe.clock()
+            for stored_message in stored_messages:
+                if stored_message.has_expired(now):
+                    continue
+                sequence = self.next_sequences[index]
+                with contextlib.suppress(QuotaExceededError):
+                    stripe.add(
+                        receiver_name,
+                        stored_message.sender_name,
+                        stored_message.message,
+                        expires_at=stored_message.expires_at,
+                        sequence=sequence,
+                        stored_at=stored_message.stored_at,
+                        priority=stored_message.priority,
+                    )
+                    self.next_sequences[index] = sequence + len(self.stripes)
+                    stored += 1
+        return stored
+
+    def peek(
+        self,
+        receiver_name: str,
+        count: int,
+        after_sequence: Union[int, Mapping[int, int]] = 0,
+    ) -> list[StoredMessage]:
+        """Get the next messages to deliver from a mailbox without removing them.
+
+        The messages are only safe to use while the mailbox's stripe is
+        ``locked``, as another thread may remove them.
+
+        :param receiver_name: The name of the user whose mailbox to look in.
+        :param count: The maximum number of messages to return.
+        :param after_sequence: Skip messages numbered up to and including
+            this, or up to the number given for their lane's priority.
+        :return: Up to ``count`` messages, in the order they are delivered.
+        """
+        index = self._stripe_index(receiver_name)
+        with self.locks[index]:
+            return self.stripes[index].peek(receiver_name, count, after_sequence)
+
+    def drain(
+        self, receiver_name: str, count: int, priority: Optional[int] = None
+    ) -> None:
+        """Remove the first messages from a mailbox once they have been delivered.
+
+        :param receiver_name: The name of the user whose mailbox to drain.
+        :param count: The number of messages to remove.
+        :param priority: The priority of the only lane to remove messages
+            from, or ``None`` to remove them in the order they are delivered.
+        """
+        index = self._stripe_index(receiver_name)
+        with self.locks[index]:
+            self.stripes[index].drain(receiver_name, count, priority)
+
+    def acknowledge(
+        self, receiver_name: str, sequence: Union[int, Mapping[int, int]]
+    ) -> int:
+        """Remove the messages a reader has confirmed it received.
+
+        :param receiver_name: The name of the user whose mailbox to drain.
+        :param sequence: The sequence number of the last message received,
+            or of the last received from each lane, by priority.
+        :return: The number of messages removed.
+        """
+        index = self._stripe_index(receiver_name)
+        with self.locks[index]:
+            return self.stripes[index].acknowledge(receiver_name, sequence)
+
+    def search(
+        self,
+        receiver_name: str,
+        words: set[str],
+        count: int,
+        after_sequence: int = 0,
+    ) -> list[StoredMessage]:
+        """Find the oldest messages in a mailbox containing every one of some words.
+
+        The messages are only safe to use while the mailbox's stripe is
+        ``locked``, as another thread may remove them.
+
+        :param receiver_name: The name of the user whose mailbox to look in.
+        :param words: The words to look for, in lower case.
+        :param count: The maximum number of messages to return.
+        :param after_sequence: Skip messages numbered up to and including this.
+        :return: Up to ``count`` of the oldest matching messages in the mailbox.
+        """
+        index = self._stripe_index(receiver_name)
+        with self.locks[index]:
+            return self.stripes[index].search(
+                receiver_name, words, count, after_sequence
+            )
+
+    def search_candidates(
+        self, receiver_name: str, after_sequence: int = 0, limit: Optional[int] = None
+    ) -> Optional[tuple[list[int], list[bytearray], Optional[int]]]:
+        """Get the messages a search of a mailbox would have to read through.
+
+        :param receiver_name: The name of the user whose mailbox to look in.
+        :param after_sequence: Skip messages numbered up to and including this.
+        :param limit: The most messages to read from each lane, or ``None``
+            to read them all.
+        :return: The sequence numbers and bodies of the mailbox's messages,
+            oldest first, and the sequence number to carry on reading
+            after, or ``None`` once every message has been read. ``None``
+            is returned instead if the search index covers the mailbox.
+        """
+        index = self._stripe_index(receiver_name)
+        with self.locks[index]:
+            return self.stripes[index].search_candidates(
+                receiver_name, after_sequence, limit
+            )
+
+    def find_messages(
+        self, receiver_name: str, sequences: Iterable[int]
+    ) -> list[StoredMessage]:
+        """Look up messages in a mailbox by their sequence numbers.
+
+        The messages are only safe to use while the mailbox's stripe is
+        ``locked``, as another thread may remove them.
+
+        :param receiver_name: The name of the user whose mailbox to look in.
+        :param sequences: The sequence numbers of the messages.
+        :return: The messages which are still in the mailbox, in the order
+            asked for.
+        """
+        index = self._stripe_index(receiver_name)
+        with self.locks[index]:
+            return self.stripes[index].find_messages(receiver_name, sequences)
+
+    def holds(self, receiver_name: str, sequence: int) -> bool:
+        """Check whether a message is still waiting in a mailbox.
+
+        :param receiver_name: The name of the user whose mailbox to look in.
+        :param sequence: The sequence number of the message.
+        :return: ``False`` if the message has been delivered or removed.
+        """
+        index = self._stripe_index(receiver_name)
+        with self.locks[index]:
+            return self.stripes[index].holds(receiver_name, sequence)
+
+    def mailbox_size(self, receiver_name: str) -> int:
+        """Get the number of messages waiting in a mailbox.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :return: The number of messages in the mailbox.
+        """
+        index = self._stripe_index(receiver_name)
+        with self.locks[index]:
+            return self.stripes[index].mailbox_size(receiver_name)
+
+    def mailbox_status(self, receiver_name: str) -> MailboxStatus:
+        """Summarise a mailbox from its running totals.
+
+        :param receiver_name: The name of the user who owns the mailbox.
+        :return: The number of messages in the mailbox, the bytes they take
+            up, and how long the oldest has been waiting.
+        """
+        index = self._stripe_index(receiver_name)
+        with self.locks[index]:
+            return self.stripes[index].mailbox_status(receiver_name)
+
+    def snapshot(self) -> Iterator[tuple[str, StoredMessage]]:
+        """Visit every deliverable message, one stripe at a time.
+
+        :return: An iterator of each message and the name of its receiver.
+        """
+        for lock, stripe in zip(self.locks, self.stripes):
+            # The stripe is only locked while each message is found, as it
+            # may change whenever the caller pauses
+            messages = stripe.snapshot()
+            while True:
+                with lock:
+                    item = next(messages, None)
+                if item is None:
+                    break
+                yield item
+
+    def clear(self) -> None:
+        """Remove every message, including those spilled to disk."""
+        for lock, stripe in zip(self.locks, self.stripes):
+            with lock:
+                stripe.clear()
+
+    def expire(self) -> int:
+        """Remove every message whose time to live has passed.
+
+        :return: The number of messages which expired.
+        """
+        expired = 0
+        for lock, stripe in zip(self.locks, self.stripes):
+            with lock:
+                expired += stripe.expire()
+        return expired
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Get the store's memory and quota statistics, summed across stripes.
+
+        :return: A dictionary mapping each statistic's name to its value.
+        """
+        totals: dict[str, int] = {}
+        for lock, stripe in zip(self.locks, self.stripes):
+            with lock:
+                for name, value in stripe.stats.items():
+                    totals[name] = totals.get(name, 0) + value
+        return totals
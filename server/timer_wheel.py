@@ -0,0 +1,135 @@
+"""Home to the ``TimerWheel`` class."""
+
+from typing import Generic, TypeVar
+import math
+
+
+T = TypeVar("T")
+
+
+class TimerWheel(Generic[T]):
+    """A hierarchical timer wheel.
+
+    Time is divided into ticks, and each level of the wheel is a ring of
+    slots. A slot on the lowest level spans a single tick, and a slot on
+    each level above spans an entire revolution of the level below it.
+    Timers are placed in the coarsest slot that holds their deadline,
+    and are cascaded down to finer levels as their deadline approaches.
+
+    Scheduling a timer and expiring it both cost amortised O(1),
+    regardless of how many timers are pending. Timers cannot be
+    cancelled, so the owner of each item should ignore stale expiries.
+    """
+
+    def __init__(
+        self, now: float, tick: float = 1.0, slot_bits: int = 6, levels: int = 4
+    ):
+        """Create an empty timer wheel.
+
+        :param now: The current time, in seconds.
+        :param tick: The duration of a single tick, in seconds.
+        :param slot_bits: The base two logarithm of the number of slots per level.
+        :param levels: The number of levels in the wheel.
+        """
+        self.tick = tick
+        self.slot_bits = slot_bits
+        self.slot_mask = (1 << slot_bits) - 1
+        self.levels: list[list[list[tuple[int, T]]]] = [
+            [[] for _ in range(1 << slot_bits)] for _ in range(levels)
+        ]
+        self.current_tick = self._to_tick(now)
+        self.due: list[T] = []
+        self.pending = 0
+
+    def __len__(self) -> int:
+        """Get the number of timers which have not yet expired.
+
+        :return: The number of pending timers.
+        """
+        return self.pending
+
+    def _to_tick(self, time: float) -> int:
+        """Convert a time to the tick which contains it.
+
+        :param time: The time, in seconds.
+        :return: The tick number.
+        """
+        return math.floor(time / self.tick)
+
+    def schedule(self, deadline: float, item: T) -> None:
+        """Add a timer which expires once ``deadline`` has passed.
+
+        :param deadline: The time the timer expires, in seconds.
+        :param item: The item to return from ``advance`` once expired.
+        """
+        self.pending += 1
+        self._insert(math.ceil(deadline / self.tick), item)
+
+    def _insert(self, expiry_tick: int, item: T) -> None:
+        """Place a timer into the slot which holds its expiry tick.
+
+        :param expiry_tick: The tick at which the timer expires.
+        :param item: The item to return once expired.
+        """
+        delta = expiry_tick - self.current_tick
+        if delta <= 0:
+            self.due.append(item)
+            return
+
+        # Timers beyond the range of the wheel wait in its furthest slot
+        # and are re-inserted once that slot is cascaded
+        furthest = (1 << (self.slot_bits * len(self.levels))) - 1
+        slot_tick = self.current_tick + min(delta, furthest)
+
+        level = 0
+        while level < len(self.levels) - 1 and delta >> (self.slot_bits * (level + 1)):
+            level += 1
+
+        index = (slot_tick >> (self.slot_bits * level)) & self.slot_mask
+        self.levels[level][index].append((expiry_tick, item))
+
+    def advance(self, now: float) -> list[T]:
+        """Move the wheel forward to the current time.
+
+        :param now: The current time, in seconds.
+        :return: The items whose timers have expired, earliest first.
+        """
+        target_tick = self._to_tick(now)
+        expired, self.due = self.due, []
+
+        while self.current_tick < target_tick:
+            if self.pending == len(expired):
+                # Nothing left to expire, so skip straight to the target
+                self.current_tick = target_tick
+                break
+
+            self.current_tick += 1
+            self._cascade()
+
+            slot = self.levels[0][self.current_tick & self.slot_mask]
+            if slot:
+                expired.extend(item for _, item in slot)
+                slot.clear()
+            if self.due:
+                expired.extend(self.due)
+                self.due.clear()
+
+        self.pending -= len(expired)
+        return expired
+
+    def _cascade(self) -> None:
+        """Redistribute the timers of higher levels whose slot has come around.
+
+        A slot on level ``n`` is cascaded each time every level below it
+        completes a revolution.
+        """
+        for level in range(1, len(self.levels)):
+            shift = self.slot_bits * level
+            if self.current_tick & ((1 << shift) - 1):
+                return
+
+            slot = self.levels[level][(self.current_tick >> shift) & self.slot_mask]
+            timers = slot[:]
+            slot.clear()
+            for expiry_tick, item in timers:
+                self._insert(expiry_tick, item)
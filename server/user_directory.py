@@ -0,0 +1,73 @@
+"""Home to the ``UserDirectory`` class."""
+
+
+class UserDirectory:
+    """Numbers the users a store refers to, holding each name only once.
+
+    Each user is given a small number the first time they are referred
+    to, and their name is encoded once, so messages can refer to their
+    sender by number and be sent without encoding the name again. The
+    directory counts the references to each user, and forgets them once
+    there are none, reusing their number for the next new user.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty directory."""
+        self.user_ids: dict[str, int] = {}
+        self.names: list[str] = []
+        # Each user's name, encoded as it is sent to clients
+        self.encoded_names: list[bytes] = []
+        # The number of references to each user
+        self.references: list[int] = []
+        self.free_ids: list[int] = []
+
+    def __len__(self) -> int:
+        """Get the number of users referred to.
+
+        :return: The number of users.
+        """
+        return len(self.user_ids)
+
+    def add(self, name: str) -> int:
+        """Refer to a user by number.
+
+        :param name: The name of the user.
+        :return: The user's number.
+        """
+        user_id = self.user_ids.get(name)
+        if user_id is None:
+            encoded_name = name.encode()
+            if self.free_ids:
+                user_id = self.free_ids.pop()
+                self.names[user_id] = name
+                self.encoded_names[user_id] = encoded_name
+            else:
+                user_id = len(self.names)
+                self.names.append(name)
+                self.encoded_names.append(encoded_name)
+                self.references.append(0)
+            self.user_ids[name] = user_id
+
+        self.references[user_id] += 1
+        return user_id
+
+    def remove(self, user_id: int) -> None:
+        """Stop referring to a user, forgetting them once unused.
+
+        :param user_id: The user's number.
+        """
+        self.references[user_id] -= 1
+        if not self.references[user_id]:
+            del self.user_ids[self.names[user_id]]
+            self.names[user_id] = ""
+            self.encoded_names[user_id] = b""
+            self.free_ids.append(user_id)
+
+    def encode(self, name: str) -> bytes:
+        """Encode a user's name, reusing the directory's copy if it has one.
+
+        :param name: The name of the user.
+        :return: The encoded name.
+        """
+        user_id = self.user_ids.get(name)
+        return name.encode() if user_id is None else self.encoded_names[user_id]
@@ -0,0 +1,323 @@
+"""Serving connections on a pool of worker threads.
+
+The main thread accepts connections and hands each one to the next free
+worker, which serves it with blocking socket calls until the client
+disconnects or falls silent. Workers share the server's state, so
+everything they touch must be safe to use from several threads at once.
+"""
+
+from enum import Enum
+from typing import Callable, Optional, Union
+import logging
+import queue
+import selectors
+import socket
+import threading
+import time
+
+from .admission import AdmissionController
+from .connection import (
+    Connection,
+    ConnectionPhase,
+    PendingResponse,
+    StreamedResponse,
+)
+from .event_loop import EventLoop
+
+
+logger = logging.getLogger(__name__)
+
+
+class Engine(Enum):
+    """How the server runs its connections."""
+
+    EVENTS = 1
+    THREADS = 2
+
+    @staticmethod
+    def from_str(string: str) -> "Engine":
+        """Convert a string to an engine.
+
+        :param string: The string to convert.
+        :return: The engine.
+        """
+        try:
+            return Engine[string.upper()]
+        except KeyError as error:
+            raise ValueError(
+                f'Invalid engine: {string}, must be "events" or "threads"'
+            ) from error
+
+
+class WorkerPool:
+    """Serves each connection on one of a fixed number of worker threads.
+
+    A worker is busy for as long as its client stays connected, so idle
+    connections are closed after the header timeout to free the worker
+    for someone else. Connections accepted while every worker is busy
+    wait in a queue for the next one to finish.
+    """
+
+    # How long the main thread waits for connections before checking for work
+    ACCEPT_INTERVAL = 0.1
+
+    def __init__(  # noqa: PLR0913
+        self,
+        welcoming_sockets: list[socket.socket],
+        handle_request: Callable[
+            [bytes, Connection],
+            Union[bytes, PendingResponse, StreamedResponse, None],
+        ],
+        admission: AdmissionController,
+        timeouts: dict[ConnectionPhase, float],
+        housekeeping: Callable[[], None],
+        housekeeping_interval: float,
+        threads: int,
+    ):
+        """Initialise the worker pool, without starting any threads yet.
+
+        :param welcoming_sockets: The listening sockets to accept connections on.
+        :param handle_request: Called with each request packet and the
+            connection it arrived on, returning the response to send, if any.
+            It is called from many threads at once.
+        :param admission: Decides which connections are accepted.
+        :param timeouts: The number of seconds a connection may spend in
+            each phase, where zero means forever.
+        :param housekeeping: Called periodically to perform background work.
+        :param housekeeping_interval: The number of seconds between
+            calls to ``housekeeping``.
+        :param threads: The number of worker threads.
+        """
+        self.welcoming_sockets = welcoming_sockets
+        self.handle_request = handle_request
+        self.admission = admission
+        self.timeouts = timeouts
+        self.housekeeping = housekeeping
+        self.housekeeping_interval = housekeeping_interval
+        self.thread_count = threads
+
+        self.selector = selectors.DefaultSelector()
+        for welcoming_socket in welcoming_sockets:
+            welcoming_socket.setblocking(False)
+            self.selector.register(welcoming_socket, selectors.EVENT_READ)
+
+        self.accepted: queue.Queue[Optional[Connection]] = queue.Queue()
+        self.workers: list[threading.Thread] = []
+        self.stopping = threading.Event()
+        # The connections being served, so they can be cut off when closing
+        self.active: set[Connection] = set()
+        self.active_lock = threading.Lock()
+        self.next_housekeeping = time.monotonic() + housekeeping_interval
+
+    def start(self) -> None:
+        """Start the worker threads."""
+        for index in range(self.thread_count):
+            worker = threading.Thread(
+                target=self.work, name=f"worker-{index}", daemon=True
+            )
+            worker.start()
+            self.workers.append(worker)
+        logger.info("Started %s worker threads", self.thread_count)
+
+    def run(self) -> None:
+        """Serve connections forever."""
+        self.start()
+        while True:
+            self.run_once()
+
+    def run_once(self) -> None:
+        """Accept any waiting connections, and run housekeeping when it is due."""
+        for key, _ in self.selector.select(WorkerPool.ACCEPT_INTERVAL):
+            self.accept_connections(key.fileobj)  # type: ignore[arg-type]
+
+        now = time.monotonic()
+        if now >= self.next_housekeeping:
+            self.housekeeping()
+            self.next_housekeeping = now + self.housekeeping_interval
+
+    def accept_connections(self, welcoming_socket: socket.socket) -> None:
+        """Accept every connection waiting on a welcoming socket.
+
+        :param welcoming_socket: The socket to accept connections from.
+        """
+        while True:
+            try:
+                connection_socket, client_address = welcoming_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as error:
+                logger.error("Error accepting connection: %s", error)
+                return
+
+            if not self.admission.admit_connection():
+                EventLoop.reject_connection(connection_socket)
+                continue
+
+            logger.info("Connection from %s", client_address)
+            connection_socket.setblocking(True)
+            self.accepted.put(Connection(connection_socket, client_address))
+
+    def work(self) -> None:
+        """Serve connections one after another until the pool is closed."""
+        while True:
+            connection = self.accepted.get()
+            if connection is None:
+                return
+
+            with self.active_lock:
+                self.active.add(connection)
+            try:
+                self.serve(connection)
+            except Exception:  # pylint: disable=broad-exception-caught
+                # One client must never take a worker down with it
+                logger.exception("Error serving %s", connection.client_address)
+            finally:
+                with self.active_lock:
+                    self.active.discard(connection)
+                connection.close()
+                self.admission.release_connection()
+
+    def serve(self, connection: Connection) -> None:
+        """Serve every request a client sends, until it disconnects or times out.
+
+        Pipelined requests which arrive together are all served before
+        their responses are sent together.
+
+        :param connection: The connection to serve.
+        """
+        phase = None
+        deadline = 0.0
+        while not self.stopping.is_set():
+            try:
+                served = self.serve_buffered_requests(connection)
+            except ValueError as error:
+                # Without a valid header, the rest of the stream cannot be framed
+                logger.error(error)
+                print("Message request discarded")
+                return
+
+            if not self.send_responses(connection):
+                return
+
+            # Each deadline covers a whole phase, however the data trickles in
+            current_phase = connection.current_phase()
+            if served or current_phase != phase:
+                phase = current_phase
+                # Unlike the event loop, a worker is held for as long as its
+                # connection stays open, so even links from other cluster
+                # nodes are closed once idle, and reopened when next used
+                timeout = self.timeouts.get(phase, 0.0)
+                deadline = time.monotonic() + timeout if timeout else 0.0
+
+            if deadline:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.report_timeout(connection, phase)
+                    return
+                connection.socket.settimeout(remaining)
+            else:
+                connection.socket.settimeout(None)
+
+            try:
+                data = connection.socket.recv(Connection.RECEIVE_SIZE)
+            except socket.timeout:
+                self.report_timeout(connection, phase)
+                return
+            except OSError as error:
+                logger.info(
+                    "Connection to %s failed: %s", connection.client_address, error
+                )
+                return
+
+            if not data:
+                return
+            connection.inbound += data
+
+    def serve_buffered_requests(self, connection: Connection) -> bool:
+        """Serve every complete request received so far.
+
+        :param connection: The connection the requests arrived on.
+        :return: ``True`` if any request was served, otherwise ``False``.
+        :raises ValueError: If the buffer does not start with a request.
+        """
+        served = False
+        while True:
+            request = connection.next_request()
+            if request is None:
+                return served
+
+            response = self.handle_request(request, connection)
+            served = True
+            if isinstance(response, PendingResponse):
+                connection.defer(response)
+            elif response:
+                connection.queue(response)
+
+    def send_responses(self, connection: Connection) -> bool:
+        """Send every queued response, waiting for any still pending.
+
+        :param connection: The connection to send the responses on.
+        :return: ``False`` if the connection failed or timed out, otherwise ``True``.
+        """
+        connection.release()
+        if not connection.has_output:
+            return True
+
+        write_timeout = self.timeouts.get(ConnectionPhase.WRITE, 0.0)
+        connection.socket.settimeout(write_timeout or None)
+        try:
+            connection.flush()
+        except socket.timeout:
+            self.report_timeout(connection, ConnectionPhase.WRITE)
+            return False
+        except OSError as error:
+            logger.info("Connection to %s failed: %s", connection.client_address, error)
+            return False
+
+        # Only the event loop engine forwards requests, so none are left pending
+        return not connection.has_output
+
+    @staticmethod
+    def report_timeout(
+        connection: Connection, phase: Optional[ConnectionPhase]
+    ) -> None:
+        """Log that a connection stayed in one phase for too long.
+
+        :param connection: The connection which timed out.
+        :param phase: The phase it timed out in.
+        """
+        if phase == ConnectionPhase.READ_HEADER and not connection.inbound:
+            logger.info("Closing idle connection to %s", connection.client_address)
+        else:
+            logger.error(
+                "Connection to %s timed out in %s phase",
+                connection.client_address,
+                phase.name if phase is not None else "unknown",
+            )
+            print("Timed out while waiting for message request")
+
+    def close(self) -> None:
+        """Disconnect every client and stop the workers."""
+        self.stopping.set()
+        with self.active_lock:
+            for connection in self.active:
+                try:
+                    connection.socket.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        for _ in self.workers:
+            self.accepted.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers.clear()
+
+        while True:
+            try:
+                waiting = self.accepted.get_nowait()
+            except queue.Empty:
+                break
+            if waiting is not None:
+                waiting.close()
+                self.admission.release_connection()
+
+        self.selector.close()
@@ -1,7 +1,7 @@
 """Home to the ``CommandLineApplication`` abstract class."""
 
 from collections import OrderedDict
-from typing import Callable, Any
+from typing import Callable, Any, Optional
 import logging
 import abc
 
@@ -17,13 +17,32 @@ class CommandLineApplication(metaclass=abc.ABCMeta):
     """
 
     @abc.abstractmethod
-    def __init__(self, parameters: OrderedDict[str, Callable[[str], Any]]):
+    def __init__(
+        self,
+        parameters: OrderedDict[str, Callable[[str], Any]],
+        options: Optional[OrderedDict[str, tuple[Callable[[str], Any], Any]]] = None,
+    ):
         """Initialise the command line application.
 
         :param parameters: A dictionary containing the parameters for
             the command line application.
+        :param options: A dictionary mapping the name of each optional
+            ``--option value`` argument to its parser and default value.
         """
         self.parameters = parameters
+        self.options = options or OrderedDict()
+        self.option_values: dict[str, Any] = {
+            name: default for name, (_, default) in self.options.items()
+        }
+
+    @staticmethod
+    def option_flag(name: str) -> str:
+        """Get the command line flag used to specify an option.
+
+        :param name: The name of the option.
+        :return: The flag, e.g. ``--listen-backlog`` for ``listen_backlog``.
+        """
+        return "--" + name.replace("_", "-")
 
     @property
     def usage_prompt(self) -> str:
@@ -31,7 +50,40 @@ class CommandLineApplication(metaclass=abc.ABCMeta):
 
         :return: The usage prompt for the command line application.
         """
-        return f"Usage: python3 {' '.join(self.parameters)}"
+        prompt = f"Usage: python3 {' '.join(self.parameters)}"
+        for name in self.options:
+            prompt += f" [{self.option_flag(name)} <{name}>]"
+        return prompt
+
+    def parse_options(self, arguments: list[str]) -> list[str]:
+        """Parse any optional arguments, storing them in ``option_values``.
+
+        :param arguments: The command line arguments.
+        :return: The remaining positional arguments.
+        :raises ValueError: If an option is unknown or missing its value.
+        """
+        flags = {self.option_flag(name): name for name in self.options}
+        positional_arguments = []
+
+        index = 0
+        while index < len(arguments):
+            argument = arguments[index]
+            if not argument.startswith("--"):
+                positional_arguments.append(argument)
+                index += 1
+                continue
+
+            if argument not in flags:
+                raise ValueError(f"Unknown option {argument}")
+            if index + 1 >= len(arguments):
+                raise ValueError(f"Option {argument} requires a value")
+
+            name = flags[argument]
+            parser, _ = self.options[name]
+            self.option_values[name] = parser(arguments[index + 1])
+            index += 2
+
+        return positional_arguments
 
     def parse_arguments(self, arguments: list[str]) -> list[Any]:
         """Parse the command line arguments, ensuring they are valid.
@@ -40,6 +92,7 @@ class CommandLineApplication(metaclass=abc.ABCMeta):
         """
         parsed_arguments = []
         try:
+            arguments = self.parse_options(arguments)
             if len(arguments) != len(self.parameters):
                 raise ValueError(
                     f"Invalid number of arguments, must be {len(self.parameters)}"
@@ -9,6 +9,13 @@ class MessageType(Enum):
     READ = 1
     CREATE = 2
     RESPONSE = 3
+    RESULT = 4
+    STATUS = 5
+    PING = 6
+    SEARCH = 7
+    CHUNK = 8
+    PEEK = 9
+    BULK_READ = 10
 
     @staticmethod
     def from_str(string: str) -> "MessageType":
@@ -21,5 +28,6 @@ class MessageType(Enum):
             return MessageType[string.upper()]
         except KeyError as error:
             raise ValueError(
-                f'Invalid message type: {string}, must be "read" or "create"'
+                f'Invalid message type: {string}, must be "read", "create",'
+                ' "status", "ping", "search" or "peek"'
             ) from error
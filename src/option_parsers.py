@@ -0,0 +1,74 @@
+"""Parsers for the values of optional command line arguments."""
+
+
+def positive_int(string: str) -> int:
+    """Parse a strictly positive integer.
+
+    :param string: A string to parse as an integer.
+    :raises TypeError: If the ``string`` cannot be parsed.
+    :raises ValueError: If the number is not positive.
+    :return: The parsed integer.
+    """
+    try:
+        value = int(string)
+    except ValueError as error:
+        raise TypeError(f"{string} is not an integer") from error
+
+    if value < 1:
+        raise ValueError(f"{string} must be a positive integer")
+
+    return value
+
+
+def non_negative_int(string: str) -> int:
+    """Parse an integer that is zero or greater.
+
+    :param string: A string to parse as an integer.
+    :raises TypeError: If the ``string`` cannot be parsed.
+    :raises ValueError: If the number is negative.
+    :return: The parsed integer.
+    """
+    try:
+        value = int(string)
+    except ValueError as error:
+        raise TypeError(f"{string} is not an integer") from error
+
+    if value < 0:
+        raise ValueError(f"{string} must not be negative")
+
+    return value
+
+
+def non_negative_float(string: str) -> float:
+    """Parse a real number that is zero or greater.
+
+    :param string: A string to parse as a float.
+    :raises TypeError: If the ``string`` cannot be parsed.
+    :raises ValueError: If the number is negative.
+    :return: The parsed float.
+    """
+    try:
+        value = float(string)
+    except ValueError as error:
+        raise TypeError(f"{string} is not a number") from error
+
+    if value < 0:
+        raise ValueError(f"{string} must not be negative")
+
+    return value
+
+
+def switch(string: str) -> bool:
+    """Parse a switch which turns a feature on or off.
+
+    :param string: One of "on", "off", "yes", "no", "true" or "false".
+    :raises ValueError: If the string is not a recognised switch value.
+    :return: ``True`` if the feature is turned on, otherwise ``False``.
+    """
+    value = string.lower()
+    if value in ("on", "yes", "true"):
+        return True
+    if value in ("off", "no", "false"):
+        return False
+
+    raise ValueError(f'{string} must be "on" or "off"')
@@ -30,14 +30,25 @@ class Message(Packet, struct_format="!BH"):
 
         :return: A ``bytes`` object encoding the message.
         """
-        self.packet += struct.pack(
-            self.struct_format, len(self.sender_name.encode()), len(self.message)
-        )
-        self.packet += self.sender_name.encode()
-        self.packet += self.message
+        self.packet += self.pack(self.sender_name.encode(), self.message)
 
         return self.packet
 
+    @classmethod
+    def pack(cls, encoded_sender_name: bytes, message: bytes) -> bytes:
+        """Encode a message whose sender's name has already been encoded.
+
+        :param encoded_sender_name: The encoded name of the user sending
+            the message.
+        :param message: The message to be sent.
+        :return: A ``bytes`` object encoding the message.
+        """
+        return (
+            struct.pack(cls.struct_format, len(encoded_sender_name), len(message))
+            + encoded_sender_name
+            + message
+        )
+
     @classmethod
     def decode_packet(cls, packet: bytes) -> tuple[str, str, bytes]:
         """Decode a message packet into it's sender name and message.
@@ -58,3 +69,34 @@ class Message(Packet, struct_format="!BH"):
         remaining_messages = payload[index:]
 
         return sender_name, message, remaining_messages
+
+    @classmethod
+    def unpack_from(cls, buffer: bytes, offset: int = 0) -> tuple[str, bytes, int]:
+        """Decode a message packet found at ``offset`` within a buffer.
+
+        Unlike ``decode_packet``, the message is left as ``bytes`` and the
+        remainder of the buffer is not copied, making this suitable for
+        reading many consecutive messages out of a large buffer.
+
+        :param buffer: A buffer containing one or more message packets.
+        :param offset: The index at which the message packet starts.
+        :return: The sender name, the raw message,
+            and the index immediately after the message packet.
+        :raises ValueError: If the buffer ends part way through the message.
+        """
+        header_size = cls.header_size()
+        if len(buffer) < offset + header_size:
+            raise ValueError("Buffer ends part way through a message header")
+
+        sender_name_length, message_length = struct.unpack_from(
+            cls.struct_format, buffer, offset
+        )
+        index = offset + header_size
+        end = index + sender_name_length + message_length
+        if len(buffer) < end:
+            raise ValueError("Buffer ends part way through a message")
+
+        sender_name = bytes(buffer[index : index + sender_name_length]).decode()
+        message = bytes(buffer[index + sender_name_length : end])
+
+        return sender_name, message, end
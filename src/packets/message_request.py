@@ -1,9 +1,11 @@
 """Home to the ``MessageReqeust`` class."""
 
+from typing import Any, Optional
 import logging
 import struct
 
 from src.message_type import MessageType
+from src.request_option import RequestOption
 from .packet import Packet
 
 
@@ -19,14 +21,28 @@ class MessageRequest(Packet, struct_format="!HBBBH"):
 
         message_request = MessageRequest.from_record(record)
         message_type, sender_name, receiver_name, message = message_request.decode()
+
+    Requests may carry ``RequestOption``s, which are encoded after the
+    message and flagged by setting the high bit of the message type.
     """
 
-    def __init__(
+    OPTIONS_FLAG = Packet.TYPE_FLAG
+    OPTIONS_LENGTH_FORMAT = "!H"
+    OPTION_HEADER_FORMAT = "!BB"
+
+    # The most bytes of an attachment carried by each chunk request
+    MAX_CHUNK_SIZE = 0xFFFF
+    # The longest list of user names a bulk read request can carry
+    MAX_NAMES_SIZE = 0xFFFF
+    NAME_SEPARATOR = "\n"
+
+    def __init__(  # noqa: PLR0913
         self,
         message_type: MessageType,
         user_name: str,
         receiver_name: str,
         message: str,
+        options: Optional[dict[RequestOption, Any]] = None,
     ):
         """Encode a message request packet.
 
@@ -34,11 +50,13 @@ class MessageRequest(Packet, struct_format="!HBBBH"):
         :param user_name: The name of the user sending the request
         :param receiver_name: The name of the message recipient
         :param message: The string message to be sent
+        :param options: Optional fields to attach to the request
         """
         self.message_type = message_type
         self.user_name = user_name
         self.receiver_name = receiver_name
         self.message = message
+        self.options = options or {}
         self.packet = bytes()
 
     def to_bytes(self) -> bytes:
@@ -46,20 +64,26 @@ class MessageRequest(Packet, struct_format="!HBBBH"):
 
         :return: A byte array holding the message request
         """
-        if self.message_type == MessageType.READ:
-            logger.info("Creating READ request from %s", self.user_name)
-        else:
+        if self.message_type == MessageType.CREATE:
             logger.info(
                 'Creating CREATE request to send %s the message "%s" from %s',
                 self.receiver_name,
                 self.message,
                 self.user_name,
             )
+        else:
+            logger.info(
+                "Creating %s request from %s", self.message_type.name, self.user_name
+            )
+
+        message_type = self.message_type.value
+        if self.options:
+            message_type |= MessageRequest.OPTIONS_FLAG
 
         self.packet = struct.pack(
             self.struct_format,
             Packet.MAGIC_NUMBER,
-            self.message_type.value,
+            message_type,
             len(self.user_name.encode()),
             len(self.receiver_name.encode()),
             len(self.message.encode()),
@@ -69,8 +93,268 @@ class MessageRequest(Packet, struct_format="!HBBBH"):
         self.packet += self.receiver_name.encode()
         self.packet += self.message.encode()
 
+        if self.options:
+            self.packet += self.encode_options(self.options)
+
         return self.packet
 
+    @classmethod
+    def encode_chunk(cls, user_name: str, data: bytes) -> bytes:
+        """Encode a chunk request, carrying part of an attachment.
+
+        Unlike a message, an attachment need not be text, so its bytes are
+        sent as they are.
+
+        :param user_name: The name of the user sending the attachment.
+        :param data: Up to ``MAX_CHUNK_SIZE`` bytes of the attachment.
+        :return: The chunk request packet.
+        """
+        encoded_user_name = user_name.encode()
+        return (
+            struct.pack(
+                cls.struct_format,
+                Packet.MAGIC_NUMBER,
+                MessageType.CHUNK.value,
+                len(encoded_user_name),
+                0,
+                len(data),
+            )
+            + encoded_user_name
+            + data
+        )
+
+    @classmethod
+    def batch_names(cls, user_names: list[str]) -> list[str]:
+        """Join user names into as few bulk read messages as will hold them.
+
+        :param user_names: The names of the users whose mailboxes to read.
+        :return: The messages, each listing as many of the names as fit,
+            in order.
+        :raises ValueError: If a name is empty, holds the separator, or is
+            too long to fit in a message on its own.
+        """
+        batches: list[str] = []
+        batch: list[str] = []
+        batch_size = 0
+        for user_name in user_names:
+            if not user_name or cls.NAME_SEPARATOR in user_name:
+                raise ValueError(f"Invalid user name for a bulk read: {user_name!r}")
+            size = len(user_name.encode())
+            if size > cls.MAX_NAMES_SIZE:
+                raise ValueError("User name too long for a bulk read")
+
+            # Every name after the first follows a separator
+            added = size + len(cls.NAME_SEPARATOR) if batch else size
+            if batch_size + added > cls.MAX_NAMES_SIZE:
+                batches.append(cls.NAME_SEPARATOR.join(batch))
+                batch = []
+                batch_size = 0
+                added = size
+            batch.append(user_name)
+            batch_size += added
+
+        if batch:
+            batches.append(cls.NAME_SEPARATOR.join(batch))
+        return batches
+
+    @classmethod
+    def split_names(cls, message: bytes) -> list[str]:
+        """Split the message of a bulk read request into user names.
+
+        :param message: The message of a bulk read request.
+        :return: The names of the users whose mailboxes to read, in order.
+        :raises ValueError: If the message is not a list of user names.
+        """
+        try:
+            user_names = message.decode().split(cls.NAME_SEPARATOR)
+        except UnicodeDecodeError as error:
+            raise ValueError("Received bulk read request with invalid names") from error
+        if not all(user_names):
+            raise ValueError("Received bulk read request with an empty user name")
+        return user_names
+
+    @classmethod
+    def encode_options(cls, options: dict[RequestOption, Any]) -> bytes:
+        """Encode the options block which follows the message.
+
+        :param options: The options to encode.
+        :return: The length prefixed options block.
+        """
+        encoded_options = bytes()
+        for option, value in options.items():
+            encoded_value = option.encode_value(value)
+            encoded_options += struct.pack(
+                cls.OPTION_HEADER_FORMAT, option.value, len(encoded_value)
+            )
+            encoded_options += encoded_value
+
+        return (
+            struct.pack(cls.OPTIONS_LENGTH_FORMAT, len(encoded_options))
+            + encoded_options
+        )
+
+    @classmethod
+    def add_options(cls, packet: bytes, options: dict[RequestOption, Any]) -> bytes:
+        """Attach more options to an already encoded request.
+
+        The rest of the request is copied as is, without being decoded.
+
+        :param packet: An array of bytes containing the message request.
+        :param options: The options to attach.
+        :return: The message request with the options attached.
+        :raises ValueError: If the packet is too short to contain a header.
+        """
+        header_size = cls.header_size()
+        if len(packet) < header_size:
+            raise ValueError("Received message request with incomplete header")
+
+        (
+            magic_number,
+            message_type,
+            user_name_size,
+            receiver_name_size,
+            message_size,
+        ) = struct.unpack_from(cls.struct_format, packet)
+        end = header_size + user_name_size + receiver_name_size + message_size
+
+        length_size = struct.calcsize(cls.OPTIONS_LENGTH_FORMAT)
+        encoded_options = cls.encode_options(options)[length_size:]
+        if message_type & cls.OPTIONS_FLAG:
+            (options_size,) = struct.unpack_from(cls.OPTIONS_LENGTH_FORMAT, packet, end)
+            start = end + length_size
+            encoded_options = packet[start : start + options_size] + encoded_options
+
+        header = struct.pack(
+            cls.struct_format,
+            magic_number,
+            message_type | cls.OPTIONS_FLAG,
+            user_name_size,
+            receiver_name_size,
+            message_size,
+        )
+        return (
+            header
+            + packet[header_size:end]
+            + struct.pack(cls.OPTIONS_LENGTH_FORMAT, len(encoded_options))
+            + encoded_options
+        )
+
+    @classmethod
+    def without_options(cls, packet: bytes) -> bytes:
+        """Remove the options from an already encoded request.
+
+        :param packet: An array of bytes containing the message request.
+        :return: The message request without any options.
+        :raises ValueError: If the packet is too short to contain a header.
+        """
+        header_size = cls.header_size()
+        if len(packet) < header_size:
+            raise ValueError("Received message request with incomplete header")
+
+        (
+            magic_number,
+            message_type,
+            user_name_size,
+            receiver_name_size,
+            message_size,
+        ) = struct.unpack_from(cls.struct_format, packet)
+        end = header_size + user_name_size + receiver_name_size + message_size
+        header = struct.pack(
+            cls.struct_format,
+            magic_number,
+            message_type & ~cls.OPTIONS_FLAG,
+            user_name_size,
+            receiver_name_size,
+            message_size,
+        )
+        return header + packet[header_size:end]
+
+    @classmethod
+    def frame_length(cls, buffer: bytes) -> Optional[int]:
+        """Find the length of the message request at the start of a buffer.
+
+        Used to split a stream of requests into individual packets.
+
+        :param buffer: The bytes received so far.
+        :return: The total length of the first request in the buffer, or
+            ``None`` if not enough of the request has arrived to tell.
+        :raises ValueError: If the buffer does not start with a request header.
+        """
+        header_size = cls.header_size()
+        if len(buffer) < header_size:
+            return None
+
+        (
+            magic_number,
+            message_type,
+            user_name_size,
+            receiver_name_size,
+            message_size,
+        ) = struct.unpack_from(cls.struct_format, buffer)
+        if magic_number != Packet.MAGIC_NUMBER:
+            raise ValueError("Received message request with incorrect magic number")
+
+        length: int = header_size + user_name_size + receiver_name_size + message_size
+        if not message_type & cls.OPTIONS_FLAG:
+            return length
+
+        length_size = struct.calcsize(cls.OPTIONS_LENGTH_FORMAT)
+        if len(buffer) < length + length_size:
+            return None
+
+        options_size: int
+        (options_size,) = struct.unpack_from(cls.OPTIONS_LENGTH_FORMAT, buffer, length)
+        return length + length_size + options_size
+
+    @classmethod
+    def peek_names(cls, packet: bytes) -> tuple[int, bytes, bytes]:
+        """Extract the raw routing fields of a request without validating it.
+
+        This is much cheaper than ``decode_packet`` as nothing is decoded,
+        so it can be used to decide whether a request is worth decoding.
+
+        :param packet: An array of bytes containing the message request.
+        :return: The raw message type, user name bytes and receiver name bytes.
+        :raises ValueError: If the packet is too short to contain a header.
+        """
+        header_size = cls.header_size()
+        if len(packet) < header_size:
+            raise ValueError("Received message request with incomplete header")
+
+        _, message_type, user_name_size, receiver_name_size, _ = struct.unpack_from(
+            cls.struct_format, packet
+        )
+        user_name_end = header_size + user_name_size
+        return (
+            message_type & ~cls.OPTIONS_FLAG,
+            packet[header_size:user_name_end],
+            packet[user_name_end : user_name_end + receiver_name_size],
+        )
+
+    @classmethod
+    def peek_options(cls, packet: bytes) -> Optional[dict[RequestOption, Any]]:
+        """Decode the options attached to a request, if they can be read.
+
+        Requests without options, by far the most common, are told apart
+        from the header alone.
+
+        :param packet: An array of bytes containing the message request.
+        :return: A dictionary mapping each option to its value, or ``None``
+            if the request or its options cannot be read.
+        """
+        if len(packet) < cls.header_size():
+            return None
+
+        _, message_type, _, _, _ = struct.unpack_from(cls.struct_format, packet)
+        if not message_type & cls.OPTIONS_FLAG:
+            return {}
+
+        try:
+            return cls.decode_options(packet)
+        except ValueError:
+            # Malformed requests are left for the decoder to report
+            return None
+
     @classmethod
     def decode_packet(cls, packet: bytes) -> tuple[MessageType, str, str, bytes]:
         """Decode a message request packet.
@@ -90,25 +374,73 @@ class MessageRequest(Packet, struct_format="!HBBBH"):
             raise ValueError("Received message request with incorrect magic number")
 
         try:
-            message_type = MessageType(message_type)
+            message_type = MessageType(message_type & ~cls.OPTIONS_FLAG)
         except ValueError as error:
             raise ValueError("Received message request with invalid ID") from error
 
         if message_type == MessageType.RESPONSE:
             raise ValueError("Recieved message request with disallowed type RESPONSE")
 
-        if user_name_size < 1:
+        # Health checks need not say who they are
+        if user_name_size < 1 and message_type != MessageType.PING:
             raise ValueError(
                 "Received message request with insufficient user name length"
             )
 
-        if message_type == MessageType.READ:
+        cls.check_sizes(message_type, receiver_name_size, message_size)
+
+        user_name = payload[:user_name_size].decode()
+        index = user_name_size
+
+        receiver_name = payload[index : index + receiver_name_size].decode()
+        index += receiver_name_size
+
+        message = payload[index : index + message_size]
+
+        return message_type, user_name, receiver_name, message
+
+    @staticmethod
+    def check_sizes(
+        message_type: MessageType, receiver_name_size: int, message_size: int
+    ) -> None:
+        """Check that a request has the receiver name and message its type needs.
+
+        :param message_type: The type of the request.
+        :param receiver_name_size: The length of the receiver name.
+        :param message_size: The length of the message.
+        :raises ValueError: If either length is not allowed for the type.
+        """
+        request_name = message_type.name.lower().replace("_", " ")
+        if message_type in (
+            MessageType.READ,
+            MessageType.STATUS,
+            MessageType.PING,
+            MessageType.PEEK,
+        ):
             if receiver_name_size != 0:
                 raise ValueError(
-                    "Received read request with non-zero receiver name length"
+                    f"Received {request_name} request with non-zero receiver name"
+                    " length"
                 )
             if message_size != 0:
-                raise ValueError("Received read request with non-zero message length")
+                raise ValueError(
+                    f"Received {request_name} request with non-zero message length"
+                )
+
+        elif message_type in (
+            MessageType.SEARCH,
+            MessageType.BULK_READ,
+            MessageType.CHUNK,
+        ):
+            if receiver_name_size != 0:
+                raise ValueError(
+                    f"Received {request_name} request with non-zero receiver name"
+                    " length"
+                )
+            if message_size < 1:
+                raise ValueError(
+                    f"Received {request_name} request with insufficient message length"
+                )
 
         elif message_type == MessageType.CREATE:
             if receiver_name_size < 1:
@@ -120,12 +452,54 @@ class MessageRequest(Packet, struct_format="!HBBBH"):
                     "Received create request with insufficient message length"
                 )
 
-        user_name = payload[:user_name_size].decode()
-        index = user_name_size
+    @classmethod
+    def decode_options(cls, packet: bytes) -> dict[RequestOption, Any]:
+        """Decode the options attached to a message request packet.
 
-        receiver_name = payload[index : index + receiver_name_size].decode()
-        index += receiver_name_size
+        Options which are not recognised are skipped.
 
-        message = payload[index : index + message_size]
+        :param packet: An array of bytes containing the message request
+        :return: A dictionary mapping each option to its value.
+        :raises ValueError: If the options block is malformed.
+        """
+        header_fields, _ = cls.split_packet(packet)
+        _, message_type, user_name_size, receiver_name_size, message_size = (
+            header_fields
+        )
+        if not message_type & cls.OPTIONS_FLAG:
+            return {}
 
-        return message_type, user_name, receiver_name, message
+        index = cls.header_size() + user_name_size + receiver_name_size + message_size
+        length_size = struct.calcsize(cls.OPTIONS_LENGTH_FORMAT)
+        if len(packet) < index + length_size:
+            raise ValueError("Received message request with missing options")
+
+        (options_size,) = struct.unpack_from(cls.OPTIONS_LENGTH_FORMAT, packet, index)
+        index += length_size
+        end = index + options_size
+        if len(packet) < end:
+            raise ValueError("Received message request with truncated options")
+
+        options: dict[RequestOption, Any] = {}
+        option_header_size = struct.calcsize(cls.OPTION_HEADER_FORMAT)
+        while index < end:
+            if end < index + option_header_size:
+                raise ValueError("Received message request with malformed options")
+            option_id, value_size = struct.unpack_from(
+                cls.OPTION_HEADER_FORMAT, packet, index
+            )
+            index += option_header_size
+            if end < index + value_size:
+                raise ValueError("Received message request with malformed options")
+
+            try:
+                option = RequestOption(option_id)
+            except ValueError:
+                logger.info("Skipping unrecognised request option %s", option_id)
+            else:
+                options[option] = option.decode_value(
+                    packet[index : index + value_size]
+                )
+            index += value_size
+
+        return options
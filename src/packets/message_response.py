@@ -1,5 +1,6 @@
 """Home to the ``MessageResponse`` class."""
 
+from typing import Optional
 import logging
 import struct
 
@@ -12,42 +13,225 @@ logger = logging.getLogger(__name__)
 
 
 class MessageResponse(Packet, struct_format="!HBB?"):
-    """Enables encoding and decoding message response packets."""
+    """Enables encoding and decoding message response packets.
+
+    Responses to windowed reads also carry the sequence number of the last
+    message they contain, which is acknowledged once the messages are safe.
+    It is encoded after the header, and flagged by setting the high bit of
+    the message type.
+
+    Messages may also have an attachment, too large to fit in a message.
+    The attachments follow the messages, flagged by setting the next bit
+    of the message type: first their number, then the position of each
+    one's message and its length, then the attachments themselves.
+    """
 
     MAX_MESSAGE_LENGTH = 255
 
-    def __init__(self, messages: list[tuple[str, bytes]]):
+    SEQUENCE_FLAG = Packet.TYPE_FLAG
+    SEQUENCE_FORMAT = "!Q"
+
+    ATTACHMENTS_FLAG = Packet.SECOND_TYPE_FLAG
+    ATTACHMENT_COUNT_FORMAT = "!B"
+    ATTACHMENT_FORMAT = "!BQ"
+
+    def __init__(
+        self,
+        messages: list[tuple[str, bytes]],
+        last_sequence: Optional[int] = None,
+        attachment_sizes: Optional[list[tuple[int, int]]] = None,
+    ):
         """Encode a structure containing all (up to 255) messages for the specified sender.
 
         :param messages: A list of all the messages to be put in the structure.
+        :param last_sequence: The sequence number of the last message in
+            the structure, for responses to windowed reads.
+        :param attachment_sizes: The position of each message with an
+            attachment, and the attachment's length, in order.
         """
         self.num_messages = min(len(messages), MessageResponse.MAX_MESSAGE_LENGTH)
         self.more_messages = len(messages) > MessageResponse.MAX_MESSAGE_LENGTH
 
         self.messages = messages[: self.num_messages]
+        self.encoded_messages: Optional[list[bytes]] = None
+        self.last_sequence = last_sequence
+        self.attachment_sizes = attachment_sizes or []
         self.packet = bytes()
 
+    @classmethod
+    def from_encoded(
+        cls,
+        encoded_messages: list[bytes],
+        last_sequence: Optional[int] = None,
+        attachment_sizes: Optional[list[tuple[int, int]]] = None,
+    ) -> "MessageResponse":
+        """Create a response from messages already encoded as ``Message`` packets.
+
+        :param encoded_messages: A list of all the encoded messages to be
+            put in the structure.
+        :param last_sequence: The sequence number of the last message in
+            the structure, for responses to windowed reads.
+        :param attachment_sizes: The position of each message with an
+            attachment, and the attachment's length, in order.
+        :return: The message response.
+        """
+        response = cls([], last_sequence, attachment_sizes)
+        response.num_messages = min(
+            len(encoded_messages), MessageResponse.MAX_MESSAGE_LENGTH
+        )
+        response.more_messages = (
+            len(encoded_messages) > MessageResponse.MAX_MESSAGE_LENGTH
+        )
+        response.encoded_messages = encoded_messages[: response.num_messages]
+        return response
+
     def to_bytes(self) -> bytes:
         """Return the message response packet.
 
+        The attachments themselves are left out, and must be sent straight
+        after the packet, in order.
+
         :return: A byte array holding the message response.
         """
         logger.info("Creating message response for %s message(s)", self.num_messages)
 
+        message_type = MessageType.RESPONSE.value
+        if self.last_sequence is not None:
+            message_type |= MessageResponse.SEQUENCE_FLAG
+        if self.attachment_sizes:
+            message_type |= MessageResponse.ATTACHMENTS_FLAG
+
         self.packet = struct.pack(
             self.struct_format,
             Packet.MAGIC_NUMBER,
-            MessageType.RESPONSE.value,
+            message_type,
             self.num_messages,
             self.more_messages,
         )
+        if self.last_sequence is not None:
+            self.packet += struct.pack(
+                MessageResponse.SEQUENCE_FORMAT, self.last_sequence
+            )
+
+        if self.encoded_messages is not None:
+            self.packet += b"".join(self.encoded_messages)
 
         for sender, message in self.messages:
             self.packet += Message(sender, message).to_bytes()
             logger.info('Encoded message from %s: "%s"', sender, message.decode())
 
+        if self.attachment_sizes:
+            self.packet += struct.pack(
+                MessageResponse.ATTACHMENT_COUNT_FORMAT, len(self.attachment_sizes)
+            )
+            for index, size in self.attachment_sizes:
+                self.packet += struct.pack(
+                    MessageResponse.ATTACHMENT_FORMAT, index, size
+                )
+
         return self.packet
 
+    @classmethod
+    def frame_length(cls, buffer: bytes) -> Optional[int]:
+        """Find the length of the message response at the start of a buffer.
+
+        :param buffer: The bytes received so far.
+        :return: The total length of the first response in the buffer, or
+            ``None`` if not enough of the response has arrived to tell.
+        """
+        length = cls.messages_end(buffer)
+        if length is None:
+            return None
+
+        attachments = cls.attachment_headers(buffer, length)
+        if attachments is None:
+            return None
+        length, attachment_sizes = attachments
+        return length + sum(size for _, size in attachment_sizes)
+
+    @classmethod
+    def messages_end(cls, buffer: bytes) -> Optional[int]:
+        """Find where the messages of the response at the start of a buffer end.
+
+        :param buffer: The bytes received so far.
+        :return: The index just after the last message, or ``None`` if not
+            enough of the response has arrived to tell.
+        """
+        length = cls.header_size()
+        if len(buffer) < length:
+            return None
+
+        _, message_type, num_messages, _ = struct.unpack_from(cls.struct_format, buffer)
+        if message_type & cls.SEQUENCE_FLAG:
+            length += struct.calcsize(cls.SEQUENCE_FORMAT)
+        message_header_size = Message.header_size()
+        for _ in range(num_messages):
+            if len(buffer) < length + message_header_size:
+                return None
+            sender_name_length, message_length = struct.unpack_from(
+                Message.struct_format, buffer, length
+            )
+            length += message_header_size + sender_name_length + message_length
+
+        return length
+
+    @classmethod
+    def attachment_headers(
+        cls, buffer: bytes, offset: int
+    ) -> Optional[tuple[int, list[tuple[int, int]]]]:
+        """Decode the position and length of each attachment in a response.
+
+        :param buffer: The bytes received so far.
+        :param offset: The index just after the response's last message.
+        :return: The index at which the first attachment starts, and the
+            position of each attachment's message and its length, or
+            ``None`` if not enough of the response has arrived to tell.
+        """
+        _, message_type, _, _ = struct.unpack_from(cls.struct_format, buffer)
+        if not message_type & cls.ATTACHMENTS_FLAG:
+            return offset, []
+
+        count_size = struct.calcsize(cls.ATTACHMENT_COUNT_FORMAT)
+        if len(buffer) < offset + count_size:
+            return None
+        (count,) = struct.unpack_from(cls.ATTACHMENT_COUNT_FORMAT, buffer, offset)
+        offset += count_size
+
+        attachment_size = struct.calcsize(cls.ATTACHMENT_FORMAT)
+        if len(buffer) < offset + count * attachment_size:
+            return None
+        attachment_sizes = []
+        for _ in range(count):
+            attachment_sizes.append(
+                struct.unpack_from(cls.ATTACHMENT_FORMAT, buffer, offset)
+            )
+            offset += attachment_size
+        return offset, attachment_sizes
+
+    @classmethod
+    def decode_attachments(cls, packet: bytes) -> dict[int, bytes]:
+        """Decode the attachments of a message response.
+
+        :param packet: The packet to be decoded.
+        :return: Each attachment, by the position of its message.
+        :raises ValueError: If the packet ends part way through the attachments.
+        """
+        attachments = None
+        messages_end = cls.messages_end(packet)
+        if messages_end is not None:
+            attachments = cls.attachment_headers(packet, messages_end)
+        if attachments is None:
+            raise ValueError("Message response ends part way through its attachments")
+
+        offset, attachment_sizes = attachments
+        decoded = {}
+        for index, size in attachment_sizes:
+            if len(packet) < offset + size:
+                raise ValueError("Message response ends part way through an attachment")
+            decoded[index] = bytes(packet[offset : offset + size])
+            offset += size
+        return decoded
+
     @classmethod
     def decode_packet(cls, packet: bytes) -> tuple[list[tuple[str, str]], bool]:
         """Decode a message response packet into its individual components.
@@ -62,8 +246,13 @@ class MessageResponse(Packet, struct_format="!HBB?"):
         if magic_number != Packet.MAGIC_NUMBER:
             raise ValueError("Invalid magic number when decoding message response")
 
+        if message_type & cls.SEQUENCE_FLAG:
+            payload = payload[struct.calcsize(cls.SEQUENCE_FORMAT) :]
+
         try:
-            message_type = MessageType(message_type)
+            message_type = MessageType(
+                message_type & ~(cls.SEQUENCE_FLAG | cls.ATTACHMENTS_FLAG)
+            )
         except ValueError as error:
             raise ValueError(
                 "Invalid message type when decoding message response"
@@ -84,3 +273,32 @@ class MessageResponse(Packet, struct_format="!HBB?"):
             messages.append((sender_name, message))
 
         return messages, more_messages
+
+    @classmethod
+    def decode_header(cls, packet: bytes) -> tuple[int, bool]:
+        """Decode the number of messages in a response, without decoding them.
+
+        :param packet: The packet to be decoded.
+        :return: The number of messages in the packet, and whether the
+            server has more messages to send.
+        """
+        _, _, num_messages, more_messages = struct.unpack_from(
+            cls.struct_format, packet
+        )
+        return num_messages, more_messages
+
+    @classmethod
+    def decode_sequence(cls, packet: bytes) -> Optional[int]:
+        """Find the sequence number of the last message in a response.
+
+        :param packet: The packet to be decoded.
+        :return: The sequence number, or ``None`` if the response has none.
+        """
+        header_size = cls.header_size()
+        _, message_type, _, _ = struct.unpack_from(cls.struct_format, packet)
+        if not message_type & cls.SEQUENCE_FLAG:
+            return None
+
+        last_sequence: int
+        (last_sequence,) = struct.unpack_from(cls.SEQUENCE_FORMAT, packet, header_size)
+        return last_sequence
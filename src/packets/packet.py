@@ -4,6 +4,8 @@ from typing import Any
 import struct
 import abc
 
+from src.message_type import MessageType
+
 
 class Packet(metaclass=abc.ABCMeta):
     """Abstract class for all packets.
@@ -20,6 +22,14 @@ class Packet(metaclass=abc.ABCMeta):
 
     MAGIC_NUMBER = 0xAE73
 
+    # The high bit of the message type flags an extension to the packet
+    TYPE_FLAG = 0x80
+    # And the next bit flags a second extension
+    SECOND_TYPE_FLAG = 0x40
+
+    # The magic number and message type which start every packet
+    TYPE_HEADER = struct.Struct("!HB")
+
     struct_format: str
 
     @abc.abstractmethod
@@ -48,6 +58,14 @@ class Packet(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError
 
+    @classmethod
+    def header_size(cls) -> int:
+        """Get the size of the packet's fixed size header.
+
+        :return: The number of bytes in the header.
+        """
+        return struct.calcsize(cls.struct_format)
+
     @classmethod
     def split_packet(cls, packet: bytes) -> tuple[tuple[Any, ...], bytes]:
         """Split the packet into its header and payload.
@@ -57,13 +75,30 @@ class Packet(metaclass=abc.ABCMeta):
             a tuple of the individual header fields,
             and the packet's payload.
         """
-        header_size = struct.calcsize(cls.struct_format)
+        header_size = cls.header_size()
         header, payload = packet[:header_size], packet[header_size:]
 
         header_fields = struct.unpack(cls.struct_format, header)
 
         return header_fields, payload
 
+    @staticmethod
+    def peek_message_type(packet: bytes) -> MessageType:
+        """Find the type of a packet without decoding the rest of it.
+
+        :param packet: The packet to inspect.
+        :return: The message type encoded in the packet's header.
+        :raises ValueError: If the packet does not start with a valid header.
+        """
+        if len(packet) < Packet.TYPE_HEADER.size:
+            raise ValueError("Packet is too short to contain a header")
+
+        magic_number, message_type = Packet.TYPE_HEADER.unpack_from(packet)
+        if magic_number != Packet.MAGIC_NUMBER:
+            raise ValueError("Packet has incorrect magic number")
+
+        return MessageType(message_type & ~(Packet.TYPE_FLAG | Packet.SECOND_TYPE_FLAG))
+
     @classmethod
     def __init_subclass__(
         cls, struct_format: str | None = None, **kwargs: tuple[Any, ...]
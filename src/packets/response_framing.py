@@ -0,0 +1,52 @@
+"""Splitting a stream of server responses into individual packets."""
+
+from typing import Optional
+
+from src.message_type import MessageType
+from src.packets.message_response import MessageResponse
+from src.packets.packet import Packet
+from src.packets.result_response import ResultResponse
+from src.packets.status_response import StatusResponse
+
+
+def response_frame_length(buffer: bytes) -> Optional[int]:
+    """Find the length of the response at the start of a buffer.
+
+    :param buffer: The bytes received so far.
+    :return: The total length of the first response in the buffer, or
+        ``None`` if not enough of the response has arrived to tell.
+    :raises ValueError: If the buffer does not start with a response.
+    """
+    if len(buffer) < Packet.TYPE_HEADER.size:
+        return None
+
+    message_type = Packet.peek_message_type(buffer)
+    if message_type == MessageType.RESPONSE:
+        return MessageResponse.frame_length(buffer)
+    if message_type == MessageType.RESULT:
+        return ResultResponse.header_size()
+    if message_type == MessageType.STATUS:
+        return StatusResponse.header_size()
+
+    raise ValueError(f"Received {message_type.name} packet when expecting a response")
+
+
+def split_responses(buffer: bytearray) -> list[bytes]:
+    """Remove every complete response from the start of a buffer.
+
+    :param buffer: The bytes received so far, which is modified in place.
+    :return: The complete responses, in the order they were received.
+    :raises ValueError: If the buffer does not start with a response.
+    """
+    responses = []
+    offset = 0
+    with memoryview(buffer) as view:
+        while True:
+            length = response_frame_length(view[offset:])
+            if length is None or len(view) < offset + length:
+                break
+            responses.append(bytes(view[offset : offset + length]))
+            offset += length
+
+    del buffer[:offset]
+    return responses
@@ -0,0 +1,67 @@
+"""Home to the ``ResultResponse`` class."""
+
+import logging
+import struct
+
+from src.message_type import MessageType
+from src.packets.packet import Packet
+from src.result_code import ResultCode
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResultResponse(Packet, struct_format="!HBB"):
+    """Encoding and decoding of result response packets.
+
+    A result response tells the client the outcome of a request that
+    has no other response, such as a request rejected due to overload.
+    """
+
+    def __init__(self, result_code: ResultCode):
+        """Create a result response for the given outcome.
+
+        :param result_code: The outcome of the request.
+        """
+        self.result_code = result_code
+        self.packet = bytes()
+
+    def to_bytes(self) -> bytes:
+        """Return the result response packet.
+
+        :return: A byte array holding the result response.
+        """
+        logger.info("Creating %s result response", self.result_code.name)
+
+        self.packet = struct.pack(
+            self.struct_format,
+            Packet.MAGIC_NUMBER,
+            MessageType.RESULT.value,
+            self.result_code.value,
+        )
+
+        return self.packet
+
+    @classmethod
+    def decode_packet(cls, packet: bytes) -> tuple[ResultCode]:
+        """Decode a result response packet.
+
+        :param packet: The packet to be decoded.
+        :return: A tuple containing the result code.
+        """
+        header_fields, _ = cls.split_packet(packet)
+        magic_number, message_type, result_code = header_fields
+
+        if magic_number != Packet.MAGIC_NUMBER:
+            raise ValueError("Invalid magic number when decoding result response")
+
+        if message_type != MessageType.RESULT.value:
+            raise ValueError(
+                f"Message type {message_type} found when decoding result response, "
+                "expected RESULT"
+            )
+
+        try:
+            return (ResultCode(result_code),)
+        except ValueError as error:
+            raise ValueError("Invalid result code in result response") from error
@@ -0,0 +1,74 @@
+"""Home to the ``StatusResponse`` class."""
+
+import logging
+import struct
+
+from src.message_type import MessageType
+from src.packets.packet import Packet
+
+
+logger = logging.getLogger(__name__)
+
+
+class StatusResponse(Packet, struct_format="!HBIQd"):
+    """Encoding and decoding of status response packets.
+
+    A status response answers a status request, describing the mailbox
+    of the user who sent it without delivering any of its messages. It
+    has the same message type as the request it answers.
+    """
+
+    def __init__(self, message_count: int, byte_count: int, oldest_age: float):
+        """Create a status response describing a mailbox.
+
+        :param message_count: The number of messages waiting in the mailbox.
+        :param byte_count: The number of bytes the messages take up.
+        :param oldest_age: The number of seconds the oldest message has
+            been waiting for, or zero if the mailbox is empty.
+        """
+        self.message_count = message_count
+        self.byte_count = byte_count
+        self.oldest_age = oldest_age
+        self.packet = bytes()
+
+    def to_bytes(self) -> bytes:
+        """Return the status response packet.
+
+        :return: A byte array holding the status response.
+        """
+        logger.info("Creating status response for %s messages", self.message_count)
+
+        self.packet = struct.pack(
+            self.struct_format,
+            Packet.MAGIC_NUMBER,
+            MessageType.STATUS.value,
+            self.message_count,
+            self.byte_count,
+            self.oldest_age,
+        )
+
+        return self.packet
+
+    @classmethod
+    def decode_packet(cls, packet: bytes) -> tuple[int, int, float]:
+        """Decode a status response packet.
+
+        :param packet: The packet to be decoded.
+        :return: A tuple containing the number of messages, the number of
+            bytes they take up, and the age of the oldest in seconds.
+        """
+        header_fields, _ = cls.split_packet(packet)
+        magic_number, message_type, message_count, byte_count, oldest_age = (
+            header_fields
+        )
+
+        if magic_number != Packet.MAGIC_NUMBER:
+            raise ValueError("Invalid magic number when decoding status response")
+
+        if message_type != MessageType.STATUS.value:
+            raise ValueError(
+                f"Message type {message_type} found when decoding status response, "
+                "expected STATUS"
+            )
+
+        return message_count, byte_count, oldest_age
@@ -0,0 +1,76 @@
+"""Home to the ``RequestOption``."""
+
+from enum import Enum
+from typing import Any, Optional
+import struct
+
+
+class RequestOption(Enum):
+    """An enum for the optional fields that can be attached to a message request.
+
+    Options are encoded after the message, so servers and clients which
+    do not use an option are unaffected by it.
+    """
+
+    TIME_TO_LIVE = 1
+    ACKNOWLEDGE = 2
+    FORWARDED = 3
+    WINDOW = 4
+    ACKNOWLEDGE_SEQUENCE = 5
+    IDEMPOTENCY_KEY = 6
+    SEARCH_AFTER = 7
+    PRIORITY = 8
+    ATTACHMENT = 9
+    GATEWAY_KEY = 10
+
+    def encode_value(self, value: Any) -> bytes:
+        """Encode a value for this option.
+
+        :param value: The value to encode.
+        :return: The encoded value.
+        """
+        struct_format = _VALUE_FORMATS[self]
+        if struct_format is None:
+            return bytes(value)
+        return struct.pack(struct_format, value)
+
+    def decode_value(self, encoded_value: bytes) -> Any:
+        """Decode a value for this option.
+
+        :param encoded_value: The encoded value.
+        :return: The decoded value.
+        :raises ValueError: If the value is not the correct size.
+        """
+        struct_format = _VALUE_FORMATS[self]
+        if struct_format is None:
+            return bytes(encoded_value)
+
+        try:
+            (value,) = struct.unpack(struct_format, encoded_value)
+        except struct.error as error:
+            raise ValueError(f"Invalid value for {self.name} option") from error
+        return value
+
+
+_VALUE_FORMATS: dict[RequestOption, Optional[str]] = {
+    # Seconds until the message expires
+    RequestOption.TIME_TO_LIVE: "!I",
+    # Present to ask for a result response when a message is stored
+    RequestOption.ACKNOWLEDGE: None,
+    # Present on requests sent on by another node of a cluster
+    RequestOption.FORWARDED: None,
+    # Pages of messages a windowed read may be sent before acknowledging any
+    RequestOption.WINDOW: "!B",
+    # Sequence number of the last message a windowed read has safely received
+    RequestOption.ACKNOWLEDGE_SEQUENCE: "!Q",
+    # Chosen by the sender, and repeated when a request is retried
+    RequestOption.IDEMPOTENCY_KEY: None,
+    # Sequence number of the last match already received by a search
+    RequestOption.SEARCH_AFTER: "!Q",
+    # How urgent a request is, and a message's lane in its mailbox, highest first
+    RequestOption.PRIORITY: "!B",
+    # Length of an attachment sent in chunks straight after a create request
+    RequestOption.ATTACHMENT: "!Q",
+    # Shared secret allowing a gateway to read many users' mailboxes at once
+    RequestOption.GATEWAY_KEY: None,
+}
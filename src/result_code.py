@@ -0,0 +1,42 @@
+"""Home to the ``ResultCode``."""
+
+from enum import Enum
+
+
+class ResultCode(Enum):
+    """An enum for the outcomes reported in a ``ResultResponse``."""
+
+    OK = 0
+    OVERLOADED = 1
+    RATE_LIMITED = 2
+    MAILBOX_FULL = 3
+    STORE_FULL = 4
+    UNAVAILABLE = 5
+    READ_ONLY = 6
+    DUPLICATE = 7
+    TOO_LARGE = 8
+    FORBIDDEN = 9
+    INVALID = 10
+
+    @property
+    def description(self) -> str:
+        """Get a human readable description of the result.
+
+        :return: A sentence describing the result.
+        """
+        return _DESCRIPTIONS[self]
+
+
+_DESCRIPTIONS = {
+    ResultCode.OK: "Request completed successfully",
+    ResultCode.OVERLOADED: "Server is overloaded, please try again later",
+    ResultCode.RATE_LIMITED: "Too many requests, please slow down",
+    ResultCode.MAILBOX_FULL: "The receiver's mailbox is full",
+    ResultCode.STORE_FULL: "Server has no room for more messages",
+    ResultCode.UNAVAILABLE: "The server holding this mailbox is unavailable",
+    ResultCode.READ_ONLY: "This server is a read only standby",
+    ResultCode.DUPLICATE: "The message was not stored as it may be a repeat",
+    ResultCode.TOO_LARGE: "The attachment is larger than the server accepts",
+    ResultCode.FORBIDDEN: "The request needs a gateway key the server accepts",
+    ResultCode.INVALID: "The server could not understand the request",
+}
@@ -0,0 +1,125 @@
+"""Home to the ``ServerAddress`` class."""
+
+from typing import Union
+import functools
+import socket
+
+
+class ServerAddress:
+    """The address of a server, either a TCP host and port or a Unix socket path.
+
+    Unix socket addresses are written as ``unix:/path/to/socket``, and let
+    clients on the same host as the server bypass the TCP/IP stack.
+    """
+
+    UNIX_PREFIX = "unix:"
+
+    def __init__(self, host_name: str, port_number: int):
+        """Create a server address.
+
+        :param host_name: The host name, or ``unix:`` followed by a socket path.
+        :param port_number: The TCP port number, ignored for Unix sockets.
+        """
+        self.host_name = host_name
+        self.port_number = port_number
+
+    @classmethod
+    def from_str(cls, string: str) -> "ServerAddress":
+        """Parse an address written as ``host:port`` or ``unix:/path``.
+
+        :param string: The address to parse.
+        :return: The server address.
+        :raises ValueError: If the address is missing a valid port number.
+        """
+        if cls.is_unix(string):
+            return cls(string, 0)
+
+        host_name, _, port = string.rpartition(":")
+        if not host_name or not port.isdigit():
+            raise ValueError(f"{string} must be written as <host>:<port>")
+
+        return cls(host_name, int(port))
+
+    @staticmethod
+    def is_unix(host_name: str) -> bool:
+        """Check whether a host name refers to a Unix socket.
+
+        :param host_name: The host name to check.
+        :return: ``True`` if the host name is a Unix socket address.
+        """
+        return host_name.startswith(ServerAddress.UNIX_PREFIX)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def resolve(host_name: str) -> str:
+        """Look up the IPv4 address of a host, only once per process.
+
+        :param host_name: The host name, or an IPv4 address.
+        :return: The host's IPv4 address.
+        :raises socket.gaierror: If the host name cannot be resolved.
+        """
+        address_info = socket.getaddrinfo(
+            host_name, None, socket.AF_INET, socket.SOCK_STREAM
+        )
+        return address_info[0][4][0]
+
+    @property
+    def unix_path(self) -> str:
+        """Get the path of the Unix socket.
+
+        :return: The path of the socket file.
+        """
+        return self.host_name[len(ServerAddress.UNIX_PREFIX) :]
+
+    @property
+    def family(self) -> socket.AddressFamily:
+        """Get the socket address family needed to reach the server.
+
+        :return: ``AF_UNIX`` for Unix sockets, otherwise ``AF_INET``.
+        """
+        if self.is_unix(self.host_name):
+            return socket.AF_UNIX
+        return socket.AF_INET
+
+    @property
+    def socket_address(self) -> Union[str, tuple[str, int]]:
+        """Get the address in the form expected by ``socket.connect``.
+
+        :return: The socket path, or a tuple of the host name and port number.
+        """
+        if self.is_unix(self.host_name):
+            return self.unix_path
+        return self.host_name, self.port_number
+
+    def create_socket(self) -> socket.socket:
+        """Create an unconnected stream socket of the right family.
+
+        :return: A new socket.
+        """
+        return socket.socket(self.family, socket.SOCK_STREAM)
+
+    def connect(self, timeout: float) -> socket.socket:
+        """Open a connection to the server.
+
+        :param timeout: The number of seconds to wait for socket operations.
+        :return: The connected socket.
+        :raises OSError: If the connection could not be made.
+        """
+        connection_socket = self.create_socket()
+        try:
+            connection_socket.settimeout(timeout)
+            connection_socket.connect(self.socket_address)
+        except OSError:
+            connection_socket.close()
+            raise
+
+        return connection_socket
+
+    def __str__(self) -> str:
+        """Describe the address for humans.
+
+        :return: The Unix socket address, or the host name and port number.
+        """
+        if self.is_unix(self.host_name):
+            return self.host_name
+        return f"{self.host_name} port {self.port_number}"
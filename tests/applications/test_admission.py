@@ -0,0 +1,120 @@
+"""``AdmissionController`` class test suite."""
+
+import unittest
+
+from src.packets.message_request import MessageRequest
+from src.message_type import MessageType
+from src.result_code import ResultCode
+from server.admission import AdmissionController, RateLimit, TokenBucket
+from .fake_clock import FakeClock
+
+
+def create_request(sender_name: str, receiver_name: str) -> bytes:
+    """Encode a create request between two users."""
+    return MessageRequest(
+        MessageType.CREATE, sender_name, receiver_name, "Hello"
+    ).to_bytes()
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test suite for TokenBucket class."""
+
+    def test_burst_then_reject(self) -> None:
+        """Tests that a bucket admits up to its burst size at once."""
+        bucket = TokenBucket(rate=1.0, burst=3, now=0.0)
+        results = [bucket.try_consume(0.0) for _ in range(4)]
+        self.assertEqual([True, True, True, False], results)
+
+    def test_refill(self) -> None:
+        """Tests that tokens are replenished over time."""
+        bucket = TokenBucket(rate=2.0, burst=1, now=0.0)
+        bucket.try_consume(0.0)
+        self.assertFalse(bucket.try_consume(0.25))
+        self.assertTrue(bucket.try_consume(0.5))
+
+    def test_refill_capped_at_burst(self) -> None:
+        """Tests that a bucket never holds more than its burst size."""
+        bucket = TokenBucket(rate=100.0, burst=2, now=0.0)
+        bucket.refill(60.0)
+        self.assertEqual(2, bucket.tokens)
+        self.assertTrue(bucket.is_full(60.0))
+
+
+class TestAdmissionController(unittest.TestCase):
+    """Test suite for AdmissionController class."""
+
+    def setUp(self) -> None:
+        """Set up the testing environment."""
+        self.clock = FakeClock()
+
+    def test_unlimited_by_default(self) -> None:
+        """Tests that every request is admitted when no limits are set."""
+        controller = AdmissionController(clock=self.clock)
+        for _ in range(100):
+            self.assertIsNone(controller.admit_request(create_request("A", "B")))
+            self.assertTrue(controller.admit_connection())
+
+    def test_sender_rate_limit(self) -> None:
+        """Tests that a sender exceeding their rate is rejected."""
+        controller = AdmissionController(
+            sender_limit=RateLimit(1.0, 2), clock=self.clock
+        )
+        request = create_request("Alice", "John")
+        self.assertIsNone(controller.admit_request(request))
+        self.assertIsNone(controller.admit_request(request))
+        self.assertEqual(ResultCode.RATE_LIMITED, controller.admit_request(request))
+        self.assertEqual(1, controller.rejected_requests)
+
+    def test_sender_rate_limit_is_per_sender(self) -> None:
+        """Tests that one sender being limited does not affect another."""
+        controller = AdmissionController(
+            sender_limit=RateLimit(1.0, 1), clock=self.clock
+        )
+        controller.admit_request(create_request("Alice", "John"))
+        self.assertIsNotNone(controller.admit_request(create_request("Alice", "John")))
+        self.assertIsNone(controller.admit_request(create_request("Bob", "John")))
+
+    def test_receiver_rate_limit(self) -> None:
+        """Tests that messages to a flooded receiver are rejected."""
+        controller = AdmissionController(
+            receiver_limit=RateLimit(1.0, 1), clock=self.clock
+        )
+        self.assertIsNone(controller.admit_request(create_request("Alice", "John")))
+        self.assertEqual(
+            ResultCode.RATE_LIMITED,
+            controller.admit_request(create_request("Bob", "John")),
+        )
+        self.clock.now = 1.0
+        self.assertIsNone(controller.admit_request(create_request("Bob", "John")))
+
+    def test_receiver_rate_limit_ignores_reads(self) -> None:
+        """Tests that read requests do not count against a receiver limit."""
+        controller = AdmissionController(
+            receiver_limit=RateLimit(1.0, 1), clock=self.clock
+        )
+        read = MessageRequest(MessageType.READ, "John", "", "").to_bytes()
+        for _ in range(5):
+            self.assertIsNone(controller.admit_request(read))
+
+    def test_malformed_request_admitted(self) -> None:
+        """Tests that malformed requests are left for the decoder to reject."""
+        controller = AdmissionController(sender_limit=RateLimit(1.0), clock=self.clock)
+        self.assertIsNone(controller.admit_request(b"\x00"))
+
+    def test_connection_limit(self) -> None:
+        """Tests that connections beyond the limit are rejected until released."""
+        controller = AdmissionController(max_connections=2, clock=self.clock)
+        self.assertTrue(controller.admit_connection())
+        self.assertTrue(controller.admit_connection())
+        self.assertFalse(controller.admit_connection())
+        controller.release_connection()
+        self.assertTrue(controller.admit_connection())
+        self.assertEqual(1, controller.rejected_connections)
+
+    def test_bucket_pruning(self) -> None:
+        """Tests that the number of tracked buckets stays bounded."""
+        controller = AdmissionController(sender_limit=RateLimit(1.0), clock=self.clock)
+        controller.MAX_TRACKED_BUCKETS = 8
+        for index in range(20):
+            controller.admit_request(create_request(f"user{index}", "John"))
+        self.assertLessEqual(len(controller.sender_buckets), 8)
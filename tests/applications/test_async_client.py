@@ -0,0 +1,175 @@
+"""``AsyncMessagingClient`` class test suite."""
+
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from server.event_loop import EventLoop
+from server import Server
+from src.packets.message_request import MessageRequest
+from src.result_code import ResultCode
+from src.server_address import ServerAddress
+from client.async_client import AsyncMessagingClient, RequestRejectedError
+
+
+class TestAsyncMessagingClient(unittest.TestCase):
+    """Test suite for AsyncMessagingClient class."""
+
+    def setUp(self) -> None:
+        """Create a directory for the server's socket."""
+        directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(directory.name, "server.sock")
+        self.address = ServerAddress.from_str(f"unix:{self.path}")
+
+    def serve(self, *arguments: str) -> None:
+        """Run a server on the test's socket until the test ends.
+
+        :param arguments: Options to start the server with.
+        """
+        server = Server(["12000", *arguments])
+        welcoming_socket = socket.socket(socket.AF_UNIX)
+        self.addCleanup(welcoming_socket.close)
+        welcoming_socket.bind(self.path)
+        welcoming_socket.listen()
+        event_loop = EventLoop(
+            [welcoming_socket],
+            server.handle_request,
+            server.admission,
+            server.timeouts,
+            lambda: None,
+            0.01,
+        )
+        self.addCleanup(event_loop.close)
+
+        stopped = threading.Event()
+
+        def serve() -> None:
+            while not stopped.is_set():
+                event_loop.run_once()
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stopped.set)
+
+    def test_many_users(self) -> None:
+        """Tests that thousands of concurrent requests are each answered."""
+        self.serve()
+        users = [f"user{index}" for index in range(50)]
+
+        async def run() -> tuple[list[list[tuple[str, str]]], int]:
+            async with AsyncMessagingClient(
+                self.address, max_connections=4, max_in_flight=500
+            ) as client:
+                await asyncio.gather(
+                    *(
+                        client.send("Alice", receiver_name, f"{receiver_name} {index}")
+                        for index in range(40)
+                        for receiver_name in users
+                    )
+                )
+                connections = len(client.connections)
+                mailboxes = await asyncio.gather(
+                    *(client.drain(user_name) for user_name in users)
+                )
+                return mailboxes, connections
+
+        mailboxes, connections = asyncio.run(run())
+
+        self.assertLessEqual(connections, 4)
+        for user_name, messages in zip(users, mailboxes):
+            # Concurrent requests may be sent over different connections
+            self.assertCountEqual(
+                [("Alice", f"{user_name} {index}") for index in range(40)], messages
+            )
+
+    def test_read_many(self) -> None:
+        """Tests that a gateway reads thousands of mailboxes in a few requests."""
+        key_path = os.path.join(self.directory, "gateway.key")
+        with open(key_path, "wb") as key_file:
+            key_file.write(b"secret\n")
+        self.serve("--gateway-key-file", key_path)
+        users = [f"user{index}" for index in range(8000)]
+
+        async def run() -> dict[str, tuple[list[tuple[str, str]], bool]]:
+            async with AsyncMessagingClient(self.address) as client:
+                await client.send("Alice", "user1", "Hello user1")
+                await client.send("Alice", "user7999", "Hello user7999")
+                with self.assertRaises(RequestRejectedError) as context:
+                    await client.read_many("gateway", users, b"guess")
+                self.assertEqual(ResultCode.FORBIDDEN, context.exception.result_code)
+
+                pages = await client.read_many("gateway", users + ["user1"], b"secret")
+                # The messages read were removed
+                self.assertEqual(([], False), await client.read("user1"))
+                return pages
+
+        pages = asyncio.run(run())
+
+        self.assertEqual(2, len(MessageRequest.batch_names(users)))
+        self.assertEqual(8000, len(pages))
+        self.assertEqual(([("Alice", "Hello user1")], False), pages["user1"])
+        self.assertEqual(([("Alice", "Hello user7999")], False), pages["user7999"])
+        self.assertEqual(([], False), pages["user0"])
+
+    def test_created_outside_event_loop(self) -> None:
+        """Tests that a client created before its event loop runs can be used."""
+        self.serve()
+        client = AsyncMessagingClient(self.address, max_in_flight=1)
+
+        async def run() -> list[tuple[str, str]]:
+            async with client:
+                await asyncio.gather(
+                    client.send("Alice", "John", "Hello"),
+                    client.send("Bob", "John", "Hi"),
+                )
+                return await client.drain("John")
+
+        self.assertCountEqual([("Alice", "Hello"), ("Bob", "Hi")], asyncio.run(run()))
+
+    def test_connection_failure(self) -> None:
+        """Tests that requests fail if the server closes the connection."""
+        with socket.socket(socket.AF_UNIX) as welcoming_socket:
+            welcoming_socket.bind(self.path)
+            welcoming_socket.listen()
+            welcoming_socket.settimeout(5)
+
+            def close_connections() -> None:
+                for _ in range(2):
+                    connection_socket, _ = welcoming_socket.accept()
+                    connection_socket.recv(4096)
+                    connection_socket.close()
+
+            thread = threading.Thread(target=close_connections)
+            thread.start()
+
+            async def run() -> list[object]:
+                async with AsyncMessagingClient(
+                    self.address, max_connections=1
+                ) as client:
+                    first = await asyncio.gather(
+                        client.send("Alice", "John", "Hello"),
+                        client.read("John"),
+                        return_exceptions=True,
+                    )
+                    # A new connection is opened for later requests
+                    second = await asyncio.gather(
+                        client.read("John"), return_exceptions=True
+                    )
+                    return [*first, *second]
+
+            errors = asyncio.run(run())
+            thread.join()
+
+        self.assertEqual(3, len(errors))
+        for error in errors:
+            self.assertIsInstance(error, ConnectionError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""``AttachmentSpool`` class test suite."""
+
+import os
+import tempfile
+import unittest
+
+from server.attachments import AttachmentSpool
+
+
+class TestAttachmentSpool(unittest.TestCase):
+    """Test suite for AttachmentSpool class."""
+
+    def setUp(self) -> None:
+        """Create a spool writing to a temporary directory."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = os.path.join(directory.name, "attachments")
+        self.spool = AttachmentSpool(self.directory, max_size=10)
+
+    def test_accepts(self) -> None:
+        """Tests that attachments over the size limit are refused."""
+        self.assertTrue(self.spool.accepts(10))
+        self.assertFalse(self.spool.accepts(11))
+        self.assertTrue(AttachmentSpool(self.directory).accepts(1 << 40))
+
+    def test_upload(self) -> None:
+        """Tests that chunks are written to a spool file until all have arrived."""
+        upload = self.spool.start("Alice", "John", b"Photo", {}, 5)
+        upload.write(b"abc")
+        self.assertFalse(upload.complete)
+        self.assertRaises(ValueError, upload.write, b"def")
+        upload.write(b"de")
+        self.assertTrue(upload.complete)
+
+        self.spool.register("John", 7, upload)
+        upload.abort()
+        attachment = self.spool.find("John", 7)
+        assert attachment is not None
+        span = attachment.open()
+        with span.file:
+            self.assertEqual(b"abcde", span.file.read())
+        self.assertEqual(5, span.size)
+        self.assertIsNone(self.spool.find("John", 8))
+
+    def test_abort(self) -> None:
+        """Tests that an abandoned upload leaves no spool file behind."""
+        upload = self.spool.start("Alice", "John", b"Photo", {}, 5)
+        upload.write(b"abc")
+        upload.abort()
+        upload.write(b"de")
+        self.assertTrue(upload.complete)
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_sweep(self) -> None:
+        """Tests that the attachments of messages which have gone are removed."""
+        for sequence in range(3):
+            upload = self.spool.start("Alice", "John", b"Photo", {}, 1)
+            upload.write(b"a")
+            self.spool.register("John", sequence, upload)
+
+        self.assertEqual(2, self.spool.sweep(lambda _, sequence: sequence == 1))
+        self.assertEqual(1, len(os.listdir(self.directory)))
+        self.assertIsNotNone(self.spool.find("John", 1))
+
+        self.spool.close()
+        self.assertEqual([], os.listdir(self.directory))
+        self.assertEqual(3, self.spool.stats["discarded"])
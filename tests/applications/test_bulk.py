@@ -0,0 +1,73 @@
+"""Bulk export and import test suite."""
+
+import os
+import tempfile
+import unittest
+
+from server.bulk import CHUNK_MESSAGES, export_store, import_store
+from server.mailbox_store import MailboxStore
+from server.striped_store import StripedMailboxStore
+from .fake_clock import FakeClock
+
+
+class TestBulk(unittest.TestCase):
+    """Test suite for exporting and importing whole stores."""
+
+    def setUp(self) -> None:
+        """Fill a store with messages spanning several chunks."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "store.dump")
+
+        self.clock = FakeClock()
+        self.store = MailboxStore(clock=self.clock)
+        for index in range(CHUNK_MESSAGES + 10):
+            self.store.add("John", "Alice", f"message {index}".encode())
+        self.store.add("Jane", "Bob", b"expiring", time_to_live=5)
+        self.store.add("Jane", "Bob", b"hello")
+
+    def test_export_and_import(self) -> None:
+        """Tests that an imported store holds the same messages, in order."""
+        exported = export_store(self.store, self.path)
+        self.assertEqual(CHUNK_MESSAGES + 12, exported.messages)
+        self.assertEqual(os.path.getsize(self.path), exported.byte_count)
+
+        store = MailboxStore(clock=self.clock)
+        imported = import_store(store, self.path)
+        self.assertEqual(exported.messages, imported.messages)
+        self.assertEqual(exported.byte_count, imported.byte_count)
+        self.assertEqual(self.store.memory_bytes, store.memory_bytes)
+
+        messages = store.peek("John", CHUNK_MESSAGES + 10)
+        self.assertEqual(b"message 0", messages[0].message)
+        self.assertEqual(f"message {CHUNK_MESSAGES + 9}".encode(), messages[-1].message)
+        self.assertEqual(
+            [("Bob", b"expiring", 5.0), ("Bob", b"hello", 0.0)],
+            [(s.sender_name, s.message, s.expires_at) for s in store.peek("Jane", 5)],
+        )
+
+    def test_expired_messages_skipped(self) -> None:
+        """Tests that messages which expired since being exported are dropped."""
+        export_store(self.store, self.path)
+        self.clock.now = 10.0
+
+        store = StripedMailboxStore(4, clock=self.clock)
+        imported = import_store(store, self.path)
+        self.assertEqual(1, imported.skipped)
+        self.assertEqual(1, store.mailbox_size("Jane"))
+        self.assertEqual(CHUNK_MESSAGES + 10, store.mailbox_size("John"))
+
+    def test_truncated_dump(self) -> None:
+        """Tests that a dump file cut short is reported."""
+        export_store(self.store, self.path)
+        with open(self.path, "r+b") as dump_file:
+            dump_file.truncate(os.path.getsize(self.path) - 1)
+
+        self.assertRaises(ValueError, import_store, MailboxStore(), self.path)
+
+    def test_not_a_dump_file(self) -> None:
+        """Tests that other files are not mistaken for dumps."""
+        with open(self.path, "wb") as dump_file:
+            dump_file.write(b"something else entirely")
+
+        self.assertRaises(ValueError, import_store, MailboxStore(), self.path)
@@ -1,10 +1,22 @@
 """Client class test suite."""
 
-import unittest
+import contextlib
+import io
+import os
 import socket
+import tempfile
+import threading
+import unittest
+import unittest.mock
 
 from src.packets.message_request import MessageRequest
+from src.packets.result_response import ResultResponse
 from src.message_type import MessageType
+from src.request_option import RequestOption
+from src.result_code import ResultCode
+from src.server_address import ServerAddress
+from server.event_loop import EventLoop
+from server import Server
 from client import Client
 
 
@@ -26,6 +38,50 @@ class TestClient(unittest.TestCase):
             ["invalid", str(TestClient.port_number), "Alice", "create"],
         )
 
+    def test_host_looked_up_once(self) -> None:
+        """Tests that the server's host name is looked up once, when parsed."""
+        ServerAddress.resolve.cache_clear()
+        lookups = []
+        getaddrinfo = socket.getaddrinfo
+
+        def counting_getaddrinfo(*arguments, **keywords):  # type: ignore
+            lookups.append(arguments[0])
+            return getaddrinfo(*arguments, **keywords)
+
+        with unittest.mock.patch("socket.getaddrinfo", counting_getaddrinfo):
+            client = Client(
+                [TestClient.hostname, str(TestClient.port_number), "Alice", "ping"]
+            )
+            with contextlib.suppress(SystemExit):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    client.run()
+
+        self.assertEqual([TestClient.hostname], lookups)
+        self.assertEqual("127.0.0.1", client.address.host_name)
+
+    def answer_once(
+        self, welcoming_socket: socket.socket, response: bytes = b""
+    ) -> list[bytes]:
+        """Emulate a server answering a single request, in another thread.
+
+        :param welcoming_socket: The listening socket the client connects to.
+        :param response: What to send back once the request has arrived.
+        :return: A list the request is added to once it has arrived.
+        """
+        requests: list[bytes] = []
+
+        def answer() -> None:
+            connection_socket, _ = welcoming_socket.accept()
+            connection_socket.settimeout(1)
+            with connection_socket:
+                requests.append(connection_socket.recv(4096))
+                connection_socket.sendall(response)
+
+        thread = threading.Thread(target=answer)
+        thread.start()
+        self.addCleanup(thread.join)
+        return requests
+
     def test_send_message_request(self) -> None:
         """Tests that a Client object can send a message request."""
         client = Client(
@@ -36,25 +92,182 @@ class TestClient(unittest.TestCase):
         message = "Hello John"
 
         with socket.socket() as welcoming_socket:
-            # Emulate server with welcoming socket
+            # Emulate server with welcoming socket, which closes each
+            # connection first, leaving the port waiting to be reused
+            welcoming_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             welcoming_socket.bind((TestClient.hostname, TestClient.port_number))
             welcoming_socket.listen(1)
+            requests = self.answer_once(welcoming_socket)
 
             # Send message request from the client
-            client.send_message_request(
+            response = client.send_message_request(
                 MessageRequest(MessageType.CREATE, user_name, receiver_name, message)
             )
 
-            # Accept connection from the client
-            connection_socket, _ = welcoming_socket.accept()
-            connection_socket.settimeout(1)
-
-            # Receive message request from the client
-            with connection_socket:
-                packet = connection_socket.recv(4096)
-
         # Check that the packet is correct
-        request = MessageRequest.decode_packet(packet)
+        self.assertIsNone(response)
+        request = MessageRequest.decode_packet(requests[0])
         self.assertEqual(
             (MessageType.CREATE, user_name, receiver_name, message.encode()), request
         )
+
+    def test_send_message_request_unix_socket(self) -> None:
+        """Tests that a Client object can send a message request over a Unix socket."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "server.sock")
+            client = Client(
+                [f"unix:{path}", str(TestClient.port_number), "Alice", "read"]
+            )
+
+            with socket.socket(socket.AF_UNIX) as welcoming_socket:
+                welcoming_socket.bind(path)
+                welcoming_socket.listen(1)
+                requests = self.answer_once(welcoming_socket)
+
+                client.message_type = MessageType.CREATE
+                client.send_message_request(
+                    MessageRequest(MessageType.CREATE, "Alice", "John", "Hi John")
+                )
+
+        request = MessageRequest.decode_packet(requests[0])
+        self.assertEqual((MessageType.CREATE, "Alice", "John", b"Hi John"), request)
+
+    def test_refused_create_reported(self) -> None:
+        """Tests that a create request the server refuses is reported."""
+        rejection = ResultResponse(ResultCode.RATE_LIMITED).to_bytes()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "server.sock")
+            client = Client(
+                [f"unix:{path}", str(TestClient.port_number), "Alice", "read"]
+            )
+
+            with socket.socket(socket.AF_UNIX) as welcoming_socket:
+                welcoming_socket.bind(path)
+                welcoming_socket.listen(1)
+                self.answer_once(welcoming_socket, rejection)
+
+                response = client.send_message_request(
+                    MessageRequest(MessageType.CREATE, "Alice", "John", "Hi John")
+                )
+
+        self.assertEqual(rejection, response)
+
+    def test_acknowledged_create_reported(self) -> None:
+        """Tests that a create the server acknowledges is reported as sent."""
+        client = Client(
+            [TestClient.hostname, str(TestClient.port_number), "Alice", "create"]
+        )
+        client.receiver_name = "John"
+        output = io.StringIO()
+        with self.assertLogs("client", level="INFO") as logs:
+            with contextlib.redirect_stdout(output):
+                client.read_response(ResultResponse(ResultCode.OK).to_bytes())
+
+        self.assertEqual("Message sent to John\n", output.getvalue())
+        self.assertEqual(["INFO"], [record.levelname for record in logs.records])
+
+    def test_windowed_read(self) -> None:
+        """Tests that a windowed read receives and acknowledges every message."""
+        server = Server([str(TestClient.port_number)])
+        for index in range(1000):
+            server.store.add("John", "Alice", f"message {index}".encode())
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "server.sock")
+            with socket.socket(socket.AF_UNIX) as welcoming_socket:
+                welcoming_socket.bind(path)
+                welcoming_socket.listen()
+                event_loop = EventLoop(
+                    [welcoming_socket],
+                    server.handle_request,
+                    server.admission,
+                    server.timeouts,
+                    lambda: None,
+                    0.01,
+                )
+                self.addCleanup(event_loop.close)
+
+                stopped = threading.Event()
+
+                def serve() -> None:
+                    while not stopped.is_set():
+                        event_loop.run_once()
+
+                thread = threading.Thread(target=serve)
+                thread.start()
+                try:
+                    client = Client(
+                        [
+                            f"unix:{path}",
+                            str(TestClient.port_number),
+                            "John",
+                            "read",
+                            "--window",
+                            "2",
+                        ]
+                    )
+                    output = io.StringIO()
+                    with contextlib.redirect_stdout(output):
+                        client.run()
+                finally:
+                    stopped.set()
+                    thread.join()
+
+        self.assertEqual(1000, output.getvalue().count("Message from Alice"))
+        self.assertIn("message 999\n", output.getvalue())
+        self.assertEqual(0, server.store.mailbox_size("John"))
+
+    def test_create_retried_with_same_key(self) -> None:
+        """Tests that an unanswered create request is sent again unchanged."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "server.sock")
+            client = Client(
+                [
+                    f"unix:{path}",
+                    str(TestClient.port_number),
+                    "Alice",
+                    "create",
+                    "--retries",
+                    "2",
+                ]
+            )
+
+            packets = []
+            with socket.socket(socket.AF_UNIX) as welcoming_socket:
+                welcoming_socket.bind(path)
+                welcoming_socket.listen()
+
+                def serve() -> None:
+                    # Drop the first attempt without answering it
+                    for result_code in (None, ResultCode.OK):
+                        connection_socket, _ = welcoming_socket.accept()
+                        with connection_socket:
+                            packets.append(connection_socket.recv(4096))
+                            if result_code is not None:
+                                connection_socket.send(
+                                    ResultResponse(result_code).to_bytes()
+                                )
+
+                thread = threading.Thread(target=serve)
+                thread.start()
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        response = client.send_message_request(
+                            MessageRequest(
+                                MessageType.CREATE,
+                                "Alice",
+                                "John",
+                                "Hi John",
+                                {
+                                    RequestOption.IDEMPOTENCY_KEY: b"key",
+                                    RequestOption.ACKNOWLEDGE: b"",
+                                },
+                            )
+                        )
+                finally:
+                    thread.join()
+
+        self.assertEqual(2, len(packets))
+        self.assertEqual(packets[0], packets[1])
+        assert response is not None
+        self.assertEqual((ResultCode.OK,), ResultResponse.decode_packet(response))
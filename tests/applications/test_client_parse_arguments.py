@@ -28,6 +28,16 @@ class TestClientParseArguments(unittest.TestCase):
         """Test parsing an invalid IP address as hostname."""
         self.assertRaises(ValueError, Client.parse_hostname, "256.0.0.1")
 
+    def test_parse_host_name_unix_socket(self) -> None:
+        """Test parsing a Unix socket address as hostname."""
+        self.assertEqual(
+            "unix:/tmp/server.sock", Client.parse_hostname("unix:/tmp/server.sock")
+        )
+
+    def test_parse_host_name_unix_socket_without_path(self) -> None:
+        """Test parsing a Unix socket address with no path."""
+        self.assertRaises(ValueError, Client.parse_hostname, "unix:")
+
     def test_parse_username_min_length(self) -> None:
         """Test parsing a valid username with minimum length."""
         Client.parse_username("J")
@@ -0,0 +1,235 @@
+"""Cluster mode test suite."""
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from src.packets.message_request import MessageRequest
+from src.packets.message_response import MessageResponse
+from src.packets.response_framing import split_responses
+from src.packets.result_response import ResultResponse
+from src.message_type import MessageType
+from src.request_option import RequestOption
+from src.result_code import ResultCode
+from server.cluster import Cluster, load_cluster_config
+from server.hash_ring import HashRing
+from server import Server
+
+
+PROJECT_DIRECTORY = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+
+class TestClusterConfig(unittest.TestCase):
+    """Test suite for loading cluster configuration files."""
+
+    def setUp(self) -> None:
+        """Set up the testing environment."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "cluster.conf")
+
+    def write_config(self, text: str) -> None:
+        """Write the configuration file."""
+        with open(self.path, "w", encoding="utf-8") as config_file:
+            config_file.write(text)
+
+    def test_load(self) -> None:
+        """Tests that nodes are read in order, ignoring comments."""
+        self.write_config(
+            "# The cluster\n"
+            "alpha localhost 12000\n"
+            "\n"
+            "beta unix:/tmp/beta.sock  # same host\n"
+        )
+        alpha, beta = load_cluster_config(self.path)
+        self.assertEqual("alpha", alpha.name)
+        self.assertEqual(("localhost", 12000), alpha.address.socket_address)
+        self.assertEqual("beta", beta.name)
+        self.assertEqual("/tmp/beta.sock", beta.address.socket_address)
+
+    def test_invalid_configs(self) -> None:
+        """Tests that malformed configuration files are rejected."""
+        for text in (
+            "",
+            "alpha localhost\n",
+            "alpha localhost 80\n",
+            "alpha localhost 12000\nalpha localhost 12001\n",
+        ):
+            with self.subTest(text=text):
+                self.write_config(text)
+                self.assertRaises(ValueError, load_cluster_config, self.path)
+
+    def test_local_node_must_be_listed(self) -> None:
+        """Tests that a node cannot join a cluster it is not part of."""
+        self.write_config("alpha localhost 12000\n")
+        self.assertRaises(ValueError, Cluster, load_cluster_config(self.path), "beta")
+
+    def test_requests_admitted_by_owner(self) -> None:
+        """Tests that only the node holding a mailbox counts its requests."""
+        self.write_config("alpha localhost 12000\nbeta localhost 12001\n")
+        cluster = Cluster(load_cluster_config(self.path), "alpha")
+        for user_name in ("Alice", "Bob", "Carol", "Dave"):
+            owned = cluster.owner(user_name.encode()) == "alpha"
+            create = MessageRequest(MessageType.CREATE, "Eve", user_name, "Hi")
+            read = MessageRequest(MessageType.READ, user_name, "", "")
+            with self.subTest(user_name=user_name):
+                self.assertEqual(owned, cluster.admits_locally(create.to_bytes()))
+                self.assertEqual(owned, cluster.admits_locally(read.to_bytes()))
+
+    def test_peers_recognised_by_address(self) -> None:
+        """Tests that only the cluster's own nodes are trusted to forward."""
+        self.write_config("alpha 127.0.0.1 12000\nbeta 127.0.0.1 12001\n")
+        cluster = Cluster(load_cluster_config(self.path), "alpha")
+        self.assertTrue(cluster.is_peer(("127.0.0.1", 50000)))
+        self.assertFalse(cluster.is_peer(("192.0.2.1", 50000)))
+        self.assertFalse(cluster.is_peer(""))
+
+    def test_server_requires_node_name(self) -> None:
+        """Tests that a server in a cluster must be told which node it is."""
+        self.write_config("alpha localhost 12000\n")
+        self.assertRaises(SystemExit, Server, ["12000", "--cluster-config", self.path])
+
+
+class TestClusterNodes(unittest.TestCase):
+    """Test suite for several server processes running as a cluster."""
+
+    node_names = ["alpha", "beta", "gamma"]
+
+    def setUp(self) -> None:
+        """Start a server process for each node of the cluster."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.socket_paths = {
+            name: os.path.join(directory.name, f"{name}.sock")
+            for name in self.node_names + ["delta"]
+        }
+        config_path = os.path.join(directory.name, "cluster.conf")
+        with open(config_path, "w", encoding="utf-8") as config_file:
+            for name, path in self.socket_paths.items():
+                config_file.write(f"{name} unix:{path}\n")
+
+        environment = dict(os.environ, PYTHONPATH=PROJECT_DIRECTORY)
+        # delta is listed but never started, so it is always unavailable
+        for name in self.node_names:
+            process = subprocess.Popen(  # pylint: disable=consider-using-with
+                [
+                    sys.executable,
+                    "-m",
+                    "server",
+                    "12000",
+                    "--tcp",
+                    "off",
+                    "--unix-socket",
+                    self.socket_paths[name],
+                    "--cluster-config",
+                    config_path,
+                    "--node-name",
+                    name,
+                ],
+                cwd=directory.name,
+                env=environment,
+                stdout=subprocess.DEVNULL,
+            )
+            self.addCleanup(process.wait)
+            self.addCleanup(process.terminate)
+
+        deadline = time.monotonic() + 10
+        while not all(
+            os.path.exists(self.socket_paths[name]) for name in self.node_names
+        ):
+            if time.monotonic() > deadline:
+                self.fail("Cluster nodes did not start")
+            time.sleep(0.05)
+
+        self.ring = HashRing(list(self.socket_paths))
+
+    def user_owned_by(self, node_name: str) -> str:
+        """Find a user name whose mailbox is held by the given node."""
+        for index in range(1000):
+            user_name = f"user{index}"
+            if self.ring.owner(user_name.encode()) == node_name:
+                return user_name
+        raise AssertionError(f"No user is owned by {node_name}")
+
+    def exchange(
+        self, node_name: str, requests: list[bytes], count: int
+    ) -> list[bytes]:
+        """Send requests to a node and wait for ``count`` responses."""
+        with socket.socket(socket.AF_UNIX) as client_socket:
+            client_socket.settimeout(5)
+            client_socket.connect(self.socket_paths[node_name])
+            client_socket.sendall(b"".join(requests))
+
+            buffer = bytearray()
+            responses: list[bytes] = []
+            while len(responses) < count:
+                data = client_socket.recv(4096)
+                if not data:
+                    break
+                buffer += data
+                responses += split_responses(buffer)
+            return responses
+
+    def test_requests_forwarded_to_owner(self) -> None:
+        """Tests that a message sent via one node can be read via another."""
+        receiver_name = self.user_owned_by("beta")
+        acknowledge = {RequestOption.ACKNOWLEDGE: b""}
+        create = MessageRequest(
+            MessageType.CREATE, "Alice", receiver_name, "Hello", acknowledge
+        ).to_bytes()
+        unacknowledged_create = MessageRequest(
+            MessageType.CREATE, "Bob", receiver_name, "Hi"
+        ).to_bytes()
+        read = MessageRequest(MessageType.READ, receiver_name, "", "").to_bytes()
+
+        self.assertEqual(
+            [ResultResponse(ResultCode.OK).to_bytes()],
+            self.exchange("alpha", [unacknowledged_create, create], 1),
+        )
+
+        (response,) = self.exchange("gamma", [read], 1)
+        self.assertEqual(
+            ([("Bob", "Hi"), ("Alice", "Hello")], False),
+            MessageResponse.decode_packet(response),
+        )
+
+    def test_unavailable_node(self) -> None:
+        """Tests that requests for a node which is down are rejected."""
+        receiver_name = self.user_owned_by("delta")
+        create = MessageRequest(
+            MessageType.CREATE, "Alice", receiver_name, "Hello"
+        ).to_bytes()
+        reader_name = self.user_owned_by("alpha")
+        read = MessageRequest(MessageType.READ, reader_name, "", "").to_bytes()
+
+        responses = self.exchange("alpha", [create, read], 2)
+        self.assertEqual(
+            ResultResponse(ResultCode.UNAVAILABLE).to_bytes(), responses[0]
+        )
+        self.assertEqual(MessageResponse([]).to_bytes(), responses[1])
+
+    def test_windowed_read_forwarded(self) -> None:
+        """Tests that every page of a forwarded windowed read is passed back."""
+        receiver_name = self.user_owned_by("beta")
+        creates = [
+            MessageRequest(
+                MessageType.CREATE, "Alice", receiver_name, str(index)
+            ).to_bytes()
+            for index in range(300)
+        ]
+        window = {RequestOption.WINDOW: 3}
+        read = MessageRequest(
+            MessageType.READ, receiver_name, "", "", window
+        ).to_bytes()
+
+        first, second = self.exchange("gamma", creates + [read], 2)
+        self.assertEqual((255, True), MessageResponse.decode_header(first))
+        self.assertEqual((45, False), MessageResponse.decode_header(second))
+        self.assertEqual(("Alice", "299"), MessageResponse.decode_packet(second)[0][-1])
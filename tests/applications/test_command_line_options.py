@@ -0,0 +1,38 @@
+"""Test suite for optional command line arguments."""
+
+import unittest
+
+from server import Server
+
+
+class TestCommandLineOptions(unittest.TestCase):
+    """Test suite for parsing ``--option value`` arguments."""
+
+    def test_defaults(self) -> None:
+        """Tests that options take their default value when omitted."""
+        server = Server(["12000"])
+        self.assertEqual(128, server.listen_backlog)
+
+    def test_option_parsed(self) -> None:
+        """Tests that an option's value is parsed."""
+        server = Server(["--listen-backlog", "16", "12000", "--sender-rate", "2.5"])
+        self.assertEqual(16, server.listen_backlog)
+        self.assertEqual(12000, server.port_number)
+        self.assertEqual(2.5, server.admission.sender_limit.rate)
+
+    def test_unknown_option(self) -> None:
+        """Tests that an unknown option is rejected."""
+        self.assertRaises(SystemExit, Server, ["12000", "--unknown", "1"])
+
+    def test_missing_option_value(self) -> None:
+        """Tests that an option without a value is rejected."""
+        self.assertRaises(SystemExit, Server, ["12000", "--listen-backlog"])
+
+    def test_invalid_option_value(self) -> None:
+        """Tests that an option with an invalid value is rejected."""
+        self.assertRaises(SystemExit, Server, ["12000", "--listen-backlog", "0"])
+
+    def test_usage_prompt(self) -> None:
+        """Tests that options are listed in the usage prompt."""
+        server = Server(["12000"])
+        self.assertIn("[--max-connections <max_connections>]", server.usage_prompt)
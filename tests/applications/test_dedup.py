@@ -0,0 +1,87 @@
+"""Duplicate detection test suite."""
+
+import unittest
+
+from server.dedup import BloomFilter, DedupIndex
+from .fake_clock import FakeClock
+
+
+class TestBloomFilter(unittest.TestCase):
+    """Test suite for BloomFilter class."""
+
+    def test_no_false_negatives(self) -> None:
+        """Tests that every key added is found."""
+        bloom_filter = BloomFilter(1000, 0.01)
+        keys = [str(index).encode() for index in range(1000)]
+        for key in keys:
+            bloom_filter.add(key)
+
+        self.assertTrue(all(key in bloom_filter for key in keys))
+
+    def test_false_positive_rate(self) -> None:
+        """Tests that new keys are rarely mistaken for members of a full filter."""
+        bloom_filter = BloomFilter(1000, 0.01)
+        for index in range(1000):
+            bloom_filter.add(f"added {index}".encode())
+
+        false_positives = sum(
+            f"new {index}".encode() in bloom_filter for index in range(10000)
+        )
+        self.assertLess(false_positives, 300)
+
+    def test_power_of_two_size(self) -> None:
+        """Tests that the filter's size is rounded up to a power of two."""
+        for capacity in (1, 1000, 1024, 100_000):
+            bloom_filter = BloomFilter(capacity, 0.01)
+            self.assertEqual(0, bloom_filter.size & (bloom_filter.size - 1))
+            self.assertEqual(bloom_filter.size // 8, len(bloom_filter.bits))
+
+
+class TestDedupIndex(unittest.TestCase):
+    """Test suite for DedupIndex class."""
+
+    def setUp(self) -> None:
+        """Create an index with a one minute window."""
+        self.clock = FakeClock()
+        self.index = DedupIndex(60, 1000, 2, clock=self.clock)
+
+    def test_recent_keys_are_exact(self) -> None:
+        """Tests that the most recent keys are certainly recognised."""
+        self.index.add(b"one")
+        self.index.add(b"two")
+
+        self.assertTrue(self.index.is_duplicate(b"two"))
+        self.assertFalse(self.index.is_duplicate(b"three"))
+        self.assertFalse(self.index.is_probable_duplicate(b"three"))
+
+    def test_older_keys_are_probable(self) -> None:
+        """Tests that keys pushed out of the exact set are still recognised."""
+        for key in (b"one", b"two", b"three"):
+            self.index.add(key)
+
+        self.assertFalse(self.index.is_duplicate(b"one"))
+        self.assertTrue(self.index.is_probable_duplicate(b"one"))
+        self.assertEqual(1, self.index.stats["probable_duplicates"])
+
+    def test_keys_forgotten_after_window(self) -> None:
+        """Tests that keys are remembered for at least one window, and at most two."""
+        self.index.add(b"one")
+        self.clock.now = 59
+        self.assertTrue(self.index.is_probable_duplicate(b"one"))
+
+        self.clock.now = 60
+        self.index.add(b"two")
+        self.assertTrue(self.index.is_probable_duplicate(b"one"))
+
+        self.clock.now = 120
+        self.assertFalse(self.index.is_probable_duplicate(b"one"))
+        self.assertTrue(self.index.is_probable_duplicate(b"two"))
+
+    def test_full_filter_rotated(self) -> None:
+        """Tests that a filter is replaced once it holds its capacity."""
+        index = DedupIndex(60, 10, 0, clock=self.clock)
+        for key in range(25):
+            index.add(str(key).encode())
+
+        self.assertLessEqual(index.stats["keys"], 20)
+        self.assertTrue(index.is_probable_duplicate(b"24"))
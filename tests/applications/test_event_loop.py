@@ -0,0 +1,267 @@
+"""``EventLoop`` class test suite."""
+
+import os
+import socket
+import tempfile
+import time
+import unittest
+import unittest.mock
+from typing import Optional, Union
+
+from src.packets.message_request import MessageRequest
+from src.packets.message_response import MessageResponse
+from src.packets.result_response import ResultResponse
+from src.message_type import MessageType
+from src.request_option import RequestOption
+from src.result_code import ResultCode
+from server.admission import AdmissionController
+from server.connection import (
+    Connection,
+    ConnectionPhase,
+    PendingResponse,
+    StreamedResponse,
+)
+from server.event_loop import EventLoop
+from server import Server
+from .fake_clock import FakeClock
+
+
+class TestEventLoop(unittest.TestCase):
+    """Test suite for EventLoop class."""
+
+    def setUp(self) -> None:
+        """Start an event loop serving a server on an ephemeral port."""
+        self.clock = FakeClock()
+        self.server = Server(["12000"])
+        self.welcoming_socket = socket.socket()
+        self.welcoming_socket.bind(("localhost", 0))
+        self.welcoming_socket.listen()
+        self.address = self.welcoming_socket.getsockname()
+
+        self.timeouts = {
+            ConnectionPhase.READ_HEADER: 10.0,
+            ConnectionPhase.READ_BODY: 5.0,
+            ConnectionPhase.WRITE: 5.0,
+        }
+        self.event_loop = self.create_event_loop(self.server.admission)
+
+    def tearDown(self) -> None:
+        """Close the event loop and welcoming socket."""
+        self.event_loop.close()
+        self.welcoming_socket.close()
+
+    def create_event_loop(self, admission: AdmissionController) -> EventLoop:
+        """Create an event loop serving ``self.server``."""
+        return EventLoop(
+            [self.welcoming_socket],
+            self.server.handle_request,
+            admission,
+            self.timeouts,
+            lambda: None,
+            60.0,
+            clock=self.clock,
+        )
+
+    def connect(self) -> socket.socket:
+        """Open a client connection and let the event loop accept it."""
+        client_socket = socket.create_connection(self.address)
+        self.addCleanup(client_socket.close)
+        self.event_loop.run_once()
+        return client_socket
+
+    def receive(self, client_socket: socket.socket, size: int) -> bytes:
+        """Run the event loop until ``size`` bytes have arrived at the client."""
+        client_socket.settimeout(0.01)
+        data = b""
+        for _ in range(100):
+            self.event_loop.run_once()
+            try:
+                data += client_socket.recv(size - len(data))
+            except TimeoutError:
+                continue
+            if len(data) == size:
+                break
+        return data
+
+    def test_pipelined_requests(self) -> None:
+        """Tests that several requests on one connection are all served."""
+        client_socket = self.connect()
+        requests = [
+            MessageRequest(MessageType.CREATE, "Alice", "John", "Hello"),
+            MessageRequest(MessageType.CREATE, "Bob", "John", "Hi"),
+            MessageRequest(MessageType.READ, "John", "", ""),
+            MessageRequest(MessageType.READ, "John", "", ""),
+        ]
+        client_socket.sendall(b"".join(request.to_bytes() for request in requests))
+
+        first = MessageResponse([("Alice", b"Hello"), ("Bob", b"Hi")]).to_bytes()
+        second = MessageResponse([]).to_bytes()
+        expected = first + second
+        self.assertEqual(expected, self.receive(client_socket, len(expected)))
+
+    def test_urgent_requests_served_first(self) -> None:
+        """Tests that urgent requests overtake those on other connections."""
+        served = []
+
+        def handle_request(
+            request: bytes, connection: Optional[Connection]
+        ) -> Union[bytes, PendingResponse, StreamedResponse, None]:
+            served.append(MessageRequest.decode_packet(request)[3])
+            return self.server.handle_request(request, connection)
+
+        self.event_loop.handle_request = handle_request
+        bulk_socket = self.connect()
+        urgent_socket = self.connect()
+        bulk_socket.sendall(
+            b"".join(
+                MessageRequest(MessageType.CREATE, "Alice", "John", message).to_bytes()
+                for message in ("one", "two", "three")
+            )
+        )
+        urgent_socket.sendall(
+            MessageRequest(
+                MessageType.CREATE, "Bob", "John", "now", {RequestOption.PRIORITY: 9}
+            ).to_bytes()
+        )
+        # Let both batches arrive, so they are served in the same round
+        time.sleep(0.05)
+        self.event_loop.run_once()
+
+        self.assertEqual([b"now", b"one", b"two", b"three"], served)
+
+    def test_request_split_across_packets(self) -> None:
+        """Tests that a request is served once all of it has arrived."""
+        client_socket = self.connect()
+        request = MessageRequest(MessageType.READ, "John", "", "").to_bytes()
+
+        client_socket.sendall(request[:-2])
+        self.event_loop.run_once()
+        (connection,) = self.event_loop.connections
+        self.assertEqual(ConnectionPhase.READ_BODY, connection.phase)
+
+        client_socket.sendall(request[-2:])
+        expected = MessageResponse([]).to_bytes()
+        self.assertEqual(expected, self.receive(client_socket, len(expected)))
+
+    def test_idle_connection_reaped(self) -> None:
+        """Tests that a connection is closed once its header deadline passes."""
+        self.connect()
+        self.assertEqual(1, len(self.event_loop.connections))
+
+        self.clock.now = 9.0
+        self.event_loop.run_once()
+        self.assertEqual(1, len(self.event_loop.connections))
+
+        self.clock.now = 11.0
+        self.event_loop.run_once()
+        self.assertEqual(0, len(self.event_loop.connections))
+        self.assertEqual(1, self.event_loop.timed_out_connections)
+
+    def test_forwarded_connection_reaped_outside_cluster(self) -> None:
+        """Tests that claiming to be another cluster node does not stop reaping."""
+        client_socket = self.connect()
+        request = MessageRequest(
+            MessageType.READ,
+            "John",
+            "",
+            "",
+            {RequestOption.FORWARDED: (1).to_bytes(8, "big")},
+        ).to_bytes()
+        client_socket.sendall(request)
+        expected = MessageResponse([]).to_bytes()
+        self.assertEqual(expected, self.receive(client_socket, len(expected)))
+        (connection,) = self.event_loop.connections
+        self.assertFalse(connection.persistent)
+
+        self.clock.now = 11.0
+        self.event_loop.run_once()
+        self.assertEqual(0, len(self.event_loop.connections))
+
+    def test_slow_body_reaped(self) -> None:
+        """Tests that a client sending part of a request is cut off sooner."""
+        client_socket = self.connect()
+        request = MessageRequest(MessageType.READ, "John", "", "").to_bytes()
+        client_socket.sendall(request[:-2])
+        self.event_loop.run_once()
+
+        self.clock.now = 6.0
+        self.event_loop.run_once()
+        self.assertEqual(0, len(self.event_loop.connections))
+
+    def test_progress_restarts_deadline(self) -> None:
+        """Tests that serving a request gives the client a fresh deadline."""
+        client_socket = self.connect()
+        request = MessageRequest(MessageType.READ, "John", "", "").to_bytes()
+        expected = MessageResponse([]).to_bytes()
+
+        self.clock.now = 8.0
+        client_socket.sendall(request)
+        self.assertEqual(expected, self.receive(client_socket, len(expected)))
+
+        self.clock.now = 16.0
+        self.event_loop.run_once()
+        self.assertEqual(1, len(self.event_loop.connections))
+
+    def test_connection_cap(self) -> None:
+        """Tests that connections over the cap are told the server is overloaded."""
+        self.event_loop.close()
+        self.event_loop = self.create_event_loop(AdmissionController(max_connections=1))
+        self.connect()
+
+        rejected_socket = self.connect()
+        rejected_socket.settimeout(1)
+        packet = rejected_socket.recv(1024)
+        self.assertEqual((ResultCode.OVERLOADED,), ResultResponse.decode_packet(packet))
+        self.assertEqual(1, len(self.event_loop.connections))
+
+    def test_invalid_request_closes_connection(self) -> None:
+        """Tests that a connection sending garbage is closed."""
+        client_socket = self.connect()
+        client_socket.sendall(b"\x00\x00\x00\x00\x00\x00\x00\x00")
+        self.event_loop.run_once()
+        self.assertEqual(0, len(self.event_loop.connections))
+
+    def test_attachment_sent_from_disk(self) -> None:
+        """Tests that an attachment is spooled as it arrives and sent by sendfile."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.server.attachments.directory = directory.name
+        attachment = os.urandom(3 * MessageRequest.MAX_CHUNK_SIZE + 100)
+
+        client_socket = self.connect()
+        request = MessageRequest(
+            MessageType.CREATE,
+            "Alice",
+            "John",
+            "Photo",
+            {
+                RequestOption.ATTACHMENT: len(attachment),
+                RequestOption.ACKNOWLEDGE: b"",
+            },
+        )
+        client_socket.sendall(request.to_bytes())
+        for offset in range(0, len(attachment), MessageRequest.MAX_CHUNK_SIZE):
+            chunk = attachment[offset : offset + MessageRequest.MAX_CHUNK_SIZE]
+            client_socket.sendall(MessageRequest.encode_chunk("Alice", chunk))
+            self.event_loop.run_once()
+
+        expected = ResultResponse(ResultCode.OK).to_bytes()
+        self.assertEqual(expected, self.receive(client_socket, len(expected)))
+        self.assertEqual(1, len(os.listdir(directory.name)))
+
+        with unittest.mock.patch("os.sendfile", wraps=os.sendfile) as sendfile:
+            client_socket.sendall(
+                MessageRequest(MessageType.READ, "John", "", "").to_bytes()
+            )
+            header = MessageResponse(
+                [("Alice", b"Photo")], attachment_sizes=[(0, len(attachment))]
+            ).to_bytes()
+            packet = self.receive(client_socket, len(header) + len(attachment))
+
+        self.assertTrue(sendfile.called)
+        self.assertEqual(
+            ([("Alice", "Photo")], False), MessageResponse.decode_packet(packet)
+        )
+        self.assertEqual({0: attachment}, MessageResponse.decode_attachments(packet))
+        # Delivered attachments are removed from the spool
+        self.assertEqual([], os.listdir(directory.name))
@@ -0,0 +1,49 @@
+"""``HashRing`` class test suite."""
+
+import unittest
+
+from server.hash_ring import HashRing
+
+
+class TestHashRing(unittest.TestCase):
+    """Test suite for HashRing class."""
+
+    def setUp(self) -> None:
+        """Set up the testing environment."""
+        self.keys = [f"user{index}".encode() for index in range(3000)]
+
+    def test_single_node(self) -> None:
+        """Tests that a lone node owns every key."""
+        ring = HashRing(["alpha"])
+        self.assertEqual({"alpha"}, {ring.owner(key) for key in self.keys})
+
+    def test_owner_is_deterministic(self) -> None:
+        """Tests that separately built rings agree on every owner."""
+        first = HashRing(["alpha", "beta", "gamma"])
+        second = HashRing(["gamma", "alpha", "beta"])
+        for key in self.keys:
+            self.assertEqual(first.owner(key), second.owner(key))
+
+    def test_keys_spread_between_nodes(self) -> None:
+        """Tests that each node owns a fair share of the keys."""
+        ring = HashRing(["alpha", "beta", "gamma"])
+        counts = {"alpha": 0, "beta": 0, "gamma": 0}
+        for key in self.keys:
+            counts[ring.owner(key)] += 1
+
+        for count in counts.values():
+            self.assertGreater(count, len(self.keys) / 6)
+
+    def test_adding_node_moves_few_keys(self) -> None:
+        """Tests that a new node only takes keys, and about its share of them."""
+        before = HashRing(["alpha", "beta", "gamma"])
+        after = HashRing(["alpha", "beta", "gamma", "delta"])
+
+        moved = [key for key in self.keys if before.owner(key) != after.owner(key)]
+        self.assertEqual({"delta"}, {after.owner(key) for key in moved})
+        self.assertLess(len(moved), len(self.keys) / 2)
+
+    def test_invalid_nodes(self) -> None:
+        """Tests that a ring needs at least one uniquely named node."""
+        self.assertRaises(ValueError, HashRing, [])
+        self.assertRaises(ValueError, HashRing, ["alpha", "alpha"])
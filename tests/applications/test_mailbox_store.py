@@ -0,0 +1,486 @@
+"""``MailboxStore`` class test suite."""
+
+from unittest import mock
+import os
+import tempfile
+import unittest
+
+from src.result_code import ResultCode
+from server.mailbox_store import MailboxStore, QuotaExceededError, QuotaPolicy
+from server.stored_message import StoredMessage
+from .fake_clock import FakeClock
+
+
+def message_size(sender_name: str, message: bytes) -> int:
+    """Get the number of bytes a message is accounted as."""
+    return StoredMessage(sender_name, message).size
+
+
+class TestMailboxStore(unittest.TestCase):
+    """Test suite for MailboxStore class."""
+
+    def setUp(self) -> None:
+        """Set up a temporary spill directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_size_accounting(self) -> None:
+        """Tests that a message is accounted as the size of its packet."""
+        self.assertEqual(3 + 5 + 11, message_size("Alice", b"Hello John!"))
+
+    def test_add_peek_drain(self) -> None:
+        """Tests that messages are returned oldest first and removed on drain."""
+        store = MailboxStore()
+        store.add("John", "Alice", b"one")
+        store.add("John", "Bob", b"two")
+        store.add("John", "Carol", b"three")
+
+        peeked = store.peek("John", 2)
+        self.assertEqual([b"one", b"two"], [stored.message for stored in peeked])
+        self.assertEqual(3, store.mailbox_size("John"))
+
+        store.drain("John", 2)
+        self.assertEqual(
+            [b"three"], [stored.message for stored in store.peek("John", 5)]
+        )
+
+    def test_sequence_numbers(self) -> None:
+        """Tests that messages are numbered in order across every mailbox."""
+        store = MailboxStore()
+        store.add("John", "Alice", b"one")
+        store.add("Jane", "Alice", b"two")
+        store.add("John", "Bob", b"three")
+        store.drain("Jane", 1)
+        store.add("Jane", "Bob", b"four")
+
+        self.assertEqual([1, 3], [stored.sequence for stored in store.peek("John", 5)])
+        self.assertEqual([4], [stored.sequence for stored in store.peek("Jane", 5)])
+        self.assertEqual(
+            [3], [stored.sequence for stored in store.peek("John", 5, after_sequence=1)]
+        )
+
+    def test_acknowledge(self) -> None:
+        """Tests that acknowledging a sequence number removes messages up to it."""
+        store = MailboxStore()
+        for message in (b"one", b"two", b"three"):
+            store.add("John", "Alice", message)
+
+        self.assertEqual(2, store.acknowledge("John", 2))
+        self.assertEqual(
+            [b"three"], [stored.message for stored in store.peek("John", 5)]
+        )
+        self.assertEqual(0, store.acknowledge("John", 2))
+        self.assertEqual(1, store.acknowledge("John", 10))
+        self.assertEqual(0, store.mailbox_size("John"))
+
+    def test_priority_lanes(self) -> None:
+        """Tests that higher priority messages are delivered first, each lane in turn."""
+        store = MailboxStore()
+        store.add("John", "Alice", b"one")
+        store.add("John", "Alice", b"two", priority=5)
+        store.add("John", "Alice", b"three", priority=1)
+        store.add("John", "Alice", b"four", priority=5)
+
+        messages = store.peek("John", 5)
+        self.assertEqual(
+            [b"two", b"four", b"three", b"one"], [s.message for s in messages]
+        )
+        self.assertEqual([5, 5, 1, 0], [s.priority for s in messages])
+        self.assertEqual(
+            [b"three", b"one"],
+            [s.message for s in store.peek("John", 5, after_sequence={5: 4})],
+        )
+
+        store.drain("John", 3)
+        self.assertEqual([b"one"], [s.message for s in store.peek("John", 5)])
+
+    def test_acknowledge_lanes(self) -> None:
+        """Tests that acknowledging by lane removes only the messages sent from each."""
+        store = MailboxStore()
+        store.add("John", "Alice", b"one")
+        store.add("John", "Alice", b"two", priority=2)
+        store.add("John", "Alice", b"three", priority=2)
+        store.add("John", "Alice", b"four")
+
+        self.assertEqual(3, store.acknowledge("John", {2: 3, 0: 1}))
+        self.assertEqual([b"four"], [s.message for s in store.peek("John", 5)])
+
+    def test_evict_lowest_lane_first(self) -> None:
+        """Tests that the evict policy discards the least urgent messages first."""
+        size = message_size("Alice", b"one")
+        store = MailboxStore(mailbox_byte_limit=size * 2, policy=QuotaPolicy.EVICT)
+        store.add("John", "Alice", b"one", priority=1)
+        store.add("John", "Alice", b"two")
+        store.add("John", "Alice", b"six", priority=1)
+        self.assertEqual([b"one", b"six"], [s.message for s in store.peek("John", 5)])
+
+    def test_memory_accounting(self) -> None:
+        """Tests that the bytes held are tracked exactly across adds and drains."""
+        store = MailboxStore()
+        store.add("John", "Alice", b"Hello")
+        store.add("Jane", "Bob", b"Hi")
+        expected = message_size("Alice", b"Hello") + message_size("Bob", b"Hi")
+        self.assertEqual(expected, store.memory_bytes)
+        self.assertEqual(2, store.message_count)
+
+        store.drain("John", 1)
+        self.assertEqual(message_size("Bob", b"Hi"), store.memory_bytes)
+        self.assertEqual(1, store.stats["mailboxes"])
+
+    def test_mailbox_message_limit_reject(self) -> None:
+        """Tests that messages to a full mailbox are rejected."""
+        store = MailboxStore(mailbox_message_limit=2)
+        store.add("John", "Alice", b"one")
+        store.add("John", "Alice", b"two")
+        with self.assertRaises(QuotaExceededError) as context:
+            store.add("John", "Alice", b"three")
+        self.assertEqual(ResultCode.MAILBOX_FULL, context.exception.result_code)
+        self.assertEqual(1, store.rejected_messages)
+
+    def test_mailbox_byte_limit_evict(self) -> None:
+        """Tests that the evict policy discards the oldest messages in a full mailbox."""
+        size = message_size("Alice", b"one")
+        store = MailboxStore(mailbox_byte_limit=size * 2, policy=QuotaPolicy.EVICT)
+        store.add("John", "Alice", b"one")
+        store.add("John", "Alice", b"two")
+        store.add("John", "Alice", b"six")
+        self.assertEqual([b"two", b"six"], [s.message for s in store.peek("John", 5)])
+        self.assertEqual(1, store.evicted_messages)
+
+    def test_memory_limit_reject(self) -> None:
+        """Tests that messages are rejected once the memory limit is reached."""
+        store = MailboxStore(memory_limit=message_size("Alice", b"one"))
+        store.add("John", "Alice", b"one")
+        with self.assertRaises(QuotaExceededError) as context:
+            store.add("Jane", "Alice", b"two")
+        self.assertEqual(ResultCode.STORE_FULL, context.exception.result_code)
+        self.assertEqual(0, store.mailbox_size("Jane"))
+
+    def test_memory_limit_evicts_coldest_mailbox(self) -> None:
+        """Tests that the evict policy removes messages from the least recently used mailbox."""
+        size = message_size("Alice", b"one")
+        store = MailboxStore(memory_limit=size * 2, policy=QuotaPolicy.EVICT)
+        store.add("John", "Alice", b"one")
+        store.add("Jane", "Alice", b"two")
+        store.peek("John", 1)
+        store.add("Jack", "Alice", b"six")
+
+        self.assertEqual(0, store.mailbox_size("Jane"))
+        self.assertEqual(1, store.mailbox_size("John"))
+        self.assertEqual(1, store.mailbox_size("Jack"))
+        self.assertEqual(size * 2, store.memory_bytes)
+
+    def test_memory_limit_spills_and_reloads(self) -> None:
+        """Tests that the spill policy moves cold mailboxes to disk and back."""
+        size = message_size("Alice", b"one")
+        store = MailboxStore(
+            memory_limit=size * 2,
+            policy=QuotaPolicy.SPILL,
+            spill_directory=self.directory.name,
+        )
+        store.add("John", "Alice", b"one")
+        store.add("John", "Bob", b"two")
+        store.add("Jane", "Alice", b"six")
+
+        self.assertEqual(size, store.memory_bytes)
+        self.assertEqual(size + message_size("Bob", b"two"), store.spilled_bytes)
+        self.assertEqual(2, store.mailbox_size("John"))
+        self.assertEqual(1, len(os.listdir(self.directory.name)))
+
+        messages = store.peek("John", 5)
+        self.assertEqual(
+            [("Alice", b"one"), ("Bob", b"two")],
+            [(stored.sender_name, stored.message) for stored in messages],
+        )
+        # Reloading John's mailbox pushes Jane's out to disk in its place
+        self.assertEqual(size, store.spilled_bytes)
+        self.assertEqual(1, store.mailbox_size("Jane"))
+
+    def test_spilled_messages_precede_new_messages(self) -> None:
+        """Tests that messages stay in order when a spilled mailbox receives more."""
+        size = message_size("Alice", b"one")
+        store = MailboxStore(
+            memory_limit=size,
+            policy=QuotaPolicy.SPILL,
+            spill_directory=self.directory.name,
+        )
+        store.add("John", "Alice", b"one")
+        store.add("John", "Alice", b"two")
+        store.add("John", "Alice", b"six")
+        messages = store.peek("John", 5)
+        self.assertEqual([b"one", b"two", b"six"], [s.message for s in messages])
+
+    def test_spill_files_of_earlier_run_ignored(self) -> None:
+        """Tests that a new store does not load a spill file it did not write."""
+        for messages in ([b"old", b"odd"], [b"new", b"now"]):
+            # Each store stands for a run of the server, stopped without reloading
+            store = MailboxStore(
+                memory_limit=message_size("Alice", b"one"),
+                policy=QuotaPolicy.SPILL,
+                spill_directory=self.directory.name,
+            )
+            for message in messages:
+                store.add("John", "Alice", message)
+
+        self.assertEqual(2, store.mailbox_size("John"))
+        self.assertEqual(
+            [b"new", b"now"], [stored.message for stored in store.peek("John", 5)]
+        )
+
+    def test_snapshot_streams_spill_file(self) -> None:
+        """Tests that a snapshot reads spilled messages without reloading them."""
+        store = MailboxStore(
+            memory_limit=message_size("Alice", b"one"),
+            policy=QuotaPolicy.SPILL,
+            spill_directory=self.directory.name,
+        )
+        messages = [b"one", b"two", b"six", b"ten"]
+        for message in messages:
+            store.add("John", "Alice", message)
+
+        # Messages are split across reads of the file
+        with mock.patch.object(MailboxStore, "SPILL_READ_SIZE", 10):
+            snapshot = [stored.message for _, stored in store.snapshot()]
+        self.assertEqual(messages, snapshot)
+        self.assertGreater(store.stats["spilled_bytes"], 0)
+
+    def test_spilled_messages_keep_sequence_numbers(self) -> None:
+        """Tests that spilling a mailbox does not renumber its messages."""
+        store = MailboxStore(
+            memory_limit=message_size("Alice", b"one"),
+            policy=QuotaPolicy.SPILL,
+            spill_directory=self.directory.name,
+        )
+        store.add("John", "Alice", b"one")
+        store.add("John", "Alice", b"two")
+
+        self.assertEqual(1, store.acknowledge("John", 1))
+        self.assertEqual([2], [stored.sequence for stored in store.peek("John", 5)])
+
+    def test_spilled_messages_keep_priority(self) -> None:
+        """Tests that a spilled mailbox is reloaded into the same lanes."""
+        store = MailboxStore(
+            memory_limit=message_size("Alice", b"one"),
+            policy=QuotaPolicy.SPILL,
+            spill_directory=self.directory.name,
+        )
+        store.add("John", "Alice", b"one")
+        store.add("John", "Alice", b"two", priority=3)
+        store.add("Jane", "Alice", b"six")
+
+        messages = store.peek("John", 5)
+        self.assertEqual([b"two", b"one"], [s.message for s in messages])
+        self.assertEqual([3, 0], [s.priority for s in messages])
+
+    def test_mailbox_status(self) -> None:
+        """Tests that a mailbox is summarised from its running totals."""
+        clock = FakeClock()
+        store = MailboxStore(clock=clock)
+        self.assertEqual((0, 0, 0.0), store.mailbox_status("John"))
+
+        store.add("John", "Alice", b"one", time_to_live=5)
+        clock.now = 2.0
+        store.add("John", "Bob", b"two")
+        clock.now = 3.0
+        self.assertEqual(
+            (2, message_size("Alice", b"one") + message_size("Bob", b"two"), 3.0),
+            store.mailbox_status("John"),
+        )
+
+        clock.now = 6.0
+        store.expire()
+        self.assertEqual(
+            (1, message_size("Bob", b"two"), 4.0), store.mailbox_status("John")
+        )
+
+    def test_spilled_mailbox_status(self) -> None:
+        """Tests that a spilled mailbox is summarised without loading it."""
+        clock = FakeClock()
+        store = MailboxStore(
+            memory_limit=message_size("Alice", b"one"),
+            policy=QuotaPolicy.SPILL,
+            spill_directory=self.directory.name,
+            clock=clock,
+        )
+        store.add("John", "Alice", b"one")
+        clock.now = 1.0
+        store.add("John", "Alice", b"two")
+        clock.now = 10.0
+
+        self.assertEqual(10.0, store.mailbox_status("John").oldest_age)
+        self.assertGreater(store.spilled_bytes, 0)
+
+        store.peek("John", 5)
+        store.drain("John", 1)
+        self.assertEqual(9.0, store.mailbox_status("John").oldest_age)
+
+    def test_message_expiry(self) -> None:
+        """Tests that messages are removed once their time to live has passed."""
+        clock = FakeClock()
+        store = MailboxStore(clock=clock)
+        store.add("John", "Alice", b"short", time_to_live=5)
+        store.add("John", "Alice", b"forever", time_to_live=0)
+
+        clock.now = 4.0
+        self.assertEqual(0, store.expire())
+        clock.now = 5.0
+        self.assertEqual(1, store.expire())
+
+        self.assertEqual([b"forever"], [s.message for s in store.peek("John", 5)])
+        self.assertEqual(message_size("Alice", b"forever"), store.memory_bytes)
+        self.assertEqual(1, store.stats["expired_messages"])
+
+    def test_default_time_to_live(self) -> None:
+        """Tests that the default time to live applies when none is given."""
+        clock = FakeClock()
+        store = MailboxStore(default_time_to_live=10, clock=clock)
+        store.add("John", "Alice", b"Hello")
+        clock.now = 10.0
+        store.expire()
+        self.assertEqual(0, store.mailbox_size("John"))
+        self.assertEqual(0, store.stats["mailboxes"])
+
+    def test_expired_message_excluded_before_expiry_runs(self) -> None:
+        """Tests that a message past its time to live is never peeked."""
+        clock = FakeClock()
+        store = MailboxStore(clock=clock)
+        store.add("John", "Alice", b"one")
+        store.add("John", "Alice", b"two", time_to_live=1)
+        store.add("John", "Alice", b"six")
+        clock.now = 1.5
+
+        messages = store.peek("John", 5)
+        self.assertEqual([b"one", b"six"], [s.message for s in messages])
+
+        store.drain("John", len(messages))
+        self.assertEqual(0, store.mailbox_size("John"))
+        self.assertEqual(0, store.memory_bytes)
+
+    def test_expired_in_middle_of_mailbox(self) -> None:
+        """Tests that draining skips over messages which expired in place."""
+        clock = FakeClock()
+        store = MailboxStore(clock=clock)
+        store.add("John", "Alice", b"one")
+        store.add("John", "Alice", b"two", time_to_live=1)
+        store.add("John", "Alice", b"six")
+        clock.now = 2.0
+        store.expire()
+        self.assertEqual(2, store.mailbox_size("John"))
+
+        store.drain("John", 1)
+        self.assertEqual([b"six"], [s.message for s in store.peek("John", 5)])
+
+    def test_spilled_messages_expire(self) -> None:
+        """Tests that messages which expire while spilled are dropped on reload."""
+        clock = FakeClock()
+        size = message_size("Alice", b"one")
+        store = MailboxStore(
+            memory_limit=size,
+            policy=QuotaPolicy.SPILL,
+            spill_directory=self.directory.name,
+            clock=clock,
+        )
+        store.add("John", "Alice", b"one", time_to_live=5)
+        store.add("Jane", "Alice", b"two")
+        clock.now = 6.0
+
+        self.assertEqual([], store.peek("John", 5))
+        self.assertEqual(1, store.stats["expired_messages"])
+        self.assertEqual(0, store.stats["spilled_bytes"])
+
+    def test_search(self) -> None:
+        """Tests that indexed and unindexed stores find the same messages."""
+        for search_memory_limit in (None, 0):
+            store = MailboxStore(search_memory_limit=search_memory_limit)
+            store.add("John", "Alice", b"Lunch at noon?")
+            store.add("John", "Bob", b"Meeting moved")
+            store.add("John", "Alice", b"lunch is cancelled, meeting instead")
+
+            messages = store.search("John", {"lunch"}, 5)
+            self.assertEqual([1, 3], [s.sequence for s in messages])
+            messages = store.search("John", {"lunch", "meeting"}, 5)
+            self.assertEqual([3], [s.sequence for s in messages])
+            messages = store.search("John", {"meeting"}, 5, after_sequence=2)
+            self.assertEqual([3], [s.sequence for s in messages])
+            self.assertEqual([], store.search("Jane", {"lunch"}, 5))
+
+            # Searching leaves the messages in place
+            self.assertEqual(3, store.mailbox_size("John"))
+
+    def test_search_candidates(self) -> None:
+        """Tests that unindexed mailboxes give up their messages to be searched."""
+        clock = FakeClock()
+        store = MailboxStore(clock=clock)
+        store.add("John", "Alice", b"one")
+        store.add("John", "Alice", b"two", priority=1)
+        store.add("John", "Alice", b"six", time_to_live=1)
+        store.add("John", "Alice", b"ten")
+        clock.now = 2.0
+
+        self.assertEqual(
+            ([2, 4], [b"two", b"ten"], None), store.search_candidates("John", 1)
+        )
+        # Every lane is read up to the same point, so no message is skipped
+        self.assertEqual(
+            ([1, 2], [b"one", b"two"], 3), store.search_candidates("John", 0, 2)
+        )
+        self.assertEqual(([4], [b"ten"], None), store.search_candidates("John", 3, 2))
+        self.assertEqual(
+            [b"ten", b"one"],
+            [s.message for s in store.find_messages("John", [4, 3, 1])],
+        )
+        indexed = MailboxStore(search_memory_limit=0)
+        indexed.add("John", "Alice", b"one")
+        self.assertIsNone(indexed.search_candidates("John"))
+
+    def test_holds(self) -> None:
+        """Tests that a message is only held until it is delivered."""
+        store = MailboxStore()
+        first = store.add("John", "Alice", b"one")
+        second = store.add("John", "Alice", b"two", priority=1)
+        self.assertEqual(first + 1, second)
+
+        self.assertTrue(store.holds("John", first))
+        self.assertFalse(store.holds("Jane", first))
+        store.drain("John", 1)
+        self.assertTrue(store.holds("John", first))
+        self.assertFalse(store.holds("John", second))
+
+    def test_search_index_follows_removals(self) -> None:
+        """Tests that delivered and expired messages leave the search index."""
+        clock = FakeClock()
+        store = MailboxStore(clock=clock, search_memory_limit=0)
+        store.add("John", "Alice", b"hello")
+        store.add("John", "Alice", b"hello again", time_to_live=1)
+        store.add("John", "Alice", b"hello there")
+
+        store.drain("John", 1)
+        clock.now = 2.0
+        self.assertEqual(
+            [b"hello there"], [s.message for s in store.search("John", {"hello"}, 5)]
+        )
+        self.assertEqual(1, store.stats["search_indexed_messages"])
+
+        store.drain("John", 1)
+        self.assertEqual(0, store.stats["search_indexed_messages"])
+        self.assertEqual(0, store.stats["search_memory_bytes"])
+
+    def test_search_spilled_mailbox(self) -> None:
+        """Tests that spilled mailboxes are loaded back to be searched."""
+        size = message_size("Alice", b"one")
+        store = MailboxStore(
+            memory_limit=size,
+            policy=QuotaPolicy.SPILL,
+            spill_directory=self.directory.name,
+            search_memory_limit=0,
+        )
+        store.add("John", "Alice", b"one")
+        store.add("Jane", "Alice", b"two")
+
+        messages = store.search("John", {"one"}, 5)
+        self.assertEqual([b"one"], [s.message for s in messages])
+
+    def test_quota_policy_from_str(self) -> None:
+        """Tests that quota policies are parsed from strings."""
+        self.assertEqual(QuotaPolicy.SPILL, QuotaPolicy.from_str("spill"))
+        self.assertRaises(ValueError, QuotaPolicy.from_str, "invalid")
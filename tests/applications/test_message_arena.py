@@ -0,0 +1,147 @@
+"""``MessageArena`` and ``MessageColumns`` class test suite."""
+
+import unittest
+
+from server.mailbox_store import MailboxStore
+from server.message_arena import MessageArena, MessageColumns
+from server.stored_message import StoredMessage
+from server.user_directory import UserDirectory
+
+
+class TestMessageArena(unittest.TestCase):
+    """Test suite for MessageArena class."""
+
+    def test_bodies_read_back(self) -> None:
+        """Tests that bodies are read back as they were stored."""
+        arena = MessageArena()
+        first = arena.store_body(b"hello")
+        second = arena.store_body(b"world")
+
+        self.assertEqual(b"hello", arena.body(first, 5))
+        self.assertEqual(b"world", arena.body(second, 5))
+        self.assertEqual(10, arena.body_bytes)
+
+    def test_drained_blocks_reclaimed(self) -> None:
+        """Tests that a block is freed once every body in it has gone."""
+        arena = MessageArena()
+        body = bytes(MessageArena.BLOCK_SIZE // 2 + 1)
+        first = arena.store_body(body)
+        second = arena.store_body(body)
+        self.assertEqual(2, len(arena.blocks))
+
+        arena.free_body(first, len(body))
+        self.assertEqual(1, arena.reclaimed_blocks)
+        self.assertEqual(len(body), arena.block_bytes)
+
+        # The freed block is reused by the next block started
+        arena.store_body(body)
+        self.assertEqual(2, len(arena.blocks))
+        self.assertEqual(body, arena.body(second, len(body)))
+
+    def test_fragmented_bytes_reported(self) -> None:
+        """Tests that space left in full blocks is reported until they are freed."""
+        changes: list[int] = []
+        arena = MessageArena(changes.append)
+        body = bytes(MessageArena.BLOCK_SIZE // 2)
+        first = arena.store_body(body)
+        second = arena.store_body(body)
+        # The current block is not counted
+        arena.free_body(first, len(body))
+        self.assertEqual(0, arena.fragmented_bytes)
+
+        arena.store_body(b"next")
+        self.assertEqual(len(body), arena.fragmented_bytes)
+        arena.free_body(second, len(body))
+        self.assertEqual(0, arena.fragmented_bytes)
+        self.assertEqual(0, sum(changes))
+
+
+class TestMessageColumns(unittest.TestCase):
+    """Test suite for MessageColumns class."""
+
+    def setUp(self) -> None:
+        """Fill a mailbox's columns with numbered messages."""
+        self.arena = MessageArena()
+        self.users = UserDirectory()
+        self.columns = MessageColumns(self.arena, self.users)
+        for sequence in range(1, 11):
+            self.columns.append(
+                StoredMessage("Alice", f"message {sequence}".encode(), 0.0, sequence)
+            )
+
+    def test_read_back(self) -> None:
+        """Tests that messages are read back as they were added."""
+        stored_message = self.columns[2]
+        self.assertEqual("Alice", stored_message.sender_name)
+        self.assertEqual(b"message 3", stored_message.message)
+        self.assertEqual(3, stored_message.sequence)
+        self.assertEqual(
+            StoredMessage("Alice", b"message 3").size, self.columns.size(2)
+        )
+
+    def test_find(self) -> None:
+        """Tests that messages are found by their sequence numbers."""
+        self.columns.popleft()
+        self.assertEqual(2, self.columns.find(4))
+        self.assertIsNone(self.columns.find(1))
+        self.assertEqual(3, self.columns.after(4))
+        self.assertEqual(9, self.columns.after(100))
+
+    def test_release(self) -> None:
+        """Tests that released messages give back their bodies."""
+        self.columns.release(0)
+        self.assertFalse(self.columns.is_held(0))
+        self.assertFalse(self.columns[0].held)
+        self.assertEqual(b"", self.columns[0].message)
+
+        self.columns.clear()
+        self.assertEqual(0, len(self.columns))
+        self.assertEqual(0, self.arena.body_bytes)
+        self.assertEqual(0, len(self.users))
+
+    def test_compaction(self) -> None:
+        """Tests that space before the oldest message is given back."""
+        for sequence in range(11, MessageColumns.COMPACT_THRESHOLD * 2):
+            self.columns.append(StoredMessage("Bob", b"hi", 0.0, sequence))
+        for _ in range(MessageColumns.COMPACT_THRESHOLD):
+            self.columns.popleft()
+
+        self.assertEqual(0, self.columns.head)
+        self.assertEqual(MessageColumns.COMPACT_THRESHOLD + 1, self.columns.sequence(0))
+
+    def test_prepend(self) -> None:
+        """Tests that messages put in front take the place of removed ones."""
+        for _ in range(3):
+            self.columns.popleft()
+        body_bytes = self.arena.body_bytes
+
+        self.columns.prepend(
+            [StoredMessage("Bob", b"old", 0.0, sequence) for sequence in range(2, 4)]
+        )
+        self.assertEqual(1, self.columns.head)
+        self.assertEqual(body_bytes + 6, self.arena.body_bytes)
+        self.assertEqual(
+            list(range(2, 11)),
+            [stored_message.sequence for stored_message in self.columns],
+        )
+
+        # Without enough room, the rest of the columns are moved along
+        self.columns.prepend(
+            [
+                StoredMessage("Bob", b"older", 0.0, 0),
+                StoredMessage("Bob", b"", 0.0, 1),
+            ]
+        )
+        self.assertEqual(0, self.columns.head)
+        self.assertEqual(b"older", self.columns[0].message)
+        self.assertEqual(b"message 4", self.columns[4].message)
+
+    def test_store_reports_saving(self) -> None:
+        """Tests that the store reports the memory saved against plain objects."""
+        store = MailboxStore()
+        for index in range(1000):
+            store.add("John", "Alice", str(index).encode())
+
+        self.assertGreater(store.stats["layout_saved_bytes"], 0)
+        store.drain("John", 1000)
+        self.assertEqual(0, store.arena.body_bytes)
@@ -0,0 +1,115 @@
+"""Peek cache test suite."""
+
+import unittest
+
+from src.packets.message_response import MessageResponse
+from server.peek_cache import PeekCache
+from server.stored_message import StoredMessage
+from .fake_clock import FakeClock
+
+
+def make_messages(first: int, count: int, priority: int = 0) -> list[StoredMessage]:
+    """Create numbered messages from Alice.
+
+    :param first: The sequence number of the first message.
+    :param count: The number of messages.
+    :param priority: The priority of every message.
+    :return: The messages, in sequence order.
+    """
+    return [
+        StoredMessage(
+            "Alice", f"Hello {sequence}".encode(), sequence=sequence, priority=priority
+        )
+        for sequence in range(first, first + count)
+    ]
+
+
+class TestPeekCache(unittest.TestCase):
+    """Test suite for PeekCache class."""
+
+    def setUp(self) -> None:
+        """Create a cache large enough for a few pages."""
+        self.clock = FakeClock()
+        self.cache = PeekCache(1 << 20, clock=self.clock)
+
+    def test_hit_until_mailbox_changes(self) -> None:
+        """Tests that a page is sent again only while its mailbox is unchanged."""
+        record = self.cache.put("John", 2, make_messages(1, 2))
+
+        self.assertEqual(record, self.cache.get("John", 2))
+        self.assertIsNone(self.cache.get("John", 3))
+        self.assertNotIn("John", self.cache)
+        self.assertEqual(1, self.cache.stats["hits"])
+        self.assertEqual(1, self.cache.stats["misses"])
+
+    def test_expired_message_drops_page(self) -> None:
+        """Tests that a page holding an expired message is not sent."""
+        stored_message = StoredMessage("Alice", b"Soon gone", 10.0, 1)
+        self.cache.put("John", 1, [stored_message])
+
+        self.clock.now = 10.0
+        self.assertIsNone(self.cache.get("John", 1))
+
+    def test_messages_added_in_delivery_order(self) -> None:
+        """Tests that new messages are placed in the page as they are delivered."""
+        self.cache.put("John", 2, make_messages(1, 2))
+        self.cache.messages_added("John", make_messages(3, 1, priority=1), 3)
+
+        messages, more_messages = MessageResponse.decode_packet(
+            self.cache.get("John", 3) or b""
+        )
+        self.assertEqual(
+            ["Hello 3", "Hello 1", "Hello 2"], [message for _, message in messages]
+        )
+        self.assertFalse(more_messages)
+
+    def test_full_page_keeps_one_extra(self) -> None:
+        """Tests that a full page still says whether more messages follow."""
+        page_size = MessageResponse.MAX_MESSAGE_LENGTH
+        self.cache.put("John", page_size, make_messages(1, page_size))
+        self.cache.messages_added(
+            "John", make_messages(page_size + 1, 2), page_size + 2
+        )
+
+        messages, more_messages = MessageResponse.decode_packet(
+            self.cache.get("John", page_size + 2) or b""
+        )
+        self.assertEqual(page_size, len(messages))
+        self.assertTrue(more_messages)
+
+    def test_messages_removed(self) -> None:
+        """Tests that delivered messages leave the page, until it runs short."""
+        page_size = MessageResponse.MAX_MESSAGE_LENGTH
+        self.cache.put("John", 300, make_messages(1, page_size + 1))
+
+        self.cache.messages_removed("John", lambda _, sequence: sequence == 1, 1, 299)
+        self.assertNotIn("John", self.cache)
+
+        self.cache.put("John", 3, make_messages(1, 3))
+        delivered = 2
+        self.cache.messages_removed(
+            "John", lambda _, sequence: sequence <= delivered, delivered, 1
+        )
+        messages, _ = MessageResponse.decode_packet(self.cache.get("John", 1) or b"")
+        self.assertEqual([("Alice", "Hello 3")], messages)
+
+    def test_changed_elsewhere_drops_page(self) -> None:
+        """Tests that a page whose mailbox changed some other way is dropped."""
+        self.cache.put("John", 2, make_messages(1, 2))
+        self.cache.messages_added("John", make_messages(4, 1), 4)
+
+        self.assertNotIn("John", self.cache)
+
+    def test_least_recently_used_evicted(self) -> None:
+        """Tests that the pages peeked at least recently are dropped first."""
+        # Room for two pages of ten messages, but not three
+        cache = PeekCache(800)
+        for name in ("John", "Bob", "Carol"):
+            cache.put(name, 10, make_messages(1, 10))
+            cache.get("John", 10)
+
+        self.assertIn("John", cache)
+        self.assertNotIn("Bob", cache)
+        self.assertIn("Carol", cache)
+        self.assertLessEqual(cache.bytes, 800)
+        self.assertEqual(1, cache.stats["evictions"])
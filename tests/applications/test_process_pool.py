@@ -0,0 +1,134 @@
+"""``ProcessPool`` class test suite."""
+
+import socket
+import unittest
+import unittest.mock
+
+from src.packets.message_response import MessageResponse
+from server.connection import PendingResponse
+from server.event_loop import EventLoop
+from server.process_pool import ProcessPool
+from server.search_index import find_packed, pack_messages, packed_parts
+from server import Server
+
+
+class TestProcessPool(unittest.TestCase):
+    """Test suite for ProcessPool class."""
+
+    def setUp(self) -> None:
+        """Start a pool with a single worker process."""
+        self.pool = ProcessPool(1)
+        self.addCleanup(self.pool.close)
+
+    def attach_event_loop(self, server: Server) -> EventLoop:
+        """Create an event loop serving a server, and attach the pool to it."""
+        welcoming_socket = socket.socket()
+        self.addCleanup(welcoming_socket.close)
+        welcoming_socket.bind(("localhost", 0))
+        welcoming_socket.listen()
+        event_loop = EventLoop(
+            [welcoming_socket],
+            server.handle_request,
+            server.admission,
+            server.timeouts,
+            lambda: None,
+            60.0,
+        )
+        self.addCleanup(event_loop.close)
+        self.pool.attach(event_loop)
+        return event_loop
+
+    def test_submit(self) -> None:
+        """Tests that a job is run on a payload passed through shared memory."""
+        packed = pack_messages([b"hello world", b"goodbye", b"Hello again"])
+        future = self.pool.submit(find_packed, [packed], {"hello"}, 5)
+
+        self.assertEqual([0, 2], future.result(timeout=60))
+        self.assertEqual(
+            {"jobs": 1, "payload_bytes": len(packed), "failed_jobs": 0},
+            self.pool.stats,
+        )
+
+    def test_finished_jobs_reported_on_event_loop(self) -> None:
+        """Tests that a finished job's callback runs on the event loop's thread."""
+        event_loop = self.attach_event_loop(Server(["12000"]))
+        finished = []
+        future = self.pool.submit(find_packed, packed_parts([b"hi"]), {"hi"}, 1)
+        self.pool.when_done(future, lambda: finished.append(future.result()))
+        future.result(timeout=60)
+        self.assertEqual([], finished)
+
+        event_loop.run_once()
+        self.assertEqual([[0]], finished)
+
+    def test_offloaded_search(self) -> None:
+        """Tests that searches of large mailboxes find the same page in the pool."""
+        server = Server(["12000"])
+        for index in range(Server.OFFLOAD_MIN_MESSAGES + 600):
+            word = "needle" if index % 3 == 0 else "hay"
+            server.store.add("John", "Alice", f"{word} {index}".encode())
+        expected = server.process_search_request("John", b"needle", 30)
+        assert isinstance(expected, bytes)
+
+        server.process_pool = self.pool
+        self.assertEqual(expected, server.process_search_request("John", b"needle", 30))
+        self.assertEqual(1, self.pool.stats["jobs"])
+
+        # Each slice of the mailbox is searched by a job of its own
+        with unittest.mock.patch.object(Server, "OFFLOAD_SLICE_MESSAGES", 500):
+            self.assertEqual(
+                expected, server.process_search_request("John", b"needle", 30)
+            )
+        self.assertEqual(5, self.pool.stats["jobs"])
+
+        messages, more_messages = MessageResponse.decode_packet(expected)
+        self.assertEqual(("Alice", "needle 30"), messages[0])
+        self.assertTrue(more_messages)
+
+    def test_offloaded_search_pending_on_event_loop(self) -> None:
+        """Tests that the event loop is given a pending response for the search."""
+        server = Server(["12000"])
+        event_loop = self.attach_event_loop(server)
+        server.process_pool = self.pool
+        for index in range(Server.OFFLOAD_MIN_MESSAGES):
+            server.store.add("John", "Alice", f"hay {index}".encode())
+        server.store.add("John", "Bob", b"needle")
+
+        with unittest.mock.patch.object(Server, "OFFLOAD_SLICE_MESSAGES", 500):
+            response = server.process_search_request("John", b"needle", 0)
+            assert isinstance(response, PendingResponse)
+            # Only the first slice is copied before the event loop carries on
+            self.assertEqual(1, self.pool.stats["jobs"])
+            for _ in range(600):
+                if response.done:
+                    break
+                event_loop.run_once()
+
+        self.assertEqual(3, self.pool.stats["jobs"])
+        assert isinstance(response.data, bytes)
+        self.assertEqual(
+            ([("Bob", "needle")], False), MessageResponse.decode_packet(response.data)
+        )
+
+    def test_offloaded_search_more_after_removal(self) -> None:
+        """Tests that more matches are reported even if one has since gone."""
+        server = Server(["12000"])
+        event_loop = self.attach_event_loop(server)
+        server.process_pool = self.pool
+        page_size = MessageResponse.MAX_MESSAGE_LENGTH
+        for index in range(Server.OFFLOAD_MIN_MESSAGES):
+            word = "needle" if index <= page_size else "hay"
+            server.store.add("John", "Alice", f"{word} {index}".encode())
+
+        response = server.process_search_request("John", b"needle", 0)
+        assert isinstance(response, PendingResponse)
+        server.store.drain("John", 1)
+        for _ in range(600):
+            if response.done:
+                break
+            event_loop.run_once()
+
+        assert isinstance(response.data, bytes)
+        messages, more_messages = MessageResponse.decode_packet(response.data)
+        self.assertEqual(page_size, len(messages))
+        self.assertTrue(more_messages)
@@ -0,0 +1,217 @@
+"""``Proxy`` class test suite."""
+
+from typing import Any, Callable
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from src.packets.message_request import MessageRequest
+from src.packets.message_response import MessageResponse
+from src.packets.response_framing import split_responses
+from src.packets.result_response import ResultResponse
+from src.packets.status_response import StatusResponse
+from src.message_type import MessageType
+from src.request_option import RequestOption
+from src.result_code import ResultCode
+from server.event_loop import EventLoop
+from server import Server
+from proxy import Proxy
+
+
+class TestProxy(unittest.TestCase):
+    """Test suite for Proxy class."""
+
+    def setUp(self) -> None:
+        """Start a server, and a proxy in front of it, on Unix sockets."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.server_path = os.path.join(directory.name, "server.sock")
+        self.proxy_path = os.path.join(directory.name, "proxy.sock")
+
+        self.server = Server(["12000"])
+        self.server_loop = self.start_event_loop(
+            self.server_path, self.server.handle_request, self.server
+        )
+
+        self.proxy = Proxy(
+            ["12001", f"unix:{self.server_path}", "--upstream-connections", "2"]
+        )
+        self.proxy_loop = self.start_event_loop(
+            self.proxy_path, self.proxy.handle_request, self.proxy
+        )
+        self.proxy.attach(self.proxy_loop)
+        self.addCleanup(self.proxy.close)
+
+        stopped = threading.Event()
+
+        def serve() -> None:
+            while not stopped.is_set():
+                self.server_loop.run_once()
+                self.proxy_loop.run_once()
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stopped.set)
+
+    def start_event_loop(
+        self, path: str, handle_request: Callable[..., Any], owner: Any
+    ) -> EventLoop:
+        """Create an event loop listening on a Unix socket."""
+        welcoming_socket = socket.socket(socket.AF_UNIX)
+        self.addCleanup(welcoming_socket.close)
+        welcoming_socket.bind(path)
+        welcoming_socket.listen()
+        event_loop = EventLoop(
+            [welcoming_socket],
+            handle_request,
+            owner.admission,
+            owner.timeouts,
+            lambda: None,
+            0.01,
+        )
+        self.addCleanup(event_loop.close)
+        return event_loop
+
+    def exchange(self, packet: bytes, responses: int = 1) -> list[bytes]:
+        """Send requests to the proxy on a new connection, and await the responses."""
+        with socket.socket(socket.AF_UNIX) as client_socket:
+            client_socket.settimeout(5)
+            client_socket.connect(self.proxy_path)
+            client_socket.sendall(packet)
+
+            buffer = bytearray()
+            received: list[bytes] = []
+            while len(received) < responses:
+                data = client_socket.recv(4096)
+                if not data:
+                    break
+                buffer += data
+                received += split_responses(buffer)
+            return received
+
+    def test_requests_forwarded(self) -> None:
+        """Tests that messages sent through the proxy can be read through it."""
+        for sender in ("Alice", "Bob", "Carol"):
+            request = MessageRequest(
+                MessageType.CREATE,
+                sender,
+                "John",
+                f"Hi from {sender}",
+                {RequestOption.ACKNOWLEDGE: b""},
+            )
+            (response,) = self.exchange(request.to_bytes())
+            self.assertEqual((ResultCode.OK,), ResultResponse.decode_packet(response))
+
+        request = MessageRequest(MessageType.READ, "John", "", "")
+        (response,) = self.exchange(request.to_bytes())
+        messages, _ = MessageResponse.decode_packet(response)
+        self.assertEqual(
+            [
+                ("Alice", "Hi from Alice"),
+                ("Bob", "Hi from Bob"),
+                ("Carol", "Hi from Carol"),
+            ],
+            messages,
+        )
+
+    def test_upstream_connections_shared(self) -> None:
+        """Tests that many clients reach the server over a few connections."""
+        for index in range(20):
+            request = MessageRequest(
+                MessageType.CREATE,
+                f"user{index}",
+                f"user{index + 1}",
+                "Hello",
+                {RequestOption.ACKNOWLEDGE: b""},
+            )
+            self.exchange(request.to_bytes())
+
+        self.assertEqual(20, self.proxy.stats["forwarded_requests"])
+        self.assertLessEqual(self.proxy.stats["upstream_connections"], 2)
+        self.assertLessEqual(len(self.server_loop.connections), 2)
+
+    def test_pipelined_requests_batched(self) -> None:
+        """Tests that requests arriving together are sent upstream together."""
+        creates = b"".join(
+            MessageRequest(
+                MessageType.CREATE, "Alice", "John", f"message {index}"
+            ).to_bytes()
+            for index in range(50)
+        )
+        read = MessageRequest(MessageType.READ, "John", "", "").to_bytes()
+
+        # Unacknowledged creates are not answered, so only the read is
+        (response,) = self.exchange(creates + read)
+        messages, _ = MessageResponse.decode_packet(response)
+        self.assertEqual(50, len(messages))
+        self.assertLess(self.proxy.stats["upstream_batches"], 10)
+
+    def test_status_and_ping_forwarded(self) -> None:
+        """Tests that status requests and pings are answered through the proxy."""
+        self.server.store.add("John", "Alice", b"Hello")
+        status = MessageRequest(MessageType.STATUS, "John", "", "").to_bytes()
+        ping = MessageRequest(MessageType.PING, "", "", "").to_bytes()
+
+        status_response, ping_response = self.exchange(status + ping, responses=2)
+        self.assertEqual(1, StatusResponse.decode_packet(status_response)[0])
+        self.assertEqual((ResultCode.OK,), ResultResponse.decode_packet(ping_response))
+
+    def test_invalid_request_not_forwarded(self) -> None:
+        """Tests that requests the server would not answer are dropped."""
+        invalid = MessageRequest(MessageType.READ, "", "", "").to_bytes()
+        read = MessageRequest(MessageType.READ, "John", "", "").to_bytes()
+
+        (response,) = self.exchange(invalid + read)
+        self.assertEqual(MessageResponse([]).to_bytes(), response)
+        self.assertEqual(1, self.proxy.stats["forwarded_requests"])
+
+    def test_windowed_reads_kept_apart(self) -> None:
+        """Tests that clients reading through the proxy each have a cursor."""
+        for index in range(3):
+            self.server.store.add("John", "Alice", f"message {index}".encode())
+
+        def read_window(client_socket: socket.socket, window: int, ack: int) -> bytes:
+            options = {RequestOption.WINDOW: window}
+            if ack:
+                options[RequestOption.ACKNOWLEDGE_SEQUENCE] = ack
+            request = MessageRequest(MessageType.READ, "John", "", "", options)
+            client_socket.sendall(request.to_bytes())
+            buffer = bytearray()
+            responses: list[bytes] = []
+            while not responses:
+                buffer += client_socket.recv(4096)
+                responses = split_responses(buffer)
+            return responses[0]
+
+        first, second = (socket.socket(socket.AF_UNIX) for _ in range(2))
+        for client_socket in (first, second):
+            self.addCleanup(client_socket.close)
+            client_socket.settimeout(5)
+            client_socket.connect(self.proxy_path)
+
+        page = read_window(first, 1, 0)
+        self.assertEqual(3, MessageResponse.decode_sequence(page))
+        # Another reader starting over must not lose the first one's place
+        read_window(second, 0, 0)
+        read_window(first, 0, 3)
+        self.assertEqual(0, self.server.store.mailbox_size("John"))
+
+    def test_upstream_unavailable(self) -> None:
+        """Tests that clients are told when the server cannot be reached."""
+        # No upstream connection has been opened yet
+        self.proxy.upstream.host_name = f"unix:{self.server_path}.missing"
+
+        request = MessageRequest(MessageType.READ, "John", "", "")
+        (response,) = self.exchange(request.to_bytes())
+        self.assertEqual(
+            (ResultCode.UNAVAILABLE,), ResultResponse.decode_packet(response)
+        )
+
+    def test_construction_without_sockets(self) -> None:
+        """Tests that a Proxy must listen on at least one socket."""
+        self.assertRaises(
+            SystemExit, Proxy, ["12001", "localhost:12000", "--tcp", "off"]
+        )
@@ -0,0 +1,123 @@
+"""``Replay`` class test suite."""
+
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from src.packets.message_request import MessageRequest
+from src.message_type import MessageType
+from src.request_option import RequestOption
+from server.capture import CaptureWriter, read_capture
+from server.event_loop import EventLoop
+from server import Server
+from replay import Replay
+
+
+class TestReplay(unittest.TestCase):
+    """Test suite for capturing requests and replaying them."""
+
+    def setUp(self) -> None:
+        """Capture some requests served by one server."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.capture_path = os.path.join(directory.name, "requests.cap")
+        self.server_path = os.path.join(directory.name, "server.sock")
+
+        server = Server(["12000"])
+        server.capture = CaptureWriter(self.capture_path)
+        for index in range(5):
+            server.handle_request(
+                MessageRequest(
+                    MessageType.CREATE, "Alice", "John", f"message {index}"
+                ).to_bytes()
+            )
+        server.handle_request(
+            MessageRequest(
+                MessageType.READ, "John", "", "", {RequestOption.WINDOW: 2}
+            ).to_bytes()
+        )
+        server.handle_request(MessageRequest.encode_chunk("Alice", b"orphan"))
+        server.handle_request(b"not a request")
+        server.capture.close()
+
+    def test_capture(self) -> None:
+        """Tests that every request is captured in the order it arrived."""
+        requests = list(read_capture(self.capture_path))
+        self.assertEqual(8, len(requests))
+        self.assertEqual(
+            (MessageType.CREATE, "Alice", "John", b"message 0"),
+            MessageRequest.decode_packet(requests[0].packet),
+        )
+        offsets = [request.offset for request in requests]
+        self.assertEqual(sorted(offsets), offsets)
+
+    def test_gateway_key_blanked(self) -> None:
+        """Tests that the gateway key of a bulk read is never written to disk."""
+        packet = MessageRequest(
+            MessageType.BULK_READ,
+            "gateway",
+            "",
+            "John\nCarol",
+            {RequestOption.PRIORITY: 1, RequestOption.GATEWAY_KEY: b"secret"},
+        ).to_bytes()
+        capture = CaptureWriter(self.capture_path)
+        capture.record(packet, capture.started, 0.0)
+        capture.close()
+
+        (request,) = read_capture(self.capture_path)
+        self.assertEqual(len(packet), len(request.packet))
+        self.assertNotIn(b"secret", request.packet)
+        self.assertEqual(
+            {RequestOption.PRIORITY: 1, RequestOption.GATEWAY_KEY: bytes(6)},
+            MessageRequest.decode_options(request.packet),
+        )
+        self.assertEqual(
+            MessageRequest.decode_packet(packet),
+            MessageRequest.decode_packet(request.packet),
+        )
+
+    def test_not_a_capture_file(self) -> None:
+        """Tests that other files are not mistaken for captures."""
+        with open(self.capture_path, "wb") as capture_file:
+            capture_file.write(b"something else entirely")
+        self.assertRaises(ValueError, list, read_capture(self.capture_path))
+
+    def test_replay(self) -> None:
+        """Tests that a capture replayed to another server is served again."""
+        server = Server(["12001"])
+        welcoming_socket = socket.socket(socket.AF_UNIX)
+        self.addCleanup(welcoming_socket.close)
+        welcoming_socket.bind(self.server_path)
+        welcoming_socket.listen()
+        event_loop = EventLoop(
+            [welcoming_socket],
+            server.handle_request,
+            server.admission,
+            server.timeouts,
+            lambda: None,
+            0.01,
+        )
+        self.addCleanup(event_loop.close)
+
+        stopped = threading.Event()
+
+        def serve() -> None:
+            while not stopped.is_set():
+                event_loop.run_once()
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stopped.set)
+
+        replay = Replay([self.capture_path, f"unix:{self.server_path}", "--speed", "0"])
+        replay.run()
+
+        self.assertEqual(6, replay.stats["replayed_requests"])
+        # Neither the chunk nor the invalid request is answered
+        self.assertEqual(2, replay.stats["skipped_requests"])
+        # The windowed read never acknowledged the messages it was sent
+        self.assertEqual(5, server.store.mailbox_size("John"))
+        self.assertIn("Replayed 6 request(s), skipped 2", replay.report())
@@ -0,0 +1,260 @@
+"""Replication test suite."""
+
+import socket
+import unittest
+import unittest.mock
+
+from src.packets.message_request import MessageRequest
+from src.packets.message_response import MessageResponse
+from src.packets.result_response import ResultResponse
+from src.message_type import MessageType
+from src.result_code import ResultCode
+from src.server_address import ServerAddress
+from server.admission import AdmissionController
+from server.event_loop import EventLoop
+from server.mailbox_store import MailboxStore
+from server.replication import (
+    RecordKind,
+    ReplicationFollower,
+    ReplicationPrimary,
+    encode_record,
+    split_records,
+)
+from server import Server
+
+
+def create_event_loop() -> EventLoop:
+    """Create an event loop which only runs replication connections."""
+    return EventLoop(
+        [],
+        lambda packet, connection: None,
+        AdmissionController(),
+        {},
+        lambda: None,
+        0.01,
+    )
+
+
+def contents(store: MailboxStore) -> list[tuple[str, str, bytes, float, int]]:
+    """List every message in a store."""
+    return [
+        (
+            receiver_name,
+            stored.sender_name,
+            stored.message,
+            stored.expires_at,
+            stored.sequence,
+        )
+        for receiver_name, stored in store.snapshot()
+    ]
+
+
+class TestReplicationRecords(unittest.TestCase):
+    """Test suite for encoding replication stream records."""
+
+    def test_split_records(self) -> None:
+        """Tests that complete records are removed from the buffer."""
+        first = encode_record(RecordKind.CREATE, 1, b"payload")
+        second = encode_record(RecordKind.SNAPSHOT_END, 2)
+        buffer = bytearray(first + second + first[:5])
+
+        self.assertEqual(
+            [(RecordKind.CREATE, 1, b"payload"), (RecordKind.SNAPSHOT_END, 2, b"")],
+            split_records(buffer),
+        )
+        self.assertEqual(first[:5], buffer)
+
+
+class TestReplication(unittest.TestCase):
+    """Test suite for replicating a store from a primary to a follower."""
+
+    def setUp(self) -> None:
+        """Create a primary and follower, without connecting them yet."""
+        self.primary_store = MailboxStore()
+        self.primary = ReplicationPrimary(self.primary_store, backlog_limit=1 << 16)
+        self.primary_loop = create_event_loop()
+        self.addCleanup(self.primary_loop.close)
+
+        welcoming_socket = socket.socket()
+        self.addCleanup(welcoming_socket.close)
+        welcoming_socket.bind(("localhost", 0))
+        welcoming_socket.listen()
+        self.primary.attach(self.primary_loop, welcoming_socket)
+        self.addCleanup(self.primary.close)
+
+        self.follower_store = MailboxStore()
+        self.follower = ReplicationFollower(
+            self.follower_store,
+            ServerAddress("localhost", welcoming_socket.getsockname()[1]),
+        )
+        self.follower_loop = create_event_loop()
+        self.addCleanup(self.follower_loop.close)
+        self.addCleanup(self.follower.close)
+
+        self.snapshots = 0
+        clear = self.follower_store.clear
+
+        def counting_clear() -> None:
+            self.snapshots += 1
+            clear()
+
+        self.follower_store.clear = counting_clear  # type: ignore[method-assign]
+
+    def synchronise(self) -> None:
+        """Run both event loops until the follower has caught up."""
+        for _ in range(200):
+            self.primary_loop.run_once()
+            self.follower_loop.run_once()
+            if (
+                self.follower.applied_sequence == self.primary.sequence
+                and self.follower.replication_id == self.primary.replication_id
+                and self.primary.stats["max_follower_lag"] == 0
+                and not self.follower.outbound
+            ):
+                return
+        self.fail("Follower did not catch up")
+
+    def test_snapshot_catch_up(self) -> None:
+        """Tests that a new follower starts from a snapshot of the store."""
+        self.primary_store.add("John", "Alice", b"one")
+        self.primary_store.add("John", "Bob", b"two", time_to_live=60)
+        self.primary_store.add("Jane", "Carol", b"three")
+        self.primary_store.drain("John", 1)
+
+        self.follower.attach(self.follower_loop)
+        self.synchronise()
+
+        self.assertEqual(1, self.snapshots)
+        self.assertEqual(contents(self.primary_store), contents(self.follower_store))
+
+    def test_changes_streamed(self) -> None:
+        """Tests that changes made after connecting are replicated in order."""
+        self.follower.attach(self.follower_loop)
+        self.synchronise()
+
+        for index in range(100):
+            self.primary_store.add("John", "Alice", f"message {index}".encode())
+        self.primary_store.drain("John", 40)
+        self.synchronise()
+
+        self.assertEqual(contents(self.primary_store), contents(self.follower_store))
+        self.assertEqual(60, self.follower_store.mailbox_size("John"))
+        self.assertEqual(0, self.follower.stats["lag_records"])
+
+    def test_resume_from_backlog(self) -> None:
+        """Tests that a follower which reconnects does not need a new snapshot."""
+        self.follower.attach(self.follower_loop)
+        self.synchronise()
+
+        self.follower.close()
+        self.primary_store.add("John", "Alice", b"while disconnected")
+        self.follower.connect()
+        self.synchronise()
+
+        self.assertEqual(1, self.snapshots)
+        self.assertEqual(contents(self.primary_store), contents(self.follower_store))
+
+    def test_snapshot_when_backlog_exceeded(self) -> None:
+        """Tests that a follower which has missed too much is sent a snapshot."""
+        self.follower.attach(self.follower_loop)
+        self.synchronise()
+
+        self.follower.close()
+        for _ in range(100):
+            self.primary_store.add("John", "Alice", bytes(1000))
+        self.primary_store.drain("John", 50)
+        self.follower.connect()
+        self.synchronise()
+
+        self.assertEqual(2, self.snapshots)
+        self.assertEqual(contents(self.primary_store), contents(self.follower_store))
+
+    def test_drain_removes_same_messages(self) -> None:
+        """Tests that followers remove the messages the primary removed."""
+        for message in (b"one", b"two", b"three"):
+            self.primary_store.add("John", "Alice", message)
+        self.follower.attach(self.follower_loop)
+        self.synchronise()
+
+        # The follower's copy has already lost its first message
+        self.follower_store.drain("John", 1)
+        self.primary_store.drain("John", 1)
+        self.synchronise()
+
+        self.assertEqual(contents(self.primary_store), contents(self.follower_store))
+
+    def test_snapshot_sent_in_parts(self) -> None:
+        """Tests that changes made while a snapshot is sent are not lost."""
+        for index in range(100):
+            self.primary_store.add("John", "Alice", f"message {index}".encode())
+            self.primary_store.add("Jane", "Bob", f"message {index}".encode())
+
+        with unittest.mock.patch("server.replication.SNAPSHOT_CHUNK_SIZE", 256):
+            self.follower.attach(self.follower_loop)
+            for _ in range(10):
+                self.primary_loop.run_once()
+                self.follower_loop.run_once()
+            (follower_stream,) = self.primary.followers
+            self.assertIsNotNone(follower_stream.snapshot)
+
+            self.primary_store.drain("John", 10)
+            self.primary_store.add("John", "Carol", b"during the snapshot")
+            self.primary_store.add("Jane", "Carol", b"during the snapshot")
+            self.synchronise()
+
+        self.assertEqual(1, self.snapshots)
+        self.assertEqual(
+            sorted(contents(self.primary_store)), sorted(contents(self.follower_store))
+        )
+
+    def test_heartbeat_reports_lag(self) -> None:
+        """Tests that followers learn how far behind they are from heartbeats."""
+        self.follower.attach(self.follower_loop)
+        self.synchronise()
+
+        self.primary.heartbeat()
+        self.synchronise()
+        self.primary_loop.run_once()
+        self.follower_loop.run_once()
+
+        stats = self.follower.stats
+        self.assertTrue(stats["connected"])
+        self.assertEqual(0, stats["lag_records"])
+        self.assertLess(stats["lag_seconds"], 5)
+
+
+class TestFollowerServer(unittest.TestCase):
+    """Test suite for a server running as a follower."""
+
+    def setUp(self) -> None:
+        """Set up the testing environment."""
+        self.server = Server(["12000", "--primary", "localhost:12001"])
+
+    def test_create_rejected(self) -> None:
+        """Tests that a follower refuses to store new messages."""
+        packet = MessageRequest(MessageType.CREATE, "Alice", "John", "Hi").to_bytes()
+        response = self.server.handle_request(packet)
+        assert isinstance(response, bytes)
+        self.assertEqual(
+            (ResultCode.READ_ONLY,), ResultResponse.decode_packet(response)
+        )
+
+    def test_read_does_not_drain(self) -> None:
+        """Tests that a follower leaves delivered messages for the primary to remove."""
+        self.server.store.add("John", "Alice", b"Hi")
+        packet = MessageRequest(MessageType.READ, "John", "", "").to_bytes()
+        response = self.server.handle_request(packet)
+
+        assert isinstance(response, bytes)
+        self.assertEqual(
+            ([("Alice", "Hi")], False), MessageResponse.decode_packet(response)
+        )
+        self.assertEqual(1, self.server.store.mailbox_size("John"))
+
+    def test_cannot_be_primary_and_follower(self) -> None:
+        """Tests that a follower cannot accept followers of its own."""
+        self.assertRaises(
+            SystemExit,
+            Server,
+            ["12000", "--primary", "localhost:12001", "--replication-port", "12002"],
+        )
@@ -0,0 +1,59 @@
+"""``SearchIndex`` class test suite."""
+
+import unittest
+
+from server.search_index import SearchIndex, find_packed, pack_messages, words_in
+
+
+class TestSearchIndex(unittest.TestCase):
+    """Test suite for SearchIndex class."""
+
+    def test_words_in(self) -> None:
+        """Tests that words are found ignoring case and punctuation."""
+        self.assertEqual({"hello", "john", "2pm"}, words_in(b"Hello, John! 2pm?"))
+
+    def test_find_packed(self) -> None:
+        """Tests that packed messages containing every word are found in order."""
+        packed = pack_messages([b"lunch at noon", b"meeting", b"Noon lunch?", b""])
+        self.assertEqual([0, 2], find_packed(memoryview(packed), {"noon", "lunch"}, 5))
+        self.assertEqual([0], find_packed(memoryview(packed), {"noon"}, 1))
+
+    def test_search(self) -> None:
+        """Tests that only messages containing every word are found."""
+        index = SearchIndex()
+        index.add("John", 1, b"lunch at noon")
+        index.add("John", 2, b"meeting at noon")
+        index.add("Jane", 3, b"lunch at noon")
+
+        self.assertEqual([1, 2], index.search("John", {"noon"}))
+        self.assertEqual([1], index.search("John", {"noon", "lunch"}))
+        self.assertEqual([], index.search("John", {"noon", "dinner"}))
+
+    def test_remove(self) -> None:
+        """Tests that removed messages give back their memory."""
+        index = SearchIndex()
+        index.add("John", 1, b"lunch at noon")
+        index.add("John", 2, b"meeting at noon")
+        index.remove("John", 1)
+
+        self.assertEqual([], index.search("John", {"lunch"}))
+        self.assertEqual(3, index.stats["words"])
+
+        index.remove("John", 2)
+        self.assertEqual(0, index.memory_bytes)
+        self.assertEqual({}, index.mailboxes)
+
+    def test_memory_limit(self) -> None:
+        """Tests that mailboxes are left out once the index is full."""
+        index = SearchIndex(memory_limit=SearchIndex.WORD_OVERHEAD * 2)
+        index.add("John", 1, b"lunch")
+        index.add("John", 2, b"meeting")
+        index.add("John", 3, b"lunch")
+
+        self.assertFalse(index.covers("John"))
+        self.assertEqual(2, index.skipped_messages)
+
+        # An emptied mailbox can be indexed again
+        index.remove("John", 1)
+        index.forget_mailbox("John")
+        self.assertTrue(index.covers("John"))
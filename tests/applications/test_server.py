@@ -1,12 +1,45 @@
 """Server class test suite."""
 
-import unittest
+from typing import Optional
+import contextlib
+import os
 import socket
+import tempfile
+import unittest
 
+from src.packets.message_request import MessageRequest
 from src.packets.message_response import MessageResponse
+from src.packets.response_framing import split_responses
+from src.packets.result_response import ResultResponse
+from src.packets.status_response import StatusResponse
+from src.message_type import MessageType
+from src.request_option import RequestOption
+from src.result_code import ResultCode
+from server.attachments import FileSpan
+from server.connection import Connection, StreamedResponse
 from server import Server
 
 
+def sent(response: object) -> bytes:
+    """Get the bytes of a response as if it had been sent to the client.
+
+    :param response: The response, which is sent partly from files if streamed.
+    :return: The bytes of the response, leaving out any files.
+    """
+    if not isinstance(response, StreamedResponse):
+        assert isinstance(response, bytes)
+        return response
+    data = b""
+    for part in response.parts:
+        if isinstance(part, bytes):
+            data += part
+        elif callable(part):
+            part()
+    if response.on_sent is not None:
+        response.on_sent()
+    return data
+
+
 class TestServer(unittest.TestCase):
     """Test suite for Server class."""
 
@@ -23,28 +56,611 @@ class TestServer(unittest.TestCase):
             SystemExit, Server, [str(TestServer.port_number), "Extra argument"]
         )
 
+    def test_construction_without_sockets(self) -> None:
+        """Tests that a Server must listen on at least one socket."""
+        self.assertRaises(
+            SystemExit, Server, [str(TestServer.port_number), "--tcp", "off"]
+        )
+
+    def test_threads_engine_without_replication(self) -> None:
+        """Tests that the threads engine cannot be combined with replication."""
+        self.assertRaises(
+            SystemExit,
+            Server,
+            [
+                str(TestServer.port_number),
+                "--engine",
+                "threads",
+                "--primary",
+                "localhost:13000",
+            ],
+        )
+
+    def test_unix_welcoming_socket(self) -> None:
+        """Tests that a Server can listen on a Unix socket instead of TCP."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "server.sock")
+            server = Server(
+                [str(TestServer.port_number), "--tcp", "off", "--unix-socket", path]
+            )
+
+            with contextlib.ExitStack() as stack:
+                (welcoming_socket,) = server.open_welcoming_sockets(stack)
+                self.assertEqual(socket.AF_UNIX, welcoming_socket.family)
+
+                with socket.socket(socket.AF_UNIX) as client_socket:
+                    client_socket.connect(path)
+
+            self.assertFalse(os.path.exists(path))
+
     def test_process_read_request(self) -> None:
         """Tests that Server objects correctly responds to read requests."""
         server = Server([str(TestServer.port_number)])
         receiver_name = "John"
         sender_name = "Alice"
         message = b"Hello John"
-        server.messages[receiver_name] = [(sender_name, message)]
+        server.store.add(receiver_name, sender_name, message)
+
+        record = server.process_read_request(receiver_name)
+        # Check that the message stays in the mailbox until it has been sent
+        self.assertEqual(1, server.store.mailbox_size(receiver_name))
+        response = MessageResponse.decode_packet(sent(record))
+
+        # Check that the message is correct
+        self.assertEqual(([(sender_name, message.decode())], False), response)
+
+        # Check that the delivered message was removed from the mailbox
+        self.assertEqual(0, server.store.mailbox_size(receiver_name))
+
+    def test_pipelined_read_requests(self) -> None:
+        """Tests that reads queued on one connection are sent different messages."""
+        server = Server([str(TestServer.port_number)])
+        for index in range(300):
+            server.store.add("John", "Alice", f"Hello {index}".encode())
+        connection = Connection(socket.socket(), None)
+        self.addCleanup(connection.close)
+        packet = MessageRequest(MessageType.READ, "John", "", "").to_bytes()
+
+        first = server.handle_request(packet, connection)
+        second = server.handle_request(packet, connection)
+        self.assertEqual(300, server.store.mailbox_size("John"))
+
+        sent(first)
+        self.assertEqual(45, server.store.mailbox_size("John"))
+        messages, _ = MessageResponse.decode_packet(sent(second))
+        self.assertEqual(("Alice", "Hello 255"), messages[0])
+        self.assertEqual(0, server.store.mailbox_size("John"))
+        self.assertEqual({}, connection.unsent_reads)
+
+    def test_status_request(self) -> None:
+        """Tests that a status request describes a mailbox without draining it."""
+        server = Server([str(TestServer.port_number)])
+        server.store.add("John", "Alice", b"Hello John")
+        packet = MessageRequest(MessageType.STATUS, "John", "", "").to_bytes()
+
+        message_count, byte_count, _ = StatusResponse.decode_packet(
+            sent(server.handle_request(packet))
+        )
+        self.assertEqual(1, message_count)
+        self.assertEqual(server.store.stats["memory_bytes"], byte_count)
+        self.assertEqual(1, server.store.mailbox_size("John"))
+
+    def test_peek_request(self) -> None:
+        """Tests that peeks leave messages in place and follow later changes."""
+        server = Server([str(TestServer.port_number)])
+        for index in range(300):
+            server.store.add("John", "Alice", f"Hello {index}".encode())
+        packet = MessageRequest(MessageType.PEEK, "John", "", "").to_bytes()
+
+        messages, more_messages = MessageResponse.decode_packet(
+            sent(server.handle_request(packet))
+        )
+        self.assertEqual(("Alice", "Hello 0"), messages[0])
+        self.assertEqual(255, len(messages))
+        self.assertTrue(more_messages)
+        self.assertEqual(300, server.store.mailbox_size("John"))
+
+        create = MessageRequest(
+            MessageType.CREATE, "Bob", "John", "Urgent", {RequestOption.PRIORITY: 1}
+        ).to_bytes()
+        server.handle_request(create)
+        messages, _ = MessageResponse.decode_packet(sent(server.handle_request(packet)))
+        self.assertEqual([("Bob", "Urgent"), ("Alice", "Hello 0")], messages[:2])
+        assert server.peek_cache is not None
+        self.assertEqual(1, server.peek_cache.stats["hits"])
+        self.assertEqual(1, server.peek_cache.stats["updates"])
+
+        sent(server.process_read_request("John"))
+        messages, more_messages = MessageResponse.decode_packet(
+            sent(server.handle_request(packet))
+        )
+        self.assertEqual(("Alice", "Hello 254"), messages[0])
+        self.assertEqual(46, len(messages))
+        self.assertFalse(more_messages)
+
+    def test_peek_request_without_cache(self) -> None:
+        """Tests that peeks are answered the same with the cache turned off."""
+        server = Server([str(TestServer.port_number), "--peek-cache-limit", "0"])
+        server.store.add("John", "Alice", b"Hello John")
+        packet = MessageRequest(MessageType.PEEK, "John", "", "").to_bytes()
+
+        for _ in range(2):
+            self.assertEqual(
+                ([("Alice", "Hello John")], False),
+                MessageResponse.decode_packet(sent(server.handle_request(packet))),
+            )
+        self.assertIsNone(server.peek_cache)
+
+    def test_bulk_read_request(self) -> None:
+        """Tests that a gateway with the key is sent a page for each user named."""
+        with tempfile.TemporaryDirectory() as directory:
+            key_path = os.path.join(directory, "gateway.key")
+            with open(key_path, "wb") as key_file:
+                key_file.write(b"secret")
+            server = Server(
+                [str(TestServer.port_number), "--gateway-key-file", key_path]
+            )
+        server.store.add("John", "Alice", b"Hello John")
+        server.store.add("Carol", "Alice", b"Hello Carol")
+
+        def bulk_read(gateway_key: bytes) -> bytes:
+            packet = MessageRequest(
+                MessageType.BULK_READ,
+                "gateway",
+                "",
+                "John\nBob\nCarol",
+                {RequestOption.GATEWAY_KEY: gateway_key},
+            ).to_bytes()
+            return sent(server.handle_request(packet))
+
+        self.assertEqual(
+            (ResultCode.FORBIDDEN,), ResultResponse.decode_packet(bulk_read(b"guess"))
+        )
+        self.assertEqual(1, server.store.mailbox_size("John"))
+
+        responses = split_responses(bytearray(bulk_read(b"secret")))
+        self.assertEqual(
+            [
+                ([("Alice", "Hello John")], False),
+                ([], False),
+                ([("Alice", "Hello Carol")], False),
+            ],
+            [MessageResponse.decode_packet(response) for response in responses],
+        )
+        self.assertEqual(0, server.store.mailbox_size("John"))
+
+        # Each page's messages are removed once that page has been sent
+        server.store.add("John", "Alice", b"Hello again")
+        server.store.add("Carol", "Alice", b"Hello again")
+        connection = Connection(socket.socket(), None)
+        self.addCleanup(connection.close)
+        packet = MessageRequest(
+            MessageType.BULK_READ,
+            "gateway",
+            "",
+            "John\nCarol",
+            {RequestOption.GATEWAY_KEY: b"secret"},
+        ).to_bytes()
+        response = server.handle_request(packet, connection)
+        assert isinstance(response, StreamedResponse)
+        john_page, remove_john, carol_page, _ = response.parts
+        assert isinstance(john_page, bytes) and callable(remove_john)
+        assert isinstance(carol_page, bytes)
+        # A read queued behind the bulk read is not sent the same messages
+        read = MessageRequest(MessageType.READ, "John", "", "").to_bytes()
+        self.assertEqual(
+            ([], False),
+            MessageResponse.decode_packet(
+                sent(server.handle_request(read, connection))
+            ),
+        )
+        remove_john()
+        self.assertEqual(0, server.store.mailbox_size("John"))
+        self.assertEqual(1, server.store.mailbox_size("Carol"))
+        self.assertEqual(
+            ([("Alice", "Hello again")], False),
+            MessageResponse.decode_packet(carol_page),
+        )
+
+    def test_bulk_read_without_gateway_key(self) -> None:
+        """Tests that bulk reads are refused by servers without a gateway key."""
+        server = Server([str(TestServer.port_number)])
+        packet = MessageRequest(
+            MessageType.BULK_READ,
+            "gateway",
+            "",
+            "John",
+            {RequestOption.GATEWAY_KEY: b""},
+        ).to_bytes()
+
+        self.assertEqual(
+            (ResultCode.FORBIDDEN,),
+            ResultResponse.decode_packet(sent(server.handle_request(packet))),
+        )
+        self.assertRaises(
+            SystemExit,
+            Server,
+            [str(TestServer.port_number), "--gateway-key-file", "missing.key"],
+        )
+
+    def test_ping_request(self) -> None:
+        """Tests that a ping is answered even when its sender is rate limited."""
+        server = Server(
+            [str(TestServer.port_number), "--sender-rate", "1", "--sender-burst", "1"]
+        )
+        packet = MessageRequest(MessageType.PING, "", "", "").to_bytes()
+
+        for _ in range(3):
+            response = sent(server.handle_request(packet))
+            self.assertEqual((ResultCode.OK,), ResultResponse.decode_packet(response))
+
+    def test_search_request(self) -> None:
+        """Tests that search requests page through matches without draining them."""
+        server = Server([str(TestServer.port_number), "--search-index", "on"])
+        for index in range(300):
+            server.store.add("John", "Alice", f"lunch number {index}".encode())
+        server.store.add("John", "Bob", b"meeting")
+
+        packet = MessageRequest(MessageType.SEARCH, "John", "", "Lunch").to_bytes()
+        response = sent(server.handle_request(packet))
+        self.assertEqual((255, True), MessageResponse.decode_header(response))
+        self.assertEqual(255, MessageResponse.decode_sequence(response))
+
+        packet = MessageRequest(
+            MessageType.SEARCH, "John", "", "lunch", {RequestOption.SEARCH_AFTER: 255}
+        ).to_bytes()
+        messages, more_messages = MessageResponse.decode_packet(
+            sent(server.handle_request(packet))
+        )
+        self.assertEqual(("Alice", "lunch number 255"), messages[0])
+        self.assertEqual(45, len(messages))
+        self.assertFalse(more_messages)
+        self.assertEqual(301, server.store.mailbox_size("John"))
+
+    def test_acknowledged_create_request(self) -> None:
+        """Tests that a create request asking for an acknowledgement gets one."""
+        server = Server([str(TestServer.port_number)])
+        packet = MessageRequest(
+            MessageType.CREATE,
+            "Alice",
+            "John",
+            "Hello John",
+            {RequestOption.ACKNOWLEDGE: b""},
+        ).to_bytes()
+
+        response = sent(server.handle_request(packet))
+        self.assertEqual((ResultCode.OK,), ResultResponse.decode_packet(response))
+        self.assertEqual(1, server.store.mailbox_size("John"))
+
+    def test_idempotent_create_request(self) -> None:
+        """Tests that a retried create request is only stored once."""
+        server = Server([str(TestServer.port_number), "--dedup-window", "3600"])
+        packet = MessageRequest(
+            MessageType.CREATE,
+            "Alice",
+            "John",
+            "Hello John",
+            {RequestOption.IDEMPOTENCY_KEY: b"key", RequestOption.ACKNOWLEDGE: b""},
+        ).to_bytes()
+
+        for _ in range(3):
+            response = sent(server.handle_request(packet))
+            self.assertEqual((ResultCode.OK,), ResultResponse.decode_packet(response))
+        self.assertEqual(1, server.store.mailbox_size("John"))
+
+        # The same key from another sender is a different message
+        packet = MessageRequest(
+            MessageType.CREATE,
+            "Bob",
+            "John",
+            "Hello John",
+            {RequestOption.IDEMPOTENCY_KEY: b"key"},
+        ).to_bytes()
+        self.assertIsNone(server.handle_request(packet))
+        self.assertEqual(2, server.store.mailbox_size("John"))
+
+    def test_dedup_off_by_default(self) -> None:
+        """Tests that idempotency keys are only remembered when asked to."""
+        server = Server([str(TestServer.port_number)])
+        packet = MessageRequest(
+            MessageType.CREATE,
+            "Alice",
+            "John",
+            "Hello John",
+            {RequestOption.IDEMPOTENCY_KEY: b"key"},
+        ).to_bytes()
+
+        for _ in range(2):
+            self.assertIsNone(server.handle_request(packet))
+        self.assertIsNone(server.dedup)
+        self.assertEqual(2, server.store.mailbox_size("John"))
+
+    def read_window(
+        self,
+        server: Server,
+        window: int,
+        acknowledged: int = 0,
+        connection: Optional[Connection] = None,
+    ) -> list[bytes]:
+        """Send a windowed read request for John's mailbox, returning each page."""
+        options = {RequestOption.WINDOW: window}
+        if acknowledged:
+            options[RequestOption.ACKNOWLEDGE_SEQUENCE] = acknowledged
+        packet = MessageRequest(MessageType.READ, "John", "", "", options).to_bytes()
+        return split_responses(
+            bytearray(sent(server.handle_request(packet, connection)))
+        )
+
+    def test_windowed_read_request(self) -> None:
+        """Tests that windowed reads send several pages, draining once acknowledged."""
+        server = Server([str(TestServer.port_number)])
+        for index in range(600):
+            server.store.add("John", "Alice", str(index).encode())
+        connection = Connection(socket.socket(), None)
+        self.addCleanup(connection.socket.close)
+
+        first, second = self.read_window(server, 2, connection=connection)
+        self.assertEqual((255, True), MessageResponse.decode_header(first))
+        self.assertEqual(255, MessageResponse.decode_sequence(first))
+        self.assertEqual(510, MessageResponse.decode_sequence(second))
+        self.assertEqual(600, server.store.mailbox_size("John"))
+
+        # The next page carries on after those already sent
+        (third,) = self.read_window(server, 1, 255, connection)
+        messages, more_messages = MessageResponse.decode_packet(third)
+        self.assertEqual(("Alice", "510"), messages[0])
+        self.assertFalse(more_messages)
+        self.assertEqual(345, server.store.mailbox_size("John"))
+
+        (empty,) = self.read_window(server, 0, 600, connection)
+        self.assertEqual((0, False), MessageResponse.decode_header(empty))
+        self.assertEqual(0, server.store.mailbox_size("John"))
+
+    def test_windowed_read_priority_lanes(self) -> None:
+        """Tests that windowed reads send urgent messages first, removed by page."""
+        server = Server([str(TestServer.port_number)])
+        for index in range(600):
+            priority = index // 300
+            server.store.add("John", "Alice", str(index).encode(), priority=priority)
+        connection = Connection(socket.socket(), None)
+        self.addCleanup(connection.socket.close)
+
+        first, second = self.read_window(server, 2, connection=connection)
+        self.assertEqual(555, MessageResponse.decode_sequence(first))
+        messages, _ = MessageResponse.decode_packet(second)
+        self.assertEqual([("Alice", "599"), ("Alice", "0")], messages[44:46])
+        self.assertEqual(210, MessageResponse.decode_sequence(second))
+
+        # Only the urgent messages in the first page are removed
+        (third,) = self.read_window(server, 1, 555, connection)
+        self.assertEqual(345, server.store.mailbox_size("John"))
+        messages, more_messages = MessageResponse.decode_packet(third)
+        self.assertEqual(("Alice", "210"), messages[0])
+        self.assertFalse(more_messages)
+
+        self.read_window(server, 0, 210, connection)
+        self.assertEqual(90, server.store.mailbox_size("John"))
+        self.read_window(server, 0, 300, connection)
+        self.assertEqual(0, server.store.mailbox_size("John"))
+
+    def test_windowed_read_redelivers_unacknowledged(self) -> None:
+        """Tests that messages sent but never acknowledged are sent again."""
+        server = Server([str(TestServer.port_number)])
+        server.store.add("John", "Alice", b"one")
+        server.store.add("John", "Bob", b"two")
+
+        (page,) = self.read_window(server, 1)
+        self.assertEqual(2, MessageResponse.decode_sequence(page))
+
+        (page,) = self.read_window(server, 1)
+        self.assertEqual(
+            ([("Alice", "one"), ("Bob", "two")], False),
+            MessageResponse.decode_packet(page),
+        )
+
+    def test_windowed_read_acknowledged_elsewhere(self) -> None:
+        """Tests that a page acknowledged on a new connection is still removed."""
+        server = Server([str(TestServer.port_number)])
+        server.store.add("John", "Alice", b"one")
+        server.store.add("John", "Bob", b"two", priority=1)
+        server.store.add("John", "Carol", b"three")
+
+        (page,) = self.read_window(server, 1)
+        self.assertEqual(3, MessageResponse.decode_sequence(page))
+
+        # Without the page's cursor, every message numbered up to it goes
+        (page,) = self.read_window(server, 1, 2)
+        self.assertEqual(
+            ([("Carol", "three")], False), MessageResponse.decode_packet(page)
+        )
+        self.assertEqual(1, server.store.mailbox_size("John"))
+
+    def cluster_server(self) -> Server:
+        """Create the only node of a cluster, which other nodes reach over TCP.
+
+        :return: The server, holding every mailbox.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        config_path = os.path.join(directory.name, "cluster.conf")
+        with open(config_path, "w", encoding="utf-8") as config_file:
+            config_file.write(f"alpha 127.0.0.1 {TestServer.port_number}\n")
+        return Server(
+            [
+                str(TestServer.port_number),
+                "--cluster-config",
+                config_path,
+                "--node-name",
+                "alpha",
+            ]
+        )
+
+    def peer_connection(self) -> Connection:
+        """Create a connection accepted from another node of the cluster.
+
+        :return: The connection, which is never actually connected.
+        """
+        connection = Connection(socket.socket(), ("127.0.0.1", 50000))
+        self.addCleanup(connection.close)
+        return connection
+
+    def test_forwarded_readers_kept_apart(self) -> None:
+        """Tests that clients behind another node each have their own cursor."""
+        server = self.cluster_server()
+        for index in range(600):
+            server.store.add("John", "Alice", str(index).encode())
+        connection = self.peer_connection()
+
+        def read(client: int, window: int, acknowledged: int = 0) -> list[bytes]:
+            options = {
+                RequestOption.FORWARDED: client.to_bytes(8, "big"),
+                RequestOption.ACKNOWLEDGE: b"",
+                RequestOption.WINDOW: window,
+            }
+            if acknowledged:
+                options[RequestOption.ACKNOWLEDGE_SEQUENCE] = acknowledged
+            packet = MessageRequest(MessageType.READ, "John", "", "", options)
+            response = server.handle_request(packet.to_bytes(), connection)
+            return split_responses(bytearray(sent(response)))
+
+        read(1, 2)
+        read(2, 1)
+        (page,) = read(1, 1, 510)
+        self.assertEqual(("Alice", "510"), MessageResponse.decode_packet(page)[0][0])
+        self.assertEqual(90, server.store.mailbox_size("John"))
+
+    def test_unhandled_forwarded_request_answered(self) -> None:
+        """Tests that another node is always sent a response to match up."""
+        server = self.cluster_server()
+        packet = MessageRequest(
+            MessageType.RESULT,
+            "Alice",
+            "John",
+            "",
+            {RequestOption.FORWARDED: b"", RequestOption.ACKNOWLEDGE: b""},
+        ).to_bytes()
+
+        response = server.handle_request(packet, self.peer_connection())
+        self.assertEqual(
+            (ResultCode.INVALID,), ResultResponse.decode_packet(sent(response))
+        )
+
+    def test_forwarded_only_from_cluster_nodes(self) -> None:
+        """Tests that a request is not served as forwarded from anyone else."""
+        packet = MessageRequest(
+            MessageType.RESULT,
+            "Alice",
+            "John",
+            "",
+            {RequestOption.FORWARDED: b"", RequestOption.ACKNOWLEDGE: b""},
+        ).to_bytes()
+        cluster_server = self.cluster_server()
+        for server, client_address in (
+            (Server([str(TestServer.port_number)]), ("127.0.0.1", 50000)),
+            (cluster_server, ("192.0.2.1", 50000)),
+            (cluster_server, None),
+        ):
+            connection = Connection(socket.socket(), client_address)
+            self.addCleanup(connection.close)
+            with self.subTest(client_address=client_address):
+                self.assertIsNone(server.handle_request(packet, connection))
+                self.assertFalse(connection.persistent)
+
+    def test_refused_attachment(self) -> None:
+        """Tests that a refused attachment's chunks are thrown away."""
+        server = Server([str(TestServer.port_number), "--attachment-limit", "4"])
+        connection = Connection(socket.socket(), None)
+        self.addCleanup(connection.close)
+        packet = MessageRequest(
+            MessageType.CREATE,
+            "Alice",
+            "John",
+            "Photo",
+            {RequestOption.ATTACHMENT: 5},
+        ).to_bytes()
+
+        response = sent(server.handle_request(packet, connection))
+        self.assertEqual(
+            (ResultCode.TOO_LARGE,), ResultResponse.decode_packet(response)
+        )
+        chunk = MessageRequest.encode_chunk("Alice", b"abcde")
+        self.assertIsNone(server.handle_request(chunk, connection))
+        self.assertIsNone(connection.upload)
+        self.assertEqual(0, server.store.mailbox_size("John"))
 
-        with socket.socket() as server_welcoming_socket:
-            server_welcoming_socket.bind((TestServer.hostname, TestServer.port_number))
-            server_welcoming_socket.listen(1)
+    def test_rate_limited_attachment_chunks(self) -> None:
+        """Tests that chunks are rate limited, refusing the rest of the attachment."""
+        with tempfile.TemporaryDirectory() as directory:
+            server = Server(
+                [
+                    str(TestServer.port_number),
+                    "--attachment-directory",
+                    directory,
+                    "--sender-rate",
+                    "0.001",
+                    "--sender-burst",
+                    "2",
+                ]
+            )
+            connection = Connection(socket.socket(), None)
+            self.addCleanup(connection.close)
+            packet = MessageRequest(
+                MessageType.CREATE,
+                "Alice",
+                "John",
+                "Photo",
+                {RequestOption.ATTACHMENT: 6},
+            ).to_bytes()
+            self.assertIsNone(server.handle_request(packet, connection))
 
-            with socket.socket() as client_socket:
-                client_socket.connect((TestServer.hostname, TestServer.port_number))
-                server_connection_socket, _ = server_welcoming_socket.accept()
+            chunk = MessageRequest.encode_chunk("Alice", b"ab")
+            self.assertIsNone(server.handle_request(chunk, connection))
+            response = sent(server.handle_request(chunk, connection))
+            self.assertEqual(
+                (ResultCode.RATE_LIMITED,), ResultResponse.decode_packet(response)
+            )
+            # The rest is thrown away without another answer
+            self.assertIsNone(server.handle_request(chunk, connection))
+            self.assertIsNone(connection.upload)
+            self.assertEqual([], os.listdir(directory))
+            self.assertEqual(0, server.store.mailbox_size("John"))
 
-                with server_connection_socket:
-                    server.process_read_request(server_connection_socket, receiver_name)
+    def test_windowed_read_with_attachment(self) -> None:
+        """Tests that windowed reads send each page's attachments after it."""
+        with tempfile.TemporaryDirectory() as directory:
+            server = Server(
+                [str(TestServer.port_number), "--attachment-directory", directory]
+            )
+            connection = Connection(socket.socket(), None)
+            self.addCleanup(connection.close)
+            packet = MessageRequest(
+                MessageType.CREATE,
+                "Alice",
+                "John",
+                "Photo",
+                {RequestOption.ATTACHMENT: 5},
+            ).to_bytes()
+            self.assertIsNone(server.handle_request(packet, connection))
+            chunk = MessageRequest.encode_chunk("Alice", b"abcde")
+            self.assertIsNone(server.handle_request(chunk, connection))
+            server.store.add("John", "Bob", b"Hello")
 
-                # Receive message from server
-                packet = client_socket.recv(1024)
-                response = MessageResponse.decode_packet(packet)
+            packet = MessageRequest(
+                MessageType.READ, "John", "", "", {RequestOption.WINDOW: 1}
+            ).to_bytes()
+            response = server.handle_request(packet, connection)
+            assert isinstance(response, StreamedResponse)
+            page, span = response.parts
+            assert isinstance(page, bytes) and isinstance(span, FileSpan)
+            with span.file:
+                self.assertEqual(b"abcde", span.file.read())
+            self.assertEqual(
+                {0: b"abcde"}, MessageResponse.decode_attachments(page + b"abcde")
+            )
 
-                # Check that the message is correct
-                self.assertEqual(([(sender_name, message.decode())], False), response)
+            # Acknowledged attachments are removed by the next sweep
+            acknowledged = MessageResponse.decode_sequence(page)
+            assert acknowledged is not None
+            self.read_window(server, 0, acknowledged, connection)
+            server.run_housekeeping()
+            self.assertEqual([], os.listdir(directory))
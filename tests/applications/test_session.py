@@ -0,0 +1,149 @@
+"""``Session`` class test suite."""
+
+import contextlib
+import io
+import os
+import socket
+import tempfile
+import threading
+import unittest
+import unittest.mock
+
+from src.packets.message_request import MessageRequest
+from src.packets.result_response import ResultResponse
+from src.message_type import MessageType
+from src.result_code import ResultCode
+from server.event_loop import EventLoop
+from server import Server
+from client import Client
+from client.session import Session
+
+
+class TestSession(unittest.TestCase):
+    """Test suite for Session class."""
+
+    port_number = 12000
+
+    def setUp(self) -> None:
+        """Create a directory for the server's socket."""
+        directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "server.sock")
+
+    def run_session(self, commands: list[str]) -> tuple[Session, str]:
+        """Run a session as John, typing some commands.
+
+        :param commands: The commands to type.
+        :return: The session, and everything it printed.
+        """
+        client = Client(
+            [f"unix:{self.path}", str(TestSession.port_number), "John", "session"]
+        )
+        session = Session(client)
+        output = io.StringIO()
+        with unittest.mock.patch("builtins.input", side_effect=[*commands, EOFError]):
+            with contextlib.redirect_stdout(output):
+                session.run()
+        return session, output.getvalue()
+
+    def test_one_connection(self) -> None:
+        """Tests that every command is sent over a single connection."""
+        server = Server([str(TestSession.port_number)])
+        with socket.socket(socket.AF_UNIX) as welcoming_socket:
+            welcoming_socket.bind(self.path)
+            welcoming_socket.listen()
+            event_loop = EventLoop(
+                [welcoming_socket],
+                server.handle_request,
+                server.admission,
+                server.timeouts,
+                lambda: None,
+                0.01,
+            )
+            self.addCleanup(event_loop.close)
+
+            stopped = threading.Event()
+
+            def serve() -> None:
+                while not stopped.is_set():
+                    event_loop.run_once()
+
+            thread = threading.Thread(target=serve)
+            thread.start()
+            try:
+                session, output = self.run_session(
+                    [f"send John message {index}" for index in range(300)]
+                    + ["status", "search message 299", "drain", "read", "ping"]
+                )
+            finally:
+                stopped.set()
+                thread.join()
+
+        self.assertEqual(1, session.connections)
+        self.assertEqual(306, session.requests)
+        self.assertEqual(300, output.count("Message sent to John"))
+        self.assertIn("300 message(s) waiting", output)
+        # One found by the search, and every one drained
+        self.assertEqual(301, output.count("Message from John"))
+        self.assertIn("message 299\n", output)
+        self.assertIn("No messages available", output)
+        self.assertIn("Server is up", output)
+        self.assertEqual(0, server.store.mailbox_size("John"))
+
+    def test_reconnects_to_single_request_server(self) -> None:
+        """Tests that servers closing every connection after responding still work."""
+        with socket.socket(socket.AF_UNIX) as welcoming_socket:
+            welcoming_socket.bind(self.path)
+            welcoming_socket.listen()
+
+            def serve() -> None:
+                for _ in range(3):
+                    connection_socket, _ = welcoming_socket.accept()
+                    with connection_socket:
+                        connection_socket.recv(4096)
+                        connection_socket.send(ResultResponse(ResultCode.OK).to_bytes())
+
+            thread = threading.Thread(target=serve)
+            thread.start()
+            try:
+                session, output = self.run_session(["ping", "ping", "ping"])
+            finally:
+                thread.join()
+
+        self.assertEqual(3, output.count("Server is up"))
+        self.assertTrue(session.reconnect_each_request)
+        self.assertEqual(3, session.connections)
+
+    def test_server_without_options(self) -> None:
+        """Tests that messages reach a server which predates request options."""
+        received: list[bytes] = []
+        with socket.socket(socket.AF_UNIX) as welcoming_socket:
+            welcoming_socket.bind(self.path)
+            welcoming_socket.listen()
+
+            def serve() -> None:
+                # Such a server discards requests it does not understand
+                for _ in range(3):
+                    connection_socket, _ = welcoming_socket.accept()
+                    with connection_socket:
+                        packet = connection_socket.recv(4096)
+                        if packet[2] in (
+                            MessageType.READ.value,
+                            MessageType.CREATE.value,
+                        ):
+                            received.append(packet)
+
+            thread = threading.Thread(target=serve)
+            thread.start()
+            try:
+                session, output = self.run_session(["ping", "send John hello"])
+            finally:
+                thread.join()
+
+        self.assertIn("Command failed", output)
+        self.assertIn("Message sent to John", output)
+        self.assertTrue(session.plain_creates)
+        self.assertEqual(
+            [MessageRequest(MessageType.CREATE, "John", "John", "hello").to_bytes()],
+            received,
+        )
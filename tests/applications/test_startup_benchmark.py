@@ -0,0 +1,24 @@
+"""``StartupBenchmark`` class test suite."""
+
+import contextlib
+import io
+import os
+import unittest
+
+from client.startup_benchmark import StartupBenchmark
+
+
+@unittest.skipUnless(
+    os.environ.get("RUN_BENCHMARKS"), "Starts many interpreters, set RUN_BENCHMARKS=1"
+)
+class TestStartupBenchmark(unittest.TestCase):
+    """Test suite for StartupBenchmark class."""
+
+    def test_reports_startup_time(self) -> None:
+        """Tests that the client is timed pinging the stand-in server."""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            StartupBenchmark(["--runs", "1"]).run()
+
+        self.assertIn("Client: median", output.getvalue())
+        self.assertIn("Interpreter alone: median", output.getvalue())
@@ -0,0 +1,93 @@
+"""``StripedMailboxStore`` class test suite."""
+
+import tempfile
+import threading
+import unittest
+
+from server.mailbox_store import QuotaExceededError
+from server.stored_message import StoredMessage
+from server.striped_store import StripedMailboxStore
+
+
+class TestStripedMailboxStore(unittest.TestCase):
+    """Test suite for StripedMailboxStore class."""
+
+    def setUp(self) -> None:
+        """Set up a temporary spill directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_add_peek_drain(self) -> None:
+        """Tests that each mailbox behaves as it does in an unstriped store."""
+        store = StripedMailboxStore(4)
+        store.add("John", "Alice", b"one")
+        store.add("Mary", "Alice", b"two")
+        store.add("John", "Bob", b"three")
+
+        peeked = store.peek("John", 5)
+        self.assertEqual([b"one", b"three"], [stored.message for stored in peeked])
+        self.assertEqual(1, store.mailbox_size("Mary"))
+
+        store.drain("John", 1)
+        self.assertEqual(1, store.mailbox_size("John"))
+
+    def test_sequence_numbers_unique(self) -> None:
+        """Tests that messages are numbered uniquely, and in order per mailbox."""
+        store = StripedMailboxStore(8)
+        names = [f"user{index}" for index in range(20)]
+        for name in names:
+            for _ in range(3):
+                store.add(name, "Alice", b"hello")
+
+        sequences = [stored.sequence for _, stored in store.snapshot()]
+        self.assertEqual(len(sequences), len(set(sequences)))
+        for name in names:
+            mailbox = [stored.sequence for stored in store.peek(name, 3)]
+            self.assertEqual(sorted(mailbox), mailbox)
+
+    def test_acknowledge(self) -> None:
+        """Tests that acknowledging removes messages up to a sequence number."""
+        store = StripedMailboxStore(4)
+        for message in (b"one", b"two", b"three"):
+            store.add("John", "Alice", message)
+        second = store.peek("John", 2)[1].sequence
+
+        self.assertEqual(2, store.acknowledge("John", second))
+        self.assertEqual(
+            [b"three"], [stored.message for stored in store.peek("John", 5)]
+        )
+
+    def test_concurrent_adds(self) -> None:
+        """Tests that no message is lost when many threads add at once."""
+        store = StripedMailboxStore(4)
+
+        def send(sender_name: str) -> None:
+            for index in range(200):
+                store.add(f"user{index % 10}", sender_name, b"hello")
+
+        threads = [
+            threading.Thread(target=send, args=(f"sender{index}",))
+            for index in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(8 * 200, store.stats["messages"])
+        sequences = [stored.sequence for _, stored in store.snapshot()]
+        self.assertEqual(len(sequences), len(set(sequences)))
+
+    def test_memory_limit_shared(self) -> None:
+        """Tests that the memory limit applies to every stripe together."""
+        size = StoredMessage("Alice", b"Hello").size
+        store = StripedMailboxStore(
+            4, memory_limit=2 * size, spill_directory=self.directory.name
+        )
+        store.add("John", "Alice", b"Hello")
+        store.add("Bob", "Alice", b"Hello")
+
+        with self.assertRaises(QuotaExceededError):
+            store.add("Carol", "Alice", b"Hello")
+        self.assertEqual(2 * size, store.memory.bytes)
+        self.assertEqual(2 * size, store.stats["memory_bytes"])
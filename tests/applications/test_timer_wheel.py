@@ -0,0 +1,69 @@
+"""``TimerWheel`` class test suite."""
+
+import random
+import unittest
+
+from server.timer_wheel import TimerWheel
+
+
+class TestTimerWheel(unittest.TestCase):
+    """Test suite for TimerWheel class."""
+
+    def test_not_expired_early(self) -> None:
+        """Tests that a timer does not expire before its deadline."""
+        wheel: TimerWheel[str] = TimerWheel(now=0.0)
+        wheel.schedule(5.0, "timer")
+        self.assertEqual([], wheel.advance(4.0))
+        self.assertEqual(1, len(wheel))
+
+    def test_expired_on_deadline(self) -> None:
+        """Tests that a timer expires once its deadline has passed."""
+        wheel: TimerWheel[str] = TimerWheel(now=0.0)
+        wheel.schedule(5.0, "timer")
+        self.assertEqual(["timer"], wheel.advance(5.0))
+        self.assertEqual(0, len(wheel))
+
+    def test_past_deadline(self) -> None:
+        """Tests that a timer scheduled in the past expires on the next advance."""
+        wheel: TimerWheel[str] = TimerWheel(now=100.0)
+        wheel.schedule(50.0, "timer")
+        self.assertEqual(["timer"], wheel.advance(100.0))
+
+    def test_cascade(self) -> None:
+        """Tests that timers on higher levels expire at the right tick."""
+        wheel: TimerWheel[int] = TimerWheel(now=0.0, slot_bits=2, levels=3)
+        wheel.schedule(9.0, 9)
+        wheel.schedule(40.0, 40)
+        self.assertEqual([], wheel.advance(8.0))
+        self.assertEqual([9], wheel.advance(9.0))
+        self.assertEqual([], wheel.advance(39.0))
+        self.assertEqual([40], wheel.advance(40.0))
+
+    def test_beyond_range(self) -> None:
+        """Tests that timers further away than the wheel's range still expire on time."""
+        wheel: TimerWheel[int] = TimerWheel(now=0.0, slot_bits=2, levels=2)
+        wheel.schedule(100.0, 100)
+        self.assertEqual([], wheel.advance(99.0))
+        self.assertEqual([100], wheel.advance(100.0))
+
+    def test_sub_tick_deadline(self) -> None:
+        """Tests that a deadline within a tick is rounded up, never down."""
+        wheel: TimerWheel[str] = TimerWheel(now=0.0, tick=1.0)
+        wheel.schedule(2.5, "timer")
+        self.assertEqual([], wheel.advance(2.9))
+        self.assertEqual(["timer"], wheel.advance(3.0))
+
+    def test_random_deadlines(self) -> None:
+        """Tests that many random timers each expire at the first advance past them."""
+        generator = random.Random(1)
+        wheel: TimerWheel[int] = TimerWheel(now=0.0, slot_bits=3, levels=3)
+        deadlines = [generator.randrange(1, 2000) for _ in range(500)]
+        for index, deadline in enumerate(deadlines):
+            wheel.schedule(float(deadline), index)
+
+        now = 0
+        while len(wheel):
+            now += generator.randrange(1, 20)
+            for index in wheel.advance(float(now)):
+                self.assertLessEqual(deadlines[index], now)
+                self.assertGreater(deadlines[index], now - 20)
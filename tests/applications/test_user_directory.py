@@ -0,0 +1,54 @@
+"""``UserDirectory`` class test suite."""
+
+import unittest
+
+from server.mailbox_store import MailboxStore
+from server.user_directory import UserDirectory
+
+
+class TestUserDirectory(unittest.TestCase):
+    """Test suite for UserDirectory class."""
+
+    def test_users_shared(self) -> None:
+        """Tests that each user is numbered once, until no longer referred to."""
+        users = UserDirectory()
+        alice = users.add("Alice")
+        self.assertEqual(alice, users.add("Alice"))
+        bob = users.add("Bob")
+        self.assertEqual(b"Alice", users.encoded_names[alice])
+
+        users.remove(alice)
+        self.assertIn("Alice", users.user_ids)
+        users.remove(alice)
+        self.assertNotIn("Alice", users.user_ids)
+        self.assertEqual(1, len(users))
+
+        # The number is reused by the next new user
+        self.assertEqual(alice, users.add("Carol"))
+        self.assertEqual("Bob", users.names[bob])
+
+    def test_encode_reuses_names(self) -> None:
+        """Tests that names already in the directory are not encoded again."""
+        users = UserDirectory()
+        encoded_name = users.encoded_names[users.add("Ålice")]
+
+        self.assertIs(encoded_name, users.encode("Ålice"))
+        self.assertEqual("Bob".encode(), users.encode("Bob"))
+
+    def test_store_numbers_senders(self) -> None:
+        """Tests that a store holds each sender's name once, however many messages."""
+        store = MailboxStore()
+        for index in range(10):
+            store.add("John", "Alice", str(index).encode())
+            store.add("Jack", "Alice", str(index).encode())
+
+        self.assertEqual(1, store.stats["users"])
+        stored_message = store.peek("John", 1)[0]
+        self.assertIs(
+            store.users.encoded_names[store.users.user_ids["Alice"]],
+            stored_message.encoded_sender_name,
+        )
+
+        store.drain("John", 10)
+        store.drain("Jack", 10)
+        self.assertEqual(0, store.stats["users"])
@@ -0,0 +1,149 @@
+"""``WorkerPool`` class test suite."""
+
+import socket
+import threading
+import unittest
+
+from src.packets.message_request import MessageRequest
+from src.packets.message_response import MessageResponse
+from src.packets.response_framing import split_responses
+from src.message_type import MessageType
+from src.request_option import RequestOption
+from server.connection import ConnectionPhase
+from server.worker_pool import Engine, WorkerPool
+from server import Server
+
+
+class TestWorkerPool(unittest.TestCase):
+    """Test suite for WorkerPool class."""
+
+    def setUp(self) -> None:
+        """Start a worker pool serving a threaded server on an ephemeral port."""
+        self.server = Server(["12000", "--engine", "threads", "--lock-stripes", "4"])
+        self.welcoming_socket = socket.socket()
+        self.welcoming_socket.bind(("localhost", 0))
+        self.welcoming_socket.listen()
+        self.address = self.welcoming_socket.getsockname()
+
+        self.pool = WorkerPool(
+            [self.welcoming_socket],
+            self.server.handle_request,
+            self.server.admission,
+            {
+                ConnectionPhase.READ_HEADER: 10.0,
+                ConnectionPhase.READ_BODY: 5.0,
+                ConnectionPhase.WRITE: 5.0,
+            },
+            lambda: None,
+            60.0,
+            threads=4,
+        )
+        self.pool.start()
+        self.stopping = threading.Event()
+        self.acceptor = threading.Thread(target=self.accept, daemon=True)
+        self.acceptor.start()
+
+    def tearDown(self) -> None:
+        """Stop the worker pool and close the welcoming socket."""
+        self.stopping.set()
+        self.acceptor.join()
+        self.pool.close()
+        self.welcoming_socket.close()
+
+    def accept(self) -> None:
+        """Accept connections until the test is over."""
+        while not self.stopping.is_set():
+            self.pool.run_once()
+
+    def connect(self) -> socket.socket:
+        """Open a client connection to the worker pool."""
+        client_socket = socket.create_connection(self.address, timeout=5)
+        self.addCleanup(client_socket.close)
+        return client_socket
+
+    @staticmethod
+    def receive(client_socket: socket.socket, size: int) -> bytes:
+        """Receive exactly ``size`` bytes."""
+        data = b""
+        while len(data) < size:
+            chunk = client_socket.recv(size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    def test_engine_from_str(self) -> None:
+        """Tests that engines are parsed from their names."""
+        self.assertEqual(Engine.THREADS, Engine.from_str("threads"))
+        self.assertRaises(ValueError, Engine.from_str, "processes")
+
+    def test_pipelined_requests(self) -> None:
+        """Tests that several requests on one connection are all served."""
+        client_socket = self.connect()
+        requests = [
+            MessageRequest(MessageType.CREATE, "Alice", "John", "Hello"),
+            MessageRequest(MessageType.CREATE, "Bob", "John", "Hi"),
+            MessageRequest(MessageType.READ, "John", "", ""),
+            MessageRequest(MessageType.READ, "John", "", ""),
+        ]
+        client_socket.sendall(b"".join(request.to_bytes() for request in requests))
+
+        first = MessageResponse([("Alice", b"Hello"), ("Bob", b"Hi")]).to_bytes()
+        second = MessageResponse([]).to_bytes()
+        expected = first + second
+        self.assertEqual(expected, self.receive(client_socket, len(expected)))
+
+    def test_concurrent_clients(self) -> None:
+        """Tests that clients on separate workers share the same mailboxes."""
+        senders = [self.connect() for _ in range(4)]
+        for index, client_socket in enumerate(senders):
+            request = MessageRequest(MessageType.CREATE, f"user{index}", "John", "Hi")
+            client_socket.sendall(request.to_bytes() * 10)
+        for client_socket in senders:
+            client_socket.close()
+
+        reader = self.connect()
+        buffer = bytearray()
+        received = 0
+        expected = len(senders) * 10
+        for _ in range(100):
+            reader.sendall(MessageRequest(MessageType.READ, "John", "", "").to_bytes())
+            responses: list[bytes] = []
+            while not responses:
+                buffer += reader.recv(4096)
+                responses = split_responses(buffer)
+            (response,) = responses
+            received += len(MessageResponse.decode_packet(response)[0])
+            if received == expected:
+                break
+        self.assertEqual(expected, received)
+
+    def test_idle_cluster_link_closed(self) -> None:
+        """Tests that a link from another cluster node is not kept open when idle."""
+        self.pool.timeouts[ConnectionPhase.READ_HEADER] = 0.2
+        client_socket = self.connect()
+        request = MessageRequest(
+            MessageType.READ,
+            "John",
+            "",
+            "",
+            {RequestOption.FORWARDED: (1).to_bytes(8, "big")},
+        ).to_bytes()
+        client_socket.sendall(request)
+        expected = MessageResponse([]).to_bytes()
+        self.assertEqual(expected, self.receive(client_socket, len(expected)))
+
+        self.assertEqual(b"", client_socket.recv(1024))
+
+    def test_close_disconnects_clients(self) -> None:
+        """Tests that closing the pool cuts off connected clients."""
+        client_socket = self.connect()
+        request = MessageRequest(MessageType.READ, "John", "", "").to_bytes()
+        client_socket.sendall(request)
+        expected = MessageResponse([]).to_bytes()
+        self.assertEqual(expected, self.receive(client_socket, len(expected)))
+
+        self.stopping.set()
+        self.acceptor.join()
+        self.pool.close()
+        self.assertEqual(b"", client_socket.recv(1024))
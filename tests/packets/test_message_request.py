@@ -5,6 +5,7 @@ import unittest
 from src.packets.packet import Packet
 from src.message_type import MessageType
 from src.packets.message_request import MessageRequest
+from src.request_option import RequestOption
 
 
 class TestMessageRequestEncoding(unittest.TestCase):
@@ -221,6 +222,81 @@ class TestMessageRequestDecoding(unittest.TestCase):
 
         self.assertRaises(ValueError, MessageRequest.decode_packet, self.packet)
 
+    def test_status_request_decoding(self) -> None:
+        """Tests that a status request is decoded like a read request."""
+        packet = MessageRequest(MessageType.STATUS, "Alice", "", "").to_bytes()
+        self.assertEqual(
+            (MessageType.STATUS, "Alice", "", b""), MessageRequest.decode_packet(packet)
+        )
+
+    def test_peek_request_decoding(self) -> None:
+        """Tests that a peek request is decoded like a read request."""
+        packet = MessageRequest(MessageType.PEEK, "Alice", "", "").to_bytes()
+        self.assertEqual(
+            (MessageType.PEEK, "Alice", "", b""), MessageRequest.decode_packet(packet)
+        )
+
+        packet = MessageRequest(MessageType.PEEK, "Alice", "Bob", "").to_bytes()
+        self.assertRaises(ValueError, MessageRequest.decode_packet, packet)
+
+    def test_ping_without_user_name(self) -> None:
+        """Tests that a ping request need not name its sender."""
+        packet = MessageRequest(MessageType.PING, "", "", "").to_bytes()
+        self.assertEqual(
+            (MessageType.PING, "", "", b""), MessageRequest.decode_packet(packet)
+        )
+
+    def test_search_request_decoding(self) -> None:
+        """Tests that a search request carries its query as the message."""
+        packet = MessageRequest(MessageType.SEARCH, "Alice", "", "lunch").to_bytes()
+        self.assertEqual(
+            (MessageType.SEARCH, "Alice", "", b"lunch"),
+            MessageRequest.decode_packet(packet),
+        )
+
+        packet = MessageRequest(MessageType.SEARCH, "Alice", "", "").to_bytes()
+        self.assertRaises(ValueError, MessageRequest.decode_packet, packet)
+
+    def test_bulk_read_request_decoding(self) -> None:
+        """Tests that a bulk read request lists its users as the message."""
+        packet = MessageRequest(
+            MessageType.BULK_READ, "gateway", "", "Alice\nBob"
+        ).to_bytes()
+        message_type, _, _, message = MessageRequest.decode_packet(packet)
+        self.assertEqual(MessageType.BULK_READ, message_type)
+        self.assertEqual(["Alice", "Bob"], MessageRequest.split_names(message))
+
+        self.assertRaises(ValueError, MessageRequest.split_names, b"Alice\n")
+        packet = MessageRequest(MessageType.BULK_READ, "gateway", "", "").to_bytes()
+        self.assertRaises(ValueError, MessageRequest.decode_packet, packet)
+
+    def test_batch_names(self) -> None:
+        """Tests that user names are split into batches which fit in a request."""
+        user_names = [f"user{index:04}" for index in range(10000)]
+        batches = MessageRequest.batch_names(user_names)
+
+        self.assertEqual(2, len(batches))
+        self.assertTrue(
+            all(len(batch) <= MessageRequest.MAX_NAMES_SIZE for batch in batches)
+        )
+        self.assertEqual(
+            user_names,
+            [name for batch in batches for name in batch.split("\n")],
+        )
+        self.assertRaises(ValueError, MessageRequest.batch_names, ["Alice\nBob"])
+
+    def test_chunk_request_decoding(self) -> None:
+        """Tests that a chunk request carries its part of an attachment as is."""
+        data = bytes(range(256))
+        packet = MessageRequest.encode_chunk("Alice", data)
+        self.assertEqual(
+            (MessageType.CHUNK, "Alice", "", data), MessageRequest.decode_packet(packet)
+        )
+        self.assertEqual(len(packet), MessageRequest.frame_length(packet))
+
+        packet = MessageRequest.encode_chunk("Alice", b"")
+        self.assertRaises(ValueError, MessageRequest.decode_packet, packet)
+
     def test_insufficient_receiver_name_length_for_create(self) -> None:
         """Tests that an exception is raised.
 
@@ -243,3 +319,108 @@ class TestMessageRequestDecoding(unittest.TestCase):
         self.packet[6] = 0
 
         self.assertRaises(ValueError, MessageRequest.decode_packet, self.packet)
+
+
+class TestMessageRequestOptions(unittest.TestCase):
+    """Test suite for ``MessageRequest`` packets carrying options."""
+
+    def setUp(self) -> None:
+        """Set up the testing environment."""
+        self.request = MessageRequest(
+            MessageType.CREATE,
+            "Jamie",
+            "Jonty",
+            "Hello, World!",
+            {RequestOption.TIME_TO_LIVE: 3600},
+        )
+        self.packet = self.request.to_bytes()
+
+    def test_options_flag(self) -> None:
+        """Tests that the options flag is set when options are present."""
+        self.assertEqual(
+            MessageType.CREATE.value | MessageRequest.OPTIONS_FLAG, self.packet[2]
+        )
+
+    def test_no_options_unchanged(self) -> None:
+        """Tests that requests without options are encoded exactly as before."""
+        packet = MessageRequest(
+            MessageType.CREATE, "Jamie", "Jonty", "Hello, World!"
+        ).to_bytes()
+        self.assertEqual(MessageType.CREATE.value, packet[2])
+        self.assertEqual({}, MessageRequest.decode_options(packet))
+
+    def test_fields_decoded(self) -> None:
+        """Tests that the fields of a request with options are decoded correctly."""
+        self.assertEqual(
+            (MessageType.CREATE, "Jamie", "Jonty", b"Hello, World!"),
+            MessageRequest.decode_packet(self.packet),
+        )
+
+    def test_options_decoded(self) -> None:
+        """Tests that the options are decoded correctly."""
+        self.assertEqual(
+            {RequestOption.TIME_TO_LIVE: 3600},
+            MessageRequest.decode_options(self.packet),
+        )
+
+    def test_unknown_option_skipped(self) -> None:
+        """Tests that options which are not recognised are ignored."""
+        packet = bytearray(self.packet)
+        packet[-6] = 0xFF
+        self.assertEqual({}, MessageRequest.decode_options(bytes(packet)))
+
+    def test_truncated_options(self) -> None:
+        """Tests that an exception is raised if the options are cut short."""
+        self.assertRaises(ValueError, MessageRequest.decode_options, self.packet[:-1])
+
+    def test_peek_names_ignores_flag(self) -> None:
+        """Tests that the options flag is removed from the peeked message type."""
+        message_type, user_name, receiver_name = MessageRequest.peek_names(self.packet)
+        self.assertEqual(MessageType.CREATE.value, message_type)
+        self.assertEqual((b"Jamie", b"Jonty"), (user_name, receiver_name))
+
+    def test_peek_options(self) -> None:
+        """Tests that a request's options are found, unless malformed."""
+        plain = MessageRequest(MessageType.READ, "Jamie", "", "").to_bytes()
+        self.assertEqual({}, MessageRequest.peek_options(plain))
+        packet = MessageRequest.add_options(self.packet, {RequestOption.PRIORITY: 7})
+        self.assertEqual(
+            {RequestOption.TIME_TO_LIVE: 3600, RequestOption.PRIORITY: 7},
+            MessageRequest.peek_options(packet),
+        )
+        self.assertIsNone(MessageRequest.peek_options(packet[:-1]))
+        self.assertIsNone(MessageRequest.peek_options(b"\x00"))
+
+    def test_without_options(self) -> None:
+        """Tests that options can be removed from an encoded request."""
+        plain = MessageRequest(MessageType.CREATE, "Jamie", "Jonty", "Hi").to_bytes()
+        packet = MessageRequest.add_options(plain, {RequestOption.PRIORITY: 7})
+        self.assertEqual(plain, MessageRequest.without_options(packet))
+        self.assertEqual(plain, MessageRequest.without_options(plain))
+        self.assertRaises(ValueError, MessageRequest.without_options, b"\x00")
+
+    def test_add_options(self) -> None:
+        """Tests that options can be attached to an encoded request."""
+        packet = MessageRequest.add_options(
+            self.packet, {RequestOption.ACKNOWLEDGE: b""}
+        )
+        self.assertEqual(
+            {RequestOption.TIME_TO_LIVE: 3600, RequestOption.ACKNOWLEDGE: b""},
+            MessageRequest.decode_options(packet),
+        )
+        self.assertEqual(
+            MessageRequest.decode_packet(self.packet),
+            MessageRequest.decode_packet(packet),
+        )
+        self.assertEqual(len(packet), MessageRequest.frame_length(packet))
+
+    def test_add_options_without_existing_options(self) -> None:
+        """Tests that options can be attached to a request which had none."""
+        packet = MessageRequest(MessageType.READ, "Jamie", "", "").to_bytes()
+        packet = MessageRequest.add_options(packet, {RequestOption.FORWARDED: b""})
+        self.assertEqual(
+            {RequestOption.FORWARDED: b""}, MessageRequest.decode_options(packet)
+        )
+        self.assertEqual(
+            (MessageType.READ, "Jamie", "", b""), MessageRequest.decode_packet(packet)
+        )
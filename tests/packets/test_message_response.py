@@ -4,6 +4,7 @@ import unittest
 
 from src.packets.packet import Packet
 from src.message_type import MessageType
+from src.packets.message import Message
 from src.packets.message_response import MessageResponse
 
 
@@ -49,6 +50,27 @@ class TestMessageResponseEncoding(unittest.TestCase):
         actual = packet[4]
         self.assertEqual(expected, actual)
 
+    def test_last_sequence_encoding(self) -> None:
+        """Tests that the last sequence number follows the header when given."""
+        packet = MessageResponse([("Harry", b"Hi")], last_sequence=7).to_bytes()
+
+        self.assertEqual(MessageType.RESPONSE.value | 0x80, packet[2])
+        self.assertEqual((7).to_bytes(8, "big"), packet[5:13])
+
+    def test_encoded_messages(self) -> None:
+        """Tests that responses from encoded messages match those encoded here."""
+        messages = [("Harry", b"Hello John!")] * (
+            MessageResponse.MAX_MESSAGE_LENGTH + 1
+        )
+        encoded_messages = [
+            Message.pack(sender.encode(), message) for sender, message in messages
+        ]
+
+        self.assertEqual(
+            MessageResponse(messages, last_sequence=3).to_bytes(),
+            MessageResponse.from_encoded(encoded_messages, last_sequence=3).to_bytes(),
+        )
+
 
 class TestMessageResponseDecoding(unittest.TestCase):
     """Test suite for decoding MessageResponse packets."""
@@ -89,6 +111,43 @@ class TestMessageResponseDecoding(unittest.TestCase):
         actual = MessageResponse.decode_packet(packet)[1]
         self.assertEqual(expected, actual)
 
+    def test_last_sequence_decoding(self) -> None:
+        """Tests that responses with a last sequence number decode correctly."""
+        messages = [("Harry", "Hello John!".encode())]
+        packet = MessageResponse(messages, last_sequence=2**40).to_bytes()
+
+        self.assertEqual(
+            ([("Harry", "Hello John!")], False), MessageResponse.decode_packet(packet)
+        )
+        self.assertEqual(2**40, MessageResponse.decode_sequence(packet))
+        self.assertEqual(len(packet), MessageResponse.frame_length(packet))
+        self.assertIsNone(
+            MessageResponse.decode_sequence(MessageResponse(messages).to_bytes())
+        )
+
+    def test_attachments_decoding(self) -> None:
+        """Tests that attachments follow the messages they belong to."""
+        messages = [("Harry", b"Photo"), ("Harry", b"Hello"), ("Sally", b"Video")]
+        response = MessageResponse(
+            messages, last_sequence=9, attachment_sizes=[(0, 3), (2, 5)]
+        )
+        packet = response.to_bytes() + b"abc" + b"defgh"
+
+        self.assertEqual(
+            ([("Harry", "Photo"), ("Harry", "Hello"), ("Sally", "Video")], False),
+            MessageResponse.decode_packet(packet),
+        )
+        self.assertEqual(9, MessageResponse.decode_sequence(packet))
+        self.assertEqual(
+            {0: b"abc", 2: b"defgh"}, MessageResponse.decode_attachments(packet)
+        )
+        self.assertEqual(len(packet), MessageResponse.frame_length(packet))
+        self.assertIsNone(MessageResponse.frame_length(response.to_bytes()[:-1]))
+        self.assertRaises(ValueError, MessageResponse.decode_attachments, packet[:-1])
+        self.assertEqual(
+            {}, MessageResponse.decode_attachments(MessageResponse(messages).to_bytes())
+        )
+
     def test_incorrect_magic_number(self) -> None:
         """Tests that a ``ValueError`` is raised when the magic number is incorrect."""
         messages: list[tuple[str, bytes]] = []
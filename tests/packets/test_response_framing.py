@@ -0,0 +1,58 @@
+"""Response framing test suite."""
+
+import unittest
+
+from src.packets.message_request import MessageRequest
+from src.packets.message_response import MessageResponse
+from src.packets.response_framing import response_frame_length, split_responses
+from src.packets.result_response import ResultResponse
+from src.packets.status_response import StatusResponse
+from src.message_type import MessageType
+from src.result_code import ResultCode
+
+
+class TestResponseFraming(unittest.TestCase):
+    """Test suite for splitting a stream of responses into packets."""
+
+    def setUp(self) -> None:
+        """Set up the testing environment."""
+        self.message_response = MessageResponse(
+            [("Alice", b"Hello"), ("Bob", b"Hi there")]
+        ).to_bytes()
+        self.result_response = ResultResponse(ResultCode.OK).to_bytes()
+
+    def test_message_response_length(self) -> None:
+        """Tests that the length of a message response is found."""
+        self.assertEqual(
+            len(self.message_response), response_frame_length(self.message_response)
+        )
+
+    def test_result_response_length(self) -> None:
+        """Tests that the length of a result response is found."""
+        self.assertEqual(
+            len(self.result_response), response_frame_length(self.result_response)
+        )
+
+    def test_status_response_length(self) -> None:
+        """Tests that the length of a status response is found."""
+        status_response = StatusResponse(2, 40, 1.5).to_bytes()
+        self.assertEqual(len(status_response), response_frame_length(status_response))
+
+    def test_incomplete_header(self) -> None:
+        """Tests that nothing is found until a message header has arrived."""
+        self.assertIsNone(response_frame_length(self.message_response[:7]))
+
+    def test_request_rejected(self) -> None:
+        """Tests that an exception is raised if a request is found."""
+        packet = MessageRequest(MessageType.READ, "Alice", "", "").to_bytes()
+        self.assertRaises(ValueError, response_frame_length, packet)
+
+    def test_split_responses(self) -> None:
+        """Tests that complete responses are removed from the buffer."""
+        buffer = bytearray(
+            self.message_response + self.result_response + self.message_response[:4]
+        )
+        self.assertEqual(
+            [self.message_response, self.result_response], split_responses(buffer)
+        )
+        self.assertEqual(self.message_response[:4], buffer)
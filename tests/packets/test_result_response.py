@@ -0,0 +1,41 @@
+"""``ResultResponse`` class test suite."""
+
+import unittest
+
+from src.packets.packet import Packet
+from src.packets.result_response import ResultResponse
+from src.message_type import MessageType
+from src.result_code import ResultCode
+
+
+class TestResultResponse(unittest.TestCase):
+    """Test suite for encoding and decoding ResultResponse packets."""
+
+    def test_message_type_encoding(self) -> None:
+        """Tests that the message type is encoded correctly."""
+        packet = ResultResponse(ResultCode.OVERLOADED).to_bytes()
+        self.assertEqual(MessageType.RESULT.value, packet[2])
+
+    def test_round_trip(self) -> None:
+        """Tests that a result response decodes to the encoded result code."""
+        packet = ResultResponse(ResultCode.RATE_LIMITED).to_bytes()
+        self.assertEqual(
+            (ResultCode.RATE_LIMITED,), ResultResponse.decode_packet(packet)
+        )
+
+    def test_peek_message_type(self) -> None:
+        """Tests that the type of a result response can be found cheaply."""
+        packet = ResultResponse(ResultCode.OVERLOADED).to_bytes()
+        self.assertEqual(MessageType.RESULT, Packet.peek_message_type(packet))
+
+    def test_invalid_result_code(self) -> None:
+        """Tests that an exception is raised if the result code is invalid."""
+        packet = bytearray(ResultResponse(ResultCode.OVERLOADED).to_bytes())
+        packet[3] = 0xFF
+        self.assertRaises(ValueError, ResultResponse.decode_packet, packet)
+
+    def test_wrong_message_type(self) -> None:
+        """Tests that an exception is raised if the message type is not RESULT."""
+        packet = bytearray(ResultResponse(ResultCode.OVERLOADED).to_bytes())
+        packet[2] = MessageType.RESPONSE.value
+        self.assertRaises(ValueError, ResultResponse.decode_packet, packet)
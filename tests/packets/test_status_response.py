@@ -0,0 +1,28 @@
+"""``StatusResponse`` class test suite."""
+
+import unittest
+
+from src.packets.packet import Packet
+from src.packets.status_response import StatusResponse
+from src.message_type import MessageType
+
+
+class TestStatusResponse(unittest.TestCase):
+    """Test suite for encoding and decoding StatusResponse packets."""
+
+    def test_round_trip(self) -> None:
+        """Tests that a status response decodes to the encoded fields."""
+        packet = StatusResponse(3, 1 << 40, 12.5).to_bytes()
+        self.assertEqual((3, 1 << 40, 12.5), StatusResponse.decode_packet(packet))
+
+    def test_peek_message_type(self) -> None:
+        """Tests that a status response shares the type of its request."""
+        packet = StatusResponse(0, 0, 0.0).to_bytes()
+        self.assertEqual(MessageType.STATUS, Packet.peek_message_type(packet))
+        self.assertEqual(StatusResponse.header_size(), len(packet))
+
+    def test_wrong_message_type(self) -> None:
+        """Tests that an exception is raised if the message type is not STATUS."""
+        packet = bytearray(StatusResponse(1, 2, 3.0).to_bytes())
+        packet[2] = MessageType.RESULT.value
+        self.assertRaises(ValueError, StatusResponse.decode_packet, packet)
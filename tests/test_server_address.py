@@ -0,0 +1,56 @@
+"""``ServerAddress`` class test suite."""
+
+import os
+import socket
+import tempfile
+import unittest
+
+from src.server_address import ServerAddress
+
+
+class TestServerAddress(unittest.TestCase):
+    """Test suite for ServerAddress class."""
+
+    def test_tcp_address(self) -> None:
+        """Tests that host names are used as TCP addresses."""
+        address = ServerAddress("localhost", 12000)
+        self.assertEqual(socket.AF_INET, address.family)
+        self.assertEqual(("localhost", 12000), address.socket_address)
+
+    def test_unix_address(self) -> None:
+        """Tests that unix: host names are used as Unix socket paths."""
+        address = ServerAddress("unix:/tmp/server.sock", 12000)
+        self.assertEqual(socket.AF_UNIX, address.family)
+        self.assertEqual("/tmp/server.sock", address.socket_address)
+        self.assertEqual("unix:/tmp/server.sock", str(address))
+
+    def test_connect_unix(self) -> None:
+        """Tests that a connection can be made to a Unix socket."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "server.sock")
+            with socket.socket(socket.AF_UNIX) as welcoming_socket:
+                welcoming_socket.bind(path)
+                welcoming_socket.listen(1)
+
+                address = ServerAddress(ServerAddress.UNIX_PREFIX + path, 0)
+                with address.connect(timeout=1) as connection_socket:
+                    connection_socket.send(b"Hello")
+                    server_socket, _ = welcoming_socket.accept()
+                    with server_socket:
+                        self.assertEqual(b"Hello", server_socket.recv(5))
+
+    def test_connect_missing_unix_socket(self) -> None:
+        """Tests that connecting to a missing Unix socket raises an error."""
+        address = ServerAddress("unix:/nonexistent/server.sock", 0)
+        self.assertRaises(FileNotFoundError, address.connect, 1)
+
+    def test_from_str(self) -> None:
+        """Tests that addresses can be parsed from a single string."""
+        address = ServerAddress.from_str("localhost:12000")
+        self.assertEqual(("localhost", 12000), address.socket_address)
+
+        address = ServerAddress.from_str("unix:/tmp/server.sock")
+        self.assertEqual("/tmp/server.sock", address.socket_address)
+
+        self.assertRaises(ValueError, ServerAddress.from_str, "localhost")
+        self.assertRaises(ValueError, ServerAddress.from_str, "localhost:port")